@@ -0,0 +1,66 @@
+"""add_compact_kline_storage
+
+Revision ID: 5c2e9a7d4b31
+Revises: 64cf476d46db
+Create Date: 2026-10-19 10:12:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e9a7d4b31'
+down_revision: Union[str, None] = '64cf476d46db'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Dictionary of stored pairs; klines_compact refers to them by a 2-byte id
+    op.create_table(
+        'instruments',
+        sa.Column('id', sa.SmallInteger(), primary_key=True, autoincrement=True),
+        sa.Column('symbol', sa.String(length=32), nullable=False),
+        sa.Column('timeframe', sa.String(length=8), nullable=False),
+        sa.UniqueConstraint('symbol', 'timeframe', name='uq_instruments_symbol_timeframe')
+    )
+
+    # 8-byte columns first and the smallint last, so rows carry no alignment padding. close_time is not
+    # stored (derived from open_time and the timeframe) and the primary key is the only index.
+    op.create_table(
+        'klines_compact',
+        sa.Column('open_time', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('open_price', sa.Double(), nullable=False),
+        sa.Column('high_price', sa.Double(), nullable=False),
+        sa.Column('low_price', sa.Double(), nullable=False),
+        sa.Column('close_price', sa.Double(), nullable=False),
+        sa.Column('volume', sa.Double(), nullable=False),
+        sa.Column('quote_asset_volume', sa.Double(), nullable=False),
+        sa.Column('taker_buy_base_asset_volume', sa.Double(), nullable=False),
+        sa.Column('taker_buy_quote_asset_volume', sa.Double(), nullable=False),
+        sa.Column('number_of_trades', sa.BigInteger(), nullable=False),
+        sa.Column('instrument_id', sa.SmallInteger(), sa.ForeignKey('instruments.id'), nullable=False),
+        sa.PrimaryKeyConstraint('instrument_id', 'open_time', name='pk_klines_compact')
+    )
+    # The primary key already serves every open_time lookup, so skip TimescaleDB's default open_time index
+    op.execute("SELECT create_hypertable('klines_compact'::regclass, 'open_time'::name, create_default_indexes => false);")
+
+    # Register the pairs already stored in the legacy table. Their rows are copied separately
+    # (python -m backend.data_ingestion_service.compact_kline_copier) while reads fall back to `klines`.
+    op.execute(
+        "INSERT INTO instruments (symbol, timeframe) "
+        "SELECT DISTINCT symbol, timeframe FROM klines ORDER BY symbol, timeframe "
+        "ON CONFLICT ON CONSTRAINT uq_instruments_symbol_timeframe DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The legacy klines table is left untouched by the upgrade, so nothing needs to be copied back
+    # as long as KLINE_STORAGE is switched back to "legacy" first.
+    op.drop_table('klines_compact')
+    op.drop_table('instruments')
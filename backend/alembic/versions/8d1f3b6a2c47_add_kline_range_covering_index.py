@@ -0,0 +1,53 @@
+"""add_kline_range_covering_index
+
+Revision ID: 8d1f3b6a2c47
+Revises: 5c2e9a7d4b31
+Create Date: 2026-10-19 14:03:27.552190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d1f3b6a2c47'
+down_revision: Union[str, None] = '5c2e9a7d4b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The columns GET /data/klines reads (kline_storage.VALUE_COLUMNS), carried in the index leaf pages
+INCLUDED_COLUMNS = (
+    'open_price', 'high_price', 'low_price', 'close_price', 'volume', 'quote_asset_volume',
+    'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume',
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The single-column indexes from the initial klines migration serve no query: every read filters on
+    # symbol and timeframe (the primary key prefix), and ix_klines_open_time duplicates TimescaleDB's
+    # default klines_open_time_idx, which is kept for the time-only scans (tiering, retention).
+    op.drop_index('ix_klines_symbol', table_name='klines')
+    op.drop_index('ix_klines_timeframe', table_name='klines')
+    op.drop_index('ix_klines_open_time', table_name='klines')
+
+    # Range reads of one pair, newest first (recent loads) or oldest first (start_ms scans), answered by an
+    # index-only scan of the chunks in range. transaction_per_chunk builds it chunk by chunk instead of
+    # locking the whole hypertable for the build, which can't run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_klines_pair_open_time_covering "
+            "ON klines (symbol, timeframe, open_time DESC) "
+            f"INCLUDE ({', '.join(INCLUDED_COLUMNS)}) "
+            "WITH (timescaledb.transaction_per_chunk)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_klines_pair_open_time_covering', table_name='klines')
+    op.create_index('ix_klines_open_time', 'klines', ['open_time'])
+    op.create_index('ix_klines_timeframe', 'klines', ['timeframe'])
+    op.create_index('ix_klines_symbol', 'klines', ['symbol'])
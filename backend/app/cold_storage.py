@@ -0,0 +1,172 @@
+"""
+@file: cold_storage.py
+@description: Cold tier for old klines: one Parquet file per symbol/timeframe/month under COLD_STORAGE_DIR
+              (symbol=BTCUSDT/timeframe=1m/month=2024-01.parquet, Hive-style), sorted by open_time. The
+              tiering job (data_ingestion_service/kline_tiering.py) moves whole months out of the DB into
+              these files; read_cold_klines serves them back to get_historical_klines through memory-mapped
+              Parquet reads that only decode the row groups overlapping the requested range.
+@dependencies: pyarrow (optional; without it tiering is disabled and no cold files are read)
+@created: 2026-10-19
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import settings
+from .kline_storage import VALUE_COLUMNS, close_time_for
+from .models import Kline
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Optional dependency
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+PARQUET_SUFFIX = ".parquet"
+ROW_GROUP_SIZE = 8192 # ~5.7 days of 1m klines per row group; reads skip row groups outside the range
+
+_warned_missing_pyarrow = False
+
+
+def is_enabled() -> bool:
+    """Cold storage is configured (COLD_STORAGE_DIR) and pyarrow is installed."""
+    global _warned_missing_pyarrow
+    if not settings.COLD_STORAGE_DIR:
+        return False
+    if pa is None:
+        if not _warned_missing_pyarrow:
+            logger.warning("[COLD_STORAGE] COLD_STORAGE_DIR is set but pyarrow is not installed; cold storage is disabled.")
+            _warned_missing_pyarrow = True
+        return False
+    return True
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def pair_directory(symbol: str, timeframe: str) -> str:
+    return os.path.join(settings.COLD_STORAGE_DIR, f"symbol={symbol}", f"timeframe={timeframe}")
+
+
+def month_path(symbol: str, timeframe: str, month: datetime) -> str:
+    return os.path.join(pair_directory(symbol, timeframe), f"month={month:%Y-%m}{PARQUET_SUFFIX}")
+
+
+def cold_months(symbol: str, timeframe: str) -> List[datetime]:
+    """Start of every month stored in the cold tier for the pair, oldest first."""
+    try:
+        names = os.listdir(pair_directory(symbol, timeframe))
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        if name.startswith("month=") and name.endswith(PARQUET_SUFFIX):
+            try:
+                months.append(datetime.strptime(name[len("month="):-len(PARQUET_SUFFIX)], "%Y-%m").replace(tzinfo=timezone.utc))
+            except ValueError:
+                continue
+    return sorted(months)
+
+
+def cold_range_end_ms(symbol: str, timeframe: str) -> Optional[int]:
+    """Exclusive end (ms) of the newest cold month, or None if the pair has nothing in the cold tier."""
+    months = cold_months(symbol, timeframe)
+    return _ms(next_month(months[-1])) if months else None
+
+
+def _read_month(path: str, start_ms: Optional[int], end_ms: Optional[int]):
+    filters = []
+    if start_ms is not None:
+        filters.append(("open_time", ">=", start_ms))
+    if end_ms is not None:
+        filters.append(("open_time", "<=", end_ms))
+    return pq.read_table(path, memory_map=True, filters=filters or None)
+
+
+def read_cold_klines(symbol: str, timeframe: str, start_ms: Optional[int], end_ms: Optional[int],
+                     newest_first: bool, limit: int) -> List[Kline]:
+    """
+    Blocking: up to `limit` cold klines with start_ms <= open_time <= end_ms (either bound optional), the
+    newest or the oldest ones, as transient Kline objects in ascending open_time order. Months are read
+    newest or oldest first and reading stops once `limit` klines are collected.
+    """
+    if not is_enabled() or limit <= 0:
+        return []
+    months = [m for m in cold_months(symbol, timeframe)
+              if (start_ms is None or _ms(next_month(m)) > start_ms) and (end_ms is None or _ms(m) <= end_ms)]
+    if newest_first:
+        months.reverse()
+
+    collected: List[Dict[str, list]] = []
+    remaining = limit
+    for month in months:
+        try:
+            columns = _read_month(month_path(symbol, timeframe, month), start_ms, end_ms).to_pydict()
+        except Exception as e:
+            logger.error(f"[COLD_STORAGE] Error reading {symbol}/{timeframe} {month:%Y-%m}: {e}", exc_info=True)
+            continue
+        count = len(columns["open_time"])
+        if count > remaining: # Keep the rows closest to where the read started
+            keep = slice(count - remaining, count) if newest_first else slice(0, remaining)
+            columns = {name: values[keep] for name, values in columns.items()}
+            count = remaining
+        collected.append(columns)
+        remaining -= count
+        if remaining <= 0:
+            break
+    if newest_first:
+        collected.reverse()
+
+    klines = []
+    for columns in collected:
+        for i, open_time_ms in enumerate(columns["open_time"]):
+            open_time = datetime.fromtimestamp(open_time_ms / 1000, tz=timezone.utc)
+            klines.append(Kline(
+                symbol=symbol, timeframe=timeframe, open_time=open_time, close_time=close_time_for(open_time, timeframe),
+                **{column: columns[column][i] for column in VALUE_COLUMNS}
+            ))
+    return klines
+
+
+def write_cold_month(symbol: str, timeframe: str, month: datetime, rows: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """
+    Blocking: writes rows (open_time datetimes plus VALUE_COLUMNS) of one month to its Parquet file, merged
+    with whatever the file already holds (rows already there win), atomically via a temporary file that is
+    fsynced before it replaces the old one. Returns (path, total rows in the file).
+    """
+    path = month_path(symbol, timeframe, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    by_open_time: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        by_open_time[_ms(row["open_time"]) if isinstance(row["open_time"], datetime) else int(row["open_time"])] = row
+    if os.path.exists(path):
+        existing = pq.read_table(path, memory_map=True).to_pylist()
+        for row in existing:
+            by_open_time[row["open_time"]] = row
+
+    open_times = sorted(by_open_time)
+    arrays = {"open_time": pa.array(open_times, type=pa.int64())}
+    for column in VALUE_COLUMNS:
+        values = [by_open_time[t][column] for t in open_times]
+        arrays[column] = pa.array([int(v) for v in values], type=pa.int64()) if column == "number_of_trades" \
+            else pa.array([float(v) for v in values], type=pa.float64())
+    table = pa.table(arrays)
+
+    temporary_path = f"{path}.tmp"
+    pq.write_table(table, temporary_path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    with open(temporary_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+    return path, len(open_times)
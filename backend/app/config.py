@@ -37,21 +37,100 @@ class Settings(BaseSettings):
     PROACTIVE_TIMEFRAMES: str = ""
     PROACTIVE_TIMEFRAMES_LIST: List[str] = Field(default_factory=list)
 
-    # Max number of klines to store in Redis sorted set per symbol/timeframe
+    # Max number of klines to store in Redis sorted set per symbol/timeframe, until the cache policy has sized the pair's window
     MAX_KLINES_IN_REDIS: int = 2000 # Approx 1.4 days for 1m klines
 
+    # Redis kline window sizing (data_ingestion_service/cache_policy.py): a global memory budget split across the
+    # ingested pairs by access frequency, each window capped to a time span so long timeframes don't hoard it
+    REDIS_KLINE_BUDGET_BYTES: int = 256 * 1024 * 1024
+    REDIS_KLINE_MEMBER_BYTES: int = 160 # Packed member plus ZSET entry overhead, turns the budget into a kline count
+    REDIS_WINDOW_MIN_KLINES: int = 500 # Every pair keeps at least this many (or its span cap, if smaller)
+    REDIS_WINDOW_MAX_SPAN_DAYS: int = 365
+    REDIS_WINDOW_WARM_MAX_KLINES: int = 50000 # Older klines loaded from the DB per pair and policy run when a window grows
+    CACHE_POLICY_INTERVAL_SECONDS: int = 300
+
     # Historical Data Backfill Configuration
     INITIAL_BACKFILL_DAYS: int = 14 # Days to backfill if no data exists for a symbol/timeframe
     HISTORICAL_FETCH_BUFFER_KLINES: int = 1 # Number of klines "ago" from current time to target for backfilling
+    STARTUP_BACKFILL_MAX_CONCURRENCY: int = 4 # Max number of symbol/timeframe gap fills running at once on startup
+    BINANCE_REQUEST_WEIGHT_BUDGET_PER_MINUTE: int = 1200 # Shared REST request weight budget for all backfills (Binance allows 6000/min per IP); corrected from X-MBX-USED-WEIGHT-1M
+    HISTORICAL_FETCH_MAX_CONCURRENT_WINDOWS: int = 8 # One-page windows of a single historical fetch requested concurrently
+    HISTORICAL_SAVE_BATCH_SIZE: int = 5000 # Rows per INSERT while streaming a backfill into the DB
+    HISTORICAL_SAVE_QUEUE_MAX_PAGES: int = 16 # Fetched pages waiting for the DB writer before fetchers pause
+    GAP_SCAN_INTERVAL_SECONDS: int = 3600 # How often each owned pair's full history is scanned for holes
+    GAP_SCAN_CHUNK_KLINES: int = 50000 # Open times loaded per scan query
+    GAP_REPAIR_QUEUE_MAX_RANGES: int = 500 # Missing ranges waiting to be refetched; more are picked up by the next scan
+    GAP_REPAIR_WORKERS: int = 2 # Concurrent refetches of queued ranges per worker (on-demand requests are taken first)
+    ON_DEMAND_BACKFILL_MAX_KLINES: int = 5000 # Largest older range a single chart read can request
+    ON_DEMAND_BACKFILL_LOCK_SECONDS: int = 600 # A requested range isn't queued again (by any API worker) for this long
+    BINANCE_REST_BASE_URL: str = "https://api.binance.com" # Point at backend/mock_exchange_server for local testing
+    WS_RESYNC_MAX_KLINES: int = 5000 # Klines missed during a WebSocket reconnect refetched over REST; older ones are left to the gap scanner
+    HTTP_CLIENT_HTTP2: bool = True # Negotiate HTTP/2 on the shared upstream clients (needs httpx[http2]); see app/http_clients.py
+
+    # Closed Kline Spool (closed klines the DB can't take are appended to local files and bulk replayed; see kline_spool.py)
+    KLINE_SPOOL_DIR: str = "./kline_spool" # One subdirectory per worker; empty disables the spool (klines are then dropped on DB errors)
+    KLINE_SPOOL_SEGMENT_MAX_BYTES: int = 16 * 1024 * 1024 # A segment is sealed and a new one started at this size
+    KLINE_SPOOL_FSYNC_BATCH: int = 100 # Spooled klines per fsync
+    KLINE_SPOOL_FSYNC_INTERVAL_SECONDS: float = 1.0 # Longest a spooled kline waits for its fsync
+    KLINE_SPOOL_REPLAY_INTERVAL_SECONDS: float = 5.0 # How often the replayer retries draining the spool into the DB
+    CLOSED_KLINE_DB_TIMEOUT_SECONDS: float = 2.0 # A closed kline insert slower than this is spooled instead of waited for
+
+    # Database Connection Pools (see app/db_pool.py); the API and the ingestion service each size their own
+    API_DB_POOL_SIZE: int = 10
+    API_DB_MAX_OVERFLOW: int = 10
+    API_DB_POOL_TIMEOUT_SECONDS: float = 3.0 # Longest a request waits for a connection before it gets a 503
+    API_DB_MAX_WAITING: int = 32 # Requests waiting on an exhausted pool beyond which new ones get a 503 at once (0: no limit)
+    API_DB_RETRY_AFTER_SECONDS: int = 2 # Retry-After of those 503s
+    INGESTION_DB_POOL_SIZE: int = 10
+    INGESTION_DB_MAX_OVERFLOW: int = 5
+    INGESTION_DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800 # Connections older than this are replaced on their next checkout
+
+    # Query Statistics (see app/query_stats.py); read through GET /admin/db/queries
+    QUERY_STATS_ENABLED: bool = False # Time every statement from startup; admins can also turn collection on and off at runtime
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0 # Statements at least this slow are kept with their parameters
+    SLOW_QUERY_BUFFER_SIZE: int = 200 # Most recent slow statements kept
+    SLOW_QUERY_EXPLAIN: bool = False # Also keep the EXPLAIN plan of slow SELECTs (PostgreSQL only; runs a second query)
+    ADMIN_NICKNAMES: str = "" # Comma-separated nicknames of the users allowed on the /admin endpoints
+
+    # Read Replicas (see app/read_replicas.py)
+    DATABASE_READ_URLS: str = "" # Comma-separated streaming replicas serving the read-only routes (chart history, news); empty reads from DATABASE_URL
+    DATABASE_REPLICA_CHECK_INTERVAL_SECONDS: float = 10.0 # Health and replay lag check interval
+    DATABASE_REPLICA_MAX_LAG_SECONDS: float = 300.0 # A replica further behind leaves the rotation
+    DATABASE_REPLICA_CONNECT_TIMEOUT_SECONDS: int = 3
+
+    # Kline Storage Schema (see app/kline_storage.py)
+    KLINE_STORAGE: str = "legacy" # "legacy" (klines table) or "compact" (klines_compact + instruments)
+    KLINE_LEGACY_FALLBACK_READS: bool = True # In compact mode, also read legacy rows not yet copied (turn off once the copy is done)
+
+    # Cold Storage Tiering (old klines moved from the DB to Parquet files; see app/cold_storage.py)
+    COLD_STORAGE_DIR: str = "" # Shared by the API and the ingestion workers (same host or shared volume); empty disables tiering
+    COLD_STORAGE_AFTER_DAYS: int = 90 # Whole months older than this are moved to the cold tier
+    COLD_STORAGE_TIMEFRAMES: str = "1m" # Comma-separated timeframes that are tiered
+    COLD_STORAGE_TIER_INTERVAL_SECONDS: int = 6 * 60 * 60 # How often each worker tiers its owned pairs
+
+    # Kline Chunk Cache (closed history in aligned blocks, each one packed Redis value; see app/kline_chunk_cache.py)
+    KLINE_CHUNK_CACHE_ENABLED: bool = True
+    KLINE_CHUNK_CACHE_BLOCK_KLINES: int = 1000 # Intervals per block; blocks start at multiples of this many intervals since the epoch
+    KLINE_CHUNK_CACHE_TTL_SECONDS: int = 7 * 24 * 60 * 60 # Run Redis with maxmemory-policy volatile-lru so least recently read blocks are evicted first
+
+    # Runtime Subscription Control (pairs requested via the ingestion:control stream)
+    INGESTION_PAIR_IDLE_EVICTION_SECONDS: int = 15 * 60 # Dynamically added pairs with no viewers for this long are evicted
+    INGESTION_IDLE_CHECK_INTERVAL_SECONDS: int = 60 # How often the ingestion service looks for idle pairs
+    INGESTION_MAX_DYNAMIC_PAIRS: int = 50 # Upper bound on pairs added at runtime, on top of the proactive ones
 
-    # API Data Retrieval Configuration
-    API_REDIS_LOOKBACK_MS: int = 5 * 60 * 1000 # 5 minutes in milliseconds, how far back to check Redis in API endpoint
+    # Sharded Ingestion Workers (pairs are split across workers by consistent hashing, ownership via Redis leases)
+    INGESTION_WORKER_ID: Optional[str] = None # Defaults to "<hostname>-<pid>"
+    INGESTION_LEASE_TTL_MS: int = 10000 # A crashed worker's pairs are taken over once its leases expire
+    INGESTION_HEARTBEAT_INTERVAL_SECONDS: float = 2.0 # Heartbeat, lease renewal and rebalance interval
 
     # WebSocket Configuration
     WEBSOCKET_PING_INTERVAL_SECONDS: int = 30 # Interval in seconds for sending pings to WebSocket clients
 
     # News Fetcher Configuration
     USE_VADER_SENTIMENT_ANALYSIS: bool = True # If True, use VADER. If False, use API-provided sentiment (if available).
+    NEWSDATA_IO_BASE_URL: str = "https://newsdata.io/api/1" # Point at backend/mock_exchange_server (http://localhost:8100/api/1) for local testing
+    COINDESK_BASE_URL: str = "https://data-api.coindesk.com" # Or http://localhost:8100 for the mock server
 
     @field_validator("PROACTIVE_TIMEFRAMES_LIST", mode="before")
     @classmethod
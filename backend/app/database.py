@@ -4,17 +4,36 @@
 @dependencies: sqlalchemy, backend.app.config
 @created: [v2] 2025-05-18
 """
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 # Ensure Base is imported if you plan to run create_all from here, though Alembic handles it.
 # from backend.app.models import Base 
 from .models import Base
 from .config import settings
+from .db_pool import API_SERVICE, create_pooled_engine, pool_profile
+from .read_replicas import ReadSession, ReplicaRouter
 
-engine = create_engine(settings.DATABASE_URL)
+# Sized for the API; the ingestion service switches to its own profile with use_pool_profile()
+engine = create_pooled_engine(settings.DATABASE_URL, pool_profile(API_SERVICE))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read-only routes use ReadSessionLocal: replicas from DATABASE_READ_URLS when set, else the primary
+read_router = ReplicaRouter.from_settings(engine)
+if read_router is not None:
+    ReadSessionLocal = sessionmaker(class_=ReadSession, autocommit=False, autoflush=False, router=read_router)
+else:
+    ReadSessionLocal = SessionLocal
+
+def use_pool_profile(service: str) -> None:
+    """Re-creates the primary engine with the pool profile of `service` (db_pool); call at startup, before any query."""
+    global engine
+    previous = engine
+    engine = create_pooled_engine(settings.DATABASE_URL, pool_profile(service))
+    SessionLocal.configure(bind=engine)
+    if read_router is not None:
+        read_router.primary = engine
+    previous.dispose()
+
 # Dependency to get DB session in path operations
 def get_db():
     db = SessionLocal()
@@ -23,6 +42,14 @@ def get_db():
     finally:
         db.close()
 
+# Dependency for path operations that only read (never write) the DB
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 # Function to create all tables (useful for initial setup without Alembic or for tests)
 # However, for production and development with migrations, Alembic is preferred.
 # def init_db():
@@ -0,0 +1,183 @@
+"""
+@file: db_pool.py
+@description: Sized and instrumented SQLAlchemy connection pools. The API and the ingestion service each use
+              their own pool profile (size, overflow, checkout timeout). InstrumentedQueuePool records the
+              checkout wait, utilization and connection age of every checkout. It also refuses to queue
+              without bound: once the pool is exhausted and `max_waiting` requests are already waiting,
+              further checkouts fail at once with PoolSaturatedError. The API turns that, and a checkout
+              timeout, into a 503 with Retry-After.
+@dependencies: sqlalchemy, app.config, app.query_stats
+@created: 2026-10-19
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from . import query_stats
+from .config import settings
+
+API_SERVICE = "api"
+INGESTION_SERVICE = "ingestion"
+
+_RECENT_SAMPLES = 1024 # Checkouts the wait and age percentiles are computed over
+
+
+@dataclass(frozen=True)
+class PoolProfile:
+    pool_size: int
+    max_overflow: int
+    timeout_seconds: float
+    max_waiting: int # 0: checkouts queue until the timeout, however many are waiting
+
+
+def pool_profile(service: str) -> PoolProfile:
+    if service == INGESTION_SERVICE:
+        # Few, long-lived writers; waiting for a connection beats failing a backfill or a closed kline insert
+        return PoolProfile(settings.INGESTION_DB_POOL_SIZE, settings.INGESTION_DB_MAX_OVERFLOW,
+                           settings.INGESTION_DB_POOL_TIMEOUT_SECONDS, 0)
+    return PoolProfile(settings.API_DB_POOL_SIZE, settings.API_DB_MAX_OVERFLOW,
+                       settings.API_DB_POOL_TIMEOUT_SECONDS, settings.API_DB_MAX_WAITING)
+
+
+class PoolSaturatedError(exc.TimeoutError):
+    """The pool is exhausted and enough checkouts are already waiting; raised instead of queueing."""
+
+
+class PoolStats:
+    """Checkout counters plus the waits and connection ages of the most recent checkouts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.shed = 0
+        self.max_wait_seconds = 0.0
+        self._waits = deque(maxlen=_RECENT_SAMPLES)
+        self._ages = deque(maxlen=_RECENT_SAMPLES)
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            self._waits.append(seconds)
+
+    def record_age(self, seconds: float) -> None:
+        with self._lock:
+            self._ages.append(seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def record_shed(self) -> None:
+        with self._lock:
+            self.shed += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            waits, ages = sorted(self._waits), sorted(self._ages)
+            summary = {"checkouts": self.checkouts, "timeouts": self.timeouts, "shed": self.shed,
+                       "max_wait_ms": round(self.max_wait_seconds * 1000, 3)}
+        summary["recent_wait_ms"] = {
+            "p50": round(waits[len(waits) // 2] * 1000, 3) if waits else 0.0,
+            "p95": round(waits[int(len(waits) * 0.95)] * 1000, 3) if waits else 0.0,
+            "max": round(waits[-1] * 1000, 3) if waits else 0.0,
+        }
+        summary["recent_connection_age_seconds"] = {
+            "p50": round(ages[len(ages) // 2], 1) if ages else 0.0,
+            "max": round(ages[-1], 1) if ages else 0.0,
+        }
+        return summary
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording checkout statistics and shedding checkouts beyond `max_waiting` waiters."""
+
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, max_waiting: int = 0, **kwargs):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+        self.capacity = pool_size + max_overflow if max_overflow >= 0 else None
+        self.max_waiting = max_waiting
+        self.stats = PoolStats()
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+        if "_dispatch" not in kwargs: # recreate() hands the listeners (and the stats) over
+            stats = self.stats
+
+            def on_checkout(dbapi_connection, connection_record, connection_proxy):
+                connected_at = connection_record.info.get("connected_at")
+                if connected_at is not None:
+                    stats.record_age(time.monotonic() - connected_at)
+
+            event.listen(self, "connect", _on_connect)
+            event.listen(self, "checkout", on_checkout)
+
+    def _do_get(self):
+        with self._waiting_lock:
+            exhausted = self.capacity is not None and self.checkedout() >= self.capacity
+            if exhausted and self.max_waiting and self._waiting >= self.max_waiting:
+                self.stats.record_shed()
+                raise PoolSaturatedError(
+                    f"Connection pool exhausted ({self.capacity} connections checked out, {self._waiting} waiting)"
+                )
+            self._waiting += 1
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        finally:
+            with self._waiting_lock:
+                self._waiting -= 1
+        self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # Keeps the waiting limit and the statistics across engine.dispose() and invalidation
+        pool = super().recreate()
+        pool.max_waiting, pool.stats = self.max_waiting, self.stats
+        return pool
+
+    def status_summary(self) -> Dict[str, Any]:
+        checked_out = self.checkedout()
+        summary = {
+            "pool_size": self.size(), "capacity": self.capacity, "checked_out": checked_out, "idle": self.checkedin(),
+            "waiting": self._waiting, "max_waiting": self.max_waiting,
+            "utilization": round(checked_out / self.capacity, 3) if self.capacity else None,
+        }
+        summary.update(self.stats.summary())
+        return summary
+
+
+def _on_connect(dbapi_connection, connection_record):
+    connection_record.info["connected_at"] = time.monotonic()
+
+
+def create_pooled_engine(url: str, profile: PoolProfile, **kwargs) -> Engine:
+    """
+    Engine with an InstrumentedQueuePool sized by `profile` (SQLite keeps SQLAlchemy's default pool), its
+    statements timed by query_stats whenever that is on.
+    """
+    if url.startswith("sqlite"):
+        engine = create_engine(url, **kwargs)
+        query_stats.track_engine(engine)
+        return engine
+    engine = create_engine(
+        url, poolclass=InstrumentedQueuePool, pool_size=profile.pool_size, max_overflow=profile.max_overflow,
+        pool_timeout=profile.timeout_seconds, pool_recycle=settings.DB_POOL_RECYCLE_SECONDS, **kwargs
+    )
+    engine.pool.max_waiting = profile.max_waiting # Not a create_engine() argument
+    query_stats.track_engine(engine)
+    return engine
+
+
+def pool_status(engine: Engine) -> Dict[str, Any]:
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        return engine.pool.status_summary()
+    return {"status": engine.pool.status()}
@@ -0,0 +1,107 @@
+"""
+@file: http_clients.py
+@description: Process-wide registry of shared httpx.AsyncClients, one per upstream API, so fetchers reuse
+              pooled keep-alive (and, when the h2 package is installed, HTTP/2) connections instead of paying
+              DNS/TCP/TLS setup on every call. Limits and timeouts are tuned per upstream.
+@dependencies: httpx (optional: h2, via httpx[http2])
+@created: 2026-10-19
+"""
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+BINANCE_UPSTREAM = "binance"
+NEWSDATA_UPSTREAM = "newsdata"
+COINDESK_UPSTREAM = "coindesk"
+
+
+@dataclass(frozen=True)
+class UpstreamClientProfile:
+    timeout_seconds: float
+    connect_timeout_seconds: float
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry_seconds: float
+    http2: bool = True
+
+
+# Binance backfills run up to STARTUP_BACKFILL_MAX_CONCURRENCY fills of HISTORICAL_FETCH_MAX_CONCURRENT_WINDOWS
+# requests each; over HTTP/2 those share a few multiplexed connections. The news APIs see a handful of calls
+# per fetch cycle, minutes apart, so their idle connections are not kept for long.
+UPSTREAM_PROFILES: Dict[str, UpstreamClientProfile] = {
+    BINANCE_UPSTREAM: UpstreamClientProfile(
+        timeout_seconds=30.0, connect_timeout_seconds=10.0,
+        max_connections=64, max_keepalive_connections=32, keepalive_expiry_seconds=60.0,
+    ),
+    NEWSDATA_UPSTREAM: UpstreamClientProfile(
+        timeout_seconds=20.0, connect_timeout_seconds=10.0,
+        max_connections=4, max_keepalive_connections=2, keepalive_expiry_seconds=30.0,
+    ),
+    COINDESK_UPSTREAM: UpstreamClientProfile(
+        timeout_seconds=20.0, connect_timeout_seconds=10.0,
+        max_connections=4, max_keepalive_connections=2, keepalive_expiry_seconds=30.0,
+    ),
+}
+
+# upstream -> (event loop the client was created on, client). httpx connection pools are bound to the
+# loop that opened them, so a client is only handed out on its own loop.
+_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_http2_available = importlib.util.find_spec("h2") is not None
+
+
+def uses_http2(upstream: str) -> bool:
+    return UPSTREAM_PROFILES[upstream].http2 and settings.HTTP_CLIENT_HTTP2 and _http2_available
+
+
+def build_client(upstream: str) -> httpx.AsyncClient:
+    """A new AsyncClient configured with the upstream's profile (HTTP/2 only if enabled and h2 is installed)."""
+    profile = UPSTREAM_PROFILES[upstream]
+    if profile.http2 and settings.HTTP_CLIENT_HTTP2 and not _http2_available:
+        logger.warning(f"[HTTP_CLIENTS] HTTP/2 requested for {upstream} but the 'h2' package is not installed; using HTTP/1.1.")
+    return httpx.AsyncClient(
+        http2=uses_http2(upstream),
+        timeout=httpx.Timeout(profile.timeout_seconds, connect=profile.connect_timeout_seconds),
+        limits=httpx.Limits(
+            max_connections=profile.max_connections,
+            max_keepalive_connections=profile.max_keepalive_connections,
+            keepalive_expiry=profile.keepalive_expiry_seconds,
+        ),
+    )
+
+
+def get_http_client(upstream: str) -> httpx.AsyncClient:
+    """
+    The shared client for an upstream, created on first use. Callers must not close it; the owning
+    service calls close_http_clients() on shutdown. Must be called from within a running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(upstream)
+    if entry is not None:
+        client_loop, client = entry
+        if client_loop is loop and not client.is_closed:
+            return client
+    client = build_client(upstream)
+    _clients[upstream] = (loop, client)
+    logger.info(f"[HTTP_CLIENTS] Created shared client for {upstream} (http2={uses_http2(upstream)}).")
+    return client
+
+
+async def close_http_clients():
+    """Closes the shared clients created on the current event loop (and forgets ones from other loops)."""
+    loop = asyncio.get_running_loop()
+    for upstream, (client_loop, client) in list(_clients.items()):
+        del _clients[upstream]
+        if client_loop is not loop or client.is_closed:
+            continue
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"[HTTP_CLIENTS] Error closing client for {upstream}: {e}", exc_info=True)
@@ -0,0 +1,207 @@
+"""
+@file: ingestion_control.py
+@description: Redis keys and helpers shared by the API and the Data Ingestion Service for runtime
+              subscription control (requesting ingestion of new symbol/timeframe pairs, tracking viewers),
+              on-demand backfills of older history, and the per-pair history coverage reports.
+@dependencies: redis
+@created: 2026-10-18
+"""
+import re
+import json
+import time
+import logging
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Command stream consumed by the ingestion service. Entries: {command, symbol, timeframe, source, requested_at}
+INGESTION_CONTROL_STREAM = "ingestion:control"
+INGESTION_CONTROL_STREAM_MAXLEN = 1000
+# Last stream entry id processed by the ingestion service, so commands sent during a restart are not lost
+INGESTION_CONTROL_LAST_ID_KEY = "ingestion:control:last_id"
+# SET of "SYMBOL:timeframe" pairs the ingestion service currently ingests
+TRACKED_PAIRS_KEY = "ingestion:tracked_pairs"
+# ZSET of "SYMBOL:timeframe" -> unix seconds of the last API read or WebSocket viewer heartbeat
+PAIR_LAST_ACCESS_KEY = "ingestion:pair_last_access"
+# Hourly ZSETs of "SYMBOL:timeframe" -> reads and viewer heartbeats in that hour; the cache policy sizes each
+# pair's Redis kline window from the last PAIR_ACCESS_COUNT_BUCKETS of them (see cache_policy.py)
+PAIR_ACCESS_COUNT_KEY_PREFIX = "ingestion:pair_access_count:"
+PAIR_ACCESS_COUNT_BUCKET_SECONDS = 3600
+PAIR_ACCESS_COUNT_BUCKETS = 24
+# Short-lived marker so repeated reads of an untracked pair don't flood the stream with duplicate commands
+SUBSCRIBE_REQUEST_DEDUP_KEY_PREFIX = "ingestion:subscribe_requested:"
+SUBSCRIBE_REQUEST_DEDUP_SECONDS = 60
+# JSON coverage report per pair (history bounds, missing ranges), written by the ingestion service's gap scanner
+COVERAGE_REPORT_KEY_PREFIX = "ingestion:coverage:"
+# ZSET of "SYMBOL:timeframe:start_ms-end_ms" ranges requested by chart reads, scored by request time (ms).
+# Any ingestion worker pops them (ZPOPMIN hands each to exactly one) and runs them ahead of gap repairs.
+BACKFILL_REQUEST_QUEUE_KEY = "ingestion:backfill_requests"
+# Per-range lock and status ("queued_on_demand", "in_progress_on_demand", ...). Created with SET NX, so a
+# range is queued once no matter how many API workers see the read; it expires after the request is served.
+BACKFILL_REQUEST_KEY_PREFIX = "ingestion:backfill_request:"
+# Open time (ms) before which Binance has no klines for the pair (e.g. before listing); older reads don't request backfills
+HISTORY_FLOOR_KEY_PREFIX = "ingestion:history_floor:"
+
+BACKFILL_STATUS_QUEUED = "queued_on_demand"
+BACKFILL_STATUS_IN_PROGRESS = "in_progress_on_demand"
+BACKFILL_STATUS_COMPLETED = "completed_on_demand"
+BACKFILL_STATUS_FAILED = "failed_on_demand"
+BACKFILL_STATUS_NO_OLDER_DATA = "no_older_data"
+
+COMMAND_SUBSCRIBE = "subscribe"
+COMMAND_UNSUBSCRIBE = "unsubscribe"
+
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9]{2,20}$")
+# Timeframes supported by Binance kline streams
+SUPPORTED_TIMEFRAMES = {"1s", "1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d", "3d", "1w", "1M"}
+
+def pair_member(symbol: str, timeframe: str) -> str:
+    return f"{symbol.upper()}:{timeframe}"
+
+def parse_pair_member(member: str) -> Optional[Tuple[str, str]]:
+    symbol, sep, timeframe = member.rpartition(":")
+    if not sep or not symbol or not timeframe:
+        return None
+    return symbol, timeframe
+
+def coverage_report_key(symbol: str, timeframe: str) -> str:
+    return f"{COVERAGE_REPORT_KEY_PREFIX}{pair_member(symbol, timeframe)}"
+
+def backfill_request_member(symbol: str, timeframe: str, start_ms: int, end_ms: int) -> str:
+    return f"{pair_member(symbol, timeframe)}:{start_ms}-{end_ms}"
+
+def parse_backfill_request_member(member: str) -> Optional[Tuple[str, str, int, int]]:
+    pair, sep, time_range = member.rpartition(":")
+    start_ms, dash, end_ms = time_range.partition("-")
+    parsed = parse_pair_member(pair) if sep else None
+    if not parsed or not dash or not start_ms.isdigit() or not end_ms.isdigit():
+        return None
+    return parsed[0], parsed[1], int(start_ms), int(end_ms)
+
+def backfill_request_key(symbol: str, timeframe: str, start_ms: int, end_ms: int) -> str:
+    return f"{BACKFILL_REQUEST_KEY_PREFIX}{backfill_request_member(symbol, timeframe, start_ms, end_ms)}"
+
+def history_floor_key(symbol: str, timeframe: str) -> str:
+    return f"{HISTORY_FLOOR_KEY_PREFIX}{pair_member(symbol, timeframe)}"
+
+def is_valid_pair(symbol: str, timeframe: str) -> bool:
+    return bool(SYMBOL_PATTERN.match(symbol.upper())) and timeframe in SUPPORTED_TIMEFRAMES
+
+def _access_count_key(bucket: int) -> str:
+    return f"{PAIR_ACCESS_COUNT_KEY_PREFIX}{bucket}"
+
+def touch_pair_access(redis_client, symbol: str, timeframe: str):
+    """
+    Records that someone is viewing the pair: idle dynamic pairs are evicted based on the last access,
+    and the Redis kline windows are sized from the access counts.
+    """
+    now = int(time.time())
+    member = pair_member(symbol, timeframe)
+    count_key = _access_count_key(now // PAIR_ACCESS_COUNT_BUCKET_SECONDS)
+    redis_client.zadd(PAIR_LAST_ACCESS_KEY, {member: now})
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zincrby(count_key, 1, member)
+    pipe.expire(count_key, PAIR_ACCESS_COUNT_BUCKET_SECONDS * (PAIR_ACCESS_COUNT_BUCKETS + 1))
+    pipe.execute()
+
+def get_pair_access_counts(redis_client) -> Dict[Tuple[str, str], float]:
+    """Reads and viewer heartbeats per pair over the last PAIR_ACCESS_COUNT_BUCKETS hours."""
+    current_bucket = int(time.time()) // PAIR_ACCESS_COUNT_BUCKET_SECONDS
+    pipe = redis_client.pipeline(transaction=False)
+    for bucket in range(current_bucket - PAIR_ACCESS_COUNT_BUCKETS + 1, current_bucket + 1):
+        pipe.zrange(_access_count_key(bucket), 0, -1, withscores=True)
+    counts: Dict[Tuple[str, str], float] = {}
+    for entries in pipe.execute():
+        for member, count in entries or []:
+            parsed = parse_pair_member(member.decode() if isinstance(member, bytes) else member)
+            if parsed:
+                counts[parsed] = counts.get(parsed, 0.0) + count
+    return counts
+
+def get_tracked_pairs(redis_client) -> Set[Tuple[str, str]]:
+    pairs = set()
+    for member in redis_client.smembers(TRACKED_PAIRS_KEY) or []:
+        parsed = parse_pair_member(member)
+        if parsed:
+            pairs.add(parsed)
+    return pairs
+
+def is_pair_tracked(redis_client, symbol: str, timeframe: str) -> bool:
+    return bool(redis_client.sismember(TRACKED_PAIRS_KEY, pair_member(symbol, timeframe)))
+
+def send_ingestion_command(redis_client, command: str, symbol: str, timeframe: str, source: str) -> str:
+    """Appends a command to the control stream. Returns the stream entry id."""
+    return redis_client.xadd(
+        INGESTION_CONTROL_STREAM,
+        {
+            "command": command,
+            "symbol": symbol.upper(),
+            "timeframe": timeframe,
+            "source": source,
+            "requested_at": str(int(time.time())),
+        },
+        maxlen=INGESTION_CONTROL_STREAM_MAXLEN,
+        approximate=True
+    )
+
+def request_pair_ingestion(redis_client, symbol: str, timeframe: str, source: str = "api") -> bool:
+    """
+    Asks the ingestion service to start ingesting an untracked pair.
+    Returns True if a subscribe command was sent, False if the pair is already tracked,
+    invalid, or was requested within the last SUBSCRIBE_REQUEST_DEDUP_SECONDS.
+    """
+    symbol = symbol.upper()
+    if not is_valid_pair(symbol, timeframe):
+        return False
+    if is_pair_tracked(redis_client, symbol, timeframe):
+        return False
+    dedup_key = f"{SUBSCRIBE_REQUEST_DEDUP_KEY_PREFIX}{pair_member(symbol, timeframe)}"
+    if not redis_client.set(dedup_key, "1", nx=True, ex=SUBSCRIBE_REQUEST_DEDUP_SECONDS):
+        return False
+    entry_id = send_ingestion_command(redis_client, COMMAND_SUBSCRIBE, symbol, timeframe, source)
+    logger.info(f"[INGESTION_CONTROL] Requested ingestion of {symbol}/{timeframe} (source: {source}, entry: {entry_id}).")
+    return True
+
+def get_coverage_report(redis_client, symbol: str, timeframe: str) -> Optional[dict]:
+    """Latest gap scan result for the pair, or None if it hasn't been scanned (recently)."""
+    raw = redis_client.get(coverage_report_key(symbol, timeframe))
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        logger.error(f"[INGESTION_CONTROL] Unreadable coverage report for {symbol}/{timeframe}: {raw}")
+        return None
+
+def request_backfill(redis_client, symbol: str, timeframe: str, start_ms: int, end_ms: int, source: str = "api",
+                     lock_seconds: int = 600) -> str:
+    """
+    Asks the ingestion service to backfill [start_ms, end_ms) for a pair, ahead of its background gap repairs.
+    Returns the range's backfill status: BACKFILL_STATUS_QUEUED for a new request, the status of an identical
+    request that's still pending or was just served, or BACKFILL_STATUS_NO_OLDER_DATA if the pair has no
+    klines on Binance before end_ms.
+    """
+    symbol = symbol.upper()
+    floor_ms = redis_client.get(history_floor_key(symbol, timeframe))
+    if floor_ms and end_ms <= int(floor_ms):
+        return BACKFILL_STATUS_NO_OLDER_DATA
+    request_key = backfill_request_key(symbol, timeframe, start_ms, end_ms)
+    if not redis_client.set(request_key, BACKFILL_STATUS_QUEUED, nx=True, ex=lock_seconds):
+        return redis_client.get(request_key) or BACKFILL_STATUS_QUEUED
+    redis_client.zadd(BACKFILL_REQUEST_QUEUE_KEY, {backfill_request_member(symbol, timeframe, start_ms, end_ms): int(time.time() * 1000)})
+    logger.info(f"[INGESTION_CONTROL] Requested backfill of {symbol}/{timeframe} {start_ms}-{end_ms} (source: {source}).")
+    return BACKFILL_STATUS_QUEUED
+
+def set_backfill_request_status(redis_client, symbol: str, timeframe: str, start_ms: int, end_ms: int, status: str, ttl_seconds: int):
+    redis_client.set(backfill_request_key(symbol, timeframe, start_ms, end_ms), status, ex=ttl_seconds)
+
+def pop_backfill_request(redis_client, timeout_seconds: float) -> Optional[Tuple[str, str, int, int]]:
+    """Blocking: takes the oldest requested range, waiting up to timeout_seconds. None on timeout or a malformed entry."""
+    popped = redis_client.bzpopmin(BACKFILL_REQUEST_QUEUE_KEY, timeout=timeout_seconds)
+    if not popped:
+        return None
+    _key, member, _score = popped
+    parsed = parse_backfill_request_member(member)
+    if not parsed:
+        logger.error(f"[INGESTION_CONTROL] Dropping malformed backfill request: {member}")
+    return parsed
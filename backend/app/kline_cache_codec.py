@@ -0,0 +1,110 @@
+"""
+@file: kline_cache_codec.py
+@description: Packed binary members of the Redis kline ZSETs (klines:{symbol}:{timeframe}). One fixed-size
+              little-endian record per kline (90 bytes, versus ~250 for the JSON members it replaces) whose
+              ZSET score is its open_time, so the ingestion writer can upsert by score. Batches are decoded
+              in one np.frombuffer call over the joined members; legacy JSON members are still read so
+              a rolling deploy (and redis_kline_migrator) can convert keys in place.
+@dependencies: numpy, orjson
+@created: 2026-10-19
+"""
+import struct
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import orjson
+
+MEMBER_VERSION = 1
+# version, is_closed, open_time, close_time, number_of_trades (ms / counts), then the float columns
+_MEMBER_STRUCT = struct.Struct("<BBqqq8d")
+MEMBER_SIZE = _MEMBER_STRUCT.size
+FLOAT_FIELDS = (
+    "open_price", "high_price", "low_price", "close_price", "volume",
+    "quote_asset_volume", "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume",
+)
+# Same packed layout as _MEMBER_STRUCT (no padding), so joined members can be viewed as an array
+MEMBER_DTYPE = np.dtype(
+    [("version", "u1"), ("is_closed", "u1"), ("open_time", "<i8"), ("close_time", "<i8"), ("number_of_trades", "<i8")]
+    + [(name, "<f8") for name in FLOAT_FIELDS]
+)
+
+# Keys of the legacy JSON members written by the ingestion service -> KlineRead fields
+_LEGACY_CACHE_FIELDS = {"open": "open_price", "high": "high_price", "low": "low_price", "close": "close_price"}
+
+
+def encode_member(open_time: int, close_time: int, number_of_trades: int, is_closed: bool, open_price, high_price,
+                  low_price, close_price, volume, quote_asset_volume, taker_buy_base_asset_volume,
+                  taker_buy_quote_asset_volume) -> bytes:
+    """Packs one kline. Prices and volumes may be Binance decimal strings or numbers."""
+    return _MEMBER_STRUCT.pack(
+        MEMBER_VERSION, 1 if is_closed else 0, int(open_time), int(close_time), int(number_of_trades),
+        float(open_price), float(high_price), float(low_price), float(close_price), float(volume),
+        float(quote_asset_volume), float(taker_buy_base_asset_volume), float(taker_buy_quote_asset_volume),
+    )
+
+
+def is_packed(member: bytes) -> bool:
+    return len(member) == MEMBER_SIZE and member[0] == MEMBER_VERSION
+
+
+def decode_members(members: Iterable[bytes]) -> np.ndarray:
+    """Structured MEMBER_DTYPE array of the packed members (others are skipped), in the given order."""
+    packed = [m for m in members if is_packed(m)]
+    if not packed:
+        return np.empty(0, dtype=MEMBER_DTYPE)
+    return np.frombuffer(b"".join(packed), dtype=MEMBER_DTYPE)
+
+
+def records_to_dicts(records: np.ndarray, symbol: str, timeframe: str) -> List[Dict[str, Any]]:
+    """KlineRead-shaped dicts (UTC datetimes) for the decoded records."""
+    columns = {name: records[name].tolist() for name in MEMBER_DTYPE.names if name != "version"}
+    klines = []
+    for i in range(len(records)):
+        kline = {name: values[i] for name, values in columns.items()}
+        kline["symbol"], kline["timeframe"] = symbol, timeframe
+        kline["open_time"] = datetime.fromtimestamp(kline["open_time"] / 1000, tz=timezone.utc)
+        kline["close_time"] = datetime.fromtimestamp(kline["close_time"] / 1000, tz=timezone.utc)
+        kline["is_closed"] = bool(kline["is_closed"])
+        klines.append(kline)
+    return klines
+
+
+def decode_legacy_member(member, symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+    """
+    KlineRead-shaped dict of a legacy JSON member, or None if it isn't JSON or lacks fields the packed
+    format needs (the old ingestion cache dict only had OHLCV; such members can't be converted).
+    """
+    try:
+        kline = orjson.loads(member)
+    except orjson.JSONDecodeError:
+        return None
+    if not isinstance(kline, dict):
+        return None
+    kline = {_LEGACY_CACHE_FIELDS.get(key, key): value for key, value in kline.items()}
+    kline["symbol"], kline["timeframe"] = symbol, timeframe
+    if any(kline.get(name) is None for name in FLOAT_FIELDS + ("open_time", "close_time", "number_of_trades")):
+        return None
+    return kline
+
+
+def encode_dict(kline: Dict[str, Any]) -> bytes:
+    """Packs a KlineRead-shaped dict with millisecond (int) open/close times."""
+    return encode_member(
+        kline["open_time"], kline["close_time"], kline["number_of_trades"], bool(kline.get("is_closed", True)),
+        *(kline[name] for name in FLOAT_FIELDS)
+    )
+
+
+def _datetime_ms(value: datetime) -> int:
+    if value.tzinfo is None: # SQLite hands back naive UTC datetimes
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def encode_kline(kline) -> bytes:
+    """Packs a stored (closed) Kline ORM object or a KlineRead; open/close times are datetimes."""
+    return encode_member(
+        _datetime_ms(kline.open_time), _datetime_ms(kline.close_time), kline.number_of_trades,
+        getattr(kline, "is_closed", None) is not False, *(getattr(kline, name) for name in FLOAT_FIELDS)
+    )
@@ -0,0 +1,164 @@
+"""
+@file: kline_chunk_cache.py
+@description: Cache of closed kline history in Redis for the DB reads of GET /data/klines. A pair's history is
+              split into aligned blocks of KLINE_CHUNK_CACHE_BLOCK_KLINES intervals. A block that is both
+              closed (its last kline has closed) and complete (no missing klines) never changes, so the first
+              read stores it as one Redis string of packed records (kline_cache_codec's member layout) under
+              kline_chunk:{symbol}:{timeframe}:{block klines}:{block}, with a long TTL. Later reads are put
+              together from cached blocks, and only the open block and incomplete ones are read from the DB.
+              Backfills only add klines to incomplete blocks, which are never cached, so nothing needs
+              invalidating.
+@dependencies: numpy, redis, app.kline_queries, app.kline_cache_codec
+@created: 2026-10-19
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import kline_queries, kline_storage
+from .config import settings
+from .kline_cache_codec import MEMBER_DTYPE, MEMBER_SIZE, MEMBER_VERSION
+from .kline_storage import VALUE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _ms(value: datetime) -> int:
+    if value.tzinfo is None: # SQLite hands back naive UTC datetimes
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MILLISECOND
+
+
+def _dt(ms: int) -> datetime:
+    return _EPOCH + timedelta(milliseconds=ms)
+
+
+def block_key(symbol: str, timeframe: str, block: int) -> str:
+    return f"kline_chunk:{symbol}:{timeframe}:{settings.KLINE_CHUNK_CACHE_BLOCK_KLINES}:{block}"
+
+
+def encode_block(rows: List[tuple], interval_ms: int) -> bytes:
+    """Packs (open_time, *VALUE_COLUMNS) rows into one value of fixed-size records."""
+    records = np.zeros(len(rows), dtype=MEMBER_DTYPE)
+    records["version"] = MEMBER_VERSION
+    records["is_closed"] = 1
+    open_times = np.array([_ms(row[0]) for row in rows], dtype="<i8")
+    records["open_time"] = open_times
+    records["close_time"] = open_times + (interval_ms - 1)
+    for i, column in enumerate(VALUE_COLUMNS, start=1):
+        records[column] = [row[i] for row in rows]
+    return records.tobytes()
+
+
+def decode_block(value: bytes) -> List[tuple]:
+    """The (open_time, *VALUE_COLUMNS) rows of an encoded block, open_time as a UTC datetime."""
+    records = np.frombuffer(value, dtype=MEMBER_DTYPE)
+    open_times = [_EPOCH + timedelta(milliseconds=ms) for ms in records["open_time"].tolist()]
+    return list(zip(open_times, *(records[column].tolist() for column in VALUE_COLUMNS)))
+
+
+def _consecutive_runs(blocks: List[int]):
+    run = []
+    for block in sorted(blocks):
+        if run and block != run[-1] + 1:
+            yield run[0], run[-1]
+            run = []
+        run.append(block)
+    if run:
+        yield run[0], run[-1]
+
+
+def _load_blocks(redis_client, db_session, symbol: str, timeframe: str, blocks: List[int], interval_ms: int, now_ms: int) -> Dict[int, List[tuple]]:
+    """Every block's rows (ascending): cached ones from Redis, the rest from the DB, caching those now closed and complete."""
+    block_klines = settings.KLINE_CHUNK_CACHE_BLOCK_KLINES
+    span_ms = interval_ms * block_klines
+    closed = [b for b in blocks if (b + 1) * span_ms <= now_ms]
+    loaded: Dict[int, List[tuple]] = {}
+    if closed:
+        try:
+            values = redis_client.mget([block_key(symbol, timeframe, b) for b in closed])
+            for block, value in zip(closed, values):
+                if isinstance(value, bytes) and value and len(value) % MEMBER_SIZE == 0:
+                    loaded[block] = decode_block(value)
+        except Exception as e:
+            logger.warning(f"[CHUNK_CACHE] Error reading cached blocks of {symbol}/{timeframe}, reading them from the DB: {e}")
+
+    to_cache = {}
+    for first, last in _consecutive_runs([b for b in blocks if b not in loaded]):
+        rows = kline_queries.fetch_kline_rows(db_session, symbol, timeframe, _dt(first * span_ms), _dt((last + 1) * span_ms - 1),
+                                              False, (last - first + 1) * block_klines)
+        for block in range(first, last + 1):
+            loaded[block] = []
+        for row in rows:
+            loaded[_ms(row[0]) // span_ms].append(row)
+        for block in range(first, last + 1):
+            if len(loaded[block]) == block_klines and (block + 1) * span_ms <= now_ms:
+                to_cache[block_key(symbol, timeframe, block)] = encode_block(loaded[block], interval_ms)
+    if to_cache:
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for key, value in to_cache.items():
+                pipe.set(key, value, ex=settings.KLINE_CHUNK_CACHE_TTL_SECONDS)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[CHUNK_CACHE] Error caching {len(to_cache)} blocks of {symbol}/{timeframe}: {e}")
+    return loaded
+
+
+def fetch_kline_rows(redis_client, db_session, symbol: str, timeframe: str, start: Optional[datetime], end: Optional[datetime],
+                     newest_first: bool, limit: int) -> List[tuple]:
+    """
+    Blocking. Same result as kline_queries.fetch_kline_rows(db_session, ...) with the default columns, read
+    through the block cache. redis_client must not decode responses; without one (or for calendar
+    timeframes) the DB is read directly.
+    """
+    interval_ms = kline_storage.interval_ms(timeframe)
+    if redis_client is None or not settings.KLINE_CHUNK_CACHE_ENABLED or interval_ms is None:
+        return kline_queries.fetch_kline_rows(db_session, symbol, timeframe, start, end, newest_first, limit)
+    span_ms = interval_ms * settings.KLINE_CHUNK_CACHE_BLOCK_KLINES
+    now_ms = _ms(datetime.now(timezone.utc))
+    end_ms = min(_ms(end), now_ms) if end is not None else now_ms
+    start_ms = _ms(start) if start is not None else None
+    if start_ms is None and not newest_first: # Oldest first from the start of the stored history
+        oldest = kline_queries.fetch_kline_rows(db_session, symbol, timeframe, None, _dt(end_ms), False, 1, columns=())
+        if not oldest:
+            return []
+        start_ms = _ms(oldest[0][0])
+    if start_ms is not None and start_ms > end_ms:
+        return []
+
+    first_block = start_ms // span_ms if start_ms is not None else None
+    last_block = end_ms // span_ms
+    start_dt, end_dt = (_dt(start_ms) if start_ms is not None else None), _dt(end_ms)
+    step = -1 if newest_first else 1
+    block = last_block if newest_first else first_block
+    rows: List[tuple] = []
+    while len(rows) < limit and (first_block is None or block >= first_block) and block <= last_block:
+        # Enough blocks for the rest of the limit, plus one for a read not starting on a block boundary
+        wanted = -(-(limit - len(rows)) // settings.KLINE_CHUNK_CACHE_BLOCK_KLINES) + 1
+        batch = [b for b in (block + step * i for i in range(wanted))
+                 if (first_block is None or b >= first_block) and b <= last_block]
+        loaded = _load_blocks(redis_client, db_session, symbol, timeframe, batch, interval_ms, now_ms)
+        for b in batch:
+            block_rows = loaded[b]
+            if b == first_block:
+                block_rows = [row for row in block_rows if row[0] >= start_dt]
+            if b == last_block:
+                block_rows = [row for row in block_rows if row[0] <= end_dt]
+            rows.extend(reversed(block_rows) if newest_first else block_rows)
+        block = batch[-1] + step
+        if not any(loaded[b] for b in batch):
+            # A long gap, or the end of the stored history: carry on from the next stored kline, if there is one
+            if newest_first:
+                following = kline_queries.fetch_kline_rows(db_session, symbol, timeframe, start_dt, _dt(min(batch) * span_ms - 1), True, 1, columns=())
+            else:
+                following = kline_queries.fetch_kline_rows(db_session, symbol, timeframe, _dt((max(batch) + 1) * span_ms), end_dt, False, 1, columns=())
+            if not following:
+                break
+            block = _ms(following[0][0]) // span_ms
+    return rows[:limit]
@@ -0,0 +1,96 @@
+"""
+@file: kline_queries.py
+@description: ORM-free range reads of one pair's klines for the API hot path. Each statement shape (storage
+              schema, which bounds are set, order, requested columns) is built once with bind parameters
+              and cached, so a read only binds values: SQLAlchemy's compiled cache is hit without building
+              or cache-keying a new select() per request. Rows come back as plain tuples of just the
+              requested columns, with float columns cast to float8 in SQL instead of Decimal in Python.
+@dependencies: sqlalchemy, app.kline_storage (storage schema settings, instrument ids)
+@created: 2026-10-19
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Double, bindparam, cast, exists, select, union_all
+
+from . import kline_storage
+from .kline_storage import VALUE_COLUMNS, get_instrument_id, uses_compact_storage
+from .models import CompactKline, Kline
+
+_FLOAT_COLUMNS = frozenset(c for c in VALUE_COLUMNS if c != "number_of_trades")
+
+# (source, has_start, has_end, newest_first, columns) -> statement; a handful of shapes in practice
+_statements: Dict[Tuple, object] = {}
+
+
+def _legacy_branch(columns: Tuple[str, ...], skip_copied: bool):
+    query = select(
+        Kline.open_time.label("open_time"),
+        *(cast(getattr(Kline, c), Double).label(c) if c in _FLOAT_COLUMNS else getattr(Kline, c).label(c) for c in columns)
+    ).where(Kline.symbol == bindparam("symbol"), Kline.timeframe == bindparam("timeframe"))
+    if skip_copied: # Rows already copied to the compact table are read from there
+        query = query.where(~exists().where(
+            CompactKline.instrument_id == bindparam("instrument_id"), CompactKline.open_time == Kline.open_time
+        ))
+    return query
+
+
+def _compact_branch(columns: Tuple[str, ...]):
+    return select(
+        CompactKline.open_time.label("open_time"), *(getattr(CompactKline, c).label(c) for c in columns)
+    ).where(CompactKline.instrument_id == bindparam("instrument_id"))
+
+
+def _build_statement(source: str, has_start: bool, has_end: bool, newest_first: bool, columns: Tuple[str, ...]):
+    if source == "legacy":
+        query, open_time = _legacy_branch(columns, skip_copied=False), Kline.open_time
+    elif source == "compact":
+        query, open_time = _compact_branch(columns), CompactKline.open_time
+    else: # Compact rows plus legacy rows not copied yet
+        subquery = union_all(_compact_branch(columns), _legacy_branch(columns, skip_copied=True)).subquery("pair_klines")
+        query, open_time = select(subquery), subquery.c.open_time
+    # PostgreSQL pushes the bounds, ORDER BY and LIMIT into each branch of the union
+    if has_start:
+        query = query.where(open_time >= bindparam("start", type_=open_time.type))
+    if has_end:
+        query = query.where(open_time <= bindparam("end", type_=open_time.type))
+    return query.order_by(open_time.desc() if newest_first else open_time.asc()).limit(bindparam("limit"))
+
+
+def _statement(source: str, has_start: bool, has_end: bool, newest_first: bool, columns: Tuple[str, ...]):
+    key = (source, has_start, has_end, newest_first, columns)
+    statement = _statements.get(key)
+    if statement is None:
+        statement = _statements[key] = _build_statement(*key)
+    return statement
+
+
+def fetch_kline_rows(db_session, symbol: str, timeframe: str, start: Optional[datetime], end: Optional[datetime],
+                     newest_first: bool, limit: int, columns: Sequence[str] = VALUE_COLUMNS) -> List[tuple]:
+    """
+    Up to `limit` of the pair's klines with start <= open_time <= end (either bound optional), newest or
+    oldest first, as (open_time, *columns) tuples. open_time is a UTC datetime; float columns are floats.
+    Reads the configured storage, like kline_storage.fetch_pair_klines.
+    """
+    columns = tuple(columns)
+    params = {"symbol": symbol, "timeframe": timeframe, "limit": limit}
+    if not uses_compact_storage():
+        source = "legacy"
+    else:
+        instrument_id = get_instrument_id(db_session, symbol, timeframe)
+        if instrument_id is None:
+            if not kline_storage.settings.KLINE_LEGACY_FALLBACK_READS:
+                return []
+            source = "legacy" # Nothing stored in the compact table for the pair yet
+        else:
+            params["instrument_id"] = instrument_id
+            source = "compact+legacy" if kline_storage.settings.KLINE_LEGACY_FALLBACK_READS else "compact"
+    if start is not None:
+        params["start"] = start
+    if end is not None:
+        params["end"] = end
+
+    rows = db_session.execute(_statement(source, start is not None, end is not None, newest_first, columns), params).all()
+    if rows and rows[0][0].tzinfo is None: # SQLite hands back naive UTC datetimes
+        return [(row[0].replace(tzinfo=timezone.utc), *row[1:]) for row in rows]
+    return [tuple(row) for row in rows]
@@ -0,0 +1,283 @@
+"""
+@file: kline_storage.py
+@description: Reads and writes klines in the configured storage schema (settings.KLINE_STORAGE). "legacy" is
+              the original `klines` table. "compact" is `klines_compact`: a smallint instrument id from the
+              `instruments` dictionary instead of repeated symbol/timeframe strings, float8 instead of
+              NUMERIC columns, close_time derived from open_time, and the primary key as the only index.
+              In compact mode with KLINE_LEGACY_FALLBACK_READS, reads also return legacy rows the compact
+              table doesn't have yet, so the switch doesn't wait for copy_legacy_klines to finish.
+              All functions are blocking (call via asyncio.to_thread) and leave committing to the caller.
+@dependencies: sqlalchemy
+@created: 2026-10-19
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Double, SmallInteger, cast, delete, exists, func as sql_func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .config import settings
+from .models import CompactKline, Instrument, Kline
+
+logger = logging.getLogger(__name__)
+
+STORAGE_LEGACY = "legacy"
+STORAGE_COMPACT = "compact"
+
+# Value columns shared by both schemas (close_time is stored only in the legacy table)
+VALUE_COLUMNS = (
+    "open_price", "high_price", "low_price", "close_price", "volume", "quote_asset_volume",
+    "number_of_trades", "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume",
+)
+_FLOAT_COLUMNS = tuple(c for c in VALUE_COLUMNS if c != "number_of_trades")
+
+_INTERVAL_MS = {
+    "1s": 1000, "1m": 60 * 1000, "3m": 3 * 60 * 1000, "5m": 5 * 60 * 1000, "15m": 15 * 60 * 1000,
+    "30m": 30 * 60 * 1000, "1h": 60 * 60 * 1000, "2h": 2 * 60 * 60 * 1000, "4h": 4 * 60 * 60 * 1000,
+    "6h": 6 * 60 * 60 * 1000, "8h": 8 * 60 * 60 * 1000, "12h": 12 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000, "3d": 3 * 24 * 60 * 60 * 1000, "1w": 7 * 24 * 60 * 60 * 1000,
+}
+
+# (symbol, timeframe) -> instrument id. Only ids read back from committed rows are cached, so a rolled
+# back insert can't leave a dangling id behind.
+_instrument_ids: Dict[Tuple[str, str], int] = {}
+
+
+def uses_compact_storage() -> bool:
+    return settings.KLINE_STORAGE == STORAGE_COMPACT
+
+
+def _insert(db_session, model):
+    """INSERT construct with on_conflict_do_nothing for the session's dialect (PostgreSQL, or SQLite in tests)."""
+    return (sqlite_insert if db_session.get_bind().dialect.name == "sqlite" else pg_insert)(model)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def interval_ms(timeframe: str) -> Optional[int]:
+    """Fixed length of the timeframe's klines, or None for calendar timeframes (1M)."""
+    return _INTERVAL_MS.get(timeframe)
+
+
+def close_time_for(open_time: datetime, timeframe: str) -> datetime:
+    """Binance's close_time for a kline: the last millisecond before the next kline opens."""
+    open_time = _as_utc(open_time)
+    if timeframe == "1M":
+        next_open = open_time.replace(year=open_time.year + open_time.month // 12, month=open_time.month % 12 + 1)
+        return next_open - timedelta(milliseconds=1)
+    return open_time + timedelta(milliseconds=_INTERVAL_MS[timeframe] - 1)
+
+
+def get_instrument_id(db_session, symbol: str, timeframe: str, create: bool = False) -> Optional[int]:
+    """The pair's instrument id; with create=True a missing pair is added (in the caller's transaction)."""
+    key = (symbol, timeframe)
+    cached = _instrument_ids.get(key)
+    if cached is not None:
+        return cached
+    stmt = select(Instrument.id).where(Instrument.symbol == symbol, Instrument.timeframe == timeframe)
+    instrument_id = db_session.execute(stmt).scalar_one_or_none()
+    if instrument_id is not None:
+        _instrument_ids[key] = instrument_id
+        return instrument_id
+    if not create:
+        return None
+    db_session.execute(
+        _insert(db_session, Instrument).values(symbol=symbol, timeframe=timeframe)
+        .on_conflict_do_nothing(index_elements=["symbol", "timeframe"])
+    )
+    instrument_id = db_session.execute(stmt).scalar_one()
+    logger.info(f"[KLINE_STORAGE] Registered instrument {symbol}/{timeframe} as id {instrument_id}.")
+    return instrument_id
+
+
+def to_compact_row(row: Dict[str, Any], instrument_id: int) -> Dict[str, Any]:
+    """A klines_compact row from a legacy-shaped row dict (numerics as decimal strings or Decimals)."""
+    compact = {column: float(row[column]) for column in _FLOAT_COLUMNS}
+    compact["number_of_trades"] = int(row["number_of_trades"])
+    compact["open_time"] = row["open_time"]
+    compact["instrument_id"] = instrument_id
+    return compact
+
+
+def insert_kline_rows(db_session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Inserts legacy-shaped row dicts (the Kline model's columns) into the configured storage, skipping rows
+    that already exist. Returns the number of newly inserted rows. Does not commit.
+    """
+    if not rows:
+        return 0
+    if not uses_compact_storage():
+        stmt = _insert(db_session, Kline).values(rows).on_conflict_do_nothing(index_elements=["symbol", "timeframe", "open_time"])
+    else:
+        instrument_ids: Dict[Tuple[str, str], int] = {}
+        compact_rows = []
+        for row in rows:
+            key = (row["symbol"], row["timeframe"])
+            if key not in instrument_ids:
+                instrument_ids[key] = get_instrument_id(db_session, *key, create=True)
+            compact_rows.append(to_compact_row(row, instrument_ids[key]))
+        stmt = _insert(db_session, CompactKline).values(compact_rows).on_conflict_do_nothing(index_elements=["instrument_id", "open_time"])
+    result = db_session.execute(stmt)
+    return result.rowcount if result else 0
+
+
+def pair_kline_source(db_session, symbol: str, timeframe: str):
+    """
+    Subquery with open_time and VALUE_COLUMNS for one pair's klines in the configured storage, or None if
+    nothing can be stored for it yet. Filters and ORDER BY/LIMIT on open_time are pushed into each branch
+    of the compact/legacy union by PostgreSQL, so both sides are read through their primary keys.
+    """
+    if not uses_compact_storage():
+        return select(Kline.open_time, *(getattr(Kline, c) for c in VALUE_COLUMNS)).where(
+            Kline.symbol == symbol, Kline.timeframe == timeframe
+        ).subquery("pair_klines")
+
+    instrument_id = get_instrument_id(db_session, symbol, timeframe)
+    branches = []
+    if instrument_id is not None:
+        branches.append(select(CompactKline.open_time, *(getattr(CompactKline, c) for c in VALUE_COLUMNS))
+                        .where(CompactKline.instrument_id == instrument_id))
+    if settings.KLINE_LEGACY_FALLBACK_READS:
+        legacy = select(
+            Kline.open_time,
+            *(cast(getattr(Kline, c), Double).label(c) if c in _FLOAT_COLUMNS else getattr(Kline, c) for c in VALUE_COLUMNS)
+        ).where(Kline.symbol == symbol, Kline.timeframe == timeframe)
+        if instrument_id is not None: # Rows already copied are read from the compact table only
+            legacy = legacy.where(~exists().where(CompactKline.instrument_id == instrument_id, CompactKline.open_time == Kline.open_time))
+        branches.append(legacy)
+    if not branches:
+        return None
+    return (branches[0] if len(branches) == 1 else union_all(*branches)).subquery("pair_klines")
+
+
+def history_bounds(db_session, symbol: str, timeframe: str) -> Optional[Tuple[datetime, datetime]]:
+    """(first open_time, last open_time) of the pair's stored klines, or None if there are none."""
+    source = pair_kline_source(db_session, symbol, timeframe)
+    if source is None:
+        return None
+    first, last = db_session.execute(select(sql_func.min(source.c.open_time), sql_func.max(source.c.open_time))).one()
+    return (_as_utc(first), _as_utc(last)) if first is not None else None
+
+
+def load_open_times(db_session, symbol: str, timeframe: str, start: datetime, end: datetime) -> List[datetime]:
+    """Sorted open times in [start, end). Only primary key columns are read."""
+    source = pair_kline_source(db_session, symbol, timeframe)
+    if source is None:
+        return []
+    rows = db_session.execute(
+        select(source.c.open_time).where(source.c.open_time >= start, source.c.open_time < end).order_by(source.c.open_time)
+    ).scalars()
+    return [_as_utc(open_time) for open_time in rows]
+
+
+def fetch_pair_klines(db_session, symbol: str, timeframe: str, start: Optional[datetime], end: Optional[datetime],
+                      newest_first: bool, limit: int) -> List[Kline]:
+    """
+    Up to `limit` klines with start <= open_time <= end (either bound optional), newest or oldest first, as
+    Kline objects. Compact rows are returned as transient Kline objects with close_time filled in.
+    """
+    if not uses_compact_storage():
+        query = select(Kline).where(Kline.symbol == symbol, Kline.timeframe == timeframe)
+        open_time_column = Kline.open_time
+    else:
+        source = pair_kline_source(db_session, symbol, timeframe)
+        if source is None:
+            return []
+        query = select(source)
+        open_time_column = source.c.open_time
+    if start is not None:
+        query = query.where(open_time_column >= start)
+    if end is not None:
+        query = query.where(open_time_column <= end)
+    query = query.order_by(open_time_column.desc() if newest_first else open_time_column.asc()).limit(limit)
+
+    if not uses_compact_storage():
+        return list(db_session.execute(query).scalars().all())
+    klines = []
+    for row in db_session.execute(query).mappings():
+        values = dict(row)
+        values["open_time"] = _as_utc(values["open_time"])
+        klines.append(Kline(symbol=symbol, timeframe=timeframe, close_time=close_time_for(values["open_time"], timeframe), **values))
+    return klines
+
+
+def delete_range_returning(db_session, symbol: str, timeframe: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """
+    Deletes the pair's klines with start <= open_time < end from the configured storage (in compact mode with
+    fallback reads, from the legacy table too) and returns them (open_time and VALUE_COLUMNS). Does not
+    commit, so the caller can keep the rows elsewhere before the delete becomes final.
+    """
+    deleted: Dict[datetime, Dict[str, Any]] = {}
+    targets = []
+    if not uses_compact_storage() or settings.KLINE_LEGACY_FALLBACK_READS:
+        targets.append((Kline, [Kline.symbol == symbol, Kline.timeframe == timeframe]))
+    if uses_compact_storage():
+        instrument_id = get_instrument_id(db_session, symbol, timeframe)
+        if instrument_id is not None:
+            targets.append((CompactKline, [CompactKline.instrument_id == instrument_id]))
+    for model, pair_filter in targets: # Compact rows last, so they win over legacy copies of the same kline
+        result = db_session.execute(
+            delete(model).where(*pair_filter, model.open_time >= start, model.open_time < end)
+            .returning(model.open_time, *(getattr(model, c) for c in VALUE_COLUMNS))
+        )
+        for row in result.mappings():
+            values = dict(row)
+            values["open_time"] = _as_utc(values["open_time"])
+            deleted[values["open_time"]] = values
+    return [deleted[open_time] for open_time in sorted(deleted)]
+
+
+def copy_legacy_klines(db_session_factory, batch_size: int = 50000) -> int:
+    """
+    Copies every legacy `klines` row into `klines_compact` with INSERT ... SELECT, pair by pair in open_time
+    batches of batch_size, committing after each batch. Idempotent (existing rows are skipped), so an
+    interrupted copy can simply be re-run. Returns the number of rows inserted.
+    """
+    db_session = db_session_factory()
+    try:
+        pairs = db_session.execute(select(Kline.symbol, Kline.timeframe).distinct()).all()
+    finally:
+        db_session.close()
+
+    copied = 0
+    for symbol, timeframe in pairs:
+        batch_start = None
+        while True:
+            db_session = db_session_factory()
+            try:
+                instrument_id = get_instrument_id(db_session, symbol, timeframe, create=True)
+                in_batch = [Kline.symbol == symbol, Kline.timeframe == timeframe]
+                if batch_start is not None:
+                    in_batch.append(Kline.open_time > batch_start)
+                batch_end = db_session.execute(
+                    select(Kline.open_time).where(*in_batch).order_by(Kline.open_time).offset(batch_size - 1).limit(1)
+                ).scalar_one_or_none()
+                if batch_end is not None:
+                    in_batch.append(Kline.open_time <= batch_end)
+                columns = ("open_time",) + VALUE_COLUMNS + ("instrument_id",)
+                rows = select(
+                    Kline.open_time,
+                    *(cast(getattr(Kline, c), Double) if c in _FLOAT_COLUMNS else getattr(Kline, c) for c in VALUE_COLUMNS),
+                    literal(instrument_id, SmallInteger),
+                ).where(*in_batch)
+                result = db_session.execute(
+                    _insert(db_session, CompactKline).from_select(columns, rows)
+                    .on_conflict_do_nothing(index_elements=["instrument_id", "open_time"])
+                )
+                db_session.commit()
+                copied += max(result.rowcount or 0, 0)
+            except Exception:
+                db_session.rollback()
+                raise
+            finally:
+                db_session.close()
+            if batch_end is None:
+                break
+            batch_start = batch_end
+            logger.info(f"[KLINE_STORAGE] Copied {symbol}/{timeframe} up to {batch_end} ({copied} rows inserted so far).")
+        logger.info(f"[KLINE_STORAGE] Finished copying {symbol}/{timeframe}.")
+    return copied
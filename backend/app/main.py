@@ -4,13 +4,16 @@
 @dependencies: fastapi, .routers.auth, .routers.users, .routers.data, fastapi.middleware.cors, starlette.middleware.trustedhost
 @created: [v1] 2025-05-18
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import exc as sqlalchemy_exc
 from fastapi.middleware.cors import CORSMiddleware # Added for CORS
 # from starlette.middleware.trustedhost import TrustedHostMiddleware # Temporarily commented out
 from .routers import auth, users, data, news, perflogs # Add perflogs router
+from .routers import admin
 from .routers import config as config_router # Added for config endpoints
 from .database import engine, Base 
-from . import models
+from . import models, query_stats
 from .config import settings
 
 # Create all tables in the database.
@@ -38,6 +41,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Attributes DB time to the route being served (see query_stats.py)
+app.add_middleware(query_stats.QueryStatsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/users", tags=["Users"])
@@ -45,6 +51,16 @@ app.include_router(data.router, prefix="/data", tags=["Data Services"]) # Update
 app.include_router(news.router, prefix="/api", tags=["News"]) # Corrected: Added /api prefix back for consistency
 app.include_router(perflogs.router, prefix="/api") # Added perflogs router with /api prefix
 app.include_router(config_router.router) # Register the new config router
+app.include_router(admin.router)
+
+# The DB connection pool is saturated (see db_pool.py): shed the request instead of queueing it
+@app.exception_handler(sqlalchemy_exc.TimeoutError)
+async def db_pool_saturated_handler(request: Request, exc: sqlalchemy_exc.TimeoutError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The database is busy, retry shortly."},
+        headers={"Retry-After": str(settings.API_DB_RETRY_AFTER_SECONDS)},
+    )
 
 @app.get("/ping", summary="Health check", tags=["Health"])
 async def ping():
@@ -4,7 +4,7 @@
 @dependencies: sqlalchemy, pydantic (for enums if used)
 @created: [v2] 2025-05-18
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Enum as SQLAlchemyEnum, func, BigInteger, Numeric, PrimaryKeyConstraint, Float, Index, Text, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, Boolean, DateTime, Enum as SQLAlchemyEnum, func, BigInteger, Numeric, PrimaryKeyConstraint, Float, Double, Index, Text, ForeignKey, UniqueConstraint
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.dialects.postgresql import ENUM as PgEnum
 import enum
@@ -41,9 +41,9 @@ class Kline(Base):
     __tablename__ = "klines"
 
     # Composite Primary Key
-    symbol = Column(String, nullable=False, index=True)
-    timeframe = Column(String, nullable=False, index=True)
-    open_time = Column(DateTime(timezone=True), nullable=False, index=True)
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False)
+    open_time = Column(DateTime(timezone=True), nullable=False)
 
     # Kline data fields
     open_price = Column(Numeric(precision=18, scale=8), nullable=False)
@@ -59,12 +59,54 @@ class Kline(Base):
 
     # Define the composite primary key constraint
     __table_args__ = (PrimaryKeyConstraint('symbol', 'timeframe', 'open_time', name='pk_klines'),
-                      # Add any other table-level constraints here if needed in the future
+                      # Covering index for one pair's range reads in either order (index-only scans)
+                      Index('ix_klines_pair_open_time_covering', symbol, timeframe, open_time.desc(),
+                            postgresql_include=['open_price', 'high_price', 'low_price', 'close_price', 'volume',
+                                                'quote_asset_volume', 'number_of_trades',
+                                                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume']),
                      )
 
     def __repr__(self):
         return f"<Kline(symbol='{self.symbol}', timeframe='{self.timeframe}', open_time='{self.open_time}')>" 
 
+class Instrument(Base):
+    """Dictionary of the symbol/timeframe pairs stored in klines_compact, keyed by a smallint id."""
+    __tablename__ = "instruments"
+
+    id = Column(SmallInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    symbol = Column(String(32), nullable=False)
+    timeframe = Column(String(8), nullable=False)
+
+    __table_args__ = (UniqueConstraint('symbol', 'timeframe', name='uq_instruments_symbol_timeframe'),)
+
+    def __repr__(self):
+        return f"<Instrument(id={self.id}, symbol='{self.symbol}', timeframe='{self.timeframe}')>"
+
+class CompactKline(Base):
+    """
+    Compact kline storage (see app/kline_storage.py): the pair is an instrument id instead of two strings,
+    prices and volumes are float8 instead of NUMERIC, close_time is derived from open_time and the
+    timeframe, and the primary key is the only index. 8-byte columns come first so rows need no padding.
+    """
+    __tablename__ = "klines_compact"
+
+    open_time = Column(DateTime(timezone=True), nullable=False)
+    open_price = Column(Double, nullable=False)
+    high_price = Column(Double, nullable=False)
+    low_price = Column(Double, nullable=False)
+    close_price = Column(Double, nullable=False)
+    volume = Column(Double, nullable=False)
+    quote_asset_volume = Column(Double, nullable=False)
+    taker_buy_base_asset_volume = Column(Double, nullable=False)
+    taker_buy_quote_asset_volume = Column(Double, nullable=False)
+    number_of_trades = Column(BigInteger, nullable=False)
+    instrument_id = Column(SmallInteger, ForeignKey("instruments.id"), nullable=False)
+
+    __table_args__ = (PrimaryKeyConstraint('instrument_id', 'open_time', name='pk_klines_compact'),)
+
+    def __repr__(self):
+        return f"<CompactKline(instrument_id={self.instrument_id}, open_time='{self.open_time}')>"
+
 class NewsArticle(Base):
     __tablename__ = "news_articles"
 
@@ -0,0 +1,218 @@
+"""
+@file: query_stats.py
+@description: Statement-level DB timing from SQLAlchemy's before/after_cursor_execute events. Every query's
+              latency is added to totals per normalized statement and per calling route (the API route
+              template of the request it ran for, via a context variable the app middleware sets; "-"
+              outside requests). Queries slower than SLOW_QUERY_THRESHOLD_MS are kept in a ring buffer
+              with their (redacted) parameters and, with SLOW_QUERY_EXPLAIN on PostgreSQL, their
+              EXPLAIN plan. Collection is off unless QUERY_STATS_ENABLED is set or an admin turns it on;
+              while off no listener is attached, so queries pay nothing.
+@dependencies: sqlalchemy, app.config
+@created: 2026-10-19
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+import weakref
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request being handled; the route template is read from it once routing has matched
+current_request_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("current_request_scope", default=None)
+
+_PARAMETER_LIST = re.compile(r"\(\s*(?:%\(\w+\)s|\?|:\w+|\$\d+)(?:\s*,\s*(?:%\(\w+\)s|\?|:\w+|\$\d+))+\s*\)")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+_SENSITIVE_PARAMETER = re.compile(r"password|token|secret", re.IGNORECASE)
+_MAX_PARAMETERS_LENGTH = 1000
+
+_lock = threading.Lock()
+_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+_enabled = False
+_by_statement: Dict[str, List[float]] = {} # statement -> [count, total ms, max ms]
+_by_route: Dict[str, List[float]] = {}
+_slow_queries: deque = deque(maxlen=max(1, settings.SLOW_QUERY_BUFFER_SIZE))
+
+
+@lru_cache(maxsize=2048)
+def normalize_statement(statement: str) -> str:
+    """One key per statement shape: literals replaced with ?, IN lists of any length collapsed, whitespace squeezed."""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PARAMETER_LIST.sub("(...)", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+def current_route() -> str:
+    """The route being served, as "METHOD /path/{param}"; "-" outside requests."""
+    scope = current_request_scope.get()
+    if scope is None:
+        return "-"
+    route = scope.get("query_stats_route")
+    if route is None:
+        # scope["route"].path lacks the prefixes of included routers, so put the parameter names back into the path
+        names = {str(value): f"{{{name}}}" for name, value in scope.get("path_params", {}).items()}
+        path = "/".join(names.get(segment, segment) for segment in scope.get("path", "?").split("/"))
+        route = f"{scope.get('method', 'WS')} {path}"
+        if "route" in scope: # Matched: the path parameters are final
+            scope["query_stats_route"] = route
+    return route
+
+
+def _redacted_parameters(parameters, context) -> str:
+    if context is not None and getattr(context, "compiled_parameters", None):
+        # Named even when the driver takes positional parameters
+        parameters = context.compiled_parameters if len(context.compiled_parameters) > 1 else context.compiled_parameters[0]
+    if isinstance(parameters, list):
+        return _truncated(repr([_redacted(p) for p in parameters[:20]]))
+    return _truncated(repr(_redacted(parameters)))
+
+
+def _redacted(parameters):
+    if isinstance(parameters, dict):
+        return {k: ("***" if _SENSITIVE_PARAMETER.search(str(k)) else v) for k, v in parameters.items()}
+    return parameters
+
+
+def _truncated(text: str) -> str:
+    return text if len(text) <= _MAX_PARAMETERS_LENGTH else text[:_MAX_PARAMETERS_LENGTH] + "..."
+
+
+def _explain(connection, statement: str, parameters) -> Optional[str]:
+    if connection.dialect.name != "postgresql" or statement.lstrip()[:6].upper().rstrip() not in ("SELECT", "WITH"):
+        return None
+    try:
+        # A cursor of its own: the slow query's results may not have been fetched yet
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute("EXPLAIN " + statement, parameters)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.close()
+    except Exception as e:
+        logger.warning(f"[QUERY_STATS] Could not EXPLAIN a slow query: {e}")
+        return None
+
+
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    started = connection.info.get("query_stats_started")
+    if not started:
+        return # Collection was turned on while the query was running
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    normalized = normalize_statement(statement)
+    route = current_route()
+    with _lock:
+        for totals, key in ((_by_statement, normalized), (_by_route, route)):
+            entry = totals.get(key)
+            if entry is None:
+                totals[key] = [1, elapsed_ms, elapsed_ms]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed_ms
+                entry[2] = max(entry[2], elapsed_ms)
+    if elapsed_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+        slow_query = {
+            "at": time.time(), "duration_ms": round(elapsed_ms, 3), "route": route, "statement": statement,
+            "parameters": _redacted_parameters(parameters, context), "executemany": executemany,
+            "plan": _explain(connection, statement, parameters) if settings.SLOW_QUERY_EXPLAIN and not executemany else None,
+        }
+        with _lock:
+            _slow_queries.append(slow_query)
+        logger.warning(f"[QUERY_STATS] Slow query ({elapsed_ms:.1f} ms) for {route}: {normalized[:200]}")
+
+
+def _attach(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _detach(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def track_engine(engine: Engine) -> None:
+    """Registers an engine; its queries are timed whenever collection is on."""
+    _engines.add(engine)
+    if _enabled:
+        _attach(engine)
+
+
+def set_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+    for engine in list(_engines):
+        if enabled:
+            _attach(engine)
+        else:
+            _detach(engine)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _by_statement.clear()
+        _by_route.clear()
+        _slow_queries.clear()
+
+
+def _ranked(totals: Dict[str, List[float]], key_name: str, top: int) -> List[Dict[str, Any]]:
+    ranked = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return [
+        {key_name: key, "count": int(count), "total_ms": round(total, 3), "mean_ms": round(total / count, 3), "max_ms": round(longest, 3)}
+        for key, (count, total, longest) in ranked
+    ]
+
+
+def snapshot(top: int = 50) -> Dict[str, Any]:
+    """Totals by statement and by route (largest total DB time first) and the slow query buffer, newest first."""
+    with _lock:
+        by_statement, by_route = dict((k, list(v)) for k, v in _by_statement.items()), dict((k, list(v)) for k, v in _by_route.items())
+        slow_queries = list(reversed(_slow_queries))
+    return {
+        "enabled": _enabled,
+        "slow_query_threshold_ms": settings.SLOW_QUERY_THRESHOLD_MS,
+        "by_statement": _ranked(by_statement, "statement", top),
+        "by_route": _ranked(by_route, "route", top),
+        "slow_queries": slow_queries,
+    }
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware exposing each request's scope to the query listeners, which read the matched route from it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = current_request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_scope.reset(token)
+
+
+set_enabled(settings.QUERY_STATS_ENABLED)
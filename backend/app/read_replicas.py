@@ -0,0 +1,166 @@
+"""
+@file: read_replicas.py
+@description: Routes the read-only API routes (chart history, news) to PostgreSQL streaming replicas listed in
+              DATABASE_READ_URLS, so heavy history reads don't compete with the ingestion inserts on the
+              primary. Replicas are health-checked (reachable, replay lag under DATABASE_REPLICA_MAX_LAG_SECONDS)
+              at most every DATABASE_REPLICA_CHECK_INTERVAL_SECONDS; a replica failing a check or a statement
+              leaves the rotation until a later check passes. A read that needs rows newer than what a replica
+              is known to have replayed goes to the primary.
+@dependencies: sqlalchemy, app.config, app.db_pool
+@created: 2026-10-19
+"""
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db_pool import API_SERVICE, create_pooled_engine, pool_profile
+
+logger = logging.getLogger(__name__)
+
+# Seconds of WAL the replica has received but not replayed yet (0 when it is caught up, so an idle primary
+# doesn't show up as growing lag); 0 on a server that isn't in recovery
+LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def measure_lag_seconds(connection) -> float:
+    return float(connection.execute(LAG_QUERY).scalar() or 0.0)
+
+
+@dataclass
+class Replica:
+    engine: Engine
+    healthy: bool = False # Out of rotation until its first check passes
+    lag_seconds: float = 0.0
+    checked_at: Optional[datetime] = None # Wall clock time of the last passed check
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+    def has_rows_until(self, newest: datetime) -> bool:
+        """Whether the replica had replayed everything written up to `newest` as of its last check."""
+        return self.checked_at is not None and newest <= self.checked_at - timedelta(seconds=self.lag_seconds)
+
+
+class ReplicaRouter:
+    """Picks the engine for a read: a healthy replica (round robin) that has the rows it needs, else the primary."""
+
+    def __init__(self, primary: Engine, replica_engines: List[Engine], check_interval_seconds: float, max_lag_seconds: float):
+        self.primary = primary
+        self.replicas = [Replica(engine) for engine in replica_engines]
+        self.check_interval_seconds = check_interval_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self._round_robin = itertools.count()
+        self._check_lock = threading.Lock()
+        self._last_check_monotonic: Optional[float] = None
+
+    @classmethod
+    def from_settings(cls, primary: Engine) -> Optional["ReplicaRouter"]:
+        urls = [url.strip() for url in settings.DATABASE_READ_URLS.split(",") if url.strip()]
+        if not urls:
+            return None
+        replica_engines = []
+        for url in urls:
+            connect_args = {"connect_timeout": settings.DATABASE_REPLICA_CONNECT_TIMEOUT_SECONDS} if url.startswith("postgresql") else {}
+            replica_engines.append(create_pooled_engine(url, pool_profile(API_SERVICE), pool_pre_ping=True, connect_args=connect_args))
+        return cls(primary, replica_engines, settings.DATABASE_REPLICA_CHECK_INTERVAL_SECONDS, settings.DATABASE_REPLICA_MAX_LAG_SECONDS)
+
+    def check_replicas(self) -> None:
+        """Blocking: connects to every replica and records whether it is usable and how far behind it is."""
+        self._last_check_monotonic = time.monotonic()
+        for replica in self.replicas:
+            try:
+                checked_at = datetime.now(timezone.utc)
+                with replica.engine.connect() as connection:
+                    lag_seconds = measure_lag_seconds(connection)
+            except Exception as e:
+                if replica.healthy:
+                    logger.warning(f"[DB_ROUTING] Replica {replica.name} failed its health check, reads go elsewhere: {e}")
+                replica.healthy = False
+                continue
+            replica.lag_seconds, replica.checked_at = lag_seconds, checked_at
+            healthy = lag_seconds <= self.max_lag_seconds
+            if healthy != replica.healthy:
+                if healthy:
+                    logger.info(f"[DB_ROUTING] Replica {replica.name} is in rotation (lag {lag_seconds:.1f}s).")
+                else:
+                    logger.warning(f"[DB_ROUTING] Replica {replica.name} is {lag_seconds:.1f}s behind, out of rotation.")
+            replica.healthy = healthy
+
+    def _check_if_due(self) -> None:
+        now = time.monotonic()
+        if self._last_check_monotonic is not None and now - self._last_check_monotonic < self.check_interval_seconds:
+            return
+        if not self._check_lock.acquire(blocking=False):
+            return # Another request is checking; route on the current state meanwhile
+        try:
+            self.check_replicas()
+        finally:
+            self._check_lock.release()
+
+    def engine_for(self, newest: Optional[datetime] = None) -> Engine:
+        """The engine for a read needing rows up to `newest` (None: no freshness requirement)."""
+        self._check_if_due()
+        candidates = [r for r in self.replicas if r.healthy and (newest is None or r.has_rows_until(newest))]
+        if not candidates:
+            return self.primary
+        return candidates[next(self._round_robin) % len(candidates)].engine
+
+    def mark_unhealthy(self, engine: Engine) -> None:
+        for replica in self.replicas:
+            if replica.engine is engine and replica.healthy:
+                replica.healthy = False
+                logger.warning(f"[DB_ROUTING] Replica {replica.name} failed a read, out of rotation until its next health check.")
+
+
+class ReadSession(Session):
+    """
+    Session for read-only routes. Binds to the engine the router picks on its first statement; a statement
+    failing on a replica with a connection error is retried once on the primary.
+    """
+
+    def __init__(self, *args, router: ReplicaRouter, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.router = router
+        self._newest_needed: Optional[datetime] = None
+        self._read_engine: Optional[Engine] = None
+
+    def require_rows_until(self, newest: datetime) -> None:
+        """The following reads need every row up to `newest` (e.g. the end of the requested kline range)."""
+        self._newest_needed = newest
+        self._read_engine = None # Routed again on the next statement
+
+    def get_bind(self, mapper=None, **kwargs):
+        if self._read_engine is None:
+            self._read_engine = self.router.engine_for(self._newest_needed)
+        return self._read_engine
+
+    def execute(self, statement, params=None, **kwargs):
+        try:
+            return super().execute(statement, params, **kwargs)
+        except OperationalError:
+            if self._read_engine is None or self._read_engine is self.router.primary:
+                raise
+            self.router.mark_unhealthy(self._read_engine)
+            self.rollback()
+            self._read_engine = self.router.primary
+            return super().execute(statement, params, **kwargs)
+
+
+def require_rows_until(db_session: Session, newest: datetime) -> None:
+    """ReadSession.require_rows_until for sessions that route reads; a no-op for any other session."""
+    if isinstance(db_session, ReadSession):
+        db_session.require_rows_until(newest)
@@ -1,17 +1,18 @@
 import redis
 from .config import settings
 
-def get_redis_connection():
+def get_redis_connection(decode_responses: bool = True):
     """
     Establishes a connection to Redis using settings from the config.
-    Returns a Redis client instance.
+    Returns a Redis client instance. Pass decode_responses=False to read binary values
+    (e.g. the packed kline ZSET members).
     """
     try:
         r = redis.Redis(
             host=settings.REDIS_HOST,
             port=settings.REDIS_PORT,
             db=0,  # Default Redis DB
-            decode_responses=True  # Decode responses from bytes to strings
+            decode_responses=decode_responses  # Decode responses from bytes to strings
         )
         r.ping()  # Verify connection
         print(f"Successfully connected to Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT}")
@@ -0,0 +1,43 @@
+"""
+@file: admin.py (router)
+@description: Admin-only diagnostics: DB connection pool statistics, per-statement and per-route DB timing
+              and the slow query buffer collected by app.query_stats, and turning that collection on and off.
+@dependencies: fastapi, app.database, app.db_pool, app.query_stats, app.security
+@created: 2026-10-19
+"""
+from fastapi import APIRouter, Depends, Query
+
+from .. import database, db_pool, query_stats
+from ..security import get_current_admin_user
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(get_current_admin_user)],
+)
+
+@router.get("/db/pools")
+async def get_db_pool_stats():
+    """Checkout waits, utilization and connection ages of the primary pool and of each replica pool (by index)."""
+    pools = {"primary": db_pool.pool_status(database.engine)}
+    if database.read_router is not None:
+        for index, replica in enumerate(database.read_router.replicas):
+            pools[f"replica-{index}"] = {"healthy": replica.healthy, **db_pool.pool_status(replica.engine)}
+    return pools
+
+@router.get("/db/queries")
+async def get_query_stats(top: int = Query(50, ge=1, le=1000, description="Statements and routes listed, by total DB time")):
+    """DB time by normalized statement and by route, and the most recent slow queries (newest first)."""
+    return query_stats.snapshot(top)
+
+@router.put("/db/queries/enabled")
+async def set_query_stats_enabled(enabled: bool = Query(..., description="Whether statements are timed")):
+    """Turns statement timing on or off for this API process; totals collected so far are kept."""
+    query_stats.set_enabled(enabled)
+    return {"enabled": query_stats.is_enabled()}
+
+@router.delete("/db/queries")
+async def reset_query_stats():
+    """Clears the totals and the slow query buffer."""
+    query_stats.reset()
+    return {"enabled": query_stats.is_enabled()}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Depends, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Depends, WebSocket, WebSocketDisconnect, status
 import pandas as pd
 import io
 import time # For current time
@@ -7,37 +7,137 @@ import logging # For logging
 import asyncio # Moved to top
 from typing import List, Optional, Dict
 from sqlalchemy.orm import Session
-from sqlalchemy import select, desc, asc
+from sqlalchemy import exc as sqlalchemy_exc
 import redis # For redis.exceptions.ConnectionError or similar
 from starlette.websockets import WebSocketState # Added for checking WebSocket state
 from datetime import datetime, timezone
 import websockets # Make sure this import is present or add it
 
-from ..database import get_db # Assuming get_db yields a session
-from ..models import Kline
-from ..schemas import KlineRead, KlineHistoricalResponse # Import new response model
+from ..database import get_read_db # Read-only session: a replica when DATABASE_READ_URLS is set
+from ..models import User
+from ..schemas import KlineRead, KlineHistoricalResponse, BackfillProgress, IngestionPairRequest, IngestionPairStatus, KlineCoverageReport # Import new response model
+from ..security import get_current_active_user
+from .. import cold_storage, ingestion_control, kline_cache_codec, kline_chunk_cache, kline_queries, kline_storage, read_replicas
 from ..redis_utils import get_redis_connection # For Redis connection
-from ..config import settings # For API_REDIS_LOOKBACK_MS
+from ..config import settings
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 EXPECTED_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
 
-# Helper to convert timeframe string (e.g., "1m", "1h") to milliseconds
-# This is duplicated from data_ingestion_service/main.py, consider moving to a shared util
-TIMEFRAME_MS_EQUIVALENTS = {
-    "1m": 60 * 1000,
-    "5m": 5 * 60 * 1000,
-    "15m": 15 * 60 * 1000,
-    "30m": 30 * 60 * 1000,
-    "1h": 60 * 60 * 1000,
-    "4h": 4 * 60 * 60 * 1000,
-    "1d": 24 * 60 * 60 * 1000,
-}
-
-def _timeframe_to_ms(timeframe_str: str) -> Optional[int]:
-    return TIMEFRAME_MS_EQUIVALENTS.get(timeframe_str)
+# Requested backfill ranges start on a multiple of this many intervals (one Binance page), so reads that
+# scroll back by slightly different amounts map to the same range and are deduplicated
+BACKFILL_REQUEST_ALIGN_KLINES = 1000
+
+def _older_history_range(timeframe: str, oldest_available_ms: int, missing_klines: int, start_ms: Optional[int]) -> Optional[tuple]:
+    """[start_ms, end_ms) of stored-history-preceding klines a read asked for but didn't get, or None."""
+    interval_ms = kline_storage.interval_ms(timeframe)
+    if not interval_ms or missing_klines <= 0:
+        return None
+    range_start_ms = start_ms if start_ms is not None else oldest_available_ms - missing_klines * interval_ms
+    range_start_ms = max(range_start_ms, oldest_available_ms - settings.ON_DEMAND_BACKFILL_MAX_KLINES * interval_ms, 0)
+    if oldest_available_ms - range_start_ms < interval_ms:
+        return None
+    align_ms = BACKFILL_REQUEST_ALIGN_KLINES * interval_ms
+    return range_start_ms // align_ms * align_ms, oldest_available_ms
+
+def _to_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+def _cached_open_time_bounds_ms(redis_client, redis_key: str) -> Optional[tuple]:
+    """Scores (open_time ms) of the oldest and newest members of the pair's kline ZSET, or None if it is empty."""
+    oldest = redis_client.zrange(redis_key, 0, 0, withscores=True)
+    newest = redis_client.zrange(redis_key, -1, -1, withscores=True)
+    return (int(oldest[0][1]), int(newest[0][1])) if oldest and newest else None
+
+def _is_contiguous(open_times_ms: List[int], interval_ms: Optional[int], range_start_ms: Optional[int], range_end_ms: Optional[int]) -> bool:
+    """
+    True if the ascending open times hold every kline of [range_start_ms, range_end_ms] (a None bound isn't
+    checked): count == (last - first) / interval + 1, and no interval missing at either end. Calendar
+    timeframes (1M) can't be checked and never count as contiguous.
+    """
+    if not interval_ms or not open_times_ms:
+        return False
+    first, last = open_times_ms[0], open_times_ms[-1]
+    if (last - first) % interval_ms or len(open_times_ms) != (last - first) // interval_ms + 1:
+        return False
+    return (range_start_ms is None or first - range_start_ms < interval_ms) and \
+           (range_end_ms is None or range_end_ms - last < interval_ms)
+
+def _kline_from_row(row: tuple, symbol: str, timeframe: str) -> KlineRead:
+    """KlineRead for an (open_time, *VALUE_COLUMNS) row of kline_queries; the DB types need no validation."""
+    open_time = row[0]
+    return KlineRead.model_construct(
+        symbol=symbol, timeframe=timeframe, open_time=open_time, close_time=kline_storage.close_time_for(open_time, timeframe),
+        **dict(zip(kline_storage.VALUE_COLUMNS, row[1:]))
+    )
+
+def _decode_redis_klines(members: list, symbol: str, timeframe: str, redis_key: str) -> List[KlineRead]:
+    """KlineRead objects for the kline ZSET members (packed, or legacy JSON during the migration)."""
+    klines = []
+    packed = kline_cache_codec.decode_members(m for m in members if isinstance(m, bytes))
+    for kline_dict in kline_cache_codec.records_to_dicts(packed, symbol, timeframe):
+        klines.append(KlineRead(**kline_dict))
+    for member in members:
+        if isinstance(member, bytes) and kline_cache_codec.is_packed(member):
+            continue
+        kline_dict = kline_cache_codec.decode_legacy_member(member, symbol, timeframe)
+        if kline_dict is None:
+            logger.error(f"Skipping undecodable kline member in Redis {redis_key}: {member[:100]!r}")
+            continue
+        try:
+            klines.append(KlineRead(**kline_dict))
+        except Exception as e:
+            logger.error(f"Error processing kline from Redis {redis_key}: {e}, data: {kline_dict}")
+    return klines
+
+async def _read_cold_range(symbol: str, timeframe: str, start_ms: Optional[int], end_ms: Optional[int], newest_first: bool,
+                           limit: int, db_history_exhausted: bool, klines_from_db: List[KlineRead]) -> List[KlineRead]:
+    """
+    Cold-tier klines completing a DB read: older than the oldest DB kline when a newest-first read ran out of
+    DB history, or from start_ms up to the end of the cold tier for an oldest-first read starting inside it.
+    """
+    if newest_first:
+        if not db_history_exhausted or limit <= 0:
+            return []
+        if klines_from_db:
+            end_ms = int(klines_from_db[0].open_time.timestamp() * 1000) - 1
+    else:
+        cold_end_ms = await asyncio.to_thread(cold_storage.cold_range_end_ms, symbol, timeframe)
+        if start_ms is None or cold_end_ms is None or start_ms >= cold_end_ms:
+            return []
+        end_ms = cold_end_ms - 1 if end_ms is None else min(end_ms, cold_end_ms - 1)
+        limit += len(klines_from_db) # The cold klines come first; the combined list is trimmed to the limit later
+    try:
+        klines = await asyncio.to_thread(cold_storage.read_cold_klines, symbol, timeframe, start_ms, end_ms, newest_first, limit)
+    except Exception as e:
+        logger.error(f"Error reading cold klines for {symbol}/{timeframe}: {e}", exc_info=True)
+        return []
+    if klines:
+        logger.info(f"Fetched {len(klines)} klines from cold storage for {symbol}/{timeframe}")
+    return [KlineRead.model_validate(k) for k in klines]
+
+async def _request_older_history(symbol: str, timeframe: str, start_ms: int, end_ms: int) -> Optional[str]:
+    """Queues an on-demand backfill of [start_ms, end_ms) (once across API workers). Returns its status."""
+    redis_client = None
+    try:
+        redis_client = get_redis_connection()
+        if not redis_client:
+            return None
+        return await asyncio.to_thread(
+            ingestion_control.request_backfill, redis_client, symbol, timeframe, start_ms, end_ms, "api_read",
+            settings.ON_DEMAND_BACKFILL_LOCK_SECONDS
+        )
+    except Exception as e:
+        logger.error(f"Error requesting backfill of {symbol}/{timeframe} {start_ms}-{end_ms}: {e}")
+        return None
+    finally:
+        if redis_client:
+            try:
+                await asyncio.to_thread(redis_client.close)
+            except Exception as e:
+                logger.error(f"Error closing Redis connection: {e}")
 
 @router.get("/klines/{symbol:path}/{timeframe}", response_model=KlineHistoricalResponse, tags=["Kline Data"])
 async def get_historical_klines(
@@ -46,7 +146,7 @@ async def get_historical_klines(
     start_ms: Optional[int] = Query(None, description="Start timestamp in milliseconds since epoch"),
     end_ms: Optional[int] = Query(None, description="End timestamp in milliseconds since epoch"),
     limit: int = Query(1000, ge=1, le=5000, description="Maximum number of klines to return"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Fetches historical kline data from TimescaleDB.
@@ -66,6 +166,8 @@ async def get_historical_klines(
     # Variables for backfill status response
     backfill_status_value: Optional[str] = None
     backfill_last_updated_ts_value: Optional[int] = None
+    backfill_progress_value: Optional[BackfillProgress] = None
+    ingestion_requested = False
     redis_client_for_status_check = None # Separate client for status check to avoid interference
 
     try:
@@ -79,13 +181,21 @@ async def get_historical_klines(
                     status_data = json.loads(status_data_raw)
                     backfill_status_value = status_data.get("status")
                     backfill_last_updated_ts_value = status_data.get("last_updated_ts")
+                    if "progress_pct" in status_data:
+                        backfill_progress_value = BackfillProgress(**status_data)
                     # Optional: Check if last_updated_ts is recent enough to be considered active
                     if backfill_status_value == "in_progress" and backfill_last_updated_ts_value:
                         if (current_time_ms - backfill_last_updated_ts_value * 1000) > (60 * 60 * 1000): # 1 hour threshold
                             logger.warning(f"Backfill status for {symbol_upper}/{timeframe} is 'in_progress' but last update was old. Treating as stale.")
                             backfill_status_value = "stale_in_progress" # Or None
-                except json.JSONDecodeError:
+                except ValueError: # JSONDecodeError or a malformed progress field (pydantic ValidationError)
                     logger.error(f"Error decoding backfill status from Redis for {backfill_status_key}")
+            # Mark the pair as viewed and ask the ingestion service to pick it up if nobody ingests it yet
+            if ingestion_control.is_valid_pair(symbol_upper, timeframe):
+                await asyncio.to_thread(ingestion_control.touch_pair_access, redis_client_for_status_check, symbol_upper, timeframe)
+                ingestion_requested = await asyncio.to_thread(
+                    ingestion_control.request_pair_ingestion, redis_client_for_status_check, symbol_upper, timeframe, "api_read"
+                )
     except Exception as e:
         logger.error(f"Error checking backfill status in Redis: {e}")
     finally:
@@ -95,74 +205,56 @@ async def get_historical_klines(
             except Exception as e:
                 logger.error(f"Error closing Redis connection for status check: {e}")
 
-    if actual_end_ms >= (current_time_ms - settings.API_REDIS_LOOKBACK_MS):
-        redis_client = None
-        try:
-            redis_client = get_redis_connection()
-            if redis_client:
-                redis_key = f"klines:{symbol_upper}:{timeframe}"
-                
-                redis_query_start_ms = start_ms if start_ms is not None else 0
-                # Query a slightly wider range in Redis to ensure we capture klines that might start just before API_REDIS_LOOKBACK_MS window
-                # but are still relevant if the overall request (start_ms, end_ms) is narrow and recent.
-                effective_redis_query_start_ms = max(
-                    redis_query_start_ms, 
-                    actual_end_ms - settings.MAX_KLINES_IN_REDIS * _timeframe_to_ms(timeframe) - settings.API_REDIS_LOOKBACK_MS # Heuristic
-                )
-
-                raw_klines_redis = await asyncio.to_thread(
-                    redis_client.zrangebyscore,
-                    redis_key,
-                    effective_redis_query_start_ms, # Use this calculated start for Redis query
-                    actual_end_ms      # Use actual_end_ms for Redis query
-                )
-
-                for raw_kline_str in raw_klines_redis:
-                    try:
-                        kline_dict = json.loads(raw_kline_str)
-                        # Filter client-side to match the original start_ms if it was provided
-                        if start_ms is not None and kline_dict.get('open_time', 0) < start_ms:
-                            continue
-                        klines_from_redis.append(KlineRead(**kline_dict))
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Error decoding kline from Redis {redis_key}: {e}, data: {raw_kline_str}")
-                    except Exception as e: 
-                        logger.error(f"Error processing kline from Redis {redis_key}: {e}, data: {kline_dict if 'kline_dict' in locals() else raw_kline_str}")
-                
-                # Sort Redis results as they might not be perfectly ordered depending on insertion nuances
+    # Redis holds each pair's newest closed klines, from its oldest member on (the window size is set per pair by
+    # the ingestion cache policy). Reads overlapping that window are served from it; the DB supplies anything older,
+    # and the whole read if the cached klines have a hole in it.
+    db_end_ms = end_ms
+    redis_client = None
+    try:
+        redis_client = get_redis_connection(decode_responses=False) # ZSET members are packed binary
+        if redis_client:
+            redis_key = f"klines:{symbol_upper}:{timeframe}"
+            cached_bounds = await asyncio.to_thread(_cached_open_time_bounds_ms, redis_client, redis_key)
+            oldest_cached_ms, newest_cached_ms = cached_bounds if cached_bounds else (None, None)
+            oldest_first_read = start_ms is not None and end_ms is None
+            if oldest_cached_ms is not None and actual_end_ms >= oldest_cached_ms and \
+               not (oldest_first_read and start_ms < oldest_cached_ms): # Such a read starts in the DB and gets `limit` from there
+                redis_query_start_ms = max(start_ms if start_ms is not None else 0, oldest_cached_ms)
+                if oldest_first_read:
+                    raw_klines_redis = await asyncio.to_thread(
+                        redis_client.zrangebyscore, redis_key, redis_query_start_ms, actual_end_ms, start=0, num=limit
+                    )
+                else:
+                    raw_klines_redis = await asyncio.to_thread(
+                        redis_client.zrevrangebyscore, redis_key, actual_end_ms, redis_query_start_ms, start=0, num=limit
+                    )
+                klines_from_redis = _decode_redis_klines(raw_klines_redis, symbol_upper, timeframe, redis_key)
                 klines_from_redis.sort(key=lambda k: k.open_time)
-                logger.info(f"Fetched {len(klines_from_redis)} klines from Redis for {symbol_upper}/{timeframe} between {effective_redis_query_start_ms} and {actual_end_ms}")
-
-                if len(klines_from_redis) >= limit and \
-                   (start_ms is None or start_ms >= effective_redis_query_start_ms) and \
-                   (end_ms is None or end_ms <= actual_end_ms): # Check against actual_end_ms
-                    fetch_from_db = False
-                
-                if klines_from_redis and fetch_from_db:
-                    oldest_redis_kline_time = klines_from_redis[0].open_time
-                    # Adjust the DB query range: end one interval before the oldest Redis kline
-                    # This new end_ms for DB is only used if it's earlier than the original end_ms (or current time if end_ms was None)
-                    # and if it's later than or equal to start_ms (if start_ms was provided)
-                    potential_db_end_ms = oldest_redis_kline_time - 1 
-                    
-                    if (end_ms is None or potential_db_end_ms < end_ms) and \
-                       (start_ms is None or potential_db_end_ms >= start_ms):
-                        end_ms = potential_db_end_ms
-                    elif (start_ms is not None and potential_db_end_ms < start_ms): 
-                        # If adjusting end_ms makes it earlier than start_ms, no DB query needed for this part
-                        fetch_from_db = False
-
-
-        except Exception as e:
-            logger.error(f"Error connecting to or querying Redis: {e}")
-        finally:
-            if redis_client:
-                try:
-                    await asyncio.to_thread(redis_client.close) 
-                except Exception as e:
-                    logger.error(f"Error closing Redis connection: {e}")
+                logger.info(f"Fetched {len(klines_from_redis)} klines from Redis for {symbol_upper}/{timeframe} between {redis_query_start_ms} and {actual_end_ms}")
+
+                # A full page only has to be gap-free on the side it was read from; anything shorter must cover the
+                # requested range from its start (or the oldest member) up to the newest cached kline it reaches
+                filled = len(klines_from_redis) >= limit
+                contiguous = _is_contiguous(
+                    [_to_ms(k.open_time) for k in klines_from_redis], kline_storage.interval_ms(timeframe),
+                    None if filled and not oldest_first_read else redis_query_start_ms,
+                    None if filled and oldest_first_read else min(actual_end_ms, newest_cached_ms)
+                )
+                if not contiguous:
+                    # A hole the live writer didn't fill (or members it didn't write): the DB answers the whole read
+                    logger.info(f"Redis klines for {symbol_upper}/{timeframe} between {redis_query_start_ms} and {actual_end_ms} have a gap, reading from the DB")
+                    klines_from_redis = []
+                elif filled or (start_ms is not None and start_ms >= oldest_cached_ms):
+                    fetch_from_db = False # The whole read fell inside the cached window
+                elif klines_from_redis:
+                    # The DB only supplies the klines preceding the oldest one from Redis
+                    db_end_ms = _to_ms(klines_from_redis[0].open_time) - 1
+    except Exception as e:
+        logger.error(f"Error connecting to or querying Redis: {e}")
+    # redis_client stays open for the chunk cache of the DB read below
 
     klines_from_db: List[KlineRead] = []
+    db_history_exhausted = False # The DB returned fewer klines than asked for: the read reached past stored history
     if fetch_from_db:
         # If end_ms became None due to Redis logic or was already None, and we still need to fetch from DB,
         # it implies we are fetching older data. If start_ms is also None, this case needs careful handling.
@@ -170,51 +262,57 @@ async def get_historical_klines(
         # so the DB query should proceed with its original end_ms logic (or lack thereof).
         
         db_query_start_ms = start_ms
-        db_query_end_ms = end_ms # Use potentially adjusted end_ms from Redis logic
+        db_query_end_ms = db_end_ms # Ends before the klines Redis supplied
+
+        # Reads go through kline_queries so they follow the configured schema (legacy or compact klines)
+        start_dt = datetime.fromtimestamp(db_query_start_ms / 1000.0, tz=timezone.utc) if db_query_start_ms is not None else None
+        end_dt = datetime.fromtimestamp(db_query_end_ms / 1000.0, tz=timezone.utc) if db_query_end_ms is not None else None
 
-        query = select(Kline).where(
-            Kline.symbol == symbol_upper,
-            Kline.timeframe == timeframe
-        )
-        if db_query_start_ms is not None:
-            start_dt = datetime.fromtimestamp(db_query_start_ms / 1000.0, tz=timezone.utc)
-            query = query.where(Kline.open_time >= start_dt)
-        if db_query_end_ms is not None: 
-            end_dt = datetime.fromtimestamp(db_query_end_ms / 1000.0, tz=timezone.utc)
-            query = query.where(Kline.open_time <= end_dt)
-        
         # Determine order for DB query
         # If end_ms is specified (and start_ms is not, or is earlier), fetch latest towards end_ms.
         # Otherwise, fetch oldest from start_ms.
         # MODIFIED: If neither start_ms nor end_ms is given, fetch newest first (default initial load).
         if (db_query_end_ms is not None and (db_query_start_ms is None or db_query_start_ms <= db_query_end_ms)) or \
            (db_query_start_ms is None and db_query_end_ms is None):
-            query = query.order_by(desc(Kline.open_time)) # Fetch newest first
-            db_ordered_desc = True
+            db_ordered_desc = True # Fetch newest first
         else:
-            query = query.order_by(asc(Kline.open_time)) # Fetch oldest first from start_ms
-            db_ordered_desc = False
+            db_ordered_desc = False # Fetch oldest first from start_ms
 
         db_limit = limit - len(klines_from_redis)
         if db_limit > 0:
-            query = query.limit(db_limit)
             try:
-                result = db.execute(query)
-                klines_db_orm = result.scalars().all()
-                if db_ordered_desc and klines_db_orm:
-                    klines_db_orm.reverse() # Ensure ascending order before combining
-                
-                for k_orm in klines_db_orm:
-                    # Ensure datetime fields from ORM are UTC-aware before validation
-                    if k_orm.open_time and k_orm.open_time.tzinfo is None:
-                        k_orm.open_time = k_orm.open_time.replace(tzinfo=timezone.utc)
-                    if k_orm.close_time and k_orm.close_time.tzinfo is None:
-                        k_orm.close_time = k_orm.close_time.replace(tzinfo=timezone.utc)
-                    klines_from_db.append(KlineRead.model_validate(k_orm))
+                # A replica only serves the read if it has replayed the range's newest klines
+                read_replicas.require_rows_until(db, end_dt if end_dt is not None else datetime.now(timezone.utc))
+                # Closed, complete blocks of history come from the Redis chunk cache; the rest from the DB
+                kline_rows = await asyncio.to_thread(
+                    kline_chunk_cache.fetch_kline_rows, redis_client, db, symbol_upper, timeframe, start_dt, end_dt, db_ordered_desc, db_limit
+                )
+                if db_ordered_desc:
+                    kline_rows.reverse() # Ensure ascending order before combining
+                klines_from_db = [_kline_from_row(row, symbol_upper, timeframe) for row in kline_rows]
                 logger.info(f"Fetched {len(klines_from_db)} klines from DB for {symbol_upper}/{timeframe}")
+                db_history_exhausted = len(klines_from_db) < db_limit
+            except sqlalchemy_exc.TimeoutError:
+                raise # Pool saturated: answered with a 503 by the app's handler
             except Exception as e:
                 logger.error(f"Error fetching kline data from DB: {str(e)}")
 
+            # Months moved out of the DB (see cold_storage.py) are read from their Parquet files
+            if cold_storage.is_enabled():
+                klines_from_cold = await _read_cold_range(
+                    symbol_upper, timeframe, db_query_start_ms, db_query_end_ms, db_ordered_desc,
+                    db_limit - len(klines_from_db), db_history_exhausted, klines_from_db
+                )
+                if klines_from_cold:
+                    klines_from_db = klines_from_cold + klines_from_db
+                    db_history_exhausted = len(klines_from_db) < db_limit
+
+    if redis_client:
+        try:
+            await asyncio.to_thread(redis_client.close)
+        except Exception as e:
+            logger.error(f"Error closing Redis connection: {e}")
+
     combined_klines = klines_from_db + klines_from_redis 
     
     unique_klines_dict: Dict[tuple, KlineRead] = {}
@@ -255,12 +353,92 @@ async def get_historical_klines(
     if not final_klines:
         logger.info(f"No kline data found for {symbol_upper}/{timeframe} with given parameters.")
 
+    # Scrolled back past the oldest stored kline: ask the ingestion service for the older range. The client
+    # sees backfill_status (e.g. "queued_on_demand") and retries the read once it's completed.
+    if db_history_exhausted and ingestion_control.is_valid_pair(symbol_upper, timeframe):
+        if sorted_klines:
+            oldest_available_ms = int(sorted_klines[0].open_time.timestamp() * 1000)
+        else:
+            oldest_available_ms = db_query_end_ms + 1 if db_query_end_ms is not None else None
+        if oldest_available_ms is not None:
+            older_range = _older_history_range(timeframe, oldest_available_ms, db_limit - len(klines_from_db), start_ms)
+            if older_range:
+                on_demand_status = await _request_older_history(symbol_upper, timeframe, *older_range)
+                if on_demand_status:
+                    backfill_status_value = on_demand_status
+
     return KlineHistoricalResponse(
         klines=final_klines,
         backfill_status=backfill_status_value,
-        backfill_last_updated_ts=backfill_last_updated_ts_value
+        backfill_last_updated_ts=backfill_last_updated_ts_value,
+        backfill_progress=backfill_progress_value,
+        ingestion_requested=ingestion_requested
     )
 
+@router.get("/ingestion/pairs", response_model=List[IngestionPairStatus], tags=["Ingestion Control"])
+async def list_ingested_pairs(current_user: User = Depends(get_current_active_user)):
+    """Lists the symbol/timeframe pairs the Data Ingestion Service currently ingests."""
+    redis_client = get_redis_connection()
+    if not redis_client:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Redis unavailable")
+    try:
+        tracked_pairs = await asyncio.to_thread(ingestion_control.get_tracked_pairs, redis_client)
+    finally:
+        await asyncio.to_thread(redis_client.close)
+    return [
+        IngestionPairStatus(symbol=symbol, timeframe=timeframe, tracked=True, ingestion_requested=False)
+        for symbol, timeframe in sorted(tracked_pairs)
+    ]
+
+@router.post("/ingestion/pairs", response_model=IngestionPairStatus, status_code=status.HTTP_202_ACCEPTED, tags=["Ingestion Control"])
+async def request_pair_ingestion(
+    pair: IngestionPairRequest,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Asks the Data Ingestion Service to backfill and live-ingest a symbol/timeframe pair without a restart.
+    The pair is evicted again once it has had no viewers for INGESTION_PAIR_IDLE_EVICTION_SECONDS.
+    """
+    symbol_upper = pair.symbol.upper()
+    if not ingestion_control.is_valid_pair(symbol_upper, pair.timeframe):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Unsupported symbol/timeframe: {pair.symbol}/{pair.timeframe}")
+    redis_client = get_redis_connection()
+    if not redis_client:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Redis unavailable")
+    try:
+        await asyncio.to_thread(ingestion_control.touch_pair_access, redis_client, symbol_upper, pair.timeframe)
+        tracked = await asyncio.to_thread(ingestion_control.is_pair_tracked, redis_client, symbol_upper, pair.timeframe)
+        requested = False
+        if not tracked:
+            # Explicit requests bypass the read-path dedup marker
+            await asyncio.to_thread(
+                ingestion_control.send_ingestion_command, redis_client,
+                ingestion_control.COMMAND_SUBSCRIBE, symbol_upper, pair.timeframe, f"user:{current_user.id}"
+            )
+            requested = True
+            logger.info(f"User {current_user.id} requested ingestion of {symbol_upper}/{pair.timeframe}.")
+    finally:
+        await asyncio.to_thread(redis_client.close)
+    return IngestionPairStatus(symbol=symbol_upper, timeframe=pair.timeframe, tracked=tracked, ingestion_requested=requested)
+
+@router.get("/ingestion/coverage/{symbol}/{timeframe}", response_model=KlineCoverageReport, tags=["Ingestion Control"])
+async def get_pair_coverage(symbol: str, timeframe: str, current_user: User = Depends(get_current_active_user)):
+    """
+    Returns the latest full-history scan of a pair: stored range, missing kline count and the missing
+    ranges queued for refetch. Pairs are rescanned every GAP_SCAN_INTERVAL_SECONDS by the worker that owns them.
+    """
+    symbol_upper = symbol.upper()
+    redis_client = get_redis_connection()
+    if not redis_client:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Redis unavailable")
+    try:
+        report = await asyncio.to_thread(ingestion_control.get_coverage_report, redis_client, symbol_upper, timeframe)
+    finally:
+        await asyncio.to_thread(redis_client.close)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No coverage report for {symbol_upper}/{timeframe} yet")
+    return KlineCoverageReport(**report)
+
 @router.websocket("/ws/klines/{symbol:path}/{timeframe}")
 async def websocket_kline_updates(
     websocket: WebSocket, symbol: str, timeframe: str
@@ -283,6 +461,9 @@ async def websocket_kline_updates(
         # Check if Redis connection is alive
         await asyncio.to_thread(redis_client.ping)
         logger.info(f"WS ({symbol.upper()}/{timeframe}): Successfully connected to Redis and pinged.")
+        if ingestion_control.is_valid_pair(symbol, timeframe):
+            await asyncio.to_thread(ingestion_control.touch_pair_access, redis_client, symbol, timeframe)
+            await asyncio.to_thread(ingestion_control.request_pair_ingestion, redis_client, symbol, timeframe, "websocket")
 
         pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
         channel_name = f"kline_updates:{symbol.upper()}:{timeframe}"
@@ -336,6 +517,12 @@ async def websocket_kline_updates(
                     if websocket.client_state == WebSocketState.CONNECTED:
                         # logger.debug(f"WS ({symbol.upper()}/{timeframe}): Sending ping to client.")
                         await websocket.send_json({"type": "ping", "timestamp": int(time.time() * 1000)})
+                        # Viewer heartbeat; keeps a dynamically ingested pair from being evicted
+                        if ingestion_control.is_valid_pair(symbol, timeframe):
+                            try:
+                                await asyncio.to_thread(ingestion_control.touch_pair_access, redis_client, symbol, timeframe)
+                            except redis.exceptions.RedisError as e_touch:
+                                logger.warning(f"WS ({symbol.upper()}/{timeframe}): Could not record viewer heartbeat: {e_touch}")
                     else:
                         logger.info(f"WS ({symbol.upper()}/{timeframe}): WebSocket no longer connected, stopping pinger.")
                         break
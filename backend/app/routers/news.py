@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 import logging
 from typing import List
 from sqlalchemy import select
+from sqlalchemy import exc as sqlalchemy_exc
 
 # Add project root to sys.path if not already configured for routers
 import sys
@@ -13,7 +14,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 sys.path.insert(0, PROJECT_ROOT)
 
 from .. import schemas, models
-from ..database import SessionLocal, get_db
+from ..database import SessionLocal, get_read_db
 
 router = APIRouter(
     prefix="/news",
@@ -37,7 +38,7 @@ DEFAULT_NEWS_LIMIT = 15
 @router.get("/{symbol}", response_model=List[schemas.NewsArticleRead])
 async def get_news_for_symbol(
     symbol: str, 
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     limit: int = Query(20, ge=1, le=100) # Default 20, max 100
 ):
     """
@@ -96,6 +97,8 @@ async def get_news_for_symbol(
         # For now, let's assume direct compatibility or that Pydantic handles it.
         print(f"<<<<< 6 - INSIDE get_news_for_symbol for {symbol} (articles): {news_articles}")
         return news_articles # FastAPI will handle Pydantic model conversion if types match up
+    except sqlalchemy_exc.TimeoutError:
+        raise # Pool saturated: answered with a 503 by the app's handler
     except Exception as e:
         logger.error(f"Error fetching news for symbol {symbol} from DB: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error while fetching news.") 
\ No newline at end of file
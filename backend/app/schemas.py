@@ -6,7 +6,7 @@
 """
 from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from decimal import Decimal
 
 from .models import SubscriptionPlanEnum, TradeDirectionEnum
@@ -82,10 +82,44 @@ class KlineRead(KlineBase):
             datetime: lambda dt: int(dt.timestamp() * 1000)
         }
 
+class BackfillProgress(BaseModel):
+    progress_pct: Optional[float] = None
+    rows_written: Optional[int] = None
+    rows_per_second: Optional[float] = None
+    eta_seconds: Optional[int] = None
+    fetched_until_ms: Optional[int] = None # Everything before this is in the DB
+    target_end_ms: Optional[int] = None
+    resumed_from_ms: Optional[int] = None # Set when the backfill was resumed from a checkpoint after a restart
+
 class KlineHistoricalResponse(BaseModel):
     klines: List[KlineRead]
     backfill_status: Optional[str] = None
     backfill_last_updated_ts: Optional[int] = None
+    backfill_progress: Optional[BackfillProgress] = None # Present while a backfill job reports progress
+    ingestion_requested: bool = False # True if this request asked the ingestion service to start tracking the pair
+
+class IngestionPairRequest(BaseModel):
+    symbol: str = Field(..., min_length=2, max_length=20)
+    timeframe: str
+
+class IngestionPairStatus(BaseModel):
+    symbol: str
+    timeframe: str
+    tracked: bool
+    ingestion_requested: bool
+
+class KlineCoverageReport(BaseModel):
+    symbol: str
+    timeframe: str
+    first_open_time_ms: Optional[int] = None
+    last_open_time_ms: Optional[int] = None
+    present_klines: int
+    missing_klines: int
+    coverage_pct: float
+    missing_range_count: int
+    missing_ranges: List[Tuple[int, int]] # First ranges only; [start_ms, end_ms) queued for refetch
+    unfillable_ranges: List[Tuple[int, int]] # Ranges Binance has no klines for
+    scanned_at: int
 
 class NewsArticleBase(BaseModel):
     external_article_id: str
@@ -86,6 +86,12 @@ async def get_current_active_user(current_user: models.User = Depends(get_curren
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
     return current_user
 
+async def get_current_admin_user(current_user: models.User = Depends(get_current_active_user)) -> models.User:
+    admin_nicknames = {nickname.strip() for nickname in settings.ADMIN_NICKNAMES.split(",") if nickname.strip()}
+    if current_user.nickname not in admin_nicknames:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
 # JWT Token Decoding/Verification (will be expanded in Task 1.5)
 # For now, a placeholder or basic structure if needed by registration success
 # def verify_access_token(token: str, credentials_exception) -> Optional[TokenData]:
@@ -0,0 +1,5 @@
+"""
+@file: __init__.py
+@description: Makes 'benchmarks' a Python package. Micro-benchmarks for backend hot paths.
+@dependencies: None
+"""
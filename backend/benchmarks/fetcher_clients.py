@@ -0,0 +1,119 @@
+"""
+Offline benchmark for the upstream fetchers against backend/mock_exchange_server, served over real
+local TCP by uvicorn in this process (so connection setup and keep-alive are actually measured).
+
+Runs the same sequence of calls twice: once with a fresh httpx.AsyncClient per call (how the fetchers
+used to work) and once through the shared per-upstream clients of backend.app.http_clients. Reports
+calls per second for fetch_historical_klines, fetch_stock_news and fetch_coindesk_crypto_news.
+
+Run from the project root (the usual .env / DATABASE_URL settings must be loadable, no DB is used):
+    python -m backend.benchmarks.fetcher_clients [--calls 200] [--latency-ms 5] [--jitter-ms 5]
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import time
+from unittest.mock import patch
+
+import httpx
+import uvicorn
+
+from backend.app import http_clients
+from backend.app.config import settings
+from backend.data_ingestion_service import historical_data_fetcher
+from backend.data_ingestion_service.rate_limiter import RequestWeightBudget
+from backend.mock_exchange_server.app import create_app
+from backend.news_fetcher_service import main as news_fetcher
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+_fresh_clients = []
+
+def _fresh_client_per_call(upstream: str) -> httpx.AsyncClient:
+    # Mimics `async with httpx.AsyncClient() as client:` per call: the client is never reused
+    _fresh_clients.append(httpx.AsyncClient(timeout=30.0))
+    return _fresh_clients[-1]
+
+
+async def _klines_call():
+    now_ms = int(time.time() * 1000)
+    start_ms = now_ms - 3 * 60 * 60 * 1000
+    # Three one-page windows of 60 1m klines each, fetched concurrently
+    await historical_data_fetcher.fetch_historical_klines(
+        "BTCUSDT", "1m", start_ms, now_ms, limit_per_api_call=60,
+        weight_budget=RequestWeightBudget(10 ** 9), max_concurrent_windows=3
+    )
+
+
+async def _stock_news_call():
+    await news_fetcher.fetch_stock_news("AAPL")
+
+
+async def _crypto_news_call():
+    await news_fetcher.fetch_coindesk_crypto_news(news_fetcher.CRYPTO_SYMBOLS_TO_TRACK_INTERNAL)
+
+
+async def _measure(call, calls: int, shared: bool) -> float:
+    patches = [] if shared else [
+        patch.object(historical_data_fetcher, "get_http_client", _fresh_client_per_call),
+        patch.object(news_fetcher, "get_http_client", _fresh_client_per_call),
+    ]
+    for p in patches:
+        p.start()
+    try:
+        start = time.perf_counter()
+        for _ in range(calls):
+            await call()
+        return calls / (time.perf_counter() - start)
+    finally:
+        for p in patches:
+            p.stop()
+        while _fresh_clients:
+            await _fresh_clients.pop().aclose()
+        await http_clients.close_http_clients()
+
+
+async def run(args):
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    app = create_app(weight_limit=10 ** 9, latency_seconds=args.latency_ms / 1000,
+                     latency_jitter_seconds=args.jitter_ms / 1000, news_request_limit=10 ** 9)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    settings.BINANCE_REST_BASE_URL = base_url
+    news_fetcher.NEWSDATA_IO_BASE_URL = f"{base_url}/api/1"
+    news_fetcher.COINDESK_BASE_URL = base_url
+    for logger_name in ("httpx", news_fetcher.__name__, historical_data_fetcher.__name__, http_clients.__name__):
+        logging.getLogger(logger_name).setLevel(logging.WARNING)
+    try:
+        print(f"calls per fetcher: {args.calls}, mock latency {args.latency_ms} ms + up to {args.jitter_ms} ms jitter")
+        for name, call in (("fetch_historical_klines", _klines_call), ("fetch_stock_news", _stock_news_call),
+                           ("fetch_coindesk_crypto_news", _crypto_news_call)):
+            fresh_rate = await _measure(call, args.calls, shared=False)
+            shared_rate = await _measure(call, args.calls, shared=True)
+            print(f"{name:28} fresh client: {fresh_rate:8.1f} calls/s   shared client: {shared_rate:8.1f} calls/s   "
+                  f"speedup: {shared_rate / fresh_rate:5.2f}x")
+    finally:
+        server.should_exit = True
+        await server_task
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="Calls per fetcher and client mode")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Mock server latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="Random extra mock latency, up to this much")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
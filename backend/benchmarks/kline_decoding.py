@@ -0,0 +1,118 @@
+"""
+Micro-benchmark for the ingestion decode path: Binance WebSocket kline message -> DB row,
+Redis cache member and Pub/Sub payload (everything kline_data_processor does except I/O).
+
+Compares the previous path (json.loads -> dict -> Decimal(str(...)) -> Kline ORM object ->
+attribute read-back) with the KlineRecord path (orjson -> slotted record -> string numerics).
+Runs single-threaded, so the reported rate is messages per second per core.
+
+Run from the project root:
+    python -m backend.benchmarks.kline_decoding [--messages 200000]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+
+from backend.app.models import Kline
+from backend.data_ingestion_service.kline_record import KlineRecord
+
+
+def _sample_message(i: int) -> str:
+    open_time = 1678886400000 + i * 60000
+    return json.dumps({
+        "e": "kline", "E": open_time + 60001, "s": "BTCUSDT",
+        "k": {
+            "t": open_time, "T": open_time + 59999, "s": "BTCUSDT", "i": "1m",
+            "f": 100, "L": 200, "o": "20000.01000000", "c": "20500.02000000",
+            "h": "20600.03000000", "l": "19900.04000000", "v": "1000.12345678",
+            "n": 100, "x": True, "q": "20250000.12345678", "V": "500.12345678",
+            "Q": "10125000.12345678", "B": "0"
+        }
+    })
+
+
+def legacy_path(message_str: str):
+    """The decode/convert path as it was before KlineRecord."""
+    data = json.loads(message_str)
+    k = data['k']
+    kline_data = {
+        'event_type': data.get('e'), 'event_time': data.get('E'),
+        'symbol': k.get('s'), 'timeframe': k.get('i'), 'open_time': k.get('t'),
+        'open': k.get('o'), 'high': k.get('h'), 'low': k.get('l'), 'close': k.get('c'),
+        'volume': k.get('v'), 'close_time': k.get('T'), 'quote_asset_volume': k.get('q'),
+        'number_of_trades': k.get('n'), 'is_closed': k.get('x', False),
+        'taker_buy_base_asset_volume': k.get('V'), 'taker_buy_quote_asset_volume': k.get('Q'),
+    }
+    open_time_ms = int(kline_data['open_time'])
+    kline_obj = Kline(
+        symbol=kline_data['symbol'], timeframe=kline_data['timeframe'],
+        open_time=datetime.fromtimestamp(open_time_ms / 1000, tz=timezone.utc),
+        open_price=Decimal(str(kline_data['open'])), high_price=Decimal(str(kline_data['high'])),
+        low_price=Decimal(str(kline_data['low'])), close_price=Decimal(str(kline_data['close'])),
+        volume=Decimal(str(kline_data['volume'])),
+        close_time=datetime.fromtimestamp(int(kline_data['close_time']) / 1000, tz=timezone.utc),
+        quote_asset_volume=Decimal(str(kline_data['quote_asset_volume'])),
+        number_of_trades=int(kline_data['number_of_trades']),
+        taker_buy_base_asset_volume=Decimal(str(kline_data['taker_buy_base_asset_volume'])),
+        taker_buy_quote_asset_volume=Decimal(str(kline_data['taker_buy_quote_asset_volume'])),
+    )
+    db_row = dict(
+        symbol=kline_obj.symbol, timeframe=kline_obj.timeframe, open_time=kline_obj.open_time,
+        open_price=kline_obj.open_price, high_price=kline_obj.high_price, low_price=kline_obj.low_price,
+        close_price=kline_obj.close_price, volume=kline_obj.volume, close_time=kline_obj.close_time,
+        quote_asset_volume=kline_obj.quote_asset_volume, number_of_trades=kline_obj.number_of_trades,
+        taker_buy_base_asset_volume=kline_obj.taker_buy_base_asset_volume,
+        taker_buy_quote_asset_volume=kline_obj.taker_buy_quote_asset_volume,
+    )
+    cache_member = {
+        'open_time': open_time_ms,
+        'open': str(kline_obj.open_price), 'high': str(kline_obj.high_price),
+        'low': str(kline_obj.low_price), 'close': str(kline_obj.close_price),
+        'volume': str(kline_obj.volume), 'close_time': int(kline_data['close_time']),
+        'is_closed': True,
+    }
+    member = json.dumps(cache_member)
+    payload = json.dumps({"type": "kline_closed", "data": cache_member})
+    return db_row, member, payload
+
+
+def record_path(message_str: str):
+    """The current KlineRecord decode/convert path."""
+    data = orjson.loads(message_str)
+    kline = KlineRecord.from_ws_kline(data['k'], data.get('E'))
+    db_row = kline.as_db_row()
+    member = kline.as_cache_member()
+    payload = orjson.dumps({"type": "kline_closed", "data": kline.as_publish_dict()})
+    return db_row, member, payload
+
+
+def _measure(fn, messages) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        fn(message)
+    elapsed = time.perf_counter() - start
+    return len(messages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000, help="Number of kline messages per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path; the best run is reported")
+    args = parser.parse_args()
+
+    messages = [_sample_message(i) for i in range(args.messages)]
+    legacy_rate = max(_measure(legacy_path, messages) for _ in range(args.repeat))
+    record_rate = max(_measure(record_path, messages) for _ in range(args.repeat))
+
+    print(f"messages per run:       {args.messages}")
+    print(f"legacy (json+Decimal+ORM): {legacy_rate:12,.0f} msg/s/core")
+    print(f"KlineRecord (orjson):      {record_rate:12,.0f} msg/s/core")
+    print(f"speedup:                   {record_rate / legacy_rate:12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
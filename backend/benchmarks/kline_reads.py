@@ -0,0 +1,125 @@
+"""
+Benchmark for the kline range reads behind GET /data/klines: rows per second from DB query to KlineRead.
+
+Compares the ORM path (a fresh select(Kline) per read, hydrated Kline instances, tzinfo patched on each,
+KlineRead.model_validate) with kline_queries.fetch_kline_rows (a cached statement returning tuples of the
+needed columns, KlineRead.model_construct). Each read fetches --limit klines ending at a random point of
+the stored history, like a chart scrolling back.
+
+Uses a throwaway SQLite file unless --database-url points at a (TimescaleDB) database with the klines
+schema; the benchmark pair's rows are inserted first and deleted afterwards. Run from the project root
+(the usual .env settings must be loadable):
+    python -m backend.benchmarks.kline_reads [--klines 200000] [--limit 1000] [--reads 200]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, delete, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import kline_queries, kline_storage
+from backend.app.models import Base, Kline
+from backend.app.schemas import KlineRead
+
+SYMBOL, TIMEFRAME = "BENCHUSDT", "1m"
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _populate(session, count: int):
+    rows = [
+        dict(symbol=SYMBOL, timeframe=TIMEFRAME, open_time=START + timedelta(minutes=i),
+             close_time=START + timedelta(minutes=i + 1) - timedelta(milliseconds=1),
+             open_price=20000.5 + i % 97, high_price=20100.25 + i % 89, low_price=19900.75 + i % 83, close_price=20050.125 + i % 79,
+             volume=12.5 + i % 7, quote_asset_volume=250000.5 + i % 11, number_of_trades=100 + i % 13,
+             taker_buy_base_asset_volume=6.25 + i % 5, taker_buy_quote_asset_volume=125000.25 + i % 3)
+        for i in range(count)
+    ]
+    for i in range(0, count, 10000):
+        session.execute(insert(Kline), rows[i:i + 10000])
+    session.commit()
+
+
+def orm_read(session, start: datetime, end: datetime, limit: int):
+    """How get_historical_klines used to read: ORM instances validated into KlineRead."""
+    query = select(Kline).where(Kline.symbol == SYMBOL, Kline.timeframe == TIMEFRAME, Kline.open_time >= start,
+                                Kline.open_time <= end).order_by(Kline.open_time.desc()).limit(limit)
+    klines = []
+    for k_orm in session.execute(query).scalars().all():
+        if k_orm.open_time.tzinfo is None:
+            k_orm.open_time = k_orm.open_time.replace(tzinfo=timezone.utc)
+        if k_orm.close_time.tzinfo is None:
+            k_orm.close_time = k_orm.close_time.replace(tzinfo=timezone.utc)
+        klines.append(KlineRead.model_validate(k_orm))
+    session.expunge_all() # Each API request gets a fresh session, so nothing stays in the identity map
+    return klines
+
+
+def compiled_read(session, start: datetime, end: datetime, limit: int):
+    """The current path: cached statement, tuples, KlineRead.model_construct."""
+    klines = []
+    for row in kline_queries.fetch_kline_rows(session, SYMBOL, TIMEFRAME, start, end, True, limit):
+        klines.append(KlineRead.model_construct(
+            symbol=SYMBOL, timeframe=TIMEFRAME, open_time=row[0], close_time=kline_storage.close_time_for(row[0], TIMEFRAME),
+            **dict(zip(kline_storage.VALUE_COLUMNS, row[1:]))
+        ))
+    return klines
+
+
+def _measure(read, session, windows, limit: int) -> float:
+    rows = 0
+    started = time.perf_counter()
+    for start, end in windows:
+        rows += len(read(session, start, end, limit))
+    return rows / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--klines", type=int, default=200_000, help="1m klines stored for the benchmark pair")
+    parser.add_argument("--limit", type=int, default=1000, help="Klines per read")
+    parser.add_argument("--reads", type=int, default=200, help="Reads per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path; the best run is reported")
+    parser.add_argument("--database-url", default=None, help="Database to use instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    temporary_dir = None
+    database_url = args.database_url
+    if database_url is None:
+        temporary_dir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(temporary_dir.name, 'kline_reads.db')}"
+    engine = create_engine(database_url)
+    if temporary_dir is not None:
+        Base.metadata.create_all(engine, tables=[Kline.__table__])
+    session = sessionmaker(bind=engine)()
+    try:
+        _populate(session, args.klines)
+        rng = random.Random(42)
+        windows = []
+        for _ in range(args.reads):
+            end = START + timedelta(minutes=rng.randrange(args.limit, args.klines))
+            windows.append((end - timedelta(minutes=args.limit * 2), end))
+        assert [k.open_time for k in orm_read(session, *windows[0], args.limit)] == \
+            [k.open_time for k in compiled_read(session, *windows[0], args.limit)]
+
+        orm_rate = max(_measure(orm_read, session, windows, args.limit) for _ in range(args.repeat))
+        compiled_rate = max(_measure(compiled_read, session, windows, args.limit) for _ in range(args.repeat))
+    finally:
+        session.execute(delete(Kline).where(Kline.symbol == SYMBOL))
+        session.commit()
+        session.close()
+        engine.dispose()
+        if temporary_dir is not None:
+            temporary_dir.cleanup()
+
+    print(f"database:             {engine.dialect.name}, {args.klines} klines, {args.limit} per read")
+    print(f"ORM + model_validate: {orm_rate:12,.0f} rows/s")
+    print(f"compiled tuples:      {compiled_rate:12,.0f} rows/s")
+    print(f"speedup:              {compiled_rate / orm_rate:12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
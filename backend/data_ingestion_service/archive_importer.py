@@ -0,0 +1,181 @@
+"""
+Offline import of Binance kline archive dumps (https://data.binance.vision) from local disk.
+
+Files are named like the published monthly/daily dumps, e.g. BTCUSDT-1m-2024-01.zip (containing
+BTCUSDT-1m-2024-01.csv) or BTCUSDT-1h-2024-01-15.csv, and hold rows in the REST kline array order.
+Each file is parsed and bulk loaded (COPY, ON CONFLICT DO NOTHING) by a worker process, so a directory
+of dumps seeds a fresh database without any network access and can be re-imported safely.
+
+    python -m backend.data_ingestion_service.archive_importer /data/binance/klines --workers 8
+"""
+import argparse
+import csv
+import io
+import logging
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+from backend.app.config import settings
+from .historical_data_fetcher import TIMEFRAME_TO_BINANCE_INTERVAL
+from .kline_copy_loader import load_binance_klines
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILENAME_PATTERN = re.compile(
+    r"^(?P<symbol>[A-Z0-9]{2,20})-(?P<timeframe>\d+[smhdwM])-(?P<year>\d{4})-(?P<month>\d{2})(?:-(?P<day>\d{2}))?\.(?P<ext>zip|csv)$"
+)
+# Dumps from 2025 on store spot timestamps in microseconds; anything above this is not a ms timestamp
+MAX_MS_TIMESTAMP = 10 ** 14
+
+
+@dataclass
+class FileImportResult:
+    path: str
+    symbol: str
+    timeframe: str
+    rows: int = 0
+    inserted: int = 0
+    error: Optional[str] = None
+
+
+def parse_archive_filename(path: str) -> Optional[Tuple[str, str]]:
+    """(symbol, timeframe) from a dump's file name, or None if it isn't a supported kline dump."""
+    match = ARCHIVE_FILENAME_PATTERN.match(os.path.basename(path))
+    if not match or match.group("timeframe") not in TIMEFRAME_TO_BINANCE_INTERVAL:
+        return None
+    return match.group("symbol"), match.group("timeframe")
+
+
+def find_archive_files(directory: str, symbol: Optional[str] = None, timeframe: Optional[str] = None) -> List[str]:
+    """All kline dumps under `directory` (recursively), optionally only one symbol and/or timeframe, sorted by name."""
+    paths = []
+    for root, _dirs, files in os.walk(directory):
+        for name in files:
+            parsed = parse_archive_filename(name)
+            if not parsed:
+                continue
+            if (symbol and parsed[0] != symbol.upper()) or (timeframe and parsed[1] != timeframe):
+                continue
+            paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def _open_csv_text(path: str) -> Iterator[io.TextIOBase]:
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if member.endswith(".csv"):
+                    with archive.open(member) as raw:
+                        yield io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            yield f
+
+
+def iter_archive_rows(path: str) -> Iterator[list]:
+    """
+    Kline rows of a dump as lists of strings in Binance kline array order, with timestamps normalised to ms.
+    Header rows (present in some newer dumps) and blank lines are skipped.
+    """
+    for text in _open_csv_text(path):
+        for row in csv.reader(text):
+            if len(row) < 11 or not row[0].isdigit():
+                continue
+            open_time, close_time = int(row[0]), int(row[6])
+            if open_time > MAX_MS_TIMESTAMP:
+                row[0], row[6] = str(open_time // 1000), str(close_time // 1000)
+            yield row
+
+
+def import_archive_file(path: str, db_session_factory=None, batch_size: Optional[int] = None) -> FileImportResult:
+    """Parses one dump and loads it in batches of batch_size rows. Runs in a worker process; never raises."""
+    symbol, timeframe = parse_archive_filename(path)
+    result = FileImportResult(path, symbol, timeframe)
+    if db_session_factory is None:
+        from backend.app.database import SessionLocal
+        db_session_factory = SessionLocal
+    batch_size = batch_size or settings.HISTORICAL_SAVE_BATCH_SIZE
+    try:
+        batch = []
+        for row in iter_archive_rows(path):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                result.inserted += load_binance_klines(batch, symbol, timeframe, db_session_factory)
+                result.rows += len(batch)
+                batch = []
+        if batch:
+            result.inserted += load_binance_klines(batch, symbol, timeframe, db_session_factory)
+            result.rows += len(batch)
+    except Exception as e:
+        logger.error(f"[ARCHIVE_IMPORT] Error importing {path}: {e}", exc_info=True)
+        result.error = str(e)
+    return result
+
+
+def _init_worker():
+    # Connections inherited from the parent must not be shared with it; each worker opens its own
+    from backend.app.database import engine
+    engine.dispose(close=False)
+
+
+def import_archives(paths: List[str], max_workers: Optional[int] = None, db_session_factory=None) -> List[FileImportResult]:
+    """
+    Imports the given dumps, one file per task across a process pool of max_workers (default: CPU count).
+    max_workers=1 imports in this process, which is also the only mode that uses a custom db_session_factory.
+    """
+    started = time.monotonic()
+    results: List[FileImportResult] = []
+    if max_workers == 1:
+        for path in paths:
+            results.append(import_archive_file(path, db_session_factory))
+            _log_file_result(results[-1], len(results), len(paths))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(import_archive_file, path) for path in paths]
+            for future in as_completed(futures):
+                results.append(future.result())
+                _log_file_result(results[-1], len(results), len(paths))
+
+    elapsed = time.monotonic() - started
+    total_rows = sum(r.rows for r in results)
+    failed = [r.path for r in results if r.error]
+    logger.info(f"[ARCHIVE_IMPORT] Imported {len(paths) - len(failed)}/{len(paths)} files in {elapsed:.1f}s: "
+                f"{total_rows} rows ({total_rows / max(elapsed, 1e-6):.0f} rows/s), {sum(r.inserted for r in results)} new.")
+    if failed:
+        logger.error(f"[ARCHIVE_IMPORT] Failed files: {failed}")
+    return sorted(results, key=lambda r: r.path)
+
+
+def _log_file_result(result: FileImportResult, done: int, total: int):
+    if result.error:
+        logger.error(f"[ARCHIVE_IMPORT] ({done}/{total}) {result.path} failed after {result.rows} rows: {result.error}")
+    else:
+        logger.info(f"[ARCHIVE_IMPORT] ({done}/{total}) {result.path}: {result.rows} rows, {result.inserted} new.")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .service_utils import setup_logging
+    parser = argparse.ArgumentParser(description="Import Binance kline archive dumps (.zip or .csv) from a directory into the klines table.")
+    parser.add_argument("directory", help="Directory containing dumps such as BTCUSDT-1m-2024-01.zip (searched recursively)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count; 1 imports in-process)")
+    parser.add_argument("--symbol", default=None, help="Only import this symbol")
+    parser.add_argument("--timeframe", default=None, help="Only import this timeframe")
+    args = parser.parse_args(argv)
+
+    setup_logging(level=logging.INFO)
+    paths = find_archive_files(args.directory, args.symbol, args.timeframe)
+    if not paths:
+        logger.warning(f"[ARCHIVE_IMPORT] No kline dumps found in {args.directory}.")
+        return 1
+    results = import_archives(paths, max_workers=args.workers)
+    return 1 if any(r.error for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import json
+import logging
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# backfill_job:{symbol}:{timeframe} holds the JSON of the pair's unfinished backfill. It outlives restarts
+# (unlike the in-memory fetch state and the short-lived backfill_status key) and is deleted once the job's
+# range is fully written.
+BACKFILL_JOB_KEY_PREFIX = "backfill_job:"
+BACKFILL_JOB_TTL_SECONDS = 7 * 24 * 60 * 60 # An abandoned job (pair no longer ingested) is forgotten after a week
+
+def backfill_job_key(symbol: str, timeframe: str) -> str:
+    return f"{BACKFILL_JOB_KEY_PREFIX}{symbol}:{timeframe}"
+
+
+@dataclass
+class BackfillJob:
+    """
+    A persisted backfill of [start_ms, target_end_ms) for one pair.
+
+    checkpoint_ms is the end of the contiguous prefix written to the DB (see fetch_and_save_historical_klines'
+    progress callback); a restarted service resumes from there. The run_* fields describe the current run
+    and are the baseline for its rows/s and ETA.
+    """
+    symbol: str
+    timeframe: str
+    start_ms: int
+    target_end_ms: int
+    checkpoint_ms: int
+    rows_written: int = 0
+    created_at: int = 0
+    resumed_count: int = 0
+    run_started_at: float = 0.0
+    run_start_checkpoint_ms: int = 0
+    run_start_rows: int = 0
+
+    @classmethod
+    def new(cls, symbol: str, timeframe: str, start_ms: int, target_end_ms: int) -> "BackfillJob":
+        job = cls(symbol, timeframe, start_ms, target_end_ms, checkpoint_ms=start_ms, created_at=int(time.time()))
+        job.start_run()
+        return job
+
+    def start_run(self):
+        self.run_started_at = time.time()
+        self.run_start_checkpoint_ms = self.checkpoint_ms
+        self.run_start_rows = self.rows_written
+
+    def resume(self, target_end_ms: int):
+        """Continues an interrupted job from its checkpoint, extended to the current target."""
+        self.target_end_ms = max(self.target_end_ms, target_end_ms)
+        self.resumed_count += 1
+        self.start_run()
+
+    @property
+    def is_complete(self) -> bool:
+        return self.checkpoint_ms >= self.target_end_ms
+
+    def record_progress(self, run_rows_written: int, checkpoint_ms: int):
+        self.rows_written = self.run_start_rows + run_rows_written
+        self.checkpoint_ms = max(self.checkpoint_ms, checkpoint_ms)
+
+    def progress_fields(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Progress for the backfill_status key: percent of the range done, this run's row rate and the ETA."""
+        now = now or time.time()
+        elapsed = max(now - self.run_started_at, 1e-6)
+        total_ms = self.target_end_ms - self.start_ms
+        progress_pct = 100.0 if total_ms <= 0 else min(100.0, 100.0 * (self.checkpoint_ms - self.start_ms) / total_ms)
+        covered_ms_per_second = (self.checkpoint_ms - self.run_start_checkpoint_ms) / elapsed
+        eta_seconds = None
+        if self.is_complete:
+            eta_seconds = 0
+        elif covered_ms_per_second > 0:
+            eta_seconds = int((self.target_end_ms - self.checkpoint_ms) / covered_ms_per_second)
+        return {
+            "progress_pct": round(progress_pct, 1),
+            "rows_written": self.rows_written,
+            "rows_per_second": round((self.rows_written - self.run_start_rows) / elapsed, 1),
+            "eta_seconds": eta_seconds,
+            "fetched_until_ms": self.checkpoint_ms,
+            "target_end_ms": self.target_end_ms,
+            "resumed_from_ms": self.run_start_checkpoint_ms if self.resumed_count else None,
+        }
+
+
+# Blocking Redis helpers; call via asyncio.to_thread
+
+def load_job(redis_client, symbol: str, timeframe: str) -> Optional[BackfillJob]:
+    raw = redis_client.get(backfill_job_key(symbol, timeframe))
+    if not raw:
+        return None
+    try:
+        return BackfillJob(**json.loads(raw))
+    except (TypeError, ValueError) as e:
+        logger.error(f"[BACKFILL_JOB] Discarding unreadable job for {symbol}/{timeframe}: {e}. Data: {raw}")
+        return None
+
+def save_job(redis_client, job: BackfillJob):
+    redis_client.set(backfill_job_key(job.symbol, job.timeframe), json.dumps(asdict(job)), ex=BACKFILL_JOB_TTL_SECONDS)
+
+def delete_job(redis_client, symbol: str, timeframe: str):
+    redis_client.delete(backfill_job_key(symbol, timeframe))
@@ -1,13 +1,17 @@
 import asyncio
 # import httpx # Removed httpx
 import websockets # Added websockets
-import json
+import orjson
 import logging
 import time
+from typing import Optional
 # import sys # Keep for sys.path logging for now - REMOVING
 # import inspect # Keep for inspect.getfile logging for now - REMOVING
 
 from backend.app.config import settings # Assuming settings has BINANCE_WS_BASE_URL
+from .kline_record import KlineRecord
+from .historical_data_fetcher import fetch_closed_kline_records, TIMEFRAME_TO_MS
+from .rate_limiter import RequestWeightBudget
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +21,15 @@ MAX_RECONNECT_DELAY_SECONDS = 60
 BACKOFF_FACTOR = 2
 
 class BinanceWebSocketManager:
-    def __init__(self, symbol: str, timeframe: str, data_handler_callback, shutdown_event_global):
+    """
+    Streams one symbol/timeframe from Binance and hands parsed KlineRecords to data_handler_callback,
+    reconnecting with backoff. The open_time of the last closed kline seen is tracked; after a reconnect
+    the klines that closed while the stream was down are fetched over REST and fed through the same
+    callback, in order, before live messages are read again (see _resync_missed_klines).
+    """
+
+    def __init__(self, symbol: str, timeframe: str, data_handler_callback, shutdown_event_global,
+                 weight_budget: Optional[RequestWeightBudget] = None):
         self.symbol = symbol.lower() # Binance uses lowercase symbols in stream names
         self.timeframe = timeframe
         self.data_handler_callback = data_handler_callback
@@ -29,6 +41,9 @@ class BinanceWebSocketManager:
         self._websocket_connection = None # Renamed for clarity with websockets library
         self.shutdown_event = shutdown_event_global
         self.is_running = False
+        self.weight_budget = weight_budget # Shared with backfills so resync requests count against the same REST weight
+        self.last_closed_open_time: Optional[int] = None # Of the last closed kline handed to the callback
+        self.resynced_klines_total = 0
 
     def _get_websocket_url(self) -> str:
         """Constructs the Binance WebSocket stream URL."""
@@ -40,45 +55,29 @@ class BinanceWebSocketManager:
         logger.debug(f"Constructed WebSocket URL for {self.symbol}/{self.timeframe}: {url}")
         return url
 
-    def _parse_kline_message(self, message_str: str):
+    def _parse_kline_message(self, message_str):
         """
         Parses the incoming JSON message from Binance.
-        Returns a structured kline dictionary if it's a valid kline event, otherwise None.
-        The 'is_closed' status is included in the returned dictionary.
+        Returns a KlineRecord if it's a valid kline event, otherwise None.
+        The message is decoded with orjson and the kline fields are read straight into the
+        slotted record, without building an intermediate dictionary.
         """
         try:
-            data = json.loads(message_str)
+            data = orjson.loads(message_str)
             if data.get('e') == 'kline':
                 kline_data = data.get('k')
                 if kline_data: # Check if kline data ('k') exists
-                    parsed_kline = {
-                        'event_type': data.get('e'),
-                        'event_time': data.get('E'),
-                        'symbol': kline_data.get('s'),
-                        'timeframe': kline_data.get('i'),
-                        'open_time': kline_data.get('t'),
-                        'open': kline_data.get('o'),
-                        'high': kline_data.get('h'),
-                        'low': kline_data.get('l'),
-                        'close': kline_data.get('c'),
-                        'volume': kline_data.get('v'),
-                        'close_time': kline_data.get('T'),
-                        'quote_asset_volume': kline_data.get('q'),
-                        'number_of_trades': kline_data.get('n'),
-                        'is_closed': kline_data.get('x', False), # Default to False if 'x' is not present
-                        'taker_buy_base_asset_volume': kline_data.get('V'),
-                        'taker_buy_quote_asset_volume': kline_data.get('Q')
-                    }
-                    # Basic validation: ensure essential fields for any kline update are present
-                    if not all([parsed_kline['symbol'], parsed_kline['timeframe'], parsed_kline['open_time'], parsed_kline['close']]):
-                        logger.warning(f"[{self.symbol.upper()}/{self.timeframe}] Kline message missing essential fields: {kline_data}")
+                    try:
+                        parsed_kline = KlineRecord.from_ws_kline(kline_data, data.get('E'))
+                    except KeyError as ke:
+                        logger.warning(f"[{self.symbol.upper()}/{self.timeframe}] Kline message missing essential field {ke}: {kline_data}")
                         return None
-                    
+
                     # Log whether it's a final or non-final update
-                    if parsed_kline['is_closed']:
-                        logger.debug(f"[{self.symbol.upper()}/{self.timeframe}] Received final (closed) kline update: OT {parsed_kline['open_time']}")
+                    if parsed_kline.is_closed:
+                        logger.debug(f"[{self.symbol.upper()}/{self.timeframe}] Received final (closed) kline update: OT {parsed_kline.open_time}")
                     else:
-                        logger.debug(f"[{self.symbol.upper()}/{self.timeframe}] Received non-final (tick) kline update: OT {parsed_kline['open_time']}, C {parsed_kline['close']}")
+                        logger.debug(f"[{self.symbol.upper()}/{self.timeframe}] Received non-final (tick) kline update: OT {parsed_kline.open_time}, C {parsed_kline.close}")
                     return parsed_kline
                 else:
                     logger.warning(f"[{self.symbol.upper()}/{self.timeframe}] 'kline' event received but 'k' data is missing or empty: {data}")
@@ -90,7 +89,7 @@ class BinanceWebSocketManager:
                 # Other message types (e.g., subscription confirmation), log if unexpected
                 logger.debug(f"[{self.symbol.upper()}/{self.timeframe}] Received non-kline message: {data.get('e', data)}")
                 return None
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             logger.error(f"[{self.symbol.upper()}/{self.timeframe}] Failed to decode JSON message: {message_str}")
             return None
         except Exception as e:
@@ -131,6 +130,8 @@ class BinanceWebSocketManager:
                     self._current_delay = INITIAL_RECONNECT_DELAY_SECONDS
                     connected_successfully_flag = True
                     logger.info(f"[{self.symbol.upper()}/{self.timeframe}] Successfully connected to {self.ws_url}. Listening for messages...")
+                    # Messages arriving meanwhile wait in the connection's buffer, so live klines follow the resynced ones
+                    await self._resync_missed_klines()
 
                     while not self.shutdown_event.is_set() and self.is_running:
                         try:
@@ -149,6 +150,8 @@ class BinanceWebSocketManager:
                             parsed_message = self._parse_kline_message(message_str)
                             
                             if parsed_message: # Ensure message is valid and parsed
+                                if parsed_message.is_closed:
+                                    self._note_closed(parsed_message.open_time)
                                 # The data_handler_callback is functools.partial(kline_data_processor, ...)
                                 # kline_data_processor's first argument 'kline_data' will receive parsed_message.
                                 asyncio.create_task(self.data_handler_callback(parsed_message))
@@ -231,6 +234,50 @@ class BinanceWebSocketManager:
 
         logger.info(f"[{self.symbol.upper()}/{self.timeframe}] WebSocket manager stopped.")
 
+    def _note_closed(self, open_time: int):
+        if self.last_closed_open_time is None or open_time > self.last_closed_open_time:
+            self.last_closed_open_time = open_time
+
+    async def _resync_missed_klines(self) -> int:
+        """
+        Called right after a (re)connect. Fetches the klines that closed after the last one seen on the
+        stream, up to now, and awaits the data handler for each in open_time order. Nothing is fetched on
+        the first connection (the startup gap fill covers that). If the outage exceeded WS_RESYNC_MAX_KLINES
+        intervals, only the most recent ones are fetched; the gap scanner repairs the rest.
+        Returns the number of klines fed.
+        """
+        if self.last_closed_open_time is None:
+            return 0
+        interval_ms = TIMEFRAME_TO_MS.get(self.timeframe)
+        if not interval_ms:
+            return 0
+        symbol = self.symbol.upper()
+        now_ms = int(time.time() * 1000)
+        start_ms = self.last_closed_open_time + interval_ms
+        earliest_ms = now_ms - self.settings.WS_RESYNC_MAX_KLINES * interval_ms
+        if start_ms < earliest_ms:
+            logger.warning(f"[{symbol}/{self.timeframe}] Stream was down for over {self.settings.WS_RESYNC_MAX_KLINES} intervals; "
+                           f"resyncing from {earliest_ms}, older missed klines are left to the gap scanner.")
+            start_ms = earliest_ms - earliest_ms % interval_ms
+        if start_ms + interval_ms > now_ms:
+            return 0 # Nothing can have closed since the last kline seen
+
+        try:
+            records, completed = await fetch_closed_kline_records(symbol, self.timeframe, start_ms, now_ms, weight_budget=self.weight_budget)
+        except Exception as e:
+            logger.error(f"[{symbol}/{self.timeframe}] Error fetching missed klines for resync: {e}", exc_info=True)
+            return 0
+        for record in records:
+            try:
+                await self.data_handler_callback(record)
+            except Exception as e:
+                logger.error(f"[{symbol}/{self.timeframe}] Error processing resynced kline OT:{record.open_time}: {e}", exc_info=True)
+            self._note_closed(record.open_time)
+        self.resynced_klines_total += len(records)
+        logger.info(f"[{symbol}/{self.timeframe}] Reconnect resync fed {len(records)} klines missed since {start_ms}"
+                    f"{'' if completed else ' (REST fetch incomplete, the gap scanner will repair the rest)'}.")
+        return len(records)
+
     async def stop(self):
         """Stops the WebSocket manager gracefully."""
         logger.info(f"[{self.symbol.upper()}/{self.timeframe}] Stop called for WebSocket manager.")
@@ -251,7 +298,7 @@ class BinanceWebSocketManager:
 
 # Example Usage (for testing purposes, normally used by main.py in data_ingestion_service)
 async def dummy_data_handler(kline_data):
-    logger.info(f"[DUMMY_HANDLER] Received kline: {kline_data['symbol']}@{kline_data['timeframe']} - Close: {kline_data['close']} @ {kline_data['close_time']}")
+    logger.info(f"[DUMMY_HANDLER] Received kline: {kline_data.symbol}@{kline_data.timeframe} - Close: {kline_data.close} @ {kline_data.close_time}")
 
 async def main_test():
     # setup_logging is expected to be imported if this test is run
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Tuple
+
+from backend.app import ingestion_control, kline_cache_codec, kline_storage
+from backend.app.config import settings
+from .historical_data_fetcher import TIMEFRAME_TO_MS
+from .redis_scripts import upsert_window_klines
+
+logger = logging.getLogger(__name__)
+
+# Sizes the Redis kline window (members kept in klines:{symbol}:{timeframe}) of every ingested pair. The
+# budget (REDIS_KLINE_BUDGET_BYTES) is shared by all pairs of the universe: each gets a floor, the rest goes
+# to the pairs read most over the last day, and no window spans more than REDIS_WINDOW_MAX_SPAN_DAYS (so a
+# 1d pair isn't handed years of klines). Every worker computes the same allocation from the same shared
+# inputs, applies it to the pairs it owns (trimming, or warming older klines from the DB) and its writer
+# trims to it (see kline_data_processor). Klines written to the DB outside the live path (gap fills, repairs,
+# spool replays) are upserted into the window too (cache_written_range), and the API serves a read from Redis
+# alone only when the cached klines cover it without a hole.
+
+WARM_ZADD_BATCH = 5000
+
+# Windows from the last policy run; pairs not sized yet use MAX_KLINES_IN_REDIS
+_windows: Dict[Tuple[str, str], int] = {}
+
+def window_for(symbol: str, timeframe: str, default: int) -> int:
+    return _windows.get((symbol, timeframe), default)
+
+def window_cap(timeframe: str) -> int:
+    """Most klines a window of this timeframe may hold (REDIS_WINDOW_MAX_SPAN_DAYS of them)."""
+    interval_ms = TIMEFRAME_TO_MS.get(timeframe, TIMEFRAME_TO_MS["1m"])
+    return max(1, settings.REDIS_WINDOW_MAX_SPAN_DAYS * 24 * 60 * 60 * 1000 // interval_ms)
+
+def allocate_windows(pairs: Iterable[Tuple[str, str]], access_counts: Dict[Tuple[str, str], float], budget_klines: int) -> Dict[Tuple[str, str], int]:
+    """
+    Splits budget_klines across the pairs: first a floor of REDIS_WINDOW_MIN_KLINES each (scaled down if the
+    floors alone exceed the budget), then the rest in proportion to access count + 1, water-filling so that
+    what a capped pair can't take goes to the others. Deterministic for the same inputs.
+    """
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return {}
+    caps = {pair: window_cap(pair[1]) for pair in pairs}
+    windows = {pair: min(settings.REDIS_WINDOW_MIN_KLINES, caps[pair]) for pair in pairs}
+    floor_total = sum(windows.values())
+    if floor_total >= budget_klines:
+        return {pair: max(1, windows[pair] * budget_klines // floor_total) for pair in pairs}
+
+    remaining = budget_klines - floor_total
+    growing = [pair for pair in pairs if windows[pair] < caps[pair]]
+    while remaining > 0 and growing:
+        weights = {pair: access_counts.get(pair, 0.0) + 1.0 for pair in growing}
+        total_weight = sum(weights.values())
+        granted = 0
+        for pair in growing:
+            grant = min(int(remaining * weights[pair] / total_weight), caps[pair] - windows[pair])
+            windows[pair] += grant
+            granted += grant
+        if not granted:
+            break # Shares rounded down to nothing
+        remaining -= granted
+        growing = [pair for pair in growing if windows[pair] < caps[pair]]
+    return windows
+
+def resize_pair_window(redis_client, db_session_factory, symbol: str, timeframe: str, window: int) -> Tuple[int, int]:
+    """
+    Blocking: trims the pair's ZSET to `window` members, or loads up to REDIS_WINDOW_WARM_MAX_KLINES klines
+    older than its oldest member from the DB when it holds fewer. Returns (members trimmed, members added).
+    """
+    key = f"klines:{symbol}:{timeframe}"
+    count = redis_client.zcard(key)
+    if count > window:
+        return int(redis_client.zremrangebyrank(key, 0, count - window - 1)), 0
+    missing = min(window - count, settings.REDIS_WINDOW_WARM_MAX_KLINES)
+    if missing <= 0:
+        return 0, 0
+    oldest = redis_client.zrange(key, 0, 0, withscores=True)
+    end_dt = datetime.fromtimestamp(oldest[0][1] / 1000, tz=timezone.utc) - timedelta(milliseconds=1) if oldest else None
+    db_session = db_session_factory()
+    try:
+        klines = kline_storage.fetch_pair_klines(db_session, symbol, timeframe, None, end_dt, True, missing)
+    finally:
+        db_session.close()
+    for i in range(0, len(klines), WARM_ZADD_BATCH):
+        batch = klines[i:i + WARM_ZADD_BATCH]
+        members = [kline_cache_codec.encode_kline(k) for k in batch]
+        open_times_ms = kline_cache_codec.decode_members(members)["open_time"].tolist()
+        redis_client.zadd(key, dict(zip(members, open_times_ms)))
+    return 0, len(klines)
+
+def cache_written_range(redis_client, db_session_factory, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> int:
+    """
+    Blocking: upserts the DB's klines of [start_ms, end_ms] (the newest window's worth) into the pair's ZSET,
+    skipping those older than its oldest member, and trims it to the window. Returns the members upserted.
+    """
+    key = f"klines:{symbol}:{timeframe}"
+    if not redis_client.zcount(key, "-inf", end_ms):
+        return 0 # Nothing cached, or the range is older than the window
+    window = window_for(symbol, timeframe, settings.MAX_KLINES_IN_REDIS)
+    start_dt = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)
+    end_dt = datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)
+    db_session = db_session_factory()
+    try:
+        klines = kline_storage.fetch_pair_klines(db_session, symbol, timeframe, start_dt, end_dt, True, window)
+    finally:
+        db_session.close()
+    upserted = 0
+    for i in range(0, len(klines), WARM_ZADD_BATCH):
+        members = [kline_cache_codec.encode_kline(k) for k in klines[i:i + WARM_ZADD_BATCH]]
+        open_times_ms = kline_cache_codec.decode_members(members)["open_time"].tolist()
+        upserted += upsert_window_klines(redis_client, key, list(zip(open_times_ms, members)), window)
+    return upserted
+
+async def refresh_cached_range(redis_client, db_session_factory, symbol: str, timeframe: str, start_ms: int, end_ms: int):
+    """cache_written_range off the event loop. Errors are logged: the DB write it follows has succeeded."""
+    try:
+        upserted = await asyncio.to_thread(cache_written_range, redis_client, db_session_factory, symbol, timeframe, start_ms, end_ms)
+        if upserted:
+            logger.info(f"[CACHE_POLICY] {symbol}/{timeframe}: upserted {upserted} klines of {start_ms}-{end_ms} into the Redis window.")
+    except Exception as e:
+        logger.error(f"[CACHE_POLICY] Error upserting {symbol}/{timeframe} {start_ms}-{end_ms} into the Redis window: {e}", exc_info=True)
+
+async def apply_cache_policy(registry, redis_client, db_session_factory) -> Dict[Tuple[str, str], int]:
+    """Recomputes every window and resizes the ZSETs of the pairs this worker owns. Returns the windows."""
+    global _windows
+    universe = await registry.load_universe()
+    access_counts = await asyncio.to_thread(ingestion_control.get_pair_access_counts, redis_client)
+    budget_klines = settings.REDIS_KLINE_BUDGET_BYTES // settings.REDIS_KLINE_MEMBER_BYTES
+    _windows = allocate_windows(universe, access_counts, budget_klines)
+
+    for (symbol, timeframe), pair in list(registry.pairs.items()):
+        window = _windows.get((symbol, timeframe))
+        if window is None or not pair.gap_fill_task.done():
+            continue # Warming before the gap fill has written the history would find nothing
+        try:
+            trimmed, added = await asyncio.to_thread(resize_pair_window, redis_client, db_session_factory, symbol, timeframe, window)
+            if trimmed or added:
+                logger.info(f"[CACHE_POLICY] {symbol}/{timeframe}: window {window} klines (trimmed {trimmed}, warmed {added}).")
+        except Exception as e:
+            logger.error(f"[CACHE_POLICY] Error resizing the Redis window of {symbol}/{timeframe}: {e}", exc_info=True)
+    return _windows
+
+async def cache_policy_loop(registry, redis_client, db_session_factory, shutdown_event: asyncio.Event):
+    """
+    Applies the cache policy every CACHE_POLICY_INTERVAL_SECONDS until shutdown. redis_client must not
+    decode responses (the ZSET members are binary).
+    """
+    while not shutdown_event.is_set():
+        try:
+            await apply_cache_policy(registry, redis_client, db_session_factory)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[CACHE_POLICY] Error applying the cache policy: {e}", exc_info=True)
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=settings.CACHE_POLICY_INTERVAL_SECONDS)
+            break # Shutdown
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,41 @@
+"""
+Copies the legacy `klines` table into the compact schema (`klines_compact` + `instruments`, see
+backend/app/kline_storage.py) in primary key batches, committing after each one.
+
+Rollout: apply the migration, set KLINE_STORAGE=compact (new klines go to the compact table; reads fall
+back to legacy rows not copied yet), run this copier (safe to interrupt and re-run), then set
+KLINE_LEGACY_FALLBACK_READS=false. The legacy table can be dropped once nothing reads it any more.
+
+    python -m backend.data_ingestion_service.compact_kline_copier [--batch-size 50000]
+"""
+import argparse
+import logging
+import sys
+import time
+from typing import List, Optional
+
+from backend.app.database import SessionLocal
+from backend.app.kline_storage import copy_legacy_klines
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Copy legacy klines rows into the compact kline storage schema.")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Rows copied per INSERT ... SELECT and commit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    started = time.monotonic()
+    try:
+        copied = copy_legacy_klines(SessionLocal, max(1, args.batch_size))
+    except Exception as e:
+        logger.error(f"[KLINE_COPY] Copy failed (re-run to resume): {e}", exc_info=True)
+        return 1
+    elapsed = time.monotonic() - started
+    logger.info(f"[KLINE_COPY] Copied {copied} klines in {elapsed:.1f}s ({copied / max(elapsed, 1e-6):.0f} rows/s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
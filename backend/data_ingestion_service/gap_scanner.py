@@ -0,0 +1,344 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.app.config import settings
+from backend.app import cold_storage, ingestion_control, kline_storage
+from .cache_policy import refresh_cached_range
+from .historical_data_fetcher import TIMEFRAME_TO_MS, fetch_and_save_historical_klines
+from .rate_limiter import RequestWeightBudget
+
+logger = logging.getLogger(__name__)
+
+# Consecutive open times further apart than this many intervals mean klines are missing in between.
+# The slack absorbs irregular month lengths for "1M" (TIMEFRAME_TO_MS uses 30 days).
+GAP_TOLERANCE_INTERVALS = 1.5
+MAX_REPORTED_RANGES = 50 # Missing ranges listed in a coverage report (the counts cover all of them)
+# SET of "start_ms-end_ms" ranges that were refetched but Binance has no klines for (e.g. exchange
+# maintenance); they are not queued again and are reported separately.
+UNFILLABLE_RANGES_KEY_PREFIX = "ingestion:unfillable_ranges:"
+UNFILLABLE_RANGES_TTL_SECONDS = 7 * 24 * 60 * 60 # Refreshed on every addition; expiring lets the scanner re-check the ranges
+
+# On-demand backfills (ranges requested by chart reads through the API, see ingestion_control.request_backfill)
+ON_DEMAND_BACKFILL_PREFETCH = 1 # Requested ranges a worker holds at once
+BACKFILL_REQUEST_BLOCK_SECONDS = 5 # BZPOPMIN timeout; also bounds how long shutdown waits on the listener
+BACKFILL_REQUEST_POLL_SECONDS = 0.5
+BACKFILL_REQUEST_ERROR_BACKOFF_SECONDS = 5
+BACKFILL_REQUEST_RESULT_TTL_SECONDS = 60 # How long a served request's final status is reported to retrying clients
+HISTORY_FLOOR_TTL_SECONDS = 24 * 60 * 60 # Re-checked daily, in case an empty response was a transient failure
+
+def unfillable_ranges_key(symbol: str, timeframe: str) -> str:
+    return f"{UNFILLABLE_RANGES_KEY_PREFIX}{ingestion_control.pair_member(symbol, timeframe)}"
+
+def _to_ms(dt: datetime) -> int:
+    if dt.tzinfo is None: # SQLite hands back naive UTC datetimes
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+@dataclass
+class CoverageReport:
+    """What a full-history scan found for one pair."""
+    symbol: str
+    timeframe: str
+    first_open_time_ms: Optional[int] = None
+    last_open_time_ms: Optional[int] = None
+    present_klines: int = 0
+    missing_klines: int = 0
+    coverage_pct: float = 100.0
+    missing_ranges: List[Tuple[int, int]] = field(default_factory=list) # [start_ms, end_ms) still to repair
+    unfillable_ranges: List[Tuple[int, int]] = field(default_factory=list) # Known to have no data on Binance
+    scanned_at: int = 0
+
+    def to_json(self) -> str:
+        report = asdict(self)
+        report["missing_range_count"] = len(self.missing_ranges)
+        report["missing_ranges"] = self.missing_ranges[:MAX_REPORTED_RANGES]
+        report["unfillable_ranges"] = self.unfillable_ranges[:MAX_REPORTED_RANGES]
+        return json.dumps(report)
+
+
+def find_gaps(open_times_ms: np.ndarray, interval_ms: int, previous_open_time_ms: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Missing [start_ms, end_ms) ranges between consecutive sorted open times, found with one vectorized diff.
+    previous_open_time_ms is the last open time of the preceding chunk, so gaps across chunk boundaries are found too.
+    """
+    if previous_open_time_ms is not None:
+        open_times_ms = np.concatenate((np.array([previous_open_time_ms], dtype=np.int64), open_times_ms))
+    if len(open_times_ms) < 2:
+        return []
+    gap_indices = np.flatnonzero(np.diff(open_times_ms) > interval_ms * GAP_TOLERANCE_INTERVALS)
+    return [(int(open_times_ms[i]) + interval_ms, int(open_times_ms[i + 1])) for i in gap_indices]
+
+
+# Blocking DB helpers; call via asyncio.to_thread
+
+def _get_history_bounds(db_session_factory, symbol: str, timeframe: str) -> Optional[Tuple[int, int]]:
+    db_session = db_session_factory()
+    try:
+        bounds = kline_storage.history_bounds(db_session, symbol, timeframe)
+        return (_to_ms(bounds[0]), _to_ms(bounds[1])) if bounds else None
+    finally:
+        db_session.close()
+
+def _load_open_times(db_session_factory, symbol: str, timeframe: str, start_ms: int, end_ms: int) -> np.ndarray:
+    """Sorted open times in [start_ms, end_ms) as int64 ms. Only the primary key is read."""
+    db_session = db_session_factory()
+    try:
+        open_times = kline_storage.load_open_times(
+            db_session, symbol, timeframe,
+            datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc), datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)
+        )
+        return np.fromiter((_to_ms(open_time) for open_time in open_times), dtype=np.int64, count=len(open_times))
+    finally:
+        db_session.close()
+
+
+def _outside_range(ranges: List[Tuple[int, int]], start_ms: int, end_ms: int) -> List[Tuple[int, int]]:
+    """The parts of the [start_ms, end_ms) ranges that lie outside [start_ms, end_ms)."""
+    kept = []
+    for range_start_ms, range_end_ms in ranges:
+        if range_start_ms < start_ms:
+            kept.append((range_start_ms, min(range_end_ms, start_ms)))
+        if range_end_ms > end_ms:
+            kept.append((max(range_start_ms, end_ms), range_end_ms))
+    return kept
+
+
+async def scan_pair(symbol: str, timeframe: str, db_session_factory) -> Optional[CoverageReport]:
+    """
+    Scans the pair's stored history, from its first to its last kline, in chunks of GAP_SCAN_CHUNK_KLINES
+    intervals. Returns None for timeframes without a fixed interval length.
+    """
+    interval_ms = TIMEFRAME_TO_MS.get(timeframe)
+    if not interval_ms:
+        return None
+    report = CoverageReport(symbol, timeframe, scanned_at=int(time.time()))
+    bounds = await asyncio.to_thread(_get_history_bounds, db_session_factory, symbol, timeframe)
+    if bounds is None:
+        return report
+    report.first_open_time_ms, report.last_open_time_ms = bounds
+
+    chunk_ms = settings.GAP_SCAN_CHUNK_KLINES * interval_ms
+    previous_open_time_ms = None
+    for chunk_start_ms in range(report.first_open_time_ms, report.last_open_time_ms + 1, chunk_ms):
+        open_times_ms = await asyncio.to_thread(
+            _load_open_times, db_session_factory, symbol, timeframe, chunk_start_ms, chunk_start_ms + chunk_ms
+        )
+        report.missing_ranges.extend(find_gaps(open_times_ms, interval_ms, previous_open_time_ms))
+        report.present_klines += len(open_times_ms)
+        if len(open_times_ms):
+            previous_open_time_ms = int(open_times_ms[-1])
+
+    cold_months = cold_storage.cold_months(symbol, timeframe) if cold_storage.is_enabled() else []
+    if cold_months: # Months moved to the cold tier (kline_tiering.py) are not holes in the DB
+        report.missing_ranges = _outside_range(
+            report.missing_ranges, int(cold_months[0].timestamp() * 1000), cold_storage.cold_range_end_ms(symbol, timeframe)
+        )
+
+    report.missing_klines = sum((end_ms - start_ms) // interval_ms for start_ms, end_ms in report.missing_ranges)
+    expected_klines = report.present_klines + report.missing_klines
+    report.coverage_pct = round(100.0 * report.present_klines / expected_klines, 3) if expected_klines else 100.0
+    return report
+
+
+# Repair queue priorities (lower runs first): ranges a chart read is waiting for go ahead of background repairs
+PRIORITY_INTERACTIVE = 0
+PRIORITY_GAP_REPAIR = 1
+
+class GapRepairQueue:
+    """
+    Priority queue of (symbol, timeframe, start_ms, end_ms) ranges to refetch, without duplicates and FIFO
+    within a priority. maxsize bounds the background repairs only; interactive requests are always accepted.
+    """
+
+    def __init__(self, maxsize: int):
+        self._maxsize = maxsize
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._pending: Dict[Tuple[str, str, int, int], int] = {} # item -> priority
+        self._pending_counts: Counter = Counter() # priority -> pending items
+        self._sequence = itertools.count()
+
+    def offer(self, symbol: str, timeframe: str, start_ms: int, end_ms: int, priority: int = PRIORITY_GAP_REPAIR) -> bool:
+        """Queues a range unless it's already pending. Returns False if it was a duplicate or the queue is full."""
+        item = (symbol, timeframe, start_ms, end_ms)
+        if item in self._pending:
+            return False
+        if priority != PRIORITY_INTERACTIVE and self.pending_count(priority) >= self._maxsize:
+            return False
+        self._queue.put_nowait((priority, next(self._sequence), item))
+        self._pending[item] = priority
+        self._pending_counts[priority] += 1
+        return True
+
+    async def get(self) -> Tuple[str, str, int, int]:
+        _priority, _sequence, item = await self._queue.get()
+        return item
+
+    def priority(self, item: Tuple[str, str, int, int]) -> Optional[int]:
+        return self._pending.get(item)
+
+    def done(self, item: Tuple[str, str, int, int]):
+        priority = self._pending.pop(item, None)
+        if priority is not None:
+            self._pending_counts[priority] -= 1
+
+    def pending_count(self, priority: int) -> int:
+        """Pending (queued or running) items of one priority."""
+        return self._pending_counts[priority]
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+
+async def scan_and_queue_repairs(registry, repair_queue: GapRepairQueue, redis_client, db_session_factory) -> int:
+    """
+    Scans every pair this worker runs whose startup gap fill has finished, publishes the coverage reports
+    and queues the missing ranges (except known-unfillable ones). Returns the number of ranges queued.
+    """
+    queued = 0
+    for (symbol, timeframe), pair in list(registry.pairs.items()):
+        if not pair.gap_fill_task.done():
+            continue # The startup fill is still writing this pair's history
+        report = await scan_pair(symbol, timeframe, db_session_factory)
+        if report is None:
+            continue
+        unfillable = set()
+        for member in await asyncio.to_thread(redis_client.smembers, unfillable_ranges_key(symbol, timeframe)) or []:
+            start_ms, _, end_ms = member.partition("-")
+            unfillable.add((int(start_ms), int(end_ms)))
+        report.unfillable_ranges = sorted(r for r in report.missing_ranges if r in unfillable)
+        report.missing_ranges = [r for r in report.missing_ranges if r not in unfillable]
+        await asyncio.to_thread(
+            redis_client.set, ingestion_control.coverage_report_key(symbol, timeframe), report.to_json(),
+            ex=2 * settings.GAP_SCAN_INTERVAL_SECONDS
+        )
+        for start_ms, end_ms in report.missing_ranges:
+            if repair_queue.offer(symbol, timeframe, start_ms, end_ms):
+                queued += 1
+        if report.missing_ranges:
+            logger.info(f"[GAP_SCAN] {symbol}/{timeframe}: {report.missing_klines} klines missing in {len(report.missing_ranges)} ranges "
+                        f"(coverage {report.coverage_pct}%).")
+    return queued
+
+def _mark_unfillable(redis_client, symbol: str, timeframe: str, start_ms: int, end_ms: int):
+    key = unfillable_ranges_key(symbol, timeframe)
+    pipe = redis_client.pipeline()
+    pipe.sadd(key, f"{start_ms}-{end_ms}")
+    pipe.expire(key, UNFILLABLE_RANGES_TTL_SECONDS)
+    pipe.execute()
+
+def _raise_history_floor(redis_client, symbol: str, timeframe: str, floor_ms: int):
+    key = ingestion_control.history_floor_key(symbol, timeframe)
+    current = redis_client.get(key)
+    redis_client.set(key, max(floor_ms, int(current or 0)), ex=HISTORY_FLOOR_TTL_SECONDS)
+
+async def gap_repair_worker(repair_queue: GapRepairQueue, redis_client, db_session_factory,
+                            semaphore: asyncio.Semaphore, weight_budget: RequestWeightBudget, shutdown_event: asyncio.Event):
+    """
+    Refetches queued ranges one at a time, sharing the REST weight budget with all other fetches. Background
+    repairs also share the gap fill semaphore; interactive ranges (bounded by ON_DEMAND_BACKFILL_MAX_KLINES)
+    don't wait for it, so a chart read isn't stuck behind startup gap fills.
+    """
+    while not shutdown_event.is_set():
+        item = await repair_queue.get()
+        symbol, timeframe, start_ms, end_ms = item
+        interactive = repair_queue.priority(item) == PRIORITY_INTERACTIVE
+        try:
+            if interactive:
+                await asyncio.to_thread(
+                    ingestion_control.set_backfill_request_status, redis_client, symbol, timeframe, start_ms, end_ms,
+                    ingestion_control.BACKFILL_STATUS_IN_PROGRESS, settings.ON_DEMAND_BACKFILL_LOCK_SECONDS
+                )
+                inserted, skipped, completed = await fetch_and_save_historical_klines(
+                    symbol, timeframe, start_ms, end_ms, db_session_factory, weight_budget=weight_budget
+                )
+            else:
+                async with semaphore:
+                    inserted, skipped, completed = await fetch_and_save_historical_klines(
+                        symbol, timeframe, start_ms, end_ms, db_session_factory, weight_budget=weight_budget
+                    )
+            if inserted or skipped:
+                # A repaired range inside the pair's Redis window fills the same hole there
+                await refresh_cached_range(redis_client, db_session_factory, symbol, timeframe, start_ms, end_ms)
+            if not completed:
+                # A failed fetch says nothing about whether Binance has the klines: the next scan queues the range
+                # again, and a failed on-demand request can be retried by the client
+                logger.warning(f"[GAP_REPAIR] Repair of {symbol}/{timeframe} {start_ms}-{end_ms}{' (on demand)' if interactive else ''} did not complete. "
+                               f"Inserted: {inserted}, Skipped: {skipped}.")
+            elif inserted == 0 and skipped == 0 and interactive:
+                # Nothing this far back (the pair wasn't listed yet): stop chart reads from asking again
+                await asyncio.to_thread(_raise_history_floor, redis_client, symbol, timeframe, end_ms)
+                logger.info(f"[GAP_REPAIR] No klines exist on Binance for {symbol}/{timeframe} before {end_ms}. History floor raised.")
+            elif inserted == 0 and skipped == 0:
+                # Binance returned nothing for the range: remember it so it isn't refetched on every scan
+                await asyncio.to_thread(_mark_unfillable, redis_client, symbol, timeframe, start_ms, end_ms)
+                logger.info(f"[GAP_REPAIR] No klines exist on Binance for {symbol}/{timeframe} {start_ms}-{end_ms}. Marked unfillable.")
+            else:
+                logger.info(f"[GAP_REPAIR] Repaired {symbol}/{timeframe} {start_ms}-{end_ms}{' (on demand)' if interactive else ''}. "
+                            f"Inserted: {inserted}, Skipped: {skipped}")
+            if interactive:
+                await asyncio.to_thread(
+                    ingestion_control.set_backfill_request_status, redis_client, symbol, timeframe, start_ms, end_ms,
+                    ingestion_control.BACKFILL_STATUS_COMPLETED if completed else ingestion_control.BACKFILL_STATUS_FAILED,
+                    BACKFILL_REQUEST_RESULT_TTL_SECONDS
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[GAP_REPAIR] Error repairing {symbol}/{timeframe} {start_ms}-{end_ms}: {e}", exc_info=True)
+            if interactive:
+                try:
+                    # Short-lived, so the range can be requested again
+                    await asyncio.to_thread(
+                        ingestion_control.set_backfill_request_status, redis_client, symbol, timeframe, start_ms, end_ms,
+                        ingestion_control.BACKFILL_STATUS_FAILED, BACKFILL_REQUEST_RESULT_TTL_SECONDS
+                    )
+                except Exception as e_status:
+                    logger.error(f"[GAP_REPAIR] Error recording failed backfill request for {symbol}/{timeframe}: {e_status}")
+        finally:
+            repair_queue.done(item)
+
+async def backfill_request_listener(repair_queue: GapRepairQueue, redis_client, shutdown_event: asyncio.Event):
+    """
+    Moves backfill ranges requested by chart reads (ingestion:backfill_requests, shared by all workers) into
+    this worker's repair queue at interactive priority. A worker only takes a new request once its previous
+    ones are done, so requests spread over idle workers instead of piling up on one.
+    """
+    while not shutdown_event.is_set():
+        if repair_queue.pending_count(PRIORITY_INTERACTIVE) >= ON_DEMAND_BACKFILL_PREFETCH:
+            await asyncio.sleep(BACKFILL_REQUEST_POLL_SECONDS)
+            continue
+        try:
+            request = await asyncio.to_thread(ingestion_control.pop_backfill_request, redis_client, BACKFILL_REQUEST_BLOCK_SECONDS)
+            if request:
+                repair_queue.offer(*request, priority=PRIORITY_INTERACTIVE)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[GAP_REPAIR] Error reading backfill requests: {e}. Retrying in {BACKFILL_REQUEST_ERROR_BACKOFF_SECONDS}s.", exc_info=True)
+            await asyncio.sleep(BACKFILL_REQUEST_ERROR_BACKOFF_SECONDS)
+
+async def gap_scanner(registry, repair_queue: GapRepairQueue, redis_client, db_session_factory, shutdown_event: asyncio.Event):
+    """Runs a scan of all owned pairs every GAP_SCAN_INTERVAL_SECONDS until shutdown."""
+    while not shutdown_event.is_set():
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=settings.GAP_SCAN_INTERVAL_SECONDS)
+            break # Shutdown
+        except asyncio.TimeoutError:
+            pass
+        try:
+            queued = await scan_and_queue_repairs(registry, repair_queue, redis_client, db_session_factory)
+            logger.info(f"[GAP_SCAN] Scan complete. Queued {queued} ranges for repair ({repair_queue.qsize()} pending).")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[GAP_SCAN] Error during gap scan: {e}", exc_info=True)
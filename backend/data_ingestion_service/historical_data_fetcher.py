@@ -1,36 +1,49 @@
 import asyncio
 import httpx
+import json
 import logging
 import time
-from typing import List, Optional, Dict, Any
-from decimal import Decimal
-from datetime import datetime, timezone
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Tuple
 
 from backend.app.config import settings
 from backend.app.models import Kline
-from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 from backend.app.database import SessionLocal # Assuming SessionLocal is the factory
+from backend.app.http_clients import BINANCE_UPSTREAM, get_http_client
+from backend.app import kline_storage
+from .rate_limiter import RequestWeightBudget, KLINES_REQUEST_WEIGHT
+from .kline_copy_loader import load_binance_klines, binance_kline_to_row
+from .kline_record import KlineRecord
 
 logger = logging.getLogger(__name__)
 
-BINANCE_SPOT_API_URL = "https://api.binance.com/api/v3/klines"
-# Alternative if needed: https://data.binance.com for public data, might have different limits
+# Receives the raw Binance kline arrays of one fetched page (already cut at the window end)
+PageCallback = Callable[[List[list]], Awaitable[None]]
+
+# Base URL comes from settings.BINANCE_REST_BASE_URL (https://api.binance.com by default; point it at
+# backend/mock_exchange_server to test against enforced weights locally)
+BINANCE_KLINES_PATH = "/api/v3/klines"
 
 # Binance API constants
 MAX_KLINES_PER_REQUEST = 1000
-# Rate Limits: 1200 requests per minute; 10 orders per second; 20 orders per 10 seconds.
-# We should be conservative. Let's aim for max 1 request every 2 seconds initially if unauthenticated.
-# If authenticated, limits might be higher.
-DEFAULT_REQUEST_DELAY_SECONDS = 2 # Delay between batches of requests
+# Request pacing is done by the weight budget (rate_limiter.py), which follows the X-MBX-USED-WEIGHT-1M
+# and Retry-After headers, instead of a fixed delay between requests.
 RETRY_ATTEMPTS = 5
 INITIAL_RETRY_DELAY_SECONDS = 5
 MAX_RETRY_DELAY_SECONDS = 60
 RETRY_MULTIPLIER = 2
 
+# Interval lengths used to size fetch windows ("1M" is approximate; windows keep paging if it runs over)
+TIMEFRAME_TO_MS = {
+    "1s": 1000, "1m": 60 * 1000, "3m": 3 * 60 * 1000, "5m": 5 * 60 * 1000, "15m": 15 * 60 * 1000, "30m": 30 * 60 * 1000,
+    "1h": 60 * 60 * 1000, "2h": 2 * 60 * 60 * 1000, "4h": 4 * 60 * 60 * 1000, "6h": 6 * 60 * 60 * 1000,
+    "8h": 8 * 60 * 60 * 1000, "12h": 12 * 60 * 60 * 1000, "1d": 24 * 60 * 60 * 1000,
+    "3d": 3 * 24 * 60 * 60 * 1000, "1w": 7 * 24 * 60 * 60 * 1000, "1M": 30 * 24 * 60 * 60 * 1000,
+}
+
 # Mapping from our timeframe strings to Binance API interval strings
 TIMEFRAME_TO_BINANCE_INTERVAL = {
-    "1m": "1m", "3m": "3m", "5m": "5m", "15m": "15m", "30m": "30m",
+    "1s": "1s", "1m": "1m", "3m": "3m", "5m": "5m", "15m": "15m", "30m": "30m",
     "1h": "1h", "2h": "2h", "4h": "4h", "6h": "6h", "8h": "8h", "12h": "12h",
     "1d": "1d", "3d": "3d", "1w": "1w", "1M": "1M",
 }
@@ -38,52 +51,159 @@ TIMEFRAME_TO_BINANCE_INTERVAL = {
 
 def _map_binance_kline_to_model(binance_kline: list, symbol: str, timeframe: str) -> Optional[Kline]:
     """Maps a single kline list from Binance API to our Kline model object."""
-    try:
-        # Binance kline format:
-        # [
-        #   1499040000000,      // 0 Kline open time
-        #   "0.01634790",       // 1 Open price
-        #   "0.80000000",       // 2 High price
-        #   "0.01575800",       // 3 Low price
-        #   "0.01577100",       // 4 Close price
-        #   "148976.11427815",  // 5 Volume
-        #   1499644799999,      // 6 Kline close time
-        #   "2434.19055334",    // 7 Quote asset volume
-        #   308,                // 8 Number of trades
-        #   "1756.87402397",    // 9 Taker buy base asset volume
-        #   "28.46694368",      // 10 Taker buy quote asset volume
-        #   "0"                 // 11 Ignore
-        # ]
-        return Kline(
-            symbol=symbol,
-            timeframe=timeframe,
-            open_time=datetime.fromtimestamp(int(binance_kline[0]) / 1000, tz=timezone.utc),
-            open_price=Decimal(str(binance_kline[1])),
-            high_price=Decimal(str(binance_kline[2])),
-            low_price=Decimal(str(binance_kline[3])),
-            close_price=Decimal(str(binance_kline[4])),
-            volume=Decimal(str(binance_kline[5])),
-            close_time=datetime.fromtimestamp(int(binance_kline[6]) / 1000, tz=timezone.utc),
-            quote_asset_volume=Decimal(str(binance_kline[7])),
-            number_of_trades=int(binance_kline[8]),
-            taker_buy_base_asset_volume=Decimal(str(binance_kline[9])),
-            taker_buy_quote_asset_volume=Decimal(str(binance_kline[10])),
-            # is_closed=True  # Removed: Kline ORM model does not have this field
-        )
-    except (IndexError, ValueError, TypeError) as e:
-        logger.error(f"[HIST_FETCHER] Error mapping Binance kline to model: {e}. Data: {binance_kline}", exc_info=True)
-        return None
+    row = binance_kline_to_row(binance_kline, symbol, timeframe)
+    return Kline(**row) if row else None
+
+def _klines_url() -> str:
+    return f"{settings.BINANCE_REST_BASE_URL.rstrip('/')}{BINANCE_KLINES_PATH}"
+
+def _split_into_windows(start_time_ms: int, end_time_ms: int, window_ms: int) -> List[Tuple[int, int]]:
+    """Splits [start_time_ms, end_time_ms) into consecutive [window_start, window_end) ranges of window_ms."""
+    windows = []
+    window_start = start_time_ms
+    while window_start < end_time_ms:
+        window_end = min(window_start + window_ms, end_time_ms)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+async def _request_klines_page(
+    client: httpx.AsyncClient,
+    params: Dict[str, Any],
+    headers: Dict[str, str],
+    weight_budget: RequestWeightBudget,
+    symbol: str,
+    timeframe: str
+) -> Optional[list]:
+    """
+    One GET /api/v3/klines with retries. Every attempt first takes its weight from the shared budget,
+    and every response (including 429/418) is fed back into it. Returns the decoded rows, or None if
+    the request failed for good.
+    """
+    retry_count = 0
+    current_retry_delay = INITIAL_RETRY_DELAY_SECONDS
+
+    while retry_count < RETRY_ATTEMPTS:
+        response = None
+        try:
+            await weight_budget.acquire(KLINES_REQUEST_WEIGHT)
+            response = await client.get(_klines_url(), params=params, headers=headers)
+            weight_budget.observe_response(response.status_code, response.headers)
+            response.raise_for_status()  # Raises HTTPError for bad responses (4XX or 5XX)
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            logger.warning(f"[HIST_FETCHER] HTTP error fetching {symbol}/{timeframe}: {e.response.status_code} - {e.response.text}")
+            if e.response.status_code in [429, 418]: # Rate limit or IP ban
+                # The budget now blocks every fetcher until Retry-After has passed; just try again
+                logger.warning(f"[HIST_FETCHER] Rate limit hit for {symbol}/{timeframe}. Retrying after the server-given delay...")
+                retry_count += 1
+            else: # Other HTTP errors (e.g., 400 for bad symbol)
+                logger.error(f"[HIST_FETCHER] Unrecoverable HTTP error for {symbol}/{timeframe}. Aborting fetch for this batch.")
+                return None
+        except httpx.RequestError as e: # Network errors, timeouts
+            logger.warning(f"[HIST_FETCHER] Request error for {symbol}/{timeframe}: {e}. Retrying in {current_retry_delay}s...")
+            await asyncio.sleep(current_retry_delay)
+            current_retry_delay = min(current_retry_delay * RETRY_MULTIPLIER, MAX_RETRY_DELAY_SECONDS)
+            retry_count += 1
+        except json.JSONDecodeError as e:
+            logger.error(f"[HIST_FETCHER] JSON decode error for {symbol}/{timeframe}: {e}. Response: {response.text if response is not None else 'N/A'}")
+            return None # Unlikely, but good to handle
+
+    logger.error(f"[HIST_FETCHER] Failed to fetch data for {symbol}/{timeframe} after {RETRY_ATTEMPTS} retries. Aborting.")
+    return None
+
+async def _fetch_window(
+    client: httpx.AsyncClient,
+    symbol: str,
+    timeframe: str,
+    binance_interval: str,
+    interval_ms: int,
+    window_start_ms: int,
+    window_end_ms: Optional[int],
+    limit: int,
+    headers: Dict[str, str],
+    weight_budget: RequestWeightBudget,
+    on_page: PageCallback
+) -> Tuple[int, bool]:
+    """
+    Pages through one window [window_start_ms, window_end_ms), handing each page's raw kline arrays to
+    `on_page` as it arrives. Windows are sized to one page, so this is normally a single request; it keeps paging only if a
+    window holds more klines than expected (e.g. irregular month lengths for "1M"). window_end_ms=None pages
+    until Binance runs out of data.
+    Returns (rows_delivered, completed) where completed is False if a request failed for good.
+    """
+    rows_delivered = 0
+    current_start_time_ms = window_start_ms
+    while True:
+        params = {
+            "symbol": symbol.upper(),
+            "interval": binance_interval,
+            "startTime": current_start_time_ms,
+            "limit": limit
+        }
+        if window_end_ms is not None:
+            params["endTime"] = window_end_ms - 1
+
+        logger.debug(f"[HIST_FETCHER] Fetching klines for {symbol}/{timeframe} from {current_start_time_ms}" +
+                     (f" to {window_end_ms}" if window_end_ms else f" limit {limit}"))
+
+        response_data = await _request_klines_page(client, params, headers, weight_budget, symbol, timeframe)
+        if response_data is None:
+            return rows_delivered, False
+
+        if not isinstance(response_data, list) or not response_data:
+            break # No more data
+
+        last_kline_open_time_ms = 0
+        reached_end = False
+        page_klines: List[list] = []
+        for kline_item in response_data:
+            if not isinstance(kline_item, list) or len(kline_item) < 11:
+                logger.error(f"[HIST_FETCHER] Skipping malformed kline for {symbol}/{timeframe}: {kline_item}")
+                continue
+            open_time_ms = int(kline_item[0])
+            # Ensure we don't go past the window end if the data is inclusive of it
+            if window_end_ms is not None and open_time_ms >= window_end_ms:
+                reached_end = True
+                break
+            page_klines.append(kline_item)
+            # last_kline_open_time_ms should store the integer ms timestamp for the next API call
+            last_kline_open_time_ms = open_time_ms
+        if page_klines:
+            await on_page(page_klines)
+            rows_delivered += len(page_klines)
+
+        # Fewer klines than limit means we reached the end for this period
+        if reached_end or len(response_data) < limit or not last_kline_open_time_ms:
+            break
+        # A full page whose last kline is the window's last interval: nothing left to page for
+        if window_end_ms is not None and last_kline_open_time_ms + interval_ms >= window_end_ms:
+            break
+        # The next query's startTime is the open_time of the last kline received + 1ms, to avoid re-fetching it
+        current_start_time_ms = last_kline_open_time_ms + 1
+
+    return rows_delivered, True
 
 async def fetch_historical_klines(
     symbol: str,
     timeframe: str,
     start_time_ms: int,
     end_time_ms: Optional[int] = None,
-    limit_per_api_call: int = MAX_KLINES_PER_REQUEST
+    limit_per_api_call: int = MAX_KLINES_PER_REQUEST,
+    weight_budget: Optional[RequestWeightBudget] = None,
+    progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    max_concurrent_windows: Optional[int] = None,
+    client: Optional[httpx.AsyncClient] = None
 ) -> List[Kline]:
     """
     Fetches historical kline data from Binance REST API for a given symbol and timeframe.
 
+    When end_time_ms is given, the range is split into windows of one page (limit_per_api_call klines)
+    that are fetched concurrently, up to max_concurrent_windows at a time. Pacing comes entirely from the
+    weight budget, which follows Binance's X-MBX-USED-WEIGHT-1M and Retry-After headers, so the fetch runs
+    as fast as the IP's weight limit allows. Without end_time_ms the range is paged sequentially until
+    Binance has no more data.
+
     Args:
         symbol: Trading symbol (e.g., BTCUSDT).
         timeframe: Kline timeframe (e.g., "1m", "1h", "1d").
@@ -91,23 +211,28 @@ async def fetch_historical_klines(
         end_time_ms: End timestamp in milliseconds (optional, defaults to current time if not provided by Binance).
                      If provided, fetching stops once klines pass this time.
         limit_per_api_call: Number of klines to fetch per API call (max 1000 for Binance).
+        weight_budget: Optional process-wide request weight budget shared with other fetches. If omitted, a
+                       budget of BINANCE_REQUEST_WEIGHT_BUDGET_PER_MINUTE is used for this call alone.
+        progress_callback: Optional coroutine called as windows complete with
+                           (total_klines_fetched, open_time_ms fetched contiguously from start_time_ms).
+        max_concurrent_windows: Windows in flight at once (default HISTORICAL_FETCH_MAX_CONCURRENT_WINDOWS).
+        client: Optional httpx.AsyncClient to use (e.g. one bound to a mock exchange in tests). Defaults to
+                the process-wide Binance client from backend.app.http_clients.
 
     Returns:
-        A list of Kline model instances, or an empty list if fetching fails or no data.
+        A list of Kline model instances sorted by open_time, or an empty list if fetching fails or no data.
+        If some windows fail, the klines before the first failed window are returned.
     """
     binance_interval = TIMEFRAME_TO_BINANCE_INTERVAL.get(timeframe)
-    if not binance_interval:
+    interval_ms = TIMEFRAME_TO_MS.get(timeframe)
+    if not binance_interval or not interval_ms:
         logger.error(f"[HIST_FETCHER] Invalid timeframe: {timeframe}. Cannot map to Binance interval.")
         return []
 
-    all_klines_models: List[Kline] = []
-    current_start_time_ms = start_time_ms
-    request_delay = DEFAULT_REQUEST_DELAY_SECONDS
-    
-    # Convert end_time_ms to datetime object if it exists, for proper comparison
-    end_time_dt: Optional[datetime] = None
-    if end_time_ms is not None:
-        end_time_dt = datetime.fromtimestamp(end_time_ms / 1000, tz=timezone.utc)
+    limit = min(limit_per_api_call, MAX_KLINES_PER_REQUEST) # Ensure we don't exceed Binance max
+    if weight_budget is None:
+        weight_budget = RequestWeightBudget(settings.BINANCE_REQUEST_WEIGHT_BUDGET_PER_MINUTE)
+    concurrency = max(1, max_concurrent_windows or settings.HISTORICAL_FETCH_MAX_CONCURRENT_WINDOWS)
 
     # Prepare headers - API key might increase rate limits or access
     headers = {}
@@ -115,98 +240,115 @@ async def fetch_historical_klines(
         headers['X-MBX-APIKEY'] = settings.BINANCE_API_KEY
         # Note: Secret key is not used for GET /api/v3/klines, only for signed endpoints.
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        while True:
-            params = {
-                "symbol": symbol.upper(),
-                "interval": binance_interval,
-                "startTime": current_start_time_ms,
-                "limit": min(limit_per_api_call, MAX_KLINES_PER_REQUEST) # Ensure we don't exceed Binance max
-            }
-            if end_time_ms:
-                params["endTime"] = end_time_ms
-            
-            logger.info(f"[HIST_FETCHER] Fetching klines for {symbol}/{timeframe} from {current_start_time_ms}" +
-                        (f" to {end_time_ms}" if end_time_ms else f" limit {params['limit']}"))
-
-            retry_count = 0
-            current_retry_delay = INITIAL_RETRY_DELAY_SECONDS
-            response_data = None
-
-            while retry_count < RETRY_ATTEMPTS:
-                try:
-                    response = await client.get(BINANCE_SPOT_API_URL, params=params, headers=headers)
-                    response.raise_for_status()  # Raises HTTPError for bad responses (4XX or 5XX)
-                    response_data = response.json()
-                    break # Success
-                except httpx.HTTPStatusError as e:
-                    logger.warning(f"[HIST_FETCHER] HTTP error fetching {symbol}/{timeframe}: {e.response.status_code} - {e.response.text}")
-                    if e.response.status_code in [429, 418]: # Rate limit or IP ban
-                        logger.warning(f"[HIST_FETCHER] Rate limit hit. Retrying in {current_retry_delay}s...")
-                        await asyncio.sleep(current_retry_delay)
-                        current_retry_delay = min(current_retry_delay * RETRY_MULTIPLIER, MAX_RETRY_DELAY_SECONDS)
-                        retry_count += 1
-                    else: # Other HTTP errors (e.g., 400 for bad symbol)
-                        logger.error(f"[HIST_FETCHER] Unrecoverable HTTP error for {symbol}/{timeframe}. Aborting fetch for this batch.")
-                        return all_klines_models # Return what we have so far
-                except httpx.RequestError as e: # Network errors, timeouts
-                    logger.warning(f"[HIST_FETCHER] Request error for {symbol}/{timeframe}: {e}. Retrying in {current_retry_delay}s...")
-                    await asyncio.sleep(current_retry_delay)
-                    current_retry_delay = min(current_retry_delay * RETRY_MULTIPLIER, MAX_RETRY_DELAY_SECONDS)
-                    retry_count += 1
-                except json.JSONDecodeError as e:
-                    logger.error(f"[HIST_FETCHER] JSON decode error for {symbol}/{timeframe}: {e}. Response: {response.text if 'response' in locals() else 'N/A'}")
-                    return all_klines_models # Unlikely, but good to handle
-
-            if not response_data:
-                logger.error(f"[HIST_FETCHER] Failed to fetch data for {symbol}/{timeframe} after {RETRY_ATTEMPTS} retries. Aborting.")
-                return all_klines_models # Return what we have so far
-
-            if not isinstance(response_data, list) or not response_data:
-                logger.info(f"[HIST_FETCHER] No more kline data returned for {symbol}/{timeframe} from {current_start_time_ms}.")
-                break # No more data
-
-            batch_klines_models: List[Kline] = []
-            last_kline_open_time_ms = 0
-            for kline_item in response_data:
-                kline_model = _map_binance_kline_to_model(kline_item, symbol, timeframe)
-                if kline_model:
-                    # Ensure we don't go past end_time_dt if specified and data is inclusive of it
-                    if end_time_dt and kline_model.open_time >= end_time_dt:
-                        logger.info(f"[HIST_FETCHER] Reached specified end_time ({end_time_dt}) for {symbol}/{timeframe}. Stopping fetch.")
-                        response_data = [] # Signal to break outer loop
-                        break 
-                    batch_klines_models.append(kline_model)
-                    # last_kline_open_time_ms should store the integer ms timestamp for the next API call
-                    last_kline_open_time_ms = int(kline_model.open_time.timestamp() * 1000) 
-            
-            all_klines_models.extend(batch_klines_models)
-            logger.info(f"[HIST_FETCHER] Fetched {len(batch_klines_models)} klines for {symbol}/{timeframe}. Total: {len(all_klines_models)}.")
-
-            if len(response_data) < params['limit']: # Fewer klines than limit means we reached the end for this period
-                logger.info(f"[HIST_FETCHER] Fetched fewer klines ({len(response_data)}) than limit ({params['limit']}). Assuming end of available data for {symbol}/{timeframe}.")
-                break
-            
-            if not batch_klines_models: # If after filtering (e.g. by end_time_ms) no klines were added
-                logger.info(f"[HIST_FETCHER] No new klines added to batch for {symbol}/{timeframe}, likely due to end_time_ms filter. Stopping fetch.")
-                break
-
-            # The next query's startTime should be the open_time of the last kline received + 1ms.
-            # Example: if last kline's open_time is T (in ms), next startTime is T + 1.
-            # This is to avoid re-fetching the last kline.
-            if not last_kline_open_time_ms: # Should only happen if response_data was empty from start or all items failed mapping
-                logger.warning(f"[HIST_FETCHER] last_kline_open_time_ms is not set after processing a batch for {symbol}/{timeframe}. This might indicate an issue or end of data.")
-                break
-            current_start_time_ms = last_kline_open_time_ms + 1 
+    if end_time_ms is not None:
+        windows = _split_into_windows(start_time_ms, end_time_ms, limit * interval_ms)
+    else:
+        windows = [(start_time_ms, None)]
+    if not windows:
+        return []
+    logger.info(f"[HIST_FETCHER] Fetching {symbol}/{timeframe} from {start_time_ms} to {end_time_ms} in {len(windows)} windows ({concurrency} concurrent).")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Optional[Tuple[List[Kline], bool]]] = [None] * len(windows)
+    state = {"fetched": 0, "contiguous": 0} # Windows completed in order from the start, for progress reporting
+
+    async def run_window(index: int, window_start_ms: int, window_end_ms: Optional[int]):
+        window_klines: List[Kline] = []
+
+        async def collect_page(raw_klines: List[list]):
+            window_klines.extend(k for k in (_map_binance_kline_to_model(item, symbol, timeframe) for item in raw_klines) if k)
+
+        async with semaphore:
+            completed = False
+            try:
+                _, completed = await _fetch_window(
+                    http_client, symbol, timeframe, binance_interval, interval_ms, window_start_ms, window_end_ms,
+                    limit, headers, weight_budget, collect_page
+                )
+            except Exception as e:
+                logger.error(f"[HIST_FETCHER] Unexpected error fetching window {window_start_ms}-{window_end_ms} for {symbol}/{timeframe}: {e}", exc_info=True)
+            results[index] = (window_klines, completed)
+        state["fetched"] += len(results[index][0])
+        while state["contiguous"] < len(windows) and results[state["contiguous"]] is not None and results[state["contiguous"]][1]:
+            state["contiguous"] += 1
+        if progress_callback and state["contiguous"]:
+            contiguous_end_ms = windows[state["contiguous"] - 1][1]
+            if contiguous_end_ms is None: # Open-ended single window
+                contiguous_end_ms = int(results[0][0][-1].open_time.timestamp() * 1000) if results[0][0] else window_start_ms
+            await progress_callback(state["fetched"], contiguous_end_ms)
+
+    http_client = client or get_http_client(BINANCE_UPSTREAM)
+    await asyncio.gather(*(run_window(i, ws, we) for i, (ws, we) in enumerate(windows)))
 
-            # Respectful delay before next API call
-            logger.debug(f"[HIST_FETCHER] Waiting {request_delay}s before next fetch for {symbol}/{timeframe}...")
-            await asyncio.sleep(request_delay)
+    all_klines_models: List[Kline] = []
+    for index, (window_klines, completed) in enumerate(results):
+        all_klines_models.extend(window_klines)
+        if not completed:
+            logger.error(f"[HIST_FETCHER] Window {index + 1}/{len(windows)} for {symbol}/{timeframe} failed. Returning the {len(all_klines_models)} klines fetched before it.")
+            break
 
-    logger.info(f"[HIST_FETCHER] Finished fetching historical klines for {symbol}/{timeframe}. Total fetched: {len(all_klines_models)}.")
+    logger.info(f"[HIST_FETCHER] Finished fetching historical klines for {symbol}/{timeframe}. Total fetched: {len(all_klines_models)}. Rate limited {weight_budget.rate_limited_count} times.")
     return all_klines_models
 
 
+async def fetch_closed_kline_records(
+    symbol: str,
+    timeframe: str,
+    start_time_ms: int,
+    end_time_ms: int,
+    weight_budget: Optional[RequestWeightBudget] = None,
+    client: Optional[httpx.AsyncClient] = None
+) -> Tuple[List[KlineRecord], bool]:
+    """
+    Fetches the klines opened in [start_time_ms, end_time_ms) that had closed by end_time_ms, as KlineRecords
+    (decimal strings as Binance sent them), for feeding straight into the live processing pipeline. Pages
+    sequentially; meant for short ranges such as the klines missed during a WebSocket reconnect.
+    Returns (records sorted by open_time, completed) where completed is False if a request failed for good;
+    the records fetched before the failure are still returned.
+    """
+    binance_interval = TIMEFRAME_TO_BINANCE_INTERVAL.get(timeframe)
+    interval_ms = TIMEFRAME_TO_MS.get(timeframe)
+    if not binance_interval or not interval_ms:
+        logger.error(f"[HIST_FETCHER] Invalid timeframe: {timeframe}. Cannot map to Binance interval.")
+        return [], False
+    if start_time_ms >= end_time_ms:
+        return [], True
+    if weight_budget is None:
+        weight_budget = RequestWeightBudget(settings.BINANCE_REQUEST_WEIGHT_BUDGET_PER_MINUTE)
+    headers = {'X-MBX-APIKEY': settings.BINANCE_API_KEY} if settings.BINANCE_API_KEY else {}
+    records: List[KlineRecord] = []
+
+    async def collect_page(raw_klines: List[list]):
+        for item in raw_klines:
+            record = KlineRecord.from_rest_row(item, symbol, timeframe)
+            if record.close_time < end_time_ms: # The kline still open at end_time_ms comes from the live stream
+                records.append(record)
+
+    http_client = client or get_http_client(BINANCE_UPSTREAM)
+    _, completed = await _fetch_window(
+        http_client, symbol, timeframe, binance_interval, interval_ms, start_time_ms, end_time_ms,
+        MAX_KLINES_PER_REQUEST, headers, weight_budget, collect_page
+    )
+    return records, completed
+
+
+def _insert_kline_rows(rows: List[Dict[str, Any]], db_session_factory) -> int:
+    """
+    Blocking: inserts rows with ON CONFLICT DO NOTHING in one statement and commits.
+    Returns the number of newly inserted rows. Raises on DB errors (after rolling back).
+    """
+    db_session = db_session_factory()
+    try:
+        # With on_conflict_do_nothing, rowcount is the number of rows actually inserted
+        inserted = kline_storage.insert_kline_rows(db_session, rows)
+        db_session.commit()
+        return inserted
+    except Exception:
+        db_session.rollback()
+        raise
+    finally:
+        db_session.close()
+
 async def save_historical_klines_to_db(
     klines: List[Kline],
     db_session_factory # Typically SessionLocal
@@ -224,14 +366,6 @@ async def save_historical_klines_to_db(
     if not klines:
         return 0, 0
 
-    inserted_count = 0
-    conflicted_count = 0
-    
-    # Batching might be more efficient for very large lists, but ON CONFLICT handles duplicates well.
-    # For simplicity, let's insert them one by one using the model objects,
-    # or prepare a list of dicts for a single bulk insert statement.
-    # Using bulk_insert_mappings for efficiency with on_conflict_do_nothing.
-
     kline_mappings = [
         {
             "symbol": k.symbol,
@@ -247,44 +381,175 @@ async def save_historical_klines_to_db(
             "number_of_trades": k.number_of_trades,
             "taker_buy_base_asset_volume": k.taker_buy_base_asset_volume,
             "taker_buy_quote_asset_volume": k.taker_buy_quote_asset_volume
-            # "is_closed" field removed as it's not in the Kline ORM model
         } for k in klines
     ]
 
-    db_session = None
     try:
-        db_session = db_session_factory()
-        
-        # Using SQLAlchemy's insert with on_conflict_do_nothing
-        stmt = pg_insert(Kline).values(kline_mappings)
-        stmt = stmt.on_conflict_do_nothing(index_elements=['symbol', 'timeframe', 'open_time'])
-        
-        # To get a count of inserted vs conflicted, we might need to execute differently or check result.
-        # For now, execute and assume conflicts are handled silently by DB.
-        # The `result.rowcount` from `execute(stmt)` when using `on_conflict_do_nothing`
-        # typically returns the number of rows *affected* by the INSERT, which means newly inserted rows.
-        
-        result = await asyncio.to_thread(db_session.execute, stmt)
-        await asyncio.to_thread(db_session.commit)
-        
-        inserted_count = result.rowcount if result else 0 # Number of new rows inserted
-        conflicted_count = len(klines) - inserted_count # Estimate of conflicted rows
-
-        logger.info(f"[DB_SAVE] Saved historical klines. Inserted: {inserted_count}, Conflicts/Skipped: {conflicted_count} (Total attempted: {len(klines)})")
-
+        inserted_count = await asyncio.to_thread(_insert_kline_rows, kline_mappings, db_session_factory)
     except SQLAlchemyError as e:
         logger.error(f"[DB_SAVE] SQLAlchemyError saving historical klines: {e}", exc_info=True)
-        if db_session: await asyncio.to_thread(db_session.rollback)
         return 0, len(klines) # Assume all failed if error during batch
     except Exception as e:
         logger.error(f"[DB_SAVE] Unexpected error saving historical klines: {e}", exc_info=True)
-        if db_session: await asyncio.to_thread(db_session.rollback)
         return 0, len(klines)
-    finally:
-        if db_session: await asyncio.to_thread(db_session.close)
-            
+
+    conflicted_count = len(klines) - inserted_count # Estimate of conflicted rows
+    logger.info(f"[DB_SAVE] Saved historical klines. Inserted: {inserted_count}, Conflicts/Skipped: {conflicted_count} (Total attempted: {len(klines)})")
     return inserted_count, conflicted_count
 
+# Queue items between the window fetchers and the DB writer in fetch_and_save_historical_klines
+_PAGE = "page" # (_PAGE, window_index, rows)
+_WINDOW_END = "window_end" # (_WINDOW_END, window_index, completed)
+_FETCHER_EXIT = "fetcher_exit" # (_FETCHER_EXIT, None, None)
+
+async def fetch_and_save_historical_klines(
+    symbol: str,
+    timeframe: str,
+    start_time_ms: int,
+    end_time_ms: int,
+    db_session_factory,
+    limit_per_api_call: int = MAX_KLINES_PER_REQUEST,
+    weight_budget: Optional[RequestWeightBudget] = None,
+    progress_callback: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    max_concurrent_windows: Optional[int] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    batch_size: Optional[int] = None,
+    queue_max_pages: Optional[int] = None
+) -> Tuple[int, int, bool]:
+    """
+    Fetches [start_time_ms, end_time_ms) and writes it to the DB as it arrives, with memory bounded by
+    the queue and batch sizes rather than the length of the range.
+
+    A fixed pool of max_concurrent_windows fetchers takes one-page windows in order (same pacing as
+    fetch_historical_klines) and puts each page's raw kline arrays on a queue of at most queue_max_pages
+    pages. A single writer drains the queue and bulk loads batch_size rows at a time with COPY
+    (kline_copy_loader.py), without building ORM objects. When the DB falls behind, the queue fills
+    and the fetchers wait, so neither side runs ahead of the other.
+
+    progress_callback, if given, is called after each write with (rows_written, open_time_ms written
+    contiguously from start_time_ms).
+
+    Returns:
+        A tuple (inserted_count, skipped_count, completed); skipped rows already existed or were in a failed
+        write. completed is False if any window's fetch or write failed, so (0, 0, True) means Binance has
+        no klines in the range while (0, 0, False) means it couldn't be read. Windows after a failed fetch or
+        write are still written (inserts are idempotent), but reported progress stops at the first failed
+        window, so it never claims a range that has holes.
+    """
+    binance_interval = TIMEFRAME_TO_BINANCE_INTERVAL.get(timeframe)
+    interval_ms = TIMEFRAME_TO_MS.get(timeframe)
+    if not binance_interval or not interval_ms:
+        logger.error(f"[HIST_FETCHER] Invalid timeframe: {timeframe}. Cannot map to Binance interval.")
+        return 0, 0, False
+
+    limit = min(limit_per_api_call, MAX_KLINES_PER_REQUEST)
+    if weight_budget is None:
+        weight_budget = RequestWeightBudget(settings.BINANCE_REQUEST_WEIGHT_BUDGET_PER_MINUTE)
+    concurrency = max(1, max_concurrent_windows or settings.HISTORICAL_FETCH_MAX_CONCURRENT_WINDOWS)
+    batch_size = max(1, batch_size or settings.HISTORICAL_SAVE_BATCH_SIZE)
+    queue_max_pages = max(1, queue_max_pages or settings.HISTORICAL_SAVE_QUEUE_MAX_PAGES)
+
+    headers = {}
+    if settings.BINANCE_API_KEY:
+        headers['X-MBX-APIKEY'] = settings.BINANCE_API_KEY
+
+    windows = _split_into_windows(start_time_ms, end_time_ms, limit * interval_ms)
+    if not windows:
+        return 0, 0, True
+    concurrency = min(concurrency, len(windows))
+    logger.info(f"[HIST_FETCHER] Streaming {symbol}/{timeframe} from {start_time_ms} to {end_time_ms} into the DB: "
+                f"{len(windows)} windows, {concurrency} concurrent, batches of {batch_size} rows.")
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_max_pages)
+    next_windows = iter(enumerate(windows)) # Shared by the fetchers, so windows are taken in order
+    http_client = client or get_http_client(BINANCE_UPSTREAM)
+
+    async def fetcher():
+        for index, (window_start_ms, window_end_ms) in next_windows:
+            async def enqueue_page(raw_klines: List[list], index: int = index):
+                await queue.put((_PAGE, index, raw_klines)) # Blocks while the writer is behind
+
+            completed = False
+            try:
+                _, completed = await _fetch_window(
+                    http_client, symbol, timeframe, binance_interval, interval_ms, window_start_ms, window_end_ms,
+                    limit, headers, weight_budget, enqueue_page
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[HIST_FETCHER] Unexpected error fetching window {window_start_ms}-{window_end_ms} for {symbol}/{timeframe}: {e}", exc_info=True)
+            await queue.put((_WINDOW_END, index, completed))
+        await queue.put((_FETCHER_EXIT, None, None))
+
+    totals = {"inserted": 0, "skipped": 0, "written": 0}
+    batch: List[list] = []
+    batch_windows = set() # Windows with rows in `batch`
+    ended_windows: List[int] = [] # Windows whose rows are all in `batch` or already written
+    written_windows = set() # Written windows past the contiguous prefix (at most ~concurrency of them)
+    failed_windows = set()
+    contiguous = 0 # Number of windows written in order from the start
+
+    async def flush():
+        nonlocal batch, contiguous
+        rows, batch = batch, []
+        rows_from_windows, window_indices = set(batch_windows), list(ended_windows)
+        batch_windows.clear()
+        ended_windows.clear()
+        if rows:
+            try:
+                inserted = await asyncio.to_thread(load_binance_klines, rows, symbol, timeframe, db_session_factory)
+            except Exception as e:
+                logger.error(f"[DB_SAVE] Error writing a batch of {len(rows)} klines for {symbol}/{timeframe}: {e}", exc_info=True)
+                totals["skipped"] += len(rows)
+                failed_windows.update(rows_from_windows, window_indices)
+                return
+            totals["inserted"] += inserted
+            totals["skipped"] += len(rows) - inserted
+            totals["written"] += len(rows)
+        # A window whose earlier page was in a failed batch stays failed even if its last page was written
+        written_windows.update(i for i in window_indices if i not in failed_windows)
+        while contiguous in written_windows:
+            written_windows.discard(contiguous)
+            contiguous += 1
+        if progress_callback and contiguous:
+            await progress_callback(totals["written"], windows[contiguous - 1][1])
+
+    async def writer():
+        running_fetchers = concurrency
+        while running_fetchers:
+            kind, index, payload = await queue.get()
+            if kind == _PAGE:
+                batch.extend(payload)
+                batch_windows.add(index)
+            elif kind == _WINDOW_END:
+                if payload:
+                    ended_windows.append(index)
+                else:
+                    failed_windows.add(index)
+            else:
+                running_fetchers -= 1
+            # Also flush when a window ended with nothing pending (e.g. no trading in it) so progress keeps moving
+            if len(batch) >= batch_size or (kind == _WINDOW_END and payload and not batch):
+                await flush()
+        await flush()
+
+    writer_task = asyncio.create_task(writer())
+    fetcher_tasks = [asyncio.create_task(fetcher()) for _ in range(concurrency)]
+    try:
+        await writer_task
+    finally:
+        for task in fetcher_tasks:
+            task.cancel()
+        await asyncio.gather(*fetcher_tasks, return_exceptions=True)
+
+    if failed_windows:
+        first_failed = min(failed_windows)
+        logger.error(f"[HIST_FETCHER] {len(failed_windows)} of {len(windows)} windows for {symbol}/{timeframe} failed, first at {windows[first_failed][0]}.")
+    logger.info(f"[HIST_FETCHER] Finished streaming {symbol}/{timeframe}. Inserted: {totals['inserted']}, Skipped: {totals['skipped']}. "
+                f"Rate limited {weight_budget.rate_limited_count} times.")
+    return totals["inserted"], totals["skipped"], not failed_windows
+
 
 if __name__ == "__main__":
     # Example Usage (for testing this module directly)
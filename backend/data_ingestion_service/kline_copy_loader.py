@@ -0,0 +1,165 @@
+import io
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from backend.app import kline_storage
+
+logger = logging.getLogger(__name__)
+
+# Bulk load path for historical klines: the raw Binance kline arrays are written as COPY text into a
+# temporary staging table and merged into `klines` (or `klines_compact`, see app/kline_storage.py) with
+# one INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+# No ORM objects or Decimals are created: prices stay the decimal strings Binance sent and PostgreSQL
+# parses them straight into NUMERIC, and timestamps stay integer ms until the merge converts them.
+
+STAGING_TABLE = "klines_copy_stage"
+
+# Staging columns in Binance kline array order (index 0..10); symbol/timeframe are prepended per row
+_STAGE_COLUMNS = (
+    "symbol", "timeframe", "open_time_ms", "open_price", "high_price", "low_price", "close_price", "volume",
+    "close_time_ms", "quote_asset_volume", "number_of_trades", "taker_buy_base_asset_volume", "taker_buy_quote_asset_volume",
+)
+
+_CREATE_STAGE_SQL = f"""
+CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} (
+    symbol text, timeframe text, open_time_ms bigint,
+    open_price numeric, high_price numeric, low_price numeric, close_price numeric, volume numeric,
+    close_time_ms bigint, quote_asset_volume numeric, number_of_trades bigint,
+    taker_buy_base_asset_volume numeric, taker_buy_quote_asset_volume numeric
+) ON COMMIT DELETE ROWS
+"""
+
+_COPY_SQL = f"COPY {STAGING_TABLE} ({', '.join(_STAGE_COLUMNS)}) FROM STDIN"
+
+_MERGE_SQL = f"""
+INSERT INTO klines (
+    symbol, timeframe, open_time, open_price, high_price, low_price, close_price, volume,
+    close_time, quote_asset_volume, number_of_trades, taker_buy_base_asset_volume, taker_buy_quote_asset_volume
+)
+SELECT
+    symbol, timeframe, to_timestamp(0) + open_time_ms * interval '1 millisecond',
+    open_price, high_price, low_price, close_price, volume,
+    to_timestamp(0) + close_time_ms * interval '1 millisecond',
+    quote_asset_volume, number_of_trades, taker_buy_base_asset_volume, taker_buy_quote_asset_volume
+FROM {STAGING_TABLE}
+ON CONFLICT (symbol, timeframe, open_time) DO NOTHING
+"""
+
+# Same merge for the compact schema (app/kline_storage.py): the pair becomes its instrument id, numerics are
+# cast to float8 and close_time is dropped (it is derived from open_time on read)
+_MERGE_COMPACT_SQL = f"""
+INSERT INTO klines_compact (
+    open_time, open_price, high_price, low_price, close_price, volume, quote_asset_volume,
+    taker_buy_base_asset_volume, taker_buy_quote_asset_volume, number_of_trades, instrument_id
+)
+SELECT
+    to_timestamp(0) + open_time_ms * interval '1 millisecond',
+    open_price::float8, high_price::float8, low_price::float8, close_price::float8, volume::float8,
+    quote_asset_volume::float8, taker_buy_base_asset_volume::float8, taker_buy_quote_asset_volume::float8,
+    number_of_trades, %(instrument_id)s
+FROM {STAGING_TABLE}
+ON CONFLICT (instrument_id, open_time) DO NOTHING
+"""
+
+
+def binance_kline_to_row(binance_kline: list, symbol: str, timeframe: str) -> Optional[Dict[str, Any]]:
+    """Maps a single kline list from Binance API to a row dict for the klines table (the Kline model's columns)."""
+    try:
+        # Binance kline format:
+        # [
+        #   1499040000000,      // 0 Kline open time
+        #   "0.01634790",       // 1 Open price
+        #   "0.80000000",       // 2 High price
+        #   "0.01575800",       // 3 Low price
+        #   "0.01577100",       // 4 Close price
+        #   "148976.11427815",  // 5 Volume
+        #   1499644799999,      // 6 Kline close time
+        #   "2434.19055334",    // 7 Quote asset volume
+        #   308,                // 8 Number of trades
+        #   "1756.87402397",    // 9 Taker buy base asset volume
+        #   "28.46694368",      // 10 Taker buy quote asset volume
+        #   "0"                 // 11 Ignore
+        # ]
+        return {
+            "symbol": symbol,
+            "timeframe": timeframe,
+            "open_time": datetime.fromtimestamp(int(binance_kline[0]) / 1000, tz=timezone.utc),
+            "open_price": Decimal(str(binance_kline[1])),
+            "high_price": Decimal(str(binance_kline[2])),
+            "low_price": Decimal(str(binance_kline[3])),
+            "close_price": Decimal(str(binance_kline[4])),
+            "volume": Decimal(str(binance_kline[5])),
+            "close_time": datetime.fromtimestamp(int(binance_kline[6]) / 1000, tz=timezone.utc),
+            "quote_asset_volume": Decimal(str(binance_kline[7])),
+            "number_of_trades": int(binance_kline[8]),
+            "taker_buy_base_asset_volume": Decimal(str(binance_kline[9])),
+            "taker_buy_quote_asset_volume": Decimal(str(binance_kline[10])),
+        }
+    except (IndexError, ValueError, TypeError) as e:
+        logger.error(f"[KLINE_LOADER] Error mapping Binance kline to a row: {e}. Data: {binance_kline}", exc_info=True)
+        return None
+
+
+def encode_copy_rows(raw_klines: Iterable[Sequence[Any]], symbol: str, timeframe: str) -> str:
+    """
+    Encodes raw Binance kline arrays (or the rows of a 2-D NumPy array with the same column order) as
+    COPY text: one tab-separated line per kline. Values are written as-is; symbols and timeframes are
+    validated upstream, and Binance numbers never contain tabs, newlines or backslashes.
+    """
+    prefix = f"{symbol}\t{timeframe}\t"
+    return "".join(
+        f"{prefix}{int(k[0])}\t{k[1]}\t{k[2]}\t{k[3]}\t{k[4]}\t{k[5]}\t{int(k[6])}\t{k[7]}\t{int(k[8])}\t{k[9]}\t{k[10]}\n"
+        for k in raw_klines
+    )
+
+
+def supports_copy(db_session) -> bool:
+    """COPY FROM STDIN needs psycopg2's copy_expert; other drivers use the INSERT fallback."""
+    bind = db_session.get_bind()
+    return bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2"
+
+
+def _copy_and_merge(db_session, copy_text: str, instrument_id: Optional[int] = None) -> int:
+    """instrument_id set: merge into the compact schema for that (single) pair instead of `klines`."""
+    dbapi_connection = db_session.connection().connection # Raw psycopg2 connection in the session's transaction
+    with dbapi_connection.cursor() as cursor:
+        cursor.execute(_CREATE_STAGE_SQL)
+        cursor.copy_expert(_COPY_SQL, io.StringIO(copy_text))
+        if instrument_id is None:
+            cursor.execute(_MERGE_SQL)
+        else:
+            cursor.execute(_MERGE_COMPACT_SQL, {"instrument_id": instrument_id})
+        return cursor.rowcount
+
+
+def _insert_fallback(db_session, raw_klines: List[Sequence[Any]], symbol: str, timeframe: str) -> int:
+    rows = [row for row in (binance_kline_to_row(k, symbol, timeframe) for k in raw_klines) if row]
+    if not rows:
+        return 0
+    return kline_storage.insert_kline_rows(db_session, rows)
+
+
+def load_binance_klines(raw_klines: List[Sequence[Any]], symbol: str, timeframe: str, db_session_factory) -> int:
+    """
+    Blocking: loads one batch of raw Binance kline arrays for a symbol/timeframe into the configured kline
+    storage, skipping rows that already exist, and commits. Returns the number of newly inserted rows. Raises on DB errors
+    (after rolling back).
+    """
+    if not raw_klines:
+        return 0
+    db_session = db_session_factory()
+    try:
+        if supports_copy(db_session):
+            instrument_id = kline_storage.get_instrument_id(db_session, symbol, timeframe, create=True) if kline_storage.uses_compact_storage() else None
+            inserted = _copy_and_merge(db_session, encode_copy_rows(raw_klines, symbol, timeframe), instrument_id)
+        else:
+            inserted = _insert_fallback(db_session, raw_klines, symbol, timeframe)
+        db_session.commit() # ON COMMIT DELETE ROWS empties the staging table for the next batch on this connection
+        return inserted
+    except Exception:
+        db_session.rollback()
+        raise
+    finally:
+        db_session.close()
@@ -0,0 +1,107 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+
+from backend.app.kline_cache_codec import encode_member
+
+
+@dataclass(slots=True)
+class KlineRecord:
+    """
+    A single kline as it flows through the ingestion pipeline.
+
+    Prices and volumes keep the exact decimal string Binance sent. That string is what gets
+    stored (PostgreSQL casts it straight into NUMERIC, no Decimal round trip); float views are
+    produced only for the Redis cache member and when publishing to clients.
+    Timestamps are integer milliseconds since epoch.
+    """
+    symbol: str
+    timeframe: str
+    open_time: int
+    close_time: int
+    open: str
+    high: str
+    low: str
+    close: str
+    volume: str
+    quote_asset_volume: str
+    number_of_trades: int
+    taker_buy_base_asset_volume: str
+    taker_buy_quote_asset_volume: str
+    is_closed: bool
+    event_time: Optional[int] = None
+
+    @classmethod
+    def from_ws_kline(cls, k: dict, event_time: Optional[int] = None) -> "KlineRecord":
+        """
+        Builds a record from the 'k' object of a Binance kline stream event.
+        Raises KeyError if a required field is missing.
+        """
+        return cls(
+            k['s'], k['i'], k['t'], k['T'],
+            k['o'], k['h'], k['l'], k['c'], k['v'],
+            k['q'], k['n'], k['V'], k['Q'],
+            k.get('x', False),
+            event_time,
+        )
+
+    @classmethod
+    def from_rest_row(cls, row: list, symbol: str, timeframe: str) -> "KlineRecord":
+        """
+        Builds a closed record from one row of the Binance REST /api/v3/klines response:
+        [open_time, open, high, low, close, volume, close_time, quote_volume, trades,
+         taker_buy_base_volume, taker_buy_quote_volume, ignore]
+        """
+        return cls(
+            symbol, timeframe, int(row[0]), int(row[6]),
+            row[1], row[2], row[3], row[4], row[5],
+            row[7], int(row[8]), row[9], row[10],
+            True,
+        )
+
+    def as_db_row(self) -> dict:
+        """Column mapping for an INSERT into the klines table. Numeric columns stay as strings."""
+        return {
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'open_time': datetime.fromtimestamp(self.open_time / 1000, tz=timezone.utc),
+            'open_price': self.open,
+            'high_price': self.high,
+            'low_price': self.low,
+            'close_price': self.close,
+            'volume': self.volume,
+            'close_time': datetime.fromtimestamp(self.close_time / 1000, tz=timezone.utc),
+            'quote_asset_volume': self.quote_asset_volume,
+            'number_of_trades': self.number_of_trades,
+            'taker_buy_base_asset_volume': self.taker_buy_base_asset_volume,
+            'taker_buy_quote_asset_volume': self.taker_buy_quote_asset_volume,
+        }
+
+    def as_cache_member(self) -> bytes:
+        """Packed member of the Redis kline ZSET (see backend/app/kline_cache_codec.py)."""
+        return encode_member(
+            self.open_time, self.close_time, self.number_of_trades, self.is_closed,
+            self.open, self.high, self.low, self.close, self.volume,
+            self.quote_asset_volume, self.taker_buy_base_asset_volume, self.taker_buy_quote_asset_volume,
+        )
+
+    def as_publish_dict(self) -> dict:
+        """Float view of the kline for Pub/Sub payloads consumed by chart clients."""
+        return {
+            'event_type': 'kline',
+            'event_time': self.event_time,
+            'symbol': self.symbol,
+            'timeframe': self.timeframe,
+            'open_time': self.open_time,
+            'open': float(self.open),
+            'high': float(self.high),
+            'low': float(self.low),
+            'close': float(self.close),
+            'volume': float(self.volume),
+            'close_time': self.close_time,
+            'quote_asset_volume': float(self.quote_asset_volume),
+            'number_of_trades': self.number_of_trades,
+            'is_closed': self.is_closed,
+            'taker_buy_base_asset_volume': float(self.taker_buy_base_asset_volume),
+            'taker_buy_quote_asset_volume': float(self.taker_buy_quote_asset_volume),
+        }
@@ -0,0 +1,206 @@
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+import orjson
+
+from .cache_policy import cache_written_range
+from .kline_copy_loader import load_binance_klines
+from .kline_record import KlineRecord
+
+logger = logging.getLogger(__name__)
+
+# Durable local spool for closed klines the DB couldn't take (outage or slow insert). Klines are appended
+# to segment files (spool-<seq>.log), one JSON array per line: symbol, timeframe, then the Binance REST
+# kline array fields, so a replay can hand the rows straight to the COPY bulk loader. Writes are fsynced
+# in batches (every KLINE_SPOOL_FSYNC_BATCH klines or KLINE_SPOOL_FSYNC_INTERVAL_SECONDS, whichever comes
+# first), so a crash loses at most one batch. Segments are deleted only after their klines are committed.
+
+SEGMENT_PREFIX = "spool-"
+SEGMENT_SUFFIX = ".log"
+LOCK_FILE = ".lock"
+
+
+def _segment_name(sequence: int) -> str:
+    return f"{SEGMENT_PREFIX}{sequence:012d}{SEGMENT_SUFFIX}"
+
+
+def encode_spool_line(kline: KlineRecord) -> bytes:
+    return orjson.dumps([
+        kline.symbol, kline.timeframe, kline.open_time, kline.open, kline.high, kline.low, kline.close, kline.volume,
+        kline.close_time, kline.quote_asset_volume, kline.number_of_trades,
+        kline.taker_buy_base_asset_volume, kline.taker_buy_quote_asset_volume,
+    ]) + b"\n"
+
+
+class SpoolLockedError(RuntimeError):
+    """Another process already uses the spool directory."""
+
+
+class KlineSpool:
+    """
+    Append-only segmented spool. append() and the replay helpers are blocking (call via asyncio.to_thread)
+    and thread-safe. The directory is locked (flock) for the lifetime of the spool, so two workers can't
+    interleave writes; a restarted worker with the same directory replays what its predecessor left.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int, fsync_batch_size: int, fsync_interval_seconds: float):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_batch_size = max(1, fsync_batch_size)
+        self.fsync_interval_seconds = fsync_interval_seconds
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(directory, LOCK_FILE), "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise SpoolLockedError(f"Spool directory {directory} is in use by another process")
+        self._active = None # Open segment file appended to
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        # Segments not yet replayed, including the active one; kept in memory so is_empty is cheap on the hot path
+        self._segments = set(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        latest = max(self._segments, default=None)
+        self._next_sequence = int(os.path.basename(latest)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]) + 1 if latest else 0
+        self.appended_total = 0
+
+    @property
+    def is_empty(self) -> bool:
+        """No klines waiting for the DB (spooled by this process or left over from a previous one)."""
+        return not self._segments
+
+    def append(self, kline: KlineRecord):
+        with self._lock:
+            if self._active is None:
+                path = os.path.join(self.directory, _segment_name(self._next_sequence))
+                self._next_sequence += 1
+                self._active = open(path, "ab")
+                self._segments.add(path)
+            self._active.write(encode_spool_line(kline))
+            self._unsynced += 1
+            self.appended_total += 1
+            if self._unsynced >= self.fsync_batch_size or time.monotonic() - self._last_sync >= self.fsync_interval_seconds:
+                self._sync_locked()
+            if self._active.tell() >= self.segment_max_bytes:
+                self._seal_locked()
+
+    def sync(self):
+        """fsyncs appended klines; called periodically so a quiet spool still honours the fsync interval."""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._active is not None and self._unsynced:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _seal_locked(self):
+        if self._active is not None:
+            self._sync_locked()
+            self._active.close()
+            self._active = None
+
+    def sealed_segments(self) -> List[str]:
+        """Seals the active segment (later appends start a new one) and returns all segments, oldest first."""
+        with self._lock:
+            self._seal_locked()
+            return sorted(self._segments)
+
+    def remove_segment(self, path: str):
+        """Deletes a segment whose klines are committed to the DB."""
+        with self._lock:
+            os.remove(path)
+            self._segments.discard(path)
+
+    def close(self):
+        with self._lock:
+            self._seal_locked()
+            self._lock_file.close()
+
+
+def read_segment(path: str) -> Iterator[Tuple[str, str, list]]:
+    """(symbol, timeframe, Binance kline array) per spooled kline. A torn last line (crash mid-write) is skipped."""
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, 1):
+            try:
+                values = orjson.loads(line)
+                yield values[0], values[1], values[2:]
+            except (orjson.JSONDecodeError, IndexError, TypeError):
+                logger.warning(f"[KLINE_SPOOL] Skipping unreadable line {line_number} in {path}.")
+
+
+def replay_segment(spool: KlineSpool, path: str, db_session_factory, batch_size: int, redis_client=None) -> int:
+    """
+    Blocking: bulk loads one segment's klines (idempotently) and deletes it. Returns klines read. Raises on DB errors.
+    With a redis_client, the replayed klines inside each pair's Redis window are upserted there too.
+    """
+    by_pair: Dict[Tuple[str, str], List[list]] = {}
+    count = 0
+    for symbol, timeframe, row in read_segment(path):
+        by_pair.setdefault((symbol, timeframe), []).append(row)
+        count += 1
+    for (symbol, timeframe), rows in by_pair.items():
+        for i in range(0, len(rows), batch_size):
+            load_binance_klines(rows[i:i + batch_size], symbol, timeframe, db_session_factory)
+        if redis_client is not None:
+            open_times_ms = [row[0] for row in rows]
+            try:
+                cache_written_range(redis_client, db_session_factory, symbol, timeframe, min(open_times_ms), max(open_times_ms))
+            except Exception as e:
+                logger.error(f"[KLINE_SPOOL] Error upserting replayed {symbol}/{timeframe} klines into the Redis window: {e}", exc_info=True)
+    spool.remove_segment(path)
+    return count
+
+
+def replay_spool(spool: KlineSpool, db_session_factory, batch_size: int, redis_client=None) -> int:
+    """
+    Blocking: replays every sealed segment in order until the spool is empty or the DB fails again.
+    Returns the number of klines replayed; segments that weren't written are kept for the next attempt.
+    """
+    replayed = 0
+    while True:
+        segments = spool.sealed_segments()
+        if not segments:
+            return replayed
+        for path in segments:
+            try:
+                replayed += replay_segment(spool, path, db_session_factory, batch_size, redis_client)
+            except Exception as e:
+                logger.warning(f"[KLINE_SPOOL] Replay of {path} failed ({e}); {replayed} klines replayed so far. Will retry.")
+                return replayed
+
+
+async def spool_replayer(spool: KlineSpool, db_session_factory, batch_size: int, interval_seconds: float, shutdown_event: asyncio.Event,
+                         redis_client=None):
+    """Keeps the spool fsynced and drains it into the DB (and the Redis windows) whenever it holds klines, until shutdown."""
+    while not shutdown_event.is_set():
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=interval_seconds)
+            break # Shutdown
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await asyncio.to_thread(spool.sync)
+            if spool.is_empty:
+                continue
+            started = time.monotonic()
+            replayed = await asyncio.to_thread(replay_spool, spool, db_session_factory, batch_size, redis_client)
+            if replayed:
+                elapsed = time.monotonic() - started
+                logger.info(f"[KLINE_SPOOL] Replayed {replayed} spooled klines into the DB in {elapsed:.2f}s "
+                            f"({replayed / max(elapsed, 1e-6):.0f} klines/s). Spool empty: {spool.is_empty}.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[KLINE_SPOOL] Error in spool replayer: {e}", exc_info=True)
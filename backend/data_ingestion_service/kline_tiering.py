@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from backend.app import cold_storage, kline_storage
+from backend.app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Old klines are moved out of the DB into the cold tier (backend/app/cold_storage.py) one whole month at a
+# time. Each month is deleted with DELETE ... RETURNING and only committed after its Parquet file has been
+# written and fsynced, so a failure on either side leaves the rows in the DB for the next run.
+
+def tiered_timeframes() -> set:
+    return {tf.strip() for tf in settings.COLD_STORAGE_TIMEFRAMES.split(",") if tf.strip()}
+
+def tiering_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Months starting before the returned month start are old enough to move (whole months only)."""
+    now = now or datetime.now(timezone.utc)
+    return cold_storage.month_start(now - timedelta(days=settings.COLD_STORAGE_AFTER_DAYS))
+
+def tier_pair_month(db_session_factory, symbol: str, timeframe: str, month: datetime) -> Tuple[int, int]:
+    """
+    Blocking: moves the pair's klines of one month from the DB to its cold file.
+    Returns (klines moved, total klines in the cold file).
+    """
+    db_session = db_session_factory()
+    try:
+        rows = kline_storage.delete_range_returning(db_session, symbol, timeframe, month, cold_storage.next_month(month))
+        if not rows:
+            db_session.rollback()
+            return 0, 0
+        _, total = cold_storage.write_cold_month(symbol, timeframe, month, rows)
+        db_session.commit()
+        return len(rows), total
+    except Exception:
+        db_session.rollback()
+        raise
+    finally:
+        db_session.close()
+
+def _first_stored_month(db_session_factory, symbol: str, timeframe: str) -> Optional[datetime]:
+    db_session = db_session_factory()
+    try:
+        bounds = kline_storage.history_bounds(db_session, symbol, timeframe)
+    finally:
+        db_session.close()
+    return cold_storage.month_start(bounds[0]) if bounds else None
+
+async def tier_pair(db_session_factory, symbol: str, timeframe: str, cutoff: datetime) -> int:
+    """Moves every month of the pair older than `cutoff` to the cold tier. Returns the number of klines moved."""
+    month = await asyncio.to_thread(_first_stored_month, db_session_factory, symbol, timeframe)
+    moved = 0
+    while month is not None and month < cutoff:
+        count, total = await asyncio.to_thread(tier_pair_month, db_session_factory, symbol, timeframe, month)
+        if count:
+            logger.info(f"[TIERING] {symbol}/{timeframe}: moved {count} klines of {month:%Y-%m} to the cold tier ({total} in file).")
+        moved += count
+        month = cold_storage.next_month(month)
+    return moved
+
+async def kline_tiering_loop(registry, db_session_factory, shutdown_event: asyncio.Event):
+    """Every COLD_STORAGE_TIER_INTERVAL_SECONDS, moves the aged months of this worker's pairs to the cold tier."""
+    timeframes = tiered_timeframes()
+    while not shutdown_event.is_set():
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=settings.COLD_STORAGE_TIER_INTERVAL_SECONDS)
+            break # Shutdown
+        except asyncio.TimeoutError:
+            pass
+        cutoff = tiering_cutoff()
+        for (symbol, timeframe), pair in list(registry.pairs.items()):
+            if timeframe not in timeframes or not pair.gap_fill_task.done():
+                continue
+            if shutdown_event.is_set():
+                break
+            try:
+                await tier_pair(db_session_factory, symbol, timeframe, cutoff)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[TIERING] Error moving {symbol}/{timeframe} to the cold tier: {e}", exc_info=True)
@@ -2,26 +2,41 @@ import asyncio
 import logging
 import signal
 import os
+import socket
 import sys
 import json # Added for Redis operations
 import functools # Added for functools.partial
-from decimal import Decimal # Added for price/volume precision
+import orjson # Fast JSON encoding for Redis payloads
 import time # Added for gap filling logic
-from typing import List, Tuple, Optional # Added Optional
-from datetime import datetime, timezone
+from typing import List, Tuple, Optional, Dict # Added Optional
+from dataclasses import dataclass
+from datetime import datetime
 
 # Imports assuming execution from project root as 'python -m backend.data_ingestion_service.main'
 from backend.app.config import settings
-from backend.app.database import SessionLocal, get_db # Assuming SessionLocal is what you meant for db_session_factory
+from backend.app.database import SessionLocal, get_db, use_pool_profile # Assuming SessionLocal is what you meant for db_session_factory
+from backend.app.db_pool import INGESTION_SERVICE
 from backend.app.redis_utils import get_redis_connection
+from backend.app import cold_storage, ingestion_control, kline_storage
+from backend.app.http_clients import close_http_clients
 from backend.app.models import Kline # Import the Kline model
 from sqlalchemy.dialects.postgresql import insert as pg_insert # For ON CONFLICT DO NOTHING
 from sqlalchemy.exc import SQLAlchemyError # For DB error handling
-from sqlalchemy import select, func as sql_func # Added for DB query
 
 from .service_utils import setup_logging
 from .binance_connector import BinanceWebSocketManager
-from .historical_data_fetcher import fetch_historical_klines, save_historical_klines_to_db # Added for backfill
+from .redis_scripts import upsert_trim_publish, publish_if_owner
+from .kline_record import KlineRecord
+from .kline_spool import KlineSpool, SpoolLockedError, spool_replayer
+from .historical_data_fetcher import fetch_and_save_historical_klines # Added for backfill
+from .rate_limiter import RequestWeightBudget
+from . import backfill_jobs
+from .startup_buffer import ClosedKlineBuffer
+from .subscription_control import control_stream_listener, idle_pair_evictor, evict_idle_pairs
+from .gap_scanner import GapRepairQueue, gap_scanner, gap_repair_worker, backfill_request_listener
+from .kline_tiering import kline_tiering_loop
+from .cache_policy import cache_policy_loop, refresh_cached_range, window_for
+from .sharding import LeaseCoordinator, shard_rebalancer, pair_lease_key, default_worker_id
 
 logger = logging.getLogger(__name__)
 
@@ -61,12 +76,8 @@ async def _get_latest_kline_open_time_from_db(
     db_session = None
     try:
         db_session = db_session_factory()
-        stmt = select(sql_func.max(Kline.open_time)).where(
-            Kline.symbol == symbol,
-            Kline.timeframe == timeframe
-        )
-        result = await asyncio.to_thread(db_session.execute, stmt)
-        latest_open_time = result.scalar_one_or_none()
+        bounds = await asyncio.to_thread(kline_storage.history_bounds, db_session, symbol, timeframe)
+        latest_open_time = bounds[1] if bounds else None
         if latest_open_time:
             logger.debug(f"[GAP_FILL] Latest open_time in DB for {symbol}/{timeframe}: {latest_open_time}")
             # Convert datetime to millisecond timestamp
@@ -90,182 +101,349 @@ def handle_shutdown_signal(sig, frame):
     logger.warning(f"Received shutdown signal: {sig}. Initiating graceful shutdown.")
     shutdown_event.set()
 
-async def kline_data_processor(kline_data: dict, symbol: str, timeframe: str, redis_client, db_session_factory):
-    """
-    Processes a single kline data point received from WebSocket.
-    - If kline is closed: Saves to TimescaleDB, updates Redis cache, publishes to Redis Pub/Sub.
-    - If kline is an update to the unclosed candle: Constructs a kline object representing the
-      current state of the forming candle and publishes it to a specific Redis Pub/Sub channel for live ticks.
-    """
-    try:
-        kline_is_closed = kline_data.get('is_closed', False) # Relies on _parse_kline_message correctly setting this
-        open_time_ms = int(kline_data['open_time'])
-        # Ensure all necessary fields are present for basic processing
-        # Price/volume fields will be converted to Decimal later if it's a closed kline
-        required_fields = ['open', 'high', 'low', 'close', 'volume', 'close_time']
-        if not all(kline_data.get(f) is not None for f in required_fields):
-            logger.error(f"[KLINE_PROC] Kline data for {symbol}/{timeframe} OT:{open_time_ms} is missing some required fields for processing. Data: {kline_data}")
-            return
+# Prebuilt once so SQLAlchemy's compiled-statement cache is reused for every closed kline;
+# the row values are bound per execution.
+CLOSED_KLINE_INSERT_STMT = pg_insert(Kline).on_conflict_do_nothing(index_elements=['symbol', 'timeframe', 'open_time'])
 
-    except (KeyError, ValueError) as e:
-        logger.error(f"[KLINE_PROC] Error extracting basic fields from kline_data for {symbol}/{timeframe}: {e}. Data: {kline_data}", exc_info=True)
-        return
+def _insert_closed_kline(db_session_factory, db_row: dict) -> int:
+    """Blocking: inserts one closed kline (ON CONFLICT DO NOTHING) in its own session. Returns the rowcount."""
+    db_session = db_session_factory()
+    try:
+        if kline_storage.uses_compact_storage():
+            inserted = kline_storage.insert_kline_rows(db_session, [db_row])
+        else:
+            inserted = db_session.execute(CLOSED_KLINE_INSERT_STMT, db_row).rowcount
+        db_session.commit()
+        return inserted
+    except Exception:
+        db_session.rollback()
+        raise
+    finally:
+        db_session.close()
 
-    if kline_is_closed:
-        # Process and persist finalized kline (existing logic)
-        try:
-            kline_obj = Kline(
-                symbol=symbol,
-                timeframe=timeframe,
-                open_time=datetime.fromtimestamp(open_time_ms / 1000, tz=timezone.utc),
-                open_price=Decimal(str(kline_data['open'])),
-                high_price=Decimal(str(kline_data['high'])),
-                low_price=Decimal(str(kline_data['low'])),
-                close_price=Decimal(str(kline_data['close'])),
-                volume=Decimal(str(kline_data['volume'])),
-                close_time=datetime.fromtimestamp(int(kline_data['close_time']) / 1000, tz=timezone.utc),
-                quote_asset_volume=Decimal(str(kline_data['quote_asset_volume'])),
-                number_of_trades=int(kline_data['number_of_trades']),
-                taker_buy_base_asset_volume=Decimal(str(kline_data['taker_buy_base_asset_volume'])),
-                taker_buy_quote_asset_volume=Decimal(str(kline_data['taker_buy_quote_asset_volume']))
-            )
-        except (KeyError, ValueError) as e:
-            logger.error(f"[KLINE_PROC] Error creating Kline ORM object for closed kline {symbol}/{timeframe}: {e}. Data: {kline_data}", exc_info=True)
-            return
+async def kline_data_processor(kline: KlineRecord, symbol: str, timeframe: str, redis_client, db_session_factory,
+                               lease_key: Optional[str] = None, lease_owner: Optional[str] = None,
+                               spool: Optional[KlineSpool] = None):
+    """
+    Processes a single kline received from WebSocket (a KlineRecord from _parse_kline_message).
+    - If kline is closed: Saves to TimescaleDB, then updates the Redis cache and publishes to Redis Pub/Sub
+      in one atomic server-side script (see redis_scripts.py).
+    - If kline is an update to the unclosed candle: Publishes the current state of the forming candle
+      to a specific Redis Pub/Sub channel for live ticks.
+    Numeric fields stay as Binance's decimal strings for storage; Pub/Sub payloads carry floats.
+    When lease_key/lease_owner are given (sharded workers), Redis writes and publishes are fenced: they
+    only happen while lease_owner still holds the pair's lease. The DB insert is idempotent and not fenced.
+    With a spool (kline_spool.py), a closed kline the DB fails to take within CLOSED_KLINE_DB_TIMEOUT_SECONDS
+    is spooled to disk instead of dropped, and the Redis update goes ahead. While the spool holds klines,
+    new ones are spooled directly (keeping DB insert order) until the replayer has drained it.
+    """
+    open_time_ms = kline.open_time
 
-        logger.debug(f"[KLINE_PROC] Processing closed kline for {symbol}/{timeframe}: OT {kline_obj.open_time} C {kline_obj.close_price} V {kline_obj.volume}")
+    if kline.is_closed:
+        logger.debug(f"[KLINE_PROC] Processing closed kline for {symbol}/{timeframe}: OT {open_time_ms} C {kline.close} V {kline.volume}")
 
-        # 1. Save to TimescaleDB (existing logic)
-        db_session = None
+        # 1. Save to TimescaleDB (or the spool)
         save_successful_or_conflict = False
-        try:
-            db_session = db_session_factory()
-            stmt = pg_insert(Kline).values(
-                symbol=kline_obj.symbol, timeframe=kline_obj.timeframe, open_time=kline_obj.open_time,
-                open_price=kline_obj.open_price, high_price=kline_obj.high_price, low_price=kline_obj.low_price,
-                close_price=kline_obj.close_price, volume=kline_obj.volume, close_time=kline_obj.close_time,
-                quote_asset_volume=kline_obj.quote_asset_volume, number_of_trades=kline_obj.number_of_trades,
-                taker_buy_base_asset_volume=kline_obj.taker_buy_base_asset_volume,
-                taker_buy_quote_asset_volume=kline_obj.taker_buy_quote_asset_volume
-            ).on_conflict_do_nothing(index_elements=['symbol', 'timeframe', 'open_time'])
-            result = await asyncio.to_thread(db_session.execute, stmt)
-            await asyncio.to_thread(db_session.commit)
-            if result.rowcount > 0:
-                logger.info(f"[DB_SAVE] Closed kline {symbol}/{timeframe} OT:{kline_obj.open_time} inserted.")
-            else:
-                logger.debug(f"[DB_SAVE] Closed kline {symbol}/{timeframe} OT:{kline_obj.open_time} already exists (conflict).")
-            save_successful_or_conflict = True
-        except SQLAlchemyError as e:
-            logger.error(f"[DB_SAVE] SQLAlchemyError saving closed kline {symbol}/{timeframe} OT:{kline_obj.open_time}: {e}", exc_info=True)
-            if db_session: await asyncio.to_thread(db_session.rollback)
-        except Exception as e:
-            logger.error(f"[DB_SAVE] Unexpected error saving closed kline {symbol}/{timeframe} OT:{kline_obj.open_time}: {e}", exc_info=True)
-            if db_session: await asyncio.to_thread(db_session.rollback)
-        finally:
-            if db_session: await asyncio.to_thread(db_session.close)
+        if spool is not None and not spool.is_empty:
+            save_successful_or_conflict = await _spool_closed_kline(spool, kline, symbol, timeframe, "spool is draining")
+        else:
+            try:
+                db_row = kline.as_db_row()
+                db_row['symbol'] = symbol
+                db_row['timeframe'] = timeframe
+                insert = asyncio.to_thread(_insert_closed_kline, db_session_factory, db_row)
+                # Without a spool there is nowhere else to put the kline, so wait for the DB however long it takes
+                rowcount = await (asyncio.wait_for(insert, settings.CLOSED_KLINE_DB_TIMEOUT_SECONDS) if spool is not None else insert)
+                if rowcount > 0:
+                    logger.info(f"[DB_SAVE] Closed kline {symbol}/{timeframe} OT:{open_time_ms} inserted.")
+                else:
+                    logger.debug(f"[DB_SAVE] Closed kline {symbol}/{timeframe} OT:{open_time_ms} already exists (conflict).")
+                save_successful_or_conflict = True
+            except asyncio.TimeoutError:
+                # The insert keeps running in its thread; if it lands after all, the replay is a no-op
+                logger.warning(f"[DB_SAVE] Insert of closed kline {symbol}/{timeframe} OT:{open_time_ms} took over {settings.CLOSED_KLINE_DB_TIMEOUT_SECONDS}s.")
+                save_successful_or_conflict = await _spool_closed_kline(spool, kline, symbol, timeframe, "DB insert timed out")
+            except SQLAlchemyError as e:
+                logger.error(f"[DB_SAVE] SQLAlchemyError saving closed kline {symbol}/{timeframe} OT:{open_time_ms}: {e}", exc_info=True)
+                if spool is not None:
+                    save_successful_or_conflict = await _spool_closed_kline(spool, kline, symbol, timeframe, "DB insert failed")
+            except Exception as e:
+                logger.error(f"[DB_SAVE] Unexpected error saving closed kline {symbol}/{timeframe} OT:{open_time_ms}: {e}", exc_info=True)
+                if spool is not None:
+                    save_successful_or_conflict = await _spool_closed_kline(spool, kline, symbol, timeframe, "DB insert failed")
 
         if not save_successful_or_conflict:
-            logger.warning(f"[KLINE_PROC] Aborting Redis ops for closed kline {symbol}/{timeframe} OT:{kline_obj.open_time} due to DB save failure.")
+            logger.warning(f"[KLINE_PROC] Aborting Redis ops for closed kline {symbol}/{timeframe} OT:{open_time_ms} due to DB save failure.")
             return
 
-        # 2. Update Redis Cache (Sorted Set) for closed kline (existing logic)
+        # 2. Update Redis Cache (Sorted Set) and publish to Redis Pub/Sub in a single round trip.
+        # The Lua script upserts the member (replacing any member with the same open_time), trims the ZSET to the pair's
+        # window (cache_policy.py; MAX_KLINES_IN_REDIS until sized) and publishes atomically.
         redis_key_ohlcv = f"klines:{symbol}:{timeframe}"
-        kline_for_redis_ohlcv = {
-            'open_time': open_time_ms,
-            'open': str(kline_obj.open_price), 'high': str(kline_obj.high_price),
-            'low': str(kline_obj.low_price), 'close': str(kline_obj.close_price),
-            'volume': str(kline_obj.volume),
-            'close_time': int(kline_data['close_time']),
-            'is_closed': True # Explicitly True for this path
-        }
-        kline_json_for_redis_ohlcv = json.dumps(kline_for_redis_ohlcv)
-        try:
-            score = kline_obj.open_time.timestamp()
-            await asyncio.to_thread(redis_client.zadd, redis_key_ohlcv, {kline_json_for_redis_ohlcv: score})
-            logger.debug(f"[REDIS_CACHE] Added closed kline to ZSET {redis_key_ohlcv}: Score {score}")
-            # Trim the sorted set to MAX_KLINES_IN_REDIS (existing logic)
-            # Retain (MAX_KLINES_IN_REDIS - 1) to remove elements from the beginning (older ones)
-            # zremrangebyrank key 0 -(MAX_KLINES_IN_REDIS + 1) would be more correct for keeping newest N if sorted by score ASC
-            # Or, if MAX_KLINES_IN_REDIS is, e.g., 2000, and scores are timestamps (ascending):
-            # Keep elements from rank -MAX_KLINES_IN_REDIS to -1 (the newest MAX_KLINES_IN_REDIS elements).
-            # So, remove elements from rank 0 to -(MAX_KLINES_IN_REDIS + 1) (everything OLDER than the newest MAX_KLINES_IN_REDIS).
-            # Or, simpler: if zcard > MAX_KLINES_IN_REDIS, zremrangebyrank 0 (zcard - MAX_KLINES_IN_REDIS -1)
-            # Current logic from settings: MAX_KLINES_IN_REDIS
-            # To keep the newest `max_klines`, if sorted ascending by score (timestamp), remove from rank 0 to `count - max_klines - 1`.
-            # Or, using negative indices (which count from the end, highest score first if sorted asc):
-            # remove elements from rank 0 up to `count - settings.MAX_KLINES_IN_REDIS -1`
-            # `redis_client.zremrangebyrank(redis_key, 0, -settings.MAX_KLINES_IN_REDIS -1)` is likely what was intended for trimming.
-            # The original `zremrangebyrank(redis_key, 0, settings.MAX_KLINES_IN_REDIS -1)` would keep only the oldest elements if the count is > MAX_KLINES_IN_REDIS
-            # Correct logic for keeping newest N items:
-            # await asyncio.to_thread(redis_client.zremrangebyrank, redis_key, 0, - (settings.MAX_KLINES_IN_REDIS + 1))
-            # This keeps the items from -MAX_KLINES_IN_REDIS to -1 (the newest MAX_KLINES_IN_REDIS items)
-            # Safest trim: check count, then trim if over.
-            current_count = await asyncio.to_thread(redis_client.zcard, redis_key_ohlcv)
-            if current_count > settings.MAX_KLINES_IN_REDIS:
-                # Remove the oldest entries to maintain MAX_KLINES_IN_REDIS
-                # Number to remove = current_count - MAX_KLINES_IN_REDIS
-                # Remove from rank 0 (oldest) to (number_to_remove - 1)
-                num_to_remove = current_count - settings.MAX_KLINES_IN_REDIS
-                await asyncio.to_thread(redis_client.zremrangebyrank, redis_key_ohlcv, 0, num_to_remove - 1)
-                logger.debug(f"[REDIS_CACHE] Trimmed ZSET {redis_key_ohlcv} to ~{settings.MAX_KLINES_IN_REDIS} items. Removed {num_to_remove}.")
-
-        except Exception as e:
-            logger.error(f"[REDIS_CACHE] Error updating Redis cache for closed kline {symbol}/{timeframe} OT:{kline_obj.open_time}: {e}", exc_info=True)
-
-        # 3. Publish to Redis Pub/Sub for closed kline (existing logic)
+        max_members = window_for(symbol, timeframe, settings.MAX_KLINES_IN_REDIS)
         pubsub_channel_closed = f"kline_updates:{symbol}:{timeframe}"
         payload_closed = {
             "type": "kline_closed",
-            "data": kline_for_redis_ohlcv # Use the same structure as for Redis cache
+            "data": kline.as_publish_dict()
         }
         try:
-            await asyncio.to_thread(redis_client.publish, pubsub_channel_closed, json.dumps(payload_closed))
-            logger.info(f"[REDIS_PUB] Published closed kline to {pubsub_channel_closed} for {symbol}/{timeframe} OT:{open_time_ms}")
+            # Score is open_time in ms, matching the ms ranges the API queries with zrangebyscore.
+            trimmed, receivers = await asyncio.to_thread(
+                upsert_trim_publish,
+                redis_client,
+                redis_key_ohlcv,
+                kline.as_cache_member(),
+                open_time_ms,
+                max_members,
+                pubsub_channel_closed,
+                orjson.dumps(payload_closed),
+                lease_key=lease_key,
+                lease_owner=lease_owner
+            )
+            if trimmed == -1:
+                logger.warning(f"[REDIS_PUB] Skipped cache/publish for {symbol}/{timeframe} OT:{open_time_ms}: lease is no longer held by {lease_owner}.")
+                return
+            if trimmed:
+                logger.debug(f"[REDIS_CACHE] Trimmed ZSET {redis_key_ohlcv} to {max_members} items. Removed {trimmed}.")
+            logger.info(f"[REDIS_PUB] Cached and published closed kline to {pubsub_channel_closed} for {symbol}/{timeframe} OT:{open_time_ms} (receivers: {receivers})")
         except Exception as e:
-            logger.error(f"[REDIS_PUB] Error publishing closed kline to {pubsub_channel_closed} for {symbol}/{timeframe} OT:{open_time_ms}: {e}", exc_info=True)
+            logger.error(f"[REDIS_CACHE] Error updating Redis cache/publishing closed kline {symbol}/{timeframe} OT:{open_time_ms}: {e}", exc_info=True)
 
     else:
         # Process unclosed kline update (tick)
-        logger.debug(f"[KLINE_PROC] Processing unclosed (tick) kline for {symbol}/{timeframe} OT:{open_time_ms} C:{kline_data['close']}")
-        
-        # Construct the kline data for the current tick update
-        # This represents the current state of the forming candle
-        # Timestamps should be in milliseconds as expected by frontend/DataCube
-        current_tick_kline_data = {
-            'event_type': kline_data.get('event_type'), # from _parse_kline_message
-            'event_time': kline_data.get('event_time'), # from _parse_kline_message
-            'symbol': symbol,
-            'timeframe': timeframe,
-            'open_time': open_time_ms,
-            'open': str(kline_data['open']), # Use string for consistency, Decimal not needed for pub/sub if frontend handles string
-            'high': str(kline_data['high']),
-            'low': str(kline_data['low']),
-            'close': str(kline_data['close']),
-            'volume': str(kline_data['volume']),
-            'close_time': int(kline_data['close_time']), # This is the expected end time of the interval
-            'quote_asset_volume': str(kline_data['quote_asset_volume']),
-            'number_of_trades': int(kline_data['number_of_trades']),
-            'is_closed': False, # Explicitly False for this path
-            'taker_buy_base_asset_volume': str(kline_data['taker_buy_base_asset_volume']),
-            'taker_buy_quote_asset_volume': str(kline_data['taker_buy_quote_asset_volume'])
-        }
+        logger.debug(f"[KLINE_PROC] Processing unclosed (tick) kline for {symbol}/{timeframe} OT:{open_time_ms} C:{kline.close}")
 
         # Publish to a specific Redis Pub/Sub channel for live ticks
-        # Option 1: Different channel name
-        # pubsub_channel_tick = f"kline_live_tick:{symbol}:{timeframe}"
-        # Option 2: Same channel, different message type (chosen here for simplicity on subscriber side initially)
+        # Same channel as closed klines, different message type (simpler on the subscriber side)
         pubsub_channel_tick = f"kline_updates:{symbol}:{timeframe}"
         payload_tick = {
             "type": "kline_tick", # Differentiate from "kline_closed"
-            "data": current_tick_kline_data
+            "data": kline.as_publish_dict() # Current state of the forming candle, timestamps in ms
         }
 
         try:
-            await asyncio.to_thread(redis_client.publish, pubsub_channel_tick, json.dumps(payload_tick))
-            logger.debug(f"[REDIS_PUB_TICK] Published live tick to {pubsub_channel_tick} for {symbol}/{timeframe} OT:{open_time_ms} C:{current_tick_kline_data['close']}")
+            if lease_key:
+                receivers = await asyncio.to_thread(publish_if_owner, redis_client, lease_key, lease_owner, pubsub_channel_tick, orjson.dumps(payload_tick))
+                if receivers == -1:
+                    logger.debug(f"[REDIS_PUB_TICK] Skipped tick for {symbol}/{timeframe} OT:{open_time_ms}: lease is no longer held by {lease_owner}.")
+                    return
+            else:
+                await asyncio.to_thread(redis_client.publish, pubsub_channel_tick, orjson.dumps(payload_tick))
+            logger.debug(f"[REDIS_PUB_TICK] Published live tick to {pubsub_channel_tick} for {symbol}/{timeframe} OT:{open_time_ms} C:{kline.close}")
         except Exception as e:
             logger.error(f"[REDIS_PUB_TICK] Error publishing live tick to {pubsub_channel_tick} for {symbol}/{timeframe} OT:{open_time_ms}: {e}", exc_info=True)
 
+async def _spool_closed_kline(spool: KlineSpool, kline: KlineRecord, symbol: str, timeframe: str, reason: str) -> bool:
+    """Appends a closed kline to the spool for a later bulk replay. Returns False if even that failed."""
+    try:
+        await asyncio.to_thread(spool.append, kline)
+        logger.info(f"[KLINE_SPOOL] Spooled closed kline {symbol}/{timeframe} OT:{kline.open_time} ({reason}).")
+        return True
+    except Exception as e:
+        logger.error(f"[KLINE_SPOOL] Error spooling closed kline {symbol}/{timeframe} OT:{kline.open_time}: {e}", exc_info=True)
+        return False
+
+BACKFILL_STATUS_TTL_SECONDS = 3600 # Auto-clears the status if the service crashes mid-backfill
+
+async def _set_backfill_status(redis_client, symbol: str, timeframe: str, status: str, **progress):
+    """Writes the backfill_status:{symbol}:{timeframe} key read by the klines API. Extra kwargs are stored as progress fields."""
+    backfill_status_key = f"backfill_status:{symbol}:{timeframe}"
+    try:
+        await asyncio.to_thread(
+            redis_client.set,
+            backfill_status_key,
+            json.dumps({"status": status, "last_updated_ts": int(time.time()), **progress}),
+            ex=BACKFILL_STATUS_TTL_SECONDS
+        )
+    except Exception as e:
+        logger.error(f"[GAP_FILL] Error setting backfill status '{status}' for {symbol}/{timeframe}: {e}", exc_info=True)
+
+async def _save_backfill_job(redis_client, job: backfill_jobs.BackfillJob):
+    """Persists the job's checkpoint. A failed write only costs re-fetching some windows after a restart."""
+    try:
+        await asyncio.to_thread(backfill_jobs.save_job, redis_client, job)
+    except Exception as e:
+        logger.error(f"[GAP_FILL] Error saving backfill job checkpoint for {job.symbol}/{job.timeframe}: {e}", exc_info=True)
+
+async def _startup_gap_fill(
+    symbol: str,
+    timeframe: str,
+    buffer: ClosedKlineBuffer,
+    semaphore: asyncio.Semaphore,
+    weight_budget: RequestWeightBudget,
+    redis_client,
+    db_session_factory
+):
+    """
+    Fills the gap between the latest kline in the DB and now for one pair, then releases the pair's
+    buffered live closed klines. Runs concurrently with the other pairs' fills, limited by `semaphore`.
+    The fill is a persisted job (backfill_jobs.py) checkpointed after every DB write, so a fill that was
+    interrupted by a restart or a shard handoff resumes from its last committed window.
+    """
+    try:
+        async with semaphore:
+            if shutdown_event.is_set():
+                logger.info(f"[GAP_FILL] Shutdown initiated, skipping gap fill for {symbol}/{timeframe}.")
+                return
+
+            logger.info(f"[GAP_FILL] Checking/Initiating gap fill for {symbol}/{timeframe}...")
+            await _set_backfill_status(redis_client, symbol, timeframe, "in_progress_startup")
+
+            interval_ms = _timeframe_to_ms(timeframe)
+            current_target_time_ms = int(time.time() * 1000) - (settings.HISTORICAL_FETCH_BUFFER_KLINES * interval_ms)
+
+            job = await asyncio.to_thread(backfill_jobs.load_job, redis_client, symbol, timeframe)
+            if job and not job.is_complete:
+                # A previous run (this or another worker) was interrupted; continue from its last committed window
+                job.resume(current_target_time_ms)
+                logger.info(f"[GAP_FILL] Resuming backfill job for {symbol}/{timeframe} from checkpoint {datetime.fromtimestamp(job.checkpoint_ms/1000)} (resume #{job.resumed_count}, {job.rows_written} rows written so far).")
+            else:
+                job = None
+                latest_db_open_time = await _get_latest_kline_open_time_from_db(symbol, timeframe, db_session_factory)
+                if latest_db_open_time is None:
+                    # No data exists, backfill for INITIAL_BACKFILL_DAYS
+                    start_backfill_ms = int(time.time() * 1000) - (settings.INITIAL_BACKFILL_DAYS * 24 * 60 * 60 * 1000)
+                    logger.info(f"[GAP_FILL] No data for {symbol}/{timeframe}. Backfilling from {datetime.fromtimestamp(start_backfill_ms/1000)} to now.")
+                    job = backfill_jobs.BackfillJob.new(symbol, timeframe, start_backfill_ms, current_target_time_ms)
+                elif latest_db_open_time < (current_target_time_ms - interval_ms): # Check if there's a significant gap
+                    # Data exists, but there's a gap
+                    start_backfill_ms = latest_db_open_time + interval_ms # Start from the next expected kline
+                    logger.info(f"[GAP_FILL] Gap detected for {symbol}/{timeframe}. Latest in DB: {datetime.fromtimestamp(latest_db_open_time/1000)}. Backfilling from {datetime.fromtimestamp(start_backfill_ms/1000)} to {datetime.fromtimestamp(current_target_time_ms/1000)}.")
+                    job = backfill_jobs.BackfillJob.new(symbol, timeframe, start_backfill_ms, current_target_time_ms)
+                else:
+                    logger.info(f"[GAP_FILL] No significant gap found for {symbol}/{timeframe}. Latest data is recent enough.")
+
+            if job is not None:
+                await _save_backfill_job(redis_client, job)
+                await _set_backfill_status(redis_client, symbol, timeframe, "in_progress_startup", **job.progress_fields())
+
+                async def report_progress(rows_written: int, written_until_ms: int):
+                    job.record_progress(rows_written, written_until_ms)
+                    await _save_backfill_job(redis_client, job)
+                    await _set_backfill_status(redis_client, symbol, timeframe, "in_progress_startup", **job.progress_fields())
+
+                fill_start_ms = job.checkpoint_ms
+                inserted_count, skipped_count = await fetch_historical_klines_and_save(
+                    symbol, timeframe, fill_start_ms, job.target_end_ms, db_session_factory,
+                    weight_budget=weight_budget, progress_callback=report_progress
+                )
+                # The ZSET may still hold the klines from before the gap: put the filled ones in, so the buffered live
+                # klines released below continue it without a hole
+                await refresh_cached_range(redis_client, db_session_factory, symbol, timeframe, fill_start_ms, job.checkpoint_ms)
+                if job.is_complete:
+                    await asyncio.to_thread(backfill_jobs.delete_job, redis_client, symbol, timeframe)
+                    logger.info(f"[GAP_FILL] Gap fill for {symbol}/{timeframe} complete. Inserted: {inserted_count}, Skipped: {skipped_count}")
+                    await _set_backfill_status(redis_client, symbol, timeframe, "completed_startup", **job.progress_fields())
+                else:
+                    logger.warning(f"[GAP_FILL] Gap fill for {symbol}/{timeframe} stopped at {datetime.fromtimestamp(job.checkpoint_ms/1000)}. Inserted: {inserted_count}, Skipped: {skipped_count}. The job resumes from there on the next start.")
+                    await _set_backfill_status(redis_client, symbol, timeframe, "incomplete_startup_fill", **job.progress_fields())
+            else:
+                await _set_backfill_status(redis_client, symbol, timeframe, "completed_startup")
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e_gapfill:
+        logger.error(f"[GAP_FILL] Error during gap fill for {symbol}/{timeframe}: {e_gapfill}", exc_info=True)
+        await _set_backfill_status(redis_client, symbol, timeframe, "error_during_startup_fill")
+
+    # Reconcile the live stream with the filled history, whether or not the fill succeeded
+    await buffer.release()
+
+PAIR_STOP_TIMEOUT_SECONDS = 5
+
+@dataclass
+class PairIngestion:
+    """Live connection and gap-fill task for one symbol/timeframe pair."""
+    manager: BinanceWebSocketManager
+    ws_task: asyncio.Task
+    gap_fill_task: asyncio.Task
+    dynamic: bool # Added at runtime via the control stream (evictable), as opposed to PROACTIVE_* pairs
+
+class PairRegistry:
+    """
+    Owns the pairs this worker ingests. The full set of pairs to ingest (the "universe") is the
+    configured proactive pairs plus the ingestion:tracked_pairs Redis set, which the control stream
+    adds to and idle eviction removes from (subscription_control.py). sharding.py decides which of
+    those pairs this worker owns and calls start_pair/stop_pair once it holds or gives up the lease.
+    Every started pair gets a live WebSocket manager immediately and a gap fill that runs under the
+    shared semaphore and weight budget.
+    """
+
+    def __init__(self, redis_client, db_session_factory, gap_fill_semaphore: asyncio.Semaphore, weight_budget: RequestWeightBudget,
+                 worker_id: str, proactive_pairs: Optional[List[Tuple[str, str]]] = None, spool: Optional[KlineSpool] = None):
+        self.redis_client = redis_client
+        self.db_session_factory = db_session_factory
+        self.gap_fill_semaphore = gap_fill_semaphore
+        self.weight_budget = weight_budget
+        self.worker_id = worker_id
+        self.proactive_pairs = set(proactive_pairs or [])
+        self.spool = spool
+        self.pairs: Dict[Tuple[str, str], PairIngestion] = {}
+        self.rebalance_requested = asyncio.Event()
+
+    def request_rebalance(self):
+        """Wakes the shard rebalancer so universe changes are applied without waiting for the next heartbeat."""
+        self.rebalance_requested.set()
+
+    async def load_universe(self) -> set:
+        """Proactive pairs plus every valid pair in the shared tracked set."""
+        tracked = await asyncio.to_thread(ingestion_control.get_tracked_pairs, self.redis_client)
+        return self.proactive_pairs | {(s, tf) for s, tf in tracked if tf in TIMEFRAME_MS_EQUIVALENTS}
+
+    async def start_pair(self, symbol: str, timeframe: str, dynamic: bool = False) -> bool:
+        """Starts live ingestion plus a gap fill for the pair. Returns False if it is already running."""
+        if (symbol, timeframe) in self.pairs:
+            return False
+        buffer = ClosedKlineBuffer(
+            symbol, timeframe,
+            functools.partial(
+                kline_data_processor, symbol=symbol, timeframe=timeframe, redis_client=self.redis_client, db_session_factory=self.db_session_factory,
+                lease_key=pair_lease_key(symbol, timeframe), lease_owner=self.worker_id, spool=self.spool
+            )
+        )
+        manager = BinanceWebSocketManager(
+            symbol=symbol,
+            timeframe=timeframe,
+            data_handler_callback=buffer.handle,
+            shutdown_event_global=shutdown_event, # Pass the global shutdown event
+            weight_budget=self.weight_budget
+        )
+        ws_task = asyncio.create_task(manager.run(), name=f"ws:{symbol}:{timeframe}")
+        logger.info(f"Scheduled WebSocket manager for {symbol}/{timeframe}.")
+
+        await _set_backfill_status(self.redis_client, symbol, timeframe, "queued_startup")
+        gap_fill_task = asyncio.create_task(_startup_gap_fill(
+            symbol, timeframe, buffer, self.gap_fill_semaphore, self.weight_budget, self.redis_client, self.db_session_factory
+        ), name=f"gap_fill:{symbol}:{timeframe}")
+
+        self.pairs[(symbol, timeframe)] = PairIngestion(manager, ws_task, gap_fill_task, dynamic)
+        active_tasks.extend([ws_task, gap_fill_task])
+        return True
+
+    async def stop_pair(self, symbol: str, timeframe: str) -> bool:
+        """Stops the pair's WebSocket manager and any running gap fill. Returns False if it was not running."""
+        pair = self.pairs.pop((symbol, timeframe), None)
+        if not pair:
+            return False
+
+        if not pair.gap_fill_task.done():
+            pair.gap_fill_task.cancel()
+        await pair.manager.stop()
+        try:
+            await asyncio.wait_for(asyncio.shield(pair.ws_task), timeout=PAIR_STOP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning(f"[CONTROL] WebSocket manager for {symbol}/{timeframe} did not stop in {PAIR_STOP_TIMEOUT_SECONDS}s. Cancelling.")
+            pair.ws_task.cancel()
+        except Exception as e:
+            logger.error(f"[CONTROL] WebSocket manager for {symbol}/{timeframe} raised while stopping: {e}", exc_info=True)
+        await asyncio.gather(pair.ws_task, pair.gap_fill_task, return_exceptions=True)
+
+        for task in (pair.ws_task, pair.gap_fill_task):
+            if task in active_tasks:
+                active_tasks.remove(task)
+        logger.info(f"Stopped ingestion for {symbol}/{timeframe}.")
+        return True
+
 async def run_service():
     """Main function to run the data ingestion service."""
     # Setup logging
@@ -274,6 +452,7 @@ async def run_service():
     setup_logging(level=logging.INFO) # Simplified logging setup
 
     logger.info("Data Ingestion Service starting...")
+    use_pool_profile(INGESTION_SERVICE) # Own pool size and timeouts, separate from the API's
 
     # Register signal handlers for graceful shutdown
     signal.signal(signal.SIGINT, handle_shutdown_signal)
@@ -308,105 +487,105 @@ async def run_service():
                     continue
                 proactive_pairs.append((symbol_str, tf_str))
         logger.info(f"Proactively tracking {len(proactive_pairs)} pairs: {proactive_pairs}")
-
-        # Initial Gap Filling for proactive pairs
-        for pair_symbol, pair_timeframe in proactive_pairs:
-            if shutdown_event.is_set():
-                logger.info("Shutdown initiated, skipping further gap fills.")
-                break
-            
-            logger.info(f"[GAP_FILL] Checking/Initiating gap fill for {pair_symbol}/{pair_timeframe}...")
-            backfill_status_key = f"backfill_status:{pair_symbol}:{pair_timeframe}"
-            try:
-                # Set backfill status in Redis
-                if redis_client:
-                    await asyncio.to_thread(
-                        redis_client.setex,
-                        backfill_status_key,
-                        3600, # Expires in 1 hour, to auto-clear if service crashes mid-backfill
-                        json.dumps({"status": "in_progress_startup", "last_updated_ts": int(time.time())})
-                    )
-
-                latest_db_open_time = await _get_latest_kline_open_time_from_db(pair_symbol, pair_timeframe, db_session_factory)
-                interval_ms = _timeframe_to_ms(pair_timeframe)
-                
-                if not interval_ms:
-                    logger.error(f"[GAP_FILL] Invalid timeframe {pair_timeframe} for {pair_symbol}. Cannot determine interval_ms. Skipping gap fill.")
-                    await asyncio.to_thread(redis_client.set, backfill_status_key, json.dumps({"status": "error_invalid_timeframe", "last_updated_ts": int(time.time())}), ex=3600)
-                    continue
-
-                current_target_time_ms = int(time.time() * 1000) - (settings.HISTORICAL_FETCH_BUFFER_KLINES * interval_ms)
-
-                if latest_db_open_time is None:
-                    # No data exists, backfill for INITIAL_BACKFILL_DAYS
-                    start_backfill_ms = int(time.time() * 1000) - (settings.INITIAL_BACKFILL_DAYS * 24 * 60 * 60 * 1000)
-                    logger.info(f"[GAP_FILL] No data for {pair_symbol}/{pair_timeframe}. Backfilling from {datetime.fromtimestamp(start_backfill_ms/1000)} to now.")
-                    fetched_count, failed_count = await fetch_historical_klines_and_save(pair_symbol, pair_timeframe, start_backfill_ms, current_target_time_ms, db_session_factory)
-                    logger.info(f"[GAP_FILL] Initial backfill for {pair_symbol}/{pair_timeframe} complete. Fetched: {fetched_count}, Failed: {failed_count}")
-                elif latest_db_open_time < (current_target_time_ms - interval_ms): # Check if there's a significant gap
-                    # Data exists, but there's a gap
-                    start_backfill_ms = latest_db_open_time + interval_ms # Start from the next expected kline
-                    logger.info(f"[GAP_FILL] Gap detected for {pair_symbol}/{pair_timeframe}. Latest in DB: {datetime.fromtimestamp(latest_db_open_time/1000)}. Backfilling from {datetime.fromtimestamp(start_backfill_ms/1000)} to {datetime.fromtimestamp(current_target_time_ms/1000)}.")
-                    fetched_count, failed_count = await fetch_historical_klines_and_save(pair_symbol, pair_timeframe, start_backfill_ms, current_target_time_ms, db_session_factory)
-                    logger.info(f"[GAP_FILL] Gap fill for {pair_symbol}/{pair_timeframe} complete. Fetched: {fetched_count}, Failed: {failed_count}")
-                else:
-                    logger.info(f"[GAP_FILL] No significant gap found for {pair_symbol}/{pair_timeframe}. Latest data is recent enough.")
-                
-                # Mark backfill as completed in Redis (or clear it)
-                await asyncio.to_thread(redis_client.set, backfill_status_key, json.dumps({"status": "completed_startup", "last_updated_ts": int(time.time())}), ex=3600)
-
-            except Exception as e_gapfill:
-                logger.error(f"[GAP_FILL] Error during gap fill for {pair_symbol}/{pair_timeframe}: {e_gapfill}", exc_info=True)
-                backfill_status_key = f"backfill_status:{pair_symbol}:{pair_timeframe}"
-                await asyncio.to_thread(redis_client.set, backfill_status_key, json.dumps({"status": "error_during_startup_fill", "last_updated_ts": int(time.time())}), ex=3600)
-
-            # Create and start BinanceWebSocketManager for this pair
-            manager = BinanceWebSocketManager(
-                symbol=pair_symbol,
-                timeframe=pair_timeframe,
-                data_handler_callback=functools.partial(kline_data_processor, symbol=pair_symbol, timeframe=pair_timeframe, redis_client=redis_client, db_session_factory=db_session_factory),
-                shutdown_event_global=shutdown_event # Pass the global shutdown event
-            )
-            task = asyncio.create_task(manager.run())
-            active_tasks.append(task)
-            logger.info(f"Scheduled WebSocket manager for {pair_symbol}/{pair_timeframe}.")
+        # Publish them as tracked so the API doesn't request ingestion for them
+        await asyncio.to_thread(redis_client.sadd, ingestion_control.TRACKED_PAIRS_KEY, *[ingestion_control.pair_member(s, tf) for s, tf in proactive_pairs])
     else:
-        logger.warning("PROACTIVE_SYMBOLS or PROACTIVE_TIMEFRAMES not configured. No live data will be ingested.")
-
-    # --- Start WebSocket Managers for Proactive Pairs ---
-    if proactive_pairs:
-        logger.info(f"All {len(active_tasks)} WebSocket managers scheduled. Service is running and waiting for shutdown signal...")
-        
-        # Wait for the shutdown signal
-        await shutdown_event.wait()
-        logger.info("Shutdown signal received. Proceeding to stop tasks.")
-
-        # Signal all WebSocket managers to stop (they should observe shutdown_event_global)
-        # The BinanceWebSocketManager's run loop should exit when shutdown_event is set.
-        # We still cancel them to be sure and to handle any that might be stuck.
-        
-        for task in active_tasks:
-            if not task.done():
-                logger.info(f"Cancelling task {task.get_name()}...")
-                task.cancel()
-        
-        if active_tasks:
-            logger.info(f"Awaiting cancellation of {len(active_tasks)} tasks...")
-            results = await asyncio.gather(*active_tasks, return_exceptions=True)
-            logger.info("All active tasks have been processed after cancellation.")
-            for i, result in enumerate(results):
-                if isinstance(result, asyncio.CancelledError):
-                    logger.debug(f"Task {active_tasks[i].get_name()} was cancelled successfully.")
-                elif isinstance(result, Exception):
-                    logger.error(f"Task {active_tasks[i].get_name()} raised an exception during shutdown: {result}", exc_info=result)
-                # else: (task completed normally before cancellation, or after)
-                    # logger.debug(f"Task {active_tasks[i].get_name()} completed with result: {result}")
-
-    else: # No active tasks, just wait for shutdown
-        logger.info("Service is idle (no proactive pairs). Waiting for shutdown signal.")
-        await shutdown_event.wait()
+        logger.warning("PROACTIVE_SYMBOLS or PROACTIVE_TIMEFRAMES not configured. Only pairs requested at runtime will be ingested.")
+
+    # Gap fills run concurrently, bounded by a concurrency limit and one shared request weight budget
+    worker_id = settings.INGESTION_WORKER_ID or default_worker_id()
+    # Closed klines the DB can't take are spooled locally and replayed. The directory must survive restarts,
+    # so it is keyed by the configured worker id or the hostname, not the per-process default id.
+    spool = None
+    if settings.KLINE_SPOOL_DIR:
+        spool_dir = os.path.join(settings.KLINE_SPOOL_DIR, settings.INGESTION_WORKER_ID or socket.gethostname())
+        try:
+            spool = KlineSpool(spool_dir, settings.KLINE_SPOOL_SEGMENT_MAX_BYTES, settings.KLINE_SPOOL_FSYNC_BATCH,
+                               settings.KLINE_SPOOL_FSYNC_INTERVAL_SECONDS)
+            logger.info(f"[KLINE_SPOOL] Using spool directory {spool_dir} ({'empty' if spool.is_empty else 'holds klines to replay'}).")
+        except (SpoolLockedError, OSError) as e:
+            logger.error(f"[KLINE_SPOOL] Spool unavailable, closed klines will be dropped on DB errors: {e}", exc_info=True)
+    registry = PairRegistry(
+        redis_client,
+        db_session_factory,
+        asyncio.Semaphore(max(1, settings.STARTUP_BACKFILL_MAX_CONCURRENCY)),
+        RequestWeightBudget(settings.BINANCE_REQUEST_WEIGHT_BUDGET_PER_MINUTE),
+        worker_id,
+        proactive_pairs,
+        spool
+    )
+    coordinator = LeaseCoordinator(redis_client, worker_id, settings.INGESTION_LEASE_TTL_MS)
+
+    # Drop runtime-added pairs that lost their viewers while no worker was running
+    try:
+        await evict_idle_pairs(registry, redis_client)
+    except Exception as e:
+        logger.error(f"[CONTROL] Error pruning idle pairs at startup: {e}", exc_info=True)
+
+    # Every worker owns the pairs the consistent hash ring assigns to it. Live streams start as soon as the
+    # pair's lease is acquired; closed klines are held until that pair's gap fill finishes (see startup_buffer.py).
+    active_tasks.append(asyncio.create_task(shard_rebalancer(registry, coordinator, shutdown_event), name="shard_rebalancer"))
+    # Runtime subscription control: new pairs via the ingestion:control stream, idle ones evicted
+    active_tasks.append(asyncio.create_task(control_stream_listener(registry, redis_client, shutdown_event), name="control_stream_listener"))
+    active_tasks.append(asyncio.create_task(idle_pair_evictor(registry, redis_client, shutdown_event), name="idle_pair_evictor"))
+    # Full-history hole detection: owned pairs are scanned periodically and missing ranges refetched in the background
+    repair_queue = GapRepairQueue(settings.GAP_REPAIR_QUEUE_MAX_RANGES)
+    active_tasks.append(asyncio.create_task(gap_scanner(registry, repair_queue, redis_client, db_session_factory, shutdown_event), name="gap_scanner"))
+    for i in range(max(1, settings.GAP_REPAIR_WORKERS)):
+        active_tasks.append(asyncio.create_task(gap_repair_worker(
+            repair_queue, redis_client, db_session_factory, registry.gap_fill_semaphore, registry.weight_budget, shutdown_event
+        ), name=f"gap_repair_worker_{i}"))
+    # Older history requested by chart reads past the oldest stored kline, run ahead of the background repairs
+    active_tasks.append(asyncio.create_task(backfill_request_listener(repair_queue, redis_client, shutdown_event), name="backfill_request_listener"))
+    # Redis kline windows sized from a shared memory budget by popularity and timeframe; the policy reads the
+    # binary ZSET members, so it gets a client that doesn't decode responses
+    cache_redis_client = get_redis_connection(decode_responses=False)
+    if cache_redis_client:
+        active_tasks.append(asyncio.create_task(cache_policy_loop(registry, cache_redis_client, db_session_factory, shutdown_event), name="cache_policy"))
+    else:
+        logger.error("Failed to open the Redis connection for the cache policy; every pair keeps MAX_KLINES_IN_REDIS klines.")
+    # Aged months of the tiered timeframes are moved from the DB to Parquet files (app/cold_storage.py)
+    if cold_storage.is_enabled():
+        active_tasks.append(asyncio.create_task(kline_tiering_loop(registry, db_session_factory, shutdown_event), name="kline_tiering"))
+    if spool is not None:
+        active_tasks.append(asyncio.create_task(spool_replayer(
+            spool, db_session_factory, settings.HISTORICAL_SAVE_BATCH_SIZE, settings.KLINE_SPOOL_REPLAY_INTERVAL_SECONDS, shutdown_event,
+            redis_client
+        ), name="kline_spool_replayer"))
+
+    logger.info(f"Worker {worker_id} started (max {settings.STARTUP_BACKFILL_MAX_CONCURRENCY} concurrent gap fills). Service is running and waiting for shutdown signal...")
+
+    # Wait for the shutdown signal
+    await shutdown_event.wait()
+    logger.info("Shutdown signal received. Proceeding to stop tasks.")
+
+    # Signal all WebSocket managers to stop (they should observe shutdown_event_global)
+    # The BinanceWebSocketManager's run loop should exit when shutdown_event is set.
+    # We still cancel them to be sure and to handle any that might be stuck.
+
+    for task in active_tasks:
+        if not task.done():
+            logger.info(f"Cancelling task {task.get_name()}...")
+            task.cancel()
+
+    if active_tasks:
+        logger.info(f"Awaiting cancellation of {len(active_tasks)} tasks...")
+        results = await asyncio.gather(*active_tasks, return_exceptions=True)
+        logger.info("All active tasks have been processed after cancellation.")
+        for i, result in enumerate(results):
+            if isinstance(result, asyncio.CancelledError):
+                logger.debug(f"Task {active_tasks[i].get_name()} was cancelled successfully.")
+            elif isinstance(result, Exception):
+                logger.error(f"Task {active_tasks[i].get_name()} raised an exception during shutdown: {result}", exc_info=result)
+            # else: (task completed normally before cancellation, or after)
+                # logger.debug(f"Task {active_tasks[i].get_name()} completed with result: {result}")
 
     logger.info("Shutting down InChart Data Ingestion Service.")
+    await close_http_clients()
+    if spool is not None:
+        spool.close() # Whatever is left is replayed by the next run
+    if cache_redis_client:
+        await asyncio.to_thread(cache_redis_client.close)
     if redis_client:
         try:
             logger.info("Closing Redis connection...")
@@ -418,14 +597,15 @@ async def run_service():
     logger.info("Service shutdown complete.")
     sys.exit(0)
 
-async def fetch_historical_klines_and_save(symbol, timeframe, start_ms, end_ms, db_factory):
-    """Helper to fetch and save, used by gap filling."""
+async def fetch_historical_klines_and_save(symbol, timeframe, start_ms, end_ms, db_factory, weight_budget=None, progress_callback=None):
+    """Helper to fetch and save, used by gap filling. Pages are written as they arrive (see fetch_and_save_historical_klines)."""
     try:
-        klines_models = await fetch_historical_klines(symbol, timeframe, start_ms, end_ms)
-        if klines_models:
-            saved_count, failed_count = await save_historical_klines_to_db(klines_models, db_factory)
-            return saved_count, failed_count
-        return 0, 0
+        # Whether every window completed is tracked by the job's checkpoint (progress_callback) instead
+        inserted, skipped, _completed = await fetch_and_save_historical_klines(
+            symbol, timeframe, start_ms, end_ms, db_factory,
+            weight_budget=weight_budget, progress_callback=progress_callback
+        )
+        return inserted, skipped
     except Exception as e:
         logger.error(f"[HIST_SAVE_HELPER] Error in fetch_historical_klines_and_save for {symbol}/{timeframe}: {e}", exc_info=True)
         return 0, 0
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Request weight of GET /api/v3/klines (Binance spot REST).
+KLINES_REQUEST_WEIGHT = 2
+# Response header with the weight used by this IP in the current 1-minute window
+USED_WEIGHT_HEADER = "X-MBX-USED-WEIGHT-1M"
+# Fallback wait when a 429/418 arrives without a usable Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = 10
+
+
+class RequestWeightBudget:
+    """
+    Token bucket shared by every REST fetch in the process, expressed in Binance request weight.
+
+    The bucket holds at most `weight_per_minute` tokens and refills continuously at
+    weight_per_minute / window_seconds tokens per second, so bursts are allowed up to one window's
+    budget while the long-run rate never exceeds it.
+
+    The local estimate is corrected from what Binance reports (observe_response): the
+    X-MBX-USED-WEIGHT-1M header lowers the available tokens when other clients on the same IP
+    (or requests in flight) used more than we accounted for, and a 429/418 Retry-After blocks
+    every caller until the server-given time has passed.
+    """
+
+    def __init__(self, weight_per_minute: int, window_seconds: float = 60.0):
+        if weight_per_minute <= 0:
+            raise ValueError("weight_per_minute must be positive")
+        self.capacity = float(weight_per_minute)
+        self.refill_per_second = weight_per_minute / window_seconds
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+        self.server_used_weight: Optional[int] = None # Last X-MBX-USED-WEIGHT-1M seen
+        self.rate_limited_count = 0 # Number of 429/418 responses observed
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.refill_per_second)
+        self._last_refill = now
+
+    @property
+    def available(self) -> float:
+        """Tokens currently available (refilled up to now)."""
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, weight: int = KLINES_REQUEST_WEIGHT):
+        """Waits until `weight` tokens are available and consumes them. Waiters are served in order."""
+        weight = min(weight, self.capacity) # A single request can never need more than the whole bucket
+        async with self._lock:
+            while True:
+                blocked_for = self._blocked_until - time.monotonic()
+                if blocked_for > 0:
+                    logger.debug(f"[RATE_LIMIT] Blocked by Retry-After for another {blocked_for:.2f}s.")
+                    await asyncio.sleep(blocked_for)
+                    continue
+                self._refill()
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+                wait_seconds = (weight - self._tokens) / self.refill_per_second
+                logger.debug(f"[RATE_LIMIT] Weight budget exhausted, waiting {wait_seconds:.2f}s for {weight} weight.")
+                await asyncio.sleep(wait_seconds)
+
+    def observe_response(self, status_code: int, headers: Mapping[str, str]):
+        """Feeds a Binance response back into the budget. `headers` must be case-insensitive (httpx.Headers)."""
+        used_weight_raw = headers.get(USED_WEIGHT_HEADER)
+        if used_weight_raw is not None:
+            try:
+                self.server_used_weight = int(used_weight_raw)
+            except ValueError:
+                logger.warning(f"[RATE_LIMIT] Ignoring malformed {USED_WEIGHT_HEADER} header: {used_weight_raw!r}")
+            else:
+                self._refill()
+                server_remaining = self.capacity - self.server_used_weight
+                if server_remaining < self._tokens:
+                    self._tokens = server_remaining # May go negative; acquire() then waits for the refill
+
+        if status_code in (429, 418):
+            self.rate_limited_count += 1
+            retry_after = DEFAULT_RETRY_AFTER_SECONDS
+            try:
+                retry_after = max(0.0, float(headers.get("Retry-After", DEFAULT_RETRY_AFTER_SECONDS)))
+            except ValueError:
+                pass
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._tokens = min(self._tokens, 0.0)
+            logger.warning(f"[RATE_LIMIT] Binance returned {status_code}. Pausing all REST fetches for {retry_after:.1f}s.")
@@ -0,0 +1,115 @@
+"""
+Converts the Redis kline ZSETs (klines:{symbol}:{timeframe}) from JSON members to the packed binary members
+of backend/app/kline_cache_codec.py, one key at a time under WATCH so concurrent ingestion writes are never
+lost (a key written to mid-conversion is simply retried).
+
+Members that can't be converted (the old ingestion cache dict only held OHLCV, not the volumes the API
+returns) are dropped: the klines are in the DB and the API reads them from there. Duplicate members of one
+open_time left by the old ZADD-only writer collapse to one, preferring a closed kline.
+
+Safe to run while the ingestion service and the API are up (both already read either format) and to re-run.
+
+    python -m backend.data_ingestion_service.redis_kline_migrator [--dry-run]
+"""
+import argparse
+import logging
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+from backend.app import kline_cache_codec
+from backend.app.redis_utils import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+KLINE_KEY_PATTERN = "klines:*"
+MAX_WATCH_RETRIES = 5
+
+
+def convert_members(members: List[Tuple[bytes, float]], symbol: str, timeframe: str) -> Tuple[Dict[bytes, float], int]:
+    """
+    The packed member -> score mapping a key's (member, score) pairs convert to, and how many legacy
+    members were dropped as unconvertible. Already packed members are kept as they are.
+    """
+    by_score: Dict[float, bytes] = {}
+    dropped = 0
+    for member, score in members:
+        if kline_cache_codec.is_packed(member):
+            packed = member
+        else:
+            kline = kline_cache_codec.decode_legacy_member(member, symbol, timeframe)
+            if kline is None:
+                dropped += 1
+                continue
+            packed = kline_cache_codec.encode_dict(kline)
+        current = by_score.get(score)
+        if current is None or (packed[1] and not current[1]): # Byte 1 is is_closed
+            by_score[score] = packed
+    return {member: score for score, member in by_score.items()}, dropped
+
+
+def migrate_key(redis_client, key: bytes, dry_run: bool = False) -> Optional[Tuple[int, int]]:
+    """
+    Converts one ZSET in a single MULTI/EXEC. Returns (members before, members after), or None if the
+    key isn't a kline ZSET, or was written to on every attempt.
+    """
+    parts = key.decode().split(":")
+    if len(parts) != 3:
+        return None
+    _, symbol, timeframe = parts
+    for _ in range(MAX_WATCH_RETRIES):
+        with redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.type(key) != b"zset":
+                    return None
+                members = pipe.zrange(key, 0, -1, withscores=True)
+                converted, dropped = convert_members(members, symbol, timeframe)
+                if dropped:
+                    logger.warning(f"[REDIS_MIGRATE] {key.decode()}: dropping {dropped} members without the fields the packed format needs.")
+                if dry_run or set(converted) == {member for member, _ in members}:
+                    return len(members), len(converted)
+                pipe.multi()
+                pipe.delete(key)
+                if converted:
+                    pipe.zadd(key, converted)
+                pipe.execute()
+                return len(members), len(converted)
+            except redis.WatchError:
+                continue
+    logger.warning(f"[REDIS_MIGRATE] {key.decode()} kept changing; skipped (re-run to retry).")
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert the Redis kline ZSETs to packed binary members.")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    redis_client = get_redis_connection(decode_responses=False)
+    if redis_client is None:
+        logger.error("[REDIS_MIGRATE] Could not connect to Redis.")
+        return 1
+    keys = before = after = 0
+    try:
+        for key in redis_client.scan_iter(match=KLINE_KEY_PATTERN, count=500):
+            result = migrate_key(redis_client, key, args.dry_run)
+            if result is None:
+                continue
+            keys += 1
+            before += result[0]
+            after += result[1]
+    except Exception as e:
+        logger.error(f"[REDIS_MIGRATE] Migration failed (re-run to resume): {e}", exc_info=True)
+        return 1
+    finally:
+        redis_client.close()
+    verb = "Would convert" if args.dry_run else "Converted"
+    logger.info(f"[REDIS_MIGRATE] {verb} {keys} keys: {before} members -> {after}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Upserts a closed kline into its ZSET (any member with the same open_time score is replaced, so a
+# corrected kline doesn't leave the old version behind), trims the ZSET to the newest N members and
+# publishes the kline on its Pub/Sub channel, all in a single server-side call.
+# Running the whole sequence inside Redis makes it atomic: two concurrent writers can
+# no longer both read the same ZCARD and each remove the overflow (over-deleting).
+#
+# KEYS[1] = kline ZSET key (klines:{symbol}:{timeframe})
+# KEYS[2] = (optional) pair lease key; when given, nothing is written unless ARGV[6] still holds the lease
+# ARGV[1] = ZSET member (packed kline, see backend/app/kline_cache_codec.py)
+# ARGV[2] = score (open_time in ms)
+# ARGV[3] = max members to retain (the pair's window, see cache_policy.py)
+# ARGV[4] = Pub/Sub channel (channels are not keys, so they are passed as an argument)
+# ARGV[5] = Pub/Sub payload
+# ARGV[6] = (optional) expected lease owner (worker id)
+# Returns {members_trimmed, pubsub_receivers}, or {-1, 0} if the lease is held by someone else
+UPSERT_TRIM_PUBLISH_LUA = """
+if #KEYS > 1 and redis.call('GET', KEYS[2]) ~= ARGV[6] then
+    return {-1, 0}
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], ARGV[2], ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+local max_members = tonumber(ARGV[3])
+local current_count = redis.call('ZCARD', KEYS[1])
+local trimmed = 0
+if current_count > max_members then
+    trimmed = redis.call('ZREMRANGEBYRANK', KEYS[1], 0, current_count - max_members - 1)
+end
+local receivers = redis.call('PUBLISH', ARGV[4], ARGV[5])
+return {trimmed, receivers}
+"""
+
+# Upserts klines written outside the live path (gap fills, repairs, spool replays) into a pair's ZSET, skipping
+# those older than its oldest member (the window starts there), then trims it to the newest N members. An empty
+# ZSET is left alone: the cache policy warms it. Members are upserted like UPSERT_TRIM_PUBLISH_LUA does.
+# KEYS[1] = kline ZSET key (klines:{symbol}:{timeframe})
+# ARGV[1] = max members to retain (the pair's window, see cache_policy.py)
+# ARGV[2], ARGV[3], ... = score (open_time in ms), member pairs
+# Returns the number of members upserted
+UPSERT_WINDOW_KLINES_LUA = """
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #oldest == 0 then
+    return 0
+end
+local oldest_score = tonumber(oldest[2])
+local upserted = 0
+for i = 2, #ARGV, 2 do
+    local score = tonumber(ARGV[i])
+    if score >= oldest_score then
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], score, score)
+        redis.call('ZADD', KEYS[1], score, ARGV[i + 1])
+        upserted = upserted + 1
+    end
+end
+local max_members = tonumber(ARGV[1])
+local current_count = redis.call('ZCARD', KEYS[1])
+if current_count > max_members then
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, current_count - max_members - 1)
+end
+return upserted
+"""
+
+# Publishes a live tick only if the caller still holds the pair lease (fencing for sharded workers).
+# KEYS[1] = pair lease key
+# ARGV[1] = Pub/Sub channel, ARGV[2] = payload, ARGV[3] = expected lease owner
+# Returns the number of receivers, or -1 if the lease is held by someone else
+PUBLISH_IF_OWNER_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[3] then
+    return -1
+end
+return redis.call('PUBLISH', ARGV[1], ARGV[2])
+"""
+
+# Extends a lease if it is still owned by the caller.
+# KEYS[1] = lease key, ARGV[1] = owner, ARGV[2] = TTL in ms. Returns 1 if renewed, 0 if lost.
+RENEW_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Deletes a lease only if it is still owned by the caller. KEYS[1] = lease key, ARGV[1] = owner.
+RELEASE_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Registered scripts are cached on the client they were registered on, keyed by script source, so the cache
+# goes away with the client (a Script holds a reference to its client, which rules out a module-level cache).
+# redis-py's Script object caches the SHA and falls back from EVALSHA to EVAL on NOSCRIPT,
+# so registering once per client is enough.
+_SCRIPT_CACHE_ATTRIBUTE = "_inchart_registered_scripts"
+
+
+def get_registered_script(redis_client, lua_source: str):
+    """Returns the (lazily registered) script object for `lua_source` on the given Redis client."""
+    scripts = vars(redis_client).setdefault(_SCRIPT_CACHE_ATTRIBUTE, {})
+    script = scripts.get(lua_source)
+    if script is None:
+        script = redis_client.register_script(lua_source)
+        scripts[lua_source] = script
+        logger.debug(f"[REDIS_SCRIPT] Registered Lua script ({len(scripts)} cached on this client).")
+    return script
+
+
+def get_upsert_trim_publish_script(redis_client):
+    """Returns the (lazily registered) upsert/trim/publish script for the given Redis client."""
+    return get_registered_script(redis_client, UPSERT_TRIM_PUBLISH_LUA)
+
+
+def upsert_trim_publish(redis_client, zset_key: str, member: str, score: int, max_members: int, channel: str, payload: str,
+                        lease_key: str = None, lease_owner: str = None):
+    """
+    Runs the upsert/trim/publish script in one round trip. Blocking; call via asyncio.to_thread.
+    When lease_key/lease_owner are given, the script is a no-op unless lease_owner still holds the lease.
+
+    Returns:
+        A tuple (members_trimmed, pubsub_receivers); (-1, 0) if fenced off by the lease.
+    """
+    script = get_upsert_trim_publish_script(redis_client)
+    if lease_key:
+        trimmed, receivers = script(keys=[zset_key, lease_key], args=[member, score, max_members, channel, payload, lease_owner])
+    else:
+        trimmed, receivers = script(keys=[zset_key], args=[member, score, max_members, channel, payload])
+    return int(trimmed), int(receivers)
+
+
+def upsert_window_klines(redis_client, zset_key: str, scored_members: list, max_members: int) -> int:
+    """
+    Runs the window upsert script for (score, member) pairs in one round trip. Blocking; call via asyncio.to_thread.
+    Returns the number of members upserted (those not older than the ZSET's oldest member).
+    """
+    args = [max_members]
+    for score, member in scored_members:
+        args.extend((score, member))
+    return int(get_registered_script(redis_client, UPSERT_WINDOW_KLINES_LUA)(keys=[zset_key], args=args))
+
+
+def publish_if_owner(redis_client, lease_key: str, lease_owner: str, channel: str, payload: str) -> int:
+    """Publishes unless the lease has moved to another worker. Returns receivers, or -1 if fenced off."""
+    return int(get_registered_script(redis_client, PUBLISH_IF_OWNER_LUA)(keys=[lease_key], args=[channel, payload, lease_owner]))
+
+
+def renew_lease(redis_client, lease_key: str, lease_owner: str, ttl_ms: int) -> bool:
+    return bool(get_registered_script(redis_client, RENEW_LEASE_LUA)(keys=[lease_key], args=[lease_owner, ttl_ms]))
+
+
+def release_lease(redis_client, lease_key: str, lease_owner: str) -> bool:
+    return bool(get_registered_script(redis_client, RELEASE_LEASE_LUA)(keys=[lease_key], args=[lease_owner]))
@@ -0,0 +1,167 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import time
+from typing import Iterable, List, Optional, Set, Tuple
+
+from backend.app.config import settings
+from backend.app import ingestion_control
+from .redis_scripts import renew_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+# ZSET of worker_id -> last heartbeat (ms). Workers whose heartbeat is older than the lease TTL are dead.
+WORKERS_KEY = "ingestion:workers"
+# String key per pair holding the worker_id that currently ingests (and publishes) it; set with PX TTL
+PAIR_LEASE_KEY_PREFIX = "ingestion:lease:"
+HASH_RING_VNODES = 64 # Virtual nodes per worker; keeps the pair split even with few workers
+
+def pair_lease_key(symbol: str, timeframe: str) -> str:
+    return f"{PAIR_LEASE_KEY_PREFIX}{ingestion_control.pair_member(symbol, timeframe)}"
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring over worker ids. Adding or removing a worker only moves the pairs
+    that hash next to its virtual nodes, so a rebalance doesn't reshuffle every pair.
+    """
+
+    def __init__(self, workers: Iterable[str], vnodes: int = HASH_RING_VNODES):
+        self._ring = sorted((_hash(f"{worker}#{i}"), worker) for worker in set(workers) for i in range(vnodes))
+        self._points = [point for point, _ in self._ring]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._ring)
+        return self._ring[index][1]
+
+
+class LeaseCoordinator:
+    """
+    Worker membership and per-pair leases in Redis. All methods are blocking; call via asyncio.to_thread.
+
+    A lease is `SET ingestion:lease:{pair} <worker_id> NX PX <ttl>`, renewed on every heartbeat and only
+    renewed/released by its owner (Lua compare-and-set). The Redis write scripts check the lease before
+    publishing, so a worker that lost its lease (paused, partitioned, or mid-handoff) can't publish.
+    """
+
+    def __init__(self, redis_client, worker_id: str, lease_ttl_ms: int):
+        self.redis_client = redis_client
+        self.worker_id = worker_id
+        self.lease_ttl_ms = lease_ttl_ms
+
+    def heartbeat(self) -> List[str]:
+        """Records this worker as alive, drops dead workers and returns the live worker ids."""
+        now_ms = int(time.time() * 1000)
+        pipe = self.redis_client.pipeline()
+        pipe.zadd(WORKERS_KEY, {self.worker_id: now_ms})
+        pipe.zremrangebyscore(WORKERS_KEY, "-inf", now_ms - self.lease_ttl_ms)
+        pipe.zrange(WORKERS_KEY, 0, -1)
+        return list(pipe.execute()[2])
+
+    def leave(self):
+        self.redis_client.zrem(WORKERS_KEY, self.worker_id)
+
+    def try_acquire(self, symbol: str, timeframe: str) -> bool:
+        """Takes the pair's lease if it is free (or already ours)."""
+        lease_key = pair_lease_key(symbol, timeframe)
+        if self.redis_client.set(lease_key, self.worker_id, nx=True, px=self.lease_ttl_ms):
+            return True
+        return renew_lease(self.redis_client, lease_key, self.worker_id, self.lease_ttl_ms)
+
+    def renew(self, pairs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Renews the given leases. A lease that expired without anyone else taking it is simply re-acquired.
+        Returns the pairs whose lease is now held by another worker.
+        """
+        return [(symbol, timeframe) for symbol, timeframe in pairs if not self.try_acquire(symbol, timeframe)]
+
+    def release(self, symbol: str, timeframe: str) -> bool:
+        return release_lease(self.redis_client, pair_lease_key(symbol, timeframe), self.worker_id)
+
+
+def desired_pairs(universe: Iterable[Tuple[str, str]], ring: HashRing, worker_id: str) -> Set[Tuple[str, str]]:
+    """Pairs from `universe` that the ring assigns to `worker_id`."""
+    return {(s, tf) for s, tf in universe if ring.owner(ingestion_control.pair_member(s, tf)) == worker_id}
+
+
+async def rebalance_once(registry, coordinator: LeaseCoordinator, universe: Set[Tuple[str, str]]):
+    """
+    One membership/ownership round:
+    1. heartbeat and build the ring from live workers,
+    2. renew leases of pairs we keep (first, so slow stops below can't let them expire) and stop any whose lease was lost,
+    3. stop pairs that moved to another worker, concurrently (stop first, then release, so two workers never
+       publish the same pair),
+    4. acquire leases for newly assigned pairs and start them; a pair whose previous owner hasn't
+       released yet is retried next round (its lease expires within the TTL if that owner crashed).
+    """
+    live_workers = await asyncio.to_thread(coordinator.heartbeat)
+    if coordinator.worker_id not in live_workers:
+        live_workers.append(coordinator.worker_id)
+    ring = HashRing(live_workers)
+    wanted = desired_pairs(universe, ring, coordinator.worker_id)
+    running = set(registry.pairs)
+
+    lost = await asyncio.to_thread(coordinator.renew, sorted(running & wanted))
+    for symbol, timeframe in lost:
+        logger.warning(f"[SHARD] Lease for {symbol}/{timeframe} was lost by {coordinator.worker_id}. Stopping it.")
+    await asyncio.gather(*(registry.stop_pair(symbol, timeframe) for symbol, timeframe in lost))
+
+    async def hand_off(symbol: str, timeframe: str):
+        logger.info(f"[SHARD] {symbol}/{timeframe} is no longer assigned to {coordinator.worker_id}. Handing off.")
+        await registry.stop_pair(symbol, timeframe)
+        await asyncio.to_thread(coordinator.release, symbol, timeframe)
+
+    await asyncio.gather(*(hand_off(symbol, timeframe) for symbol, timeframe in sorted(running - wanted)))
+
+    for symbol, timeframe in sorted(wanted - running):
+        if await asyncio.to_thread(coordinator.try_acquire, symbol, timeframe):
+            await registry.start_pair(symbol, timeframe, dynamic=(symbol, timeframe) not in registry.proactive_pairs)
+        else:
+            logger.debug(f"[SHARD] {symbol}/{timeframe} is assigned to {coordinator.worker_id} but still leased by another worker. Retrying.")
+
+    return wanted
+
+
+async def shard_rebalancer(registry, coordinator: LeaseCoordinator, shutdown_event: asyncio.Event):
+    """
+    Runs rebalance rounds every INGESTION_HEARTBEAT_INTERVAL_SECONDS (or sooner when
+    registry.rebalance_requested is set) until shutdown, then releases every lease this worker holds.
+    """
+    logger.info(f"[SHARD] Worker {coordinator.worker_id} joining (lease TTL {coordinator.lease_ttl_ms}ms).")
+    try:
+        while not shutdown_event.is_set():
+            try:
+                universe = await registry.load_universe()
+                await rebalance_once(registry, coordinator, universe)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[SHARD] Error during rebalance on {coordinator.worker_id}: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(registry.rebalance_requested.wait(), timeout=settings.INGESTION_HEARTBEAT_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            registry.rebalance_requested.clear()
+    finally:
+        # Hand everything back immediately instead of letting the leases expire
+        for symbol, timeframe in list(registry.pairs):
+            try:
+                await asyncio.to_thread(coordinator.release, symbol, timeframe)
+            except Exception as e:
+                logger.error(f"[SHARD] Error releasing lease for {symbol}/{timeframe}: {e}")
+        try:
+            await asyncio.to_thread(coordinator.leave)
+        except Exception as e:
+            logger.error(f"[SHARD] Error leaving worker set: {e}")
+        logger.info(f"[SHARD] Worker {coordinator.worker_id} left.")
@@ -0,0 +1,51 @@
+import logging
+from typing import Awaitable, Callable, Dict
+
+from .kline_record import KlineRecord
+
+logger = logging.getLogger(__name__)
+
+
+class ClosedKlineBuffer:
+    """
+    Sits between a BinanceWebSocketManager and kline_data_processor while the pair's gap fill runs.
+
+    Live ticks (unclosed klines) pass straight through so charts stay live. Closed klines are held,
+    keyed by open_time, until release() is called once the REST gap fill has finished; they are then
+    replayed in open_time order through the normal processor and the buffer switches to pass-through.
+    Replaying after the fill keeps the DB insert order roughly chronological, and ON CONFLICT DO NOTHING
+    reconciles any klines that both the fill and the live stream delivered.
+    """
+
+    def __init__(self, symbol: str, timeframe: str, processor: Callable[[KlineRecord], Awaitable[None]]):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self._processor = processor
+        self._pending: Dict[int, KlineRecord] = {}
+        self.is_live = False
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def handle(self, kline: KlineRecord):
+        """Data handler callback for the WebSocket manager."""
+        if self.is_live or not kline.is_closed:
+            await self._processor(kline)
+            return
+        # A later message for the same open_time supersedes the earlier one
+        self._pending[kline.open_time] = kline
+        logger.debug(f"[BUFFER] Holding closed kline {self.symbol}/{self.timeframe} OT:{kline.open_time} until gap fill completes ({len(self._pending)} pending).")
+
+    async def release(self):
+        """Replays held closed klines in order and switches to pass-through."""
+        replayed = 0
+        # New klines can arrive while a replay is awaiting the processor; keep draining until empty.
+        # is_live is flipped with no await between the emptiness check and the assignment.
+        while self._pending:
+            for open_time in sorted(self._pending):
+                kline = self._pending.pop(open_time)
+                await self._processor(kline)
+                replayed += 1
+        self.is_live = True
+        logger.info(f"[BUFFER] {self.symbol}/{self.timeframe} is live. Replayed {replayed} buffered closed klines.")
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from backend.app.config import settings
+from backend.app import ingestion_control
+
+logger = logging.getLogger(__name__)
+
+CONTROL_STREAM_BLOCK_MS = 5000 # XREAD block time; also bounds how long shutdown waits on the listener
+CONTROL_STREAM_BATCH_SIZE = 50
+CONTROL_STREAM_ERROR_BACKOFF_SECONDS = 5
+
+async def handle_control_command(registry, redis_client, fields: Dict[str, str]):
+    """
+    Applies one ingestion:control stream entry to the shared set of pairs to ingest (ingestion:tracked_pairs).
+    Every worker reads every entry; the updates are idempotent and the shard rebalancer of whichever worker
+    owns the pair starts or stops it. Proactive pairs can't be unsubscribed.
+    """
+    command = fields.get("command")
+    symbol = (fields.get("symbol") or "").upper()
+    timeframe = fields.get("timeframe") or ""
+    source = fields.get("source", "unknown")
+    member = ingestion_control.pair_member(symbol, timeframe)
+
+    if not ingestion_control.is_valid_pair(symbol, timeframe):
+        logger.warning(f"[CONTROL] Ignoring '{command}' for invalid pair {symbol}/{timeframe} (source: {source}).")
+        return
+
+    if command == ingestion_control.COMMAND_SUBSCRIBE:
+        if (symbol, timeframe) in registry.proactive_pairs:
+            return
+        tracked = await asyncio.to_thread(ingestion_control.get_tracked_pairs, redis_client)
+        if (symbol, timeframe) in tracked:
+            logger.debug(f"[CONTROL] {symbol}/{timeframe} is already tracked. Ignoring subscribe from {source}.")
+            return
+        if len(tracked - registry.proactive_pairs) >= settings.INGESTION_MAX_DYNAMIC_PAIRS:
+            logger.warning(f"[CONTROL] Dynamic pair limit ({settings.INGESTION_MAX_DYNAMIC_PAIRS}) reached. Not subscribing {symbol}/{timeframe} (source: {source}).")
+            return
+        # Count the request as an access so the pair isn't evicted before its first viewer shows up
+        await asyncio.to_thread(ingestion_control.touch_pair_access, redis_client, symbol, timeframe)
+        await asyncio.to_thread(redis_client.sadd, ingestion_control.TRACKED_PAIRS_KEY, member)
+        registry.request_rebalance()
+        logger.info(f"[CONTROL] Subscribed {symbol}/{timeframe} at runtime (source: {source}).")
+    elif command == ingestion_control.COMMAND_UNSUBSCRIBE:
+        if (symbol, timeframe) in registry.proactive_pairs:
+            logger.info(f"[CONTROL] Ignoring unsubscribe for proactive pair {symbol}/{timeframe}.")
+            return
+        await asyncio.to_thread(redis_client.srem, ingestion_control.TRACKED_PAIRS_KEY, member)
+        registry.request_rebalance()
+        logger.info(f"[CONTROL] Unsubscribed {symbol}/{timeframe} (source: {source}).")
+    else:
+        logger.warning(f"[CONTROL] Unknown command '{command}' for {symbol}/{timeframe} (source: {source}).")
+
+async def control_stream_listener(registry, redis_client, shutdown_event: asyncio.Event):
+    """
+    Consumes the ingestion:control stream until shutdown. The last processed entry id is persisted so
+    commands sent while the service was down are applied on the next start.
+    """
+    last_id = await asyncio.to_thread(redis_client.get, ingestion_control.INGESTION_CONTROL_LAST_ID_KEY)
+    if not last_id:
+        last_id = f"{int(time.time() * 1000)}-0" # First run: only commands from now on
+    logger.info(f"[CONTROL] Listening on '{ingestion_control.INGESTION_CONTROL_STREAM}' after entry {last_id}.")
+
+    while not shutdown_event.is_set():
+        try:
+            response = await asyncio.to_thread(
+                redis_client.xread,
+                {ingestion_control.INGESTION_CONTROL_STREAM: last_id},
+                count=CONTROL_STREAM_BATCH_SIZE,
+                block=CONTROL_STREAM_BLOCK_MS
+            )
+            for _stream_name, entries in response or []:
+                for entry_id, fields in entries:
+                    try:
+                        await handle_control_command(registry, redis_client, fields)
+                    except Exception as e_cmd:
+                        logger.error(f"[CONTROL] Error applying control entry {entry_id} {fields}: {e_cmd}", exc_info=True)
+                    last_id = entry_id
+                await asyncio.to_thread(redis_client.set, ingestion_control.INGESTION_CONTROL_LAST_ID_KEY, last_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[CONTROL] Error reading control stream: {e}. Retrying in {CONTROL_STREAM_ERROR_BACKOFF_SECONDS}s.", exc_info=True)
+            await asyncio.sleep(CONTROL_STREAM_ERROR_BACKOFF_SECONDS)
+
+async def evict_idle_pairs(registry, redis_client) -> int:
+    """
+    Removes runtime-added pairs whose last viewer access is older than INGESTION_PAIR_IDLE_EVICTION_SECONDS
+    from the tracked set; the owning worker's rebalancer then stops them. Returns the number evicted.
+    """
+    now = int(time.time())
+    evicted = 0
+    tracked = await asyncio.to_thread(ingestion_control.get_tracked_pairs, redis_client)
+    for symbol, timeframe in sorted(tracked - registry.proactive_pairs):
+        member = ingestion_control.pair_member(symbol, timeframe)
+        last_access = await asyncio.to_thread(redis_client.zscore, ingestion_control.PAIR_LAST_ACCESS_KEY, member)
+        idle_seconds = now - int(last_access or 0)
+        if idle_seconds > settings.INGESTION_PAIR_IDLE_EVICTION_SECONDS:
+            logger.info(f"[CONTROL] Evicting {symbol}/{timeframe}: no viewers for {idle_seconds}s.")
+            await asyncio.to_thread(redis_client.srem, ingestion_control.TRACKED_PAIRS_KEY, member)
+            evicted += 1
+    if evicted:
+        registry.request_rebalance()
+    return evicted
+
+async def idle_pair_evictor(registry, redis_client, shutdown_event: asyncio.Event):
+    """Periodically evicts idle dynamic pairs until shutdown."""
+    while not shutdown_event.is_set():
+        try:
+            await asyncio.wait_for(shutdown_event.wait(), timeout=settings.INGESTION_IDLE_CHECK_INTERVAL_SECONDS)
+            break # Shutdown
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await evict_idle_pairs(registry, redis_client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"[CONTROL] Error while evicting idle pairs: {e}", exc_info=True)
@@ -0,0 +1,6 @@
+"""
+@file: __init__.py
+@description: Makes 'mock_exchange_server' a Python package. A local stand-in for the Binance REST API
+              (with enforced request weights) and the news APIs, for testing and benchmarking the fetchers offline.
+@dependencies: fastapi, uvicorn
+"""
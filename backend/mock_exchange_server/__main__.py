@@ -0,0 +1,23 @@
+"""
+Runs the mock exchange: python -m backend.mock_exchange_server [--port 8100] [--weight-limit 6000] [--latency-ms 50]
+Then set BINANCE_REST_BASE_URL=http://localhost:8100 for the ingestion service, and
+NEWSDATA_IO_BASE_URL=http://localhost:8100/api/1 and COINDESK_BASE_URL=http://localhost:8100 for the news fetcher.
+"""
+import argparse
+
+import uvicorn
+
+from .app import create_app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Binance REST API with enforced request weights, plus mock news endpoints.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--weight-limit", type=int, default=6000, help="Request weight allowed per window")
+    parser.add_argument("--window-seconds", type=float, default=60.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency per request, up to this much")
+    parser.add_argument("--news-request-limit", type=int, default=30, help="News requests allowed per window")
+    args = parser.parse_args()
+    app = create_app(args.weight_limit, args.window_seconds, args.latency_ms / 1000, args.jitter_ms / 1000, args.news_request_limit)
+    uvicorn.run(app, host=args.host, port=args.port)
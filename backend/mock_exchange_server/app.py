@@ -0,0 +1,220 @@
+"""
+@file: app.py
+@description: Mock Binance spot REST API (GET /api/v3/klines) with enforced request weights, plus the
+              NewsData.io (GET /api/1/latest) and CoinDesk (GET /news/v1/article/list) news endpoints.
+              Serves deterministic synthetic klines, reports X-MBX-USED-WEIGHT-1M on every response,
+              answers 429 + Retry-After when a window's weight limit is exceeded and 418 (temporary ban)
+              if the client keeps sending requests while rate limited, like the real exchange. The news
+              endpoints serve synthetic articles and have their own per-window request limit. Every
+              endpoint can add a fixed latency plus random jitter.
+@dependencies: fastapi
+"""
+import asyncio
+import hashlib
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from fastapi import FastAPI, Query
+from fastapi.responses import JSONResponse
+
+KLINES_REQUEST_WEIGHT = 2
+MAX_KLINES_LIMIT = 1000
+NEWSDATA_MAX_SIZE = 50
+COINDESK_MAX_LIMIT = 100
+NEWS_CATEGORIES = ("BTC", "ETH", "SOL", "MARKET", "REGULATION")
+# Requests sent while already rate limited (within the same window) before the IP is "banned"
+VIOLATIONS_BEFORE_BAN = 5
+BAN_WINDOWS = 2
+
+INTERVAL_MS = {
+    "1s": 1000, "1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+    "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000, "8h": 28_800_000,
+    "12h": 43_200_000, "1d": 86_400_000, "3d": 259_200_000, "1w": 604_800_000, "1M": 2_592_000_000,
+}
+
+
+@dataclass
+class ExchangeState:
+    """Weight accounting for the single simulated client IP, plus counters for tests."""
+    weight_limit: int
+    window_seconds: float
+    latency_seconds: float = 0.0
+    latency_jitter_seconds: float = 0.0
+    news_request_limit: int = 30 # News requests allowed per window, across both news endpoints
+    window_start: float = field(default_factory=time.monotonic)
+    used_weight: int = 0
+    violations_in_window: int = 0
+    banned_until: float = 0.0
+    news_requests_in_window: int = 0
+    requests_served: int = 0
+    rate_limited_responses: int = 0
+    ban_responses: int = 0
+    news_requests_served: int = 0
+    news_rate_limited_responses: int = 0
+
+    async def simulate_latency(self):
+        delay = self.latency_seconds + (random.uniform(0, self.latency_jitter_seconds) if self.latency_jitter_seconds else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def take_news_request(self, now: float) -> bool:
+        """Counts a news request against the window. False if the window's news limit is used up."""
+        self._roll_window(now)
+        if self.news_requests_in_window >= self.news_request_limit:
+            self.news_rate_limited_responses += 1
+            return False
+        self.news_requests_in_window += 1
+        self.news_requests_served += 1
+        return True
+
+    def _roll_window(self, now: float):
+        # Fixed windows, like Binance's per-minute counters
+        if now - self.window_start >= self.window_seconds:
+            elapsed_windows = math.floor((now - self.window_start) / self.window_seconds)
+            self.window_start += elapsed_windows * self.window_seconds
+            self.used_weight = 0
+            self.violations_in_window = 0
+            self.news_requests_in_window = 0
+
+    def seconds_until_window_reset(self, now: float) -> int:
+        return max(1, math.ceil(self.window_start + self.window_seconds - now))
+
+
+def _synthetic_price(symbol: str, open_time: int) -> float:
+    digest = hashlib.md5(f"{symbol}:{open_time}".encode()).digest()
+    return 100.0 + int.from_bytes(digest[:4], "big") / 2**32 * 10.0
+
+
+def generate_klines(symbol: str, interval: str, start_time: Optional[int], end_time: Optional[int], limit: int, now_ms: int) -> List[list]:
+    """Deterministic klines aligned to the interval, never past the current time (like the real API)."""
+    interval_ms = INTERVAL_MS[interval]
+    end_bound = now_ms if end_time is None else min(end_time, now_ms)
+    if start_time is None:
+        first_open = (end_bound // interval_ms - limit + 1) * interval_ms
+    else:
+        first_open = -(-start_time // interval_ms) * interval_ms # Round up to the interval
+    rows = []
+    open_time = first_open
+    while open_time <= end_bound and len(rows) < limit:
+        open_price = _synthetic_price(symbol, open_time)
+        close_price = _synthetic_price(symbol, open_time + interval_ms)
+        high_price = max(open_price, close_price) * 1.001
+        low_price = min(open_price, close_price) * 0.999
+        rows.append([
+            open_time, f"{open_price:.8f}", f"{high_price:.8f}", f"{low_price:.8f}", f"{close_price:.8f}",
+            "10.00000000", open_time + interval_ms - 1, f"{10 * close_price:.8f}", 42,
+            "5.00000000", f"{5 * close_price:.8f}", "0"
+        ])
+        open_time += interval_ms
+    return rows
+
+
+def generate_articles(count: int, now_s: int, id_prefix: str) -> List[dict]:
+    """Deterministic synthetic articles, one every 10 minutes back from now (stable ids between calls)."""
+    latest_slot = now_s // 600
+    articles = []
+    for slot in range(latest_slot, latest_slot - count, -1):
+        category = NEWS_CATEGORIES[slot % len(NEWS_CATEGORIES)]
+        sentiment = ("POSITIVE", "NEGATIVE", "NEUTRAL")[slot % 3]
+        articles.append({
+            "id": f"{id_prefix}{slot}", "published_on": slot * 600, "category": category, "sentiment": sentiment,
+            "title": f"{category} market update #{slot}",
+            "body": f"Synthetic {sentiment.lower()} coverage of {category} for offline benchmarks. " * 4,
+            "url": f"https://news.example.invalid/{id_prefix}{slot}", "source": "mocknews",
+        })
+    return articles
+
+
+def create_app(weight_limit: int = 6000, window_seconds: float = 60.0, latency_seconds: float = 0.0,
+               latency_jitter_seconds: float = 0.0, news_request_limit: int = 30) -> FastAPI:
+    """
+    Builds a mock exchange. `window_seconds` shortens the weight window for fast tests; the header is
+    still called X-MBX-USED-WEIGHT-1M. The ExchangeState is exposed as app.state.exchange.
+    """
+    app = FastAPI(title="Mock Binance REST API")
+    state = ExchangeState(weight_limit=weight_limit, window_seconds=window_seconds, latency_seconds=latency_seconds,
+                          latency_jitter_seconds=latency_jitter_seconds, news_request_limit=news_request_limit)
+    app.state.exchange = state
+
+    @app.get("/api/v3/klines")
+    async def klines(
+        symbol: str,
+        interval: str,
+        startTime: Optional[int] = Query(None),
+        endTime: Optional[int] = Query(None),
+        limit: int = Query(500, ge=1, le=MAX_KLINES_LIMIT),
+    ):
+        await state.simulate_latency()
+        now = time.monotonic()
+
+        if now < state.banned_until:
+            state.ban_responses += 1
+            retry_after = max(1, math.ceil(state.banned_until - now))
+            return JSONResponse({"code": -1003, "msg": "Way too many requests; IP banned."}, status_code=418,
+                                headers={"Retry-After": str(retry_after)})
+
+        state._roll_window(now)
+        if state.used_weight + KLINES_REQUEST_WEIGHT > state.weight_limit:
+            state.violations_in_window += 1
+            if state.violations_in_window > VIOLATIONS_BEFORE_BAN:
+                state.banned_until = now + BAN_WINDOWS * state.window_seconds
+                state.ban_responses += 1
+                return JSONResponse({"code": -1003, "msg": "Way too many requests; IP banned."}, status_code=418,
+                                    headers={"Retry-After": str(math.ceil(BAN_WINDOWS * state.window_seconds))})
+            state.rate_limited_responses += 1
+            return JSONResponse({"code": -1003, "msg": "Too much request weight used."}, status_code=429,
+                                headers={"Retry-After": str(state.seconds_until_window_reset(now)),
+                                         "X-MBX-USED-WEIGHT-1M": str(state.used_weight)})
+
+        if interval not in INTERVAL_MS:
+            return JSONResponse({"code": -1120, "msg": "Invalid interval."}, status_code=400)
+
+        state.used_weight += KLINES_REQUEST_WEIGHT
+        state.requests_served += 1
+        rows = generate_klines(symbol.upper(), interval, startTime, endTime, limit, int(time.time() * 1000))
+        return JSONResponse(rows, headers={"X-MBX-USED-WEIGHT-1M": str(state.used_weight)})
+
+    @app.get("/api/1/latest")
+    async def newsdata_latest(
+        apikey: str,
+        q: Optional[str] = None,
+        language: Optional[str] = None,
+        size: int = Query(10, ge=1, le=NEWSDATA_MAX_SIZE),
+    ):
+        await state.simulate_latency()
+        now = time.monotonic()
+        if not state.take_news_request(now):
+            return JSONResponse({"status": "error", "results": {"message": "Rate limit exceeded", "code": "RateLimitExceeded"}},
+                                status_code=429, headers={"Retry-After": str(state.seconds_until_window_reset(now))})
+        results = [{
+            "article_id": article["id"], "title": f"{q or article['category']}: {article['title']}",
+            "description": article["body"][:200], "link": article["url"], "source_id": article["source"],
+            "image_url": None, "pubDate": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(article["published_on"])),
+        } for article in generate_articles(size, int(time.time()), "nd")]
+        return {"status": "success", "totalResults": len(results), "results": results, "nextPage": None}
+
+    @app.get("/news/v1/article/list")
+    async def coindesk_article_list(
+        limit: int = Query(10, ge=1, le=COINDESK_MAX_LIMIT),
+        lang: str = "EN",
+        offset: int = 0,
+    ):
+        await state.simulate_latency()
+        now = time.monotonic()
+        if not state.take_news_request(now):
+            return JSONResponse({"Data": [], "Err": {"type": 99, "message": "You are over your rate limit."}},
+                                status_code=429, headers={"Retry-After": str(state.seconds_until_window_reset(now))})
+        data = [{
+            "ID": article["id"], "TITLE": article["title"], "URL": article["url"], "PUBLISHED_ON": article["published_on"],
+            "BODY": article["body"], "IMAGE_URL": None, "SENTIMENT": article["sentiment"],
+            "SOURCE_DATA": {"NAME": article["source"]}, "CATEGORY_DATA": [{"CATEGORY": article["category"]}],
+        } for article in generate_articles(offset + limit, int(time.time()), "cd")[offset:]]
+        return {"Data": data, "Err": {}}
+
+    return app
+
+
+app = create_app()
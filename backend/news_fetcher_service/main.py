@@ -19,6 +19,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from backend.app.database import SessionLocal
 from backend.app.models import NewsArticle
 from backend.app.config import settings
+from backend.app.http_clients import NEWSDATA_UPSTREAM, COINDESK_UPSTREAM, get_http_client, close_http_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,11 +30,11 @@ sentiment_analyzer = SentimentIntensityAnalyzer()
 
 # NewsData.io for Stocks
 NEWSDATA_IO_API_TOKEN = settings.NEWSDATA_IO_API_TOKEN
-NEWSDATA_IO_BASE_URL = "https://newsdata.io/api/1"
+NEWSDATA_IO_BASE_URL = settings.NEWSDATA_IO_BASE_URL
 
 # CoinDesk for Crypto
 COINDESK_API_TOKEN = settings.COINDESK_API_TOKEN
-COINDESK_BASE_URL = "https://data-api.coindesk.com"
+COINDESK_BASE_URL = settings.COINDESK_BASE_URL
 
 STOCK_SYMBOLS_TO_TRACK = ["AAPL", "MSFT", "GOOG", "AMZN", "TSLA", "NVDA"]
 CRYPTO_SYMBOLS_TO_TRACK_INTERNAL = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
@@ -77,52 +78,52 @@ async def fetch_stock_news(symbol: str):
         "language": "en",
         "size": NEWSDATA_FETCH_LIMIT_PER_REQUEST,
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            logger.info(f"Fetching stock news for {symbol} from NewsData.io...")
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
+    client = get_http_client(NEWSDATA_UPSTREAM)
+    try:
+        logger.info(f"Fetching stock news for {symbol} from NewsData.io...")
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        data = response.json()
+        
+        raw_articles = data.get("results", [])
+        logger.info(f"Received {len(raw_articles)} raw articles for stock {symbol} from NewsData.io.")
+
+        for article in raw_articles:
+            headline = article.get("title", "")
+            snippet = article.get("description", "")
+            text_for_sentiment = f"{headline}. {snippet}"
             
-            raw_articles = data.get("results", [])
-            logger.info(f"Received {len(raw_articles)} raw articles for stock {symbol} from NewsData.io.")
-
-            for article in raw_articles:
-                headline = article.get("title", "")
-                snippet = article.get("description", "")
-                text_for_sentiment = f"{headline}. {snippet}"
-                
-                vader_score = None
-                derived_category = "Neutral" # Default
-
-                if settings.USE_VADER_SENTIMENT_ANALYSIS and text_for_sentiment.strip() and text_for_sentiment.strip() != '.':
-                    try:
-                        vs = sentiment_analyzer.polarity_scores(text_for_sentiment)
-                        vader_score = vs['compound']
-                        derived_category = map_sentiment_score_to_category(vader_score)
-                        logger.debug(f"VADER for NewsData {article.get('article_id')}: Score {vader_score}, Cat: {derived_category}")
-                    except Exception as e:
-                        logger.error(f"Error during VADER sentiment analysis for NewsData article {article.get('article_id')}: {e}")
-                        # Keep default Neutral category and None score on VADER error
-                
-                articles_data.append({
-                    "external_article_id": article.get("article_id"),
-                    "symbol": symbol,
-                    "headline": headline,
-                    "snippet": snippet,
-                    "source_name": article.get("source_id"),
-                    "article_url": article.get("link"),
-                    "image_url": article.get("image_url"),
-                    "published_at": article.get("pubDate"), # NewsData.io pubDate is usually a string, needs conversion in DB or here if not already
-                    "sentiment_score_external": vader_score, # Store VADER compound score
-                    "sentiment_category_derived": derived_category
-                })
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error fetching stock news for {symbol}: {e.response.status_code} - {e.response.text}")
-        except httpx.RequestError as e:
-            logger.error(f"Request error fetching stock news for {symbol}: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error fetching stock news for {symbol}: {e}")
+            vader_score = None
+            derived_category = "Neutral" # Default
+
+            if settings.USE_VADER_SENTIMENT_ANALYSIS and text_for_sentiment.strip() and text_for_sentiment.strip() != '.':
+                try:
+                    vs = sentiment_analyzer.polarity_scores(text_for_sentiment)
+                    vader_score = vs['compound']
+                    derived_category = map_sentiment_score_to_category(vader_score)
+                    logger.debug(f"VADER for NewsData {article.get('article_id')}: Score {vader_score}, Cat: {derived_category}")
+                except Exception as e:
+                    logger.error(f"Error during VADER sentiment analysis for NewsData article {article.get('article_id')}: {e}")
+                    # Keep default Neutral category and None score on VADER error
+            
+            articles_data.append({
+                "external_article_id": article.get("article_id"),
+                "symbol": symbol,
+                "headline": headline,
+                "snippet": snippet,
+                "source_name": article.get("source_id"),
+                "article_url": article.get("link"),
+                "image_url": article.get("image_url"),
+                "published_at": article.get("pubDate"), # NewsData.io pubDate is usually a string, needs conversion in DB or here if not already
+                "sentiment_score_external": vader_score, # Store VADER compound score
+                "sentiment_category_derived": derived_category
+            })
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error fetching stock news for {symbol}: {e.response.status_code} - {e.response.text}")
+    except httpx.RequestError as e:
+        logger.error(f"Request error fetching stock news for {symbol}: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error fetching stock news for {symbol}: {e}")
     return articles_data
 
 async def fetch_coindesk_crypto_news(internal_symbols_to_map: list[str]):
@@ -138,116 +139,116 @@ async def fetch_coindesk_crypto_news(internal_symbols_to_map: list[str]):
         "offset": 0 
     }
 
-    async with httpx.AsyncClient() as client:
+    client = get_http_client(COINDESK_UPSTREAM)
+    try:
+        logger.info(f"Fetching crypto news from CoinDesk with params: {params}...")
+        response = await client.get(url, headers=headers, params=params)
+        response.raise_for_status()
+        
         try:
-            logger.info(f"Fetching crypto news from CoinDesk with params: {params}...")
-            response = await client.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            
-            try:
-                data = response.json()
-                logger.info(f"CoinDesk Full Response JSON: {data}") # Log the full JSON response
-            except Exception as json_e:
-                logger.error(f"Error decoding CoinDesk JSON response: {json_e}")
-                logger.error(f"CoinDesk Raw Response Text: {response.text}")
-                return [] # Cannot proceed without valid JSON
-
-            raw_articles = data.get("Data", []) # CoinDesk uses "Data" (capital D)
-            if not isinstance(raw_articles, list): # Ensure it's a list
-                logger.error(f"CoinDesk 'Data' field is not a list: {raw_articles}")
-                raw_articles = []
-                
-            logger.info(f"Received {len(raw_articles)} raw articles from CoinDesk.")
+            data = response.json()
+            logger.info(f"CoinDesk Full Response JSON: {data}") # Log the full JSON response
+        except Exception as json_e:
+            logger.error(f"Error decoding CoinDesk JSON response: {json_e}")
+            logger.error(f"CoinDesk Raw Response Text: {response.text}")
+            return [] # Cannot proceed without valid JSON
+
+        raw_articles = data.get("Data", []) # CoinDesk uses "Data" (capital D)
+        if not isinstance(raw_articles, list): # Ensure it's a list
+            logger.error(f"CoinDesk 'Data' field is not a list: {raw_articles}")
+            raw_articles = []
             
-            if data.get("Err") and data.get("Err") != {}:
-                 logger.error(f"CoinDesk API returned an error in the 'Err' field: {data.get('Err')}")
+        logger.info(f"Received {len(raw_articles)} raw articles from CoinDesk.")
+        
+        if data.get("Err") and data.get("Err") != {}:
+             logger.error(f"CoinDesk API returned an error in the 'Err' field: {data.get('Err')}")
 
 
-            # Reverse map for quick lookup: "btc" -> "BTCUSDT"
-            category_to_internal_symbol_map = {v.lower(): k for k, v in CRYPTO_CATEGORY_MAP_COINDESK.items()}
+        # Reverse map for quick lookup: "btc" -> "BTCUSDT"
+        category_to_internal_symbol_map = {v.lower(): k for k, v in CRYPTO_CATEGORY_MAP_COINDESK.items()}
 
-            for article in raw_articles:
-                article_id = article.get("ID")
-                title = article.get("TITLE")
-                article_url = article.get("URL")
-                published_on_ts = article.get("PUBLISHED_ON") # This is a Unix timestamp
-                
-                published_at_dt = None
-                if published_on_ts:
+        for article in raw_articles:
+            article_id = article.get("ID")
+            title = article.get("TITLE")
+            article_url = article.get("URL")
+            published_on_ts = article.get("PUBLISHED_ON") # This is a Unix timestamp
+            
+            published_at_dt = None
+            if published_on_ts:
+                try:
+                    # Convert Unix timestamp to UTC datetime object
+                    published_at_dt = datetime.datetime.fromtimestamp(int(published_on_ts), tz=datetime.timezone.utc)
+                except (ValueError, TypeError) as ts_e:
+                    logger.warning(f"Could not convert timestamp '{published_on_ts}' for article ID {article_id}: {ts_e}")
+                    continue # Skip article if timestamp is invalid
+
+            source_name = article.get("SOURCE_DATA", {}).get("NAME")
+            
+            if not all([article_id, title, article_url, published_at_dt, source_name]): # Check published_at_dt
+                logger.warning(f"CoinDesk article ID {article_id} (Title: {title}) missing critical fields or invalid timestamp. Skipping.")
+                continue
+
+            # Determine sentiment
+            vader_score = None
+            api_sentiment_category = article.get("SENTIMENT", "NEUTRAL").capitalize()
+            if api_sentiment_category not in ["Positive", "Negative", "Neutral"]:
+                api_sentiment_category = "Neutral"
+            
+            derived_category = api_sentiment_category # Default to API sentiment
+
+            if settings.USE_VADER_SENTIMENT_ANALYSIS:
+                body_snippet = article.get("BODY", "")[:500] # Use snippet for VADER
+                text_for_sentiment = f"{title}. {body_snippet}"
+                if text_for_sentiment.strip() and text_for_sentiment.strip() != '.':
                     try:
-                        # Convert Unix timestamp to UTC datetime object
-                        published_at_dt = datetime.datetime.fromtimestamp(int(published_on_ts), tz=datetime.timezone.utc)
-                    except (ValueError, TypeError) as ts_e:
-                        logger.warning(f"Could not convert timestamp '{published_on_ts}' for article ID {article_id}: {ts_e}")
-                        continue # Skip article if timestamp is invalid
-
-                source_name = article.get("SOURCE_DATA", {}).get("NAME")
-                
-                if not all([article_id, title, article_url, published_at_dt, source_name]): # Check published_at_dt
-                    logger.warning(f"CoinDesk article ID {article_id} (Title: {title}) missing critical fields or invalid timestamp. Skipping.")
-                    continue
-
-                # Determine sentiment
-                vader_score = None
-                api_sentiment_category = article.get("SENTIMENT", "NEUTRAL").capitalize()
-                if api_sentiment_category not in ["Positive", "Negative", "Neutral"]:
-                    api_sentiment_category = "Neutral"
-                
-                derived_category = api_sentiment_category # Default to API sentiment
-
-                if settings.USE_VADER_SENTIMENT_ANALYSIS:
-                    body_snippet = article.get("BODY", "")[:500] # Use snippet for VADER
-                    text_for_sentiment = f"{title}. {body_snippet}"
-                    if text_for_sentiment.strip() and text_for_sentiment.strip() != '.':
-                        try:
-                            vs = sentiment_analyzer.polarity_scores(text_for_sentiment)
-                            vader_score = vs['compound']
-                            derived_category = map_sentiment_score_to_category(vader_score) # VADER overrides API if successful
-                            logger.debug(f"VADER for CoinDesk {article_id}: Score {vader_score}, Cat: {derived_category}. (API was: {api_sentiment_category})")
-                        except Exception as e:
-                            logger.error(f"Error during VADER sentiment analysis for CoinDesk article {article_id}: {e}. Falling back to API sentiment: {api_sentiment_category}")
-                            # On VADER error, derived_category remains api_sentiment_category
-                    else:
-                        logger.debug(f"Not enough text for VADER on CoinDesk article {article_id}. Using API sentiment: {api_sentiment_category}")
-                        # derived_category remains api_sentiment_category
+                        vs = sentiment_analyzer.polarity_scores(text_for_sentiment)
+                        vader_score = vs['compound']
+                        derived_category = map_sentiment_score_to_category(vader_score) # VADER overrides API if successful
+                        logger.debug(f"VADER for CoinDesk {article_id}: Score {vader_score}, Cat: {derived_category}. (API was: {api_sentiment_category})")
+                    except Exception as e:
+                        logger.error(f"Error during VADER sentiment analysis for CoinDesk article {article_id}: {e}. Falling back to API sentiment: {api_sentiment_category}")
+                        # On VADER error, derived_category remains api_sentiment_category
                 else:
-                    logger.debug(f"VADER disabled. Using CoinDesk API sentiment for {article_id}: {api_sentiment_category}")
-                    # derived_category is already api_sentiment_category
-
-                snippet_to_store = article.get("BODY", "")[:500]
-                image_url = article.get("IMAGE_URL")
-
-                matched_internal_symbols = set()
-                categories_data = article.get("CATEGORY_DATA", [])
-                if isinstance(categories_data, list):
-                    for cat_obj in categories_data: 
-                        cat_slug = cat_obj.get("CATEGORY", "").lower() # Use "CATEGORY" field, not "SLUG"
-                        if cat_slug in category_to_internal_symbol_map:
-                            matched_internal_symbols.add(category_to_internal_symbol_map[cat_slug])
-                
-                if not matched_internal_symbols:
-                    logger.debug(f"CoinDesk article {article_id} did not match any tracked crypto categories. Categories from article: {[c.get('CATEGORY') for c in categories_data if c.get('CATEGORY')]}")
-                    continue
-
-                for internal_symbol in matched_internal_symbols:
-                    articles_to_save.append({
-                        "external_article_id": f"coindesk_{article_id}", 
-                        "symbol": internal_symbol,
-                        "headline": title,
-                        "snippet": snippet_to_store,
-                        "source_name": source_name,
-                        "article_url": article_url,
-                        "image_url": image_url,
-                        "published_at": published_at_dt, 
-                        "sentiment_score_external": vader_score, # Store VADER compound score (or None if not used/failed)
-                        "sentiment_category_derived": derived_category
-                    })
-        except httpx.HTTPStatusError as e:
-            logger.error(f"HTTP error fetching CoinDesk crypto news: {e.response.status_code} - {e.response.text}")
-        except httpx.RequestError as e:
-            logger.error(f"Request error fetching CoinDesk crypto news: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error fetching CoinDesk crypto news: {e}", exc_info=True)
+                    logger.debug(f"Not enough text for VADER on CoinDesk article {article_id}. Using API sentiment: {api_sentiment_category}")
+                    # derived_category remains api_sentiment_category
+            else:
+                logger.debug(f"VADER disabled. Using CoinDesk API sentiment for {article_id}: {api_sentiment_category}")
+                # derived_category is already api_sentiment_category
+
+            snippet_to_store = article.get("BODY", "")[:500]
+            image_url = article.get("IMAGE_URL")
+
+            matched_internal_symbols = set()
+            categories_data = article.get("CATEGORY_DATA", [])
+            if isinstance(categories_data, list):
+                for cat_obj in categories_data: 
+                    cat_slug = cat_obj.get("CATEGORY", "").lower() # Use "CATEGORY" field, not "SLUG"
+                    if cat_slug in category_to_internal_symbol_map:
+                        matched_internal_symbols.add(category_to_internal_symbol_map[cat_slug])
+            
+            if not matched_internal_symbols:
+                logger.debug(f"CoinDesk article {article_id} did not match any tracked crypto categories. Categories from article: {[c.get('CATEGORY') for c in categories_data if c.get('CATEGORY')]}")
+                continue
+
+            for internal_symbol in matched_internal_symbols:
+                articles_to_save.append({
+                    "external_article_id": f"coindesk_{article_id}", 
+                    "symbol": internal_symbol,
+                    "headline": title,
+                    "snippet": snippet_to_store,
+                    "source_name": source_name,
+                    "article_url": article_url,
+                    "image_url": image_url,
+                    "published_at": published_at_dt, 
+                    "sentiment_score_external": vader_score, # Store VADER compound score (or None if not used/failed)
+                    "sentiment_category_derived": derived_category
+                })
+    except httpx.HTTPStatusError as e:
+        logger.error(f"HTTP error fetching CoinDesk crypto news: {e.response.status_code} - {e.response.text}")
+    except httpx.RequestError as e:
+        logger.error(f"Request error fetching CoinDesk crypto news: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error fetching CoinDesk crypto news: {e}", exc_info=True)
     return articles_to_save
 
 def map_sentiment_score_to_category(score: float | None) -> str:
@@ -336,6 +337,12 @@ async def main_loop():
         logger.info(f"Main news fetching cycle complete. Sleeping for {GLOBAL_FETCH_INTERVAL_SECONDS} seconds.")
         await asyncio.sleep(GLOBAL_FETCH_INTERVAL_SECONDS)
 
+async def run_service():
+    try:
+        await main_loop()
+    finally:
+        await close_http_clients()
+
 if __name__ == "__main__":
     # This allows running the service directly, e.g., python -m backend.news_fetcher_service.main
     if not NEWSDATA_IO_API_TOKEN:
@@ -345,7 +352,7 @@ if __name__ == "__main__":
         logger.error("COINDESK_API_TOKEN not found in environment settings. Exiting.")
         sys.exit(1)
     try:
-        asyncio.run(main_loop())
+        asyncio.run(run_service())
     except KeyboardInterrupt:
         logger.info("News Fetcher Service shutting down...")
     finally:
@@ -131,7 +131,6 @@ async def test_get_klines_with_data_from_db(test_client: AsyncClient, db_session
 async def test_get_klines_from_redis_cache(test_client: AsyncClient, mocker):
     """Test fetching klines primarily from Redis cache."""
     import json
-    from backend.app.config import settings
     from unittest.mock import MagicMock
 
     symbol = "REDISCOIN/USD"
@@ -141,9 +140,9 @@ async def test_get_klines_from_redis_cache(test_client: AsyncClient, mocker):
     # Timestamps should be in milliseconds for JSON, Pydantic will parse them into datetime
     # for KlineRead's datetime fields.
     current_time_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
-    # Ensure these times are within API_REDIS_LOOKBACK_MS
-    mock_kline_redis_1_ot = current_time_ms - (settings.API_REDIS_LOOKBACK_MS // 2) - 60000 
-    mock_kline_redis_2_ot = current_time_ms - (settings.API_REDIS_LOOKBACK_MS // 2)
+    # The newest closed klines, i.e. inside the pair's cached Redis window
+    mock_kline_redis_1_ot = current_time_ms - 3 * 60000
+    mock_kline_redis_2_ot = current_time_ms - 2 * 60000
 
     mock_redis_data = [
         json.dumps({
@@ -177,9 +176,8 @@ async def test_get_klines_from_redis_cache(test_client: AsyncClient, mocker):
     mocker.patch("backend.app.routers.data.get_redis_connection", return_value=mock_redis_client)
 
 
-    # API call - no start/end, should rely on API_REDIS_LOOKBACK_MS
-    # and MAX_KLINES_IN_REDIS for its internal Redis query range.
-    # The DB should not be hit if Redis provides enough data within the lookback window.
+    # API call - no start/end: the newest klines are read from the cached Redis window.
+    # The DB should not be hit if Redis provides enough data within the window.
     response = await test_client.get(f"/data/klines/{symbol}/{timeframe}?limit=2")
     
     assert response.status_code == status.HTTP_200_OK
@@ -221,7 +219,6 @@ async def test_get_klines_from_redis_and_db(test_client: AsyncClient, db_session
     """Test fetching klines from both Redis cache and the database."""
     import json
     from backend.app.models import Kline
-    from backend.app.config import settings
     from decimal import Decimal
     from unittest.mock import MagicMock
 
@@ -232,9 +229,9 @@ async def test_get_klines_from_redis_and_db(test_client: AsyncClient, db_session
     current_time_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
 
     # Mock data for Redis (more recent)
-    # Ensure these times are within API_REDIS_LOOKBACK_MS
-    redis_kline_1_ot = current_time_ms - (settings.API_REDIS_LOOKBACK_MS // 3) - 5*60000 # 5m before next
-    redis_kline_2_ot = current_time_ms - (settings.API_REDIS_LOOKBACK_MS // 3)
+    # The newest closed klines, i.e. inside the pair's cached Redis window
+    redis_kline_1_ot = current_time_ms - 2 * 5*60000 # 5m before next
+    redis_kline_2_ot = current_time_ms - 5*60000
 
     mock_redis_data = [
         json.dumps({
@@ -383,4 +380,183 @@ async def test_get_klines_backfill_status_reporting(test_client: AsyncClient, mo
     assert data_malformed["klines"] == []
     assert data_malformed["backfill_status"] is None # Expect graceful handling
     assert data_malformed["backfill_last_updated_ts"] is None
-    mock_redis_client.get.assert_called_once_with(f"backfill_status:{symbol.upper()}:{timeframe}") 
\ No newline at end of file
+    mock_redis_client.get.assert_called_once_with(f"backfill_status:{symbol.upper()}:{timeframe}") 
+async def test_get_klines_requests_ingestion_for_untracked_pair(test_client: AsyncClient, override_get_db):
+    """Reading an untracked pair records the access and sends a subscribe command to the ingestion service."""
+    from unittest.mock import MagicMock, patch
+
+    mock_redis_client = MagicMock()
+    mock_redis_client.get.return_value = None
+    mock_redis_client.zrangebyscore.return_value = []
+    mock_redis_client.sismember.return_value = False
+    mock_redis_client.set.return_value = True
+
+    with patch("backend.app.routers.data.get_redis_connection", return_value=mock_redis_client):
+        response = await test_client.get("/data/klines/DOGEUSDT/15m")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["ingestion_requested"] is True
+    mock_redis_client.zadd.assert_called_once()
+    fields = mock_redis_client.xadd.call_args[0][1]
+    assert fields["symbol"] == "DOGEUSDT" and fields["timeframe"] == "15m"
+
+async def test_get_klines_reports_backfill_progress(test_client: AsyncClient, override_get_db):
+    """A running backfill job's progress, rate and ETA are returned next to the status string."""
+    import json
+    from unittest.mock import MagicMock, patch
+
+    status_payload = {
+        "status": "in_progress_startup", "last_updated_ts": 1700000000,
+        "progress_pct": 42.5, "rows_written": 8500, "rows_per_second": 1200.0, "eta_seconds": 9,
+        "fetched_until_ms": 1699990000000, "target_end_ms": 1700000000000, "resumed_from_ms": 1699980000000,
+    }
+    mock_redis_client = MagicMock()
+    mock_redis_client.get.side_effect = lambda key: json.dumps(status_payload) if key.startswith("backfill_status:") else None
+    mock_redis_client.zrangebyscore.return_value = []
+    mock_redis_client.sismember.return_value = True
+
+    with patch("backend.app.routers.data.get_redis_connection", return_value=mock_redis_client):
+        response = await test_client.get("/data/klines/BTCUSDT/1m")
+
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["backfill_status"] == "in_progress_startup"
+    assert data["backfill_progress"]["progress_pct"] == 42.5
+    assert data["backfill_progress"]["eta_seconds"] == 9
+    assert data["backfill_progress"]["resumed_from_ms"] == 1699980000000
+
+async def test_get_pair_coverage_returns_latest_scan(test_client: AsyncClient):
+    import json
+    from unittest.mock import MagicMock, patch
+    from backend.app.main import app
+    from backend.app.security import get_current_active_user
+
+    report = {
+        "symbol": "BTCUSDT", "timeframe": "1m", "first_open_time_ms": 0, "last_open_time_ms": 600000,
+        "present_klines": 9, "missing_klines": 2, "coverage_pct": 81.818, "missing_range_count": 1,
+        "missing_ranges": [[60000, 180000]], "unfillable_ranges": [], "scanned_at": 1700000000,
+    }
+    mock_redis_client = MagicMock()
+    mock_redis_client.get.side_effect = lambda key: json.dumps(report) if key == "ingestion:coverage:BTCUSDT:1m" else None
+    app.dependency_overrides[get_current_active_user] = lambda: MagicMock(id=1)
+    try:
+        with patch("backend.app.routers.data.get_redis_connection", return_value=mock_redis_client):
+            found = await test_client.get("/data/ingestion/coverage/btcusdt/1m")
+            missing = await test_client.get("/data/ingestion/coverage/ETHUSDT/1m")
+    finally:
+        del app.dependency_overrides[get_current_active_user]
+
+    assert found.status_code == status.HTTP_200_OK
+    assert found.json()["missing_ranges"] == [[60000, 180000]]
+    assert missing.status_code == status.HTTP_404_NOT_FOUND
+
+async def test_scrolling_past_stored_history_requests_an_older_backfill(test_client: AsyncClient, db_session, override_get_db):
+    """A read that runs out of stored klines queues the older range once and reports its backfill status."""
+    from decimal import Decimal
+    from unittest.mock import ANY, MagicMock, patch
+    from backend.app.models import Kline
+    from backend.app import ingestion_control
+
+    oldest = datetime(2024, 1, 1, 0, 10, tzinfo=timezone.utc)
+    db_session.add_all([
+        Kline(symbol="BTCUSDT", timeframe="1m", open_time=oldest + timedelta(minutes=i), close_time=oldest + timedelta(minutes=i, seconds=59),
+              open_price=Decimal("1"), high_price=Decimal("1"), low_price=Decimal("1"), close_price=Decimal("1"), volume=Decimal("1"),
+              quote_asset_volume=Decimal("1"), number_of_trades=1, taker_buy_base_asset_volume=Decimal("1"), taker_buy_quote_asset_volume=Decimal("1"))
+        for i in range(3)
+    ])
+    db_session.commit()
+    oldest_ms = int(oldest.timestamp() * 1000)
+    end_ms = oldest_ms + 2 * 60_000
+    # 7 of the 10 requested klines are missing before the oldest stored one; the range start is page-aligned
+    expected_start_ms = (oldest_ms - 7 * 60_000) // (1000 * 60_000) * (1000 * 60_000)
+    request_key = ingestion_control.backfill_request_key("BTCUSDT", "1m", expected_start_ms, oldest_ms)
+
+    first_reader, second_reader = MagicMock(), MagicMock()
+    for reader in (first_reader, second_reader):
+        reader.zrangebyscore.return_value = []
+        reader.sismember.return_value = True
+    first_reader.get.return_value = None
+    first_reader.set.return_value = True
+    second_reader.get.side_effect = lambda key: ingestion_control.BACKFILL_STATUS_IN_PROGRESS if key == request_key else None
+    second_reader.set.side_effect = lambda key, *args, **kwargs: not key == request_key # Lock already held
+
+    with patch("backend.app.routers.data.get_redis_connection", return_value=first_reader):
+        first = await test_client.get(f"/data/klines/BTCUSDT/1m?end_ms={end_ms}&limit=10")
+    with patch("backend.app.routers.data.get_redis_connection", return_value=second_reader):
+        second = await test_client.get(f"/data/klines/BTCUSDT/1m?end_ms={end_ms}&limit=10")
+
+    assert len(first.json()["klines"]) == 3
+    assert first.json()["backfill_status"] == ingestion_control.BACKFILL_STATUS_QUEUED
+    first_reader.zadd.assert_any_call(
+        ingestion_control.BACKFILL_REQUEST_QUEUE_KEY,
+        {ingestion_control.backfill_request_member("BTCUSDT", "1m", expected_start_ms, oldest_ms): ANY}
+    )
+    assert second.json()["backfill_status"] == ingestion_control.BACKFILL_STATUS_IN_PROGRESS
+    assert all(c.args[0] != ingestion_control.BACKFILL_REQUEST_QUEUE_KEY for c in second_reader.zadd.call_args_list)
+
+async def test_read_inside_the_cached_window_is_served_from_redis(test_client: AsyncClient, db_session, override_get_db):
+    """A range days old but inside the pair's Redis window is answered from Redis, without the DB."""
+    from unittest.mock import MagicMock, patch
+    from backend.app import kline_cache_codec
+
+    oldest_cached_ms = int((datetime.now(timezone.utc) - timedelta(days=3)).timestamp() * 1000) // 60_000 * 60_000
+    members = [
+        kline_cache_codec.encode_member(oldest_cached_ms + i * 60_000, oldest_cached_ms + i * 60_000 + 59_999, 5, True,
+                                        "1", "2", "0.5", str(i), "10", "15", "4", "6")
+        for i in range(5)
+    ]
+    reader = MagicMock()
+    reader.get.return_value = None
+    reader.sismember.return_value = True
+    reader.zrange.side_effect = lambda key, start, end, withscores: [(members[start], float(oldest_cached_ms + start % 5 * 60_000))]
+    reader.zrevrangebyscore.side_effect = lambda key, max_score, min_score, start, num: [
+        m for m in reversed(members) if min_score <= kline_cache_codec.decode_members([m])["open_time"][0] <= max_score
+    ][start:start + num]
+
+    start_ms, end_ms = oldest_cached_ms + 60_000, oldest_cached_ms + 3 * 60_000
+    with patch("backend.app.routers.data.get_redis_connection", return_value=reader), \
+         patch("backend.app.routers.data.kline_queries.fetch_kline_rows") as fetch_from_db:
+        response = await test_client.get(f"/data/klines/BTCUSDT/1m?start_ms={start_ms}&end_ms={end_ms}&limit=10")
+
+    klines = response.json()["klines"]
+    assert [k["open_time"] for k in klines] == [start_ms, start_ms + 60_000, end_ms]
+    assert [k["close_price"] for k in klines] == [1.0, 2.0, 3.0]
+    assert klines[0]["symbol"] == "BTCUSDT" and klines[0]["quote_asset_volume"] == 15.0
+    fetch_from_db.assert_not_called()
+
+async def test_read_over_a_hole_in_the_cached_window_is_answered_by_the_db(test_client: AsyncClient, db_session, override_get_db):
+    """A kline missing from the ZSET (written only to the DB) sends the whole read to the DB instead of returning the hole."""
+    from decimal import Decimal
+    from unittest.mock import MagicMock, patch
+    from backend.app import kline_cache_codec
+    from backend.app.models import Kline
+
+    oldest_cached = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    oldest_cached_ms = int(oldest_cached.timestamp() * 1000)
+    db_session.add_all([
+        Kline(symbol="BTCUSDT", timeframe="1m", open_time=oldest_cached + timedelta(minutes=i), close_time=oldest_cached + timedelta(minutes=i, seconds=59),
+              open_price=Decimal("1"), high_price=Decimal("2"), low_price=Decimal("0.5"), close_price=Decimal(str(i)), volume=Decimal("10"),
+              quote_asset_volume=Decimal("15"), number_of_trades=5, taker_buy_base_asset_volume=Decimal("4"), taker_buy_quote_asset_volume=Decimal("6"))
+        for i in range(5)
+    ])
+    db_session.commit()
+    cached = {
+        oldest_cached_ms + i * 60_000: kline_cache_codec.encode_member(oldest_cached_ms + i * 60_000, oldest_cached_ms + i * 60_000 + 59_999, 5, True,
+                                                                      "1", "2", "0.5", str(i), "10", "15", "4", "6")
+        for i in (0, 1, 3, 4) # The gap fill wrote minute 2 to the DB only
+    }
+    reader = MagicMock()
+    reader.get.return_value = None
+    reader.sismember.return_value = True
+    reader.zrange.side_effect = lambda key, start, end, withscores: [(m, float(ms)) for ms, m in sorted(cached.items())][start:None if start == -1 else start + 1]
+    reader.zrevrangebyscore.side_effect = lambda key, max_score, min_score, start, num: [
+        m for ms, m in sorted(cached.items(), reverse=True) if min_score <= ms <= max_score
+    ][start:start + num]
+
+    start_ms, end_ms = oldest_cached_ms + 60_000, oldest_cached_ms + 3 * 60_000
+    with patch("backend.app.routers.data.get_redis_connection", return_value=reader):
+        response = await test_client.get(f"/data/klines/BTCUSDT/1m?start_ms={start_ms}&end_ms={end_ms}&limit=10")
+
+    klines = response.json()["klines"]
+    assert [k["open_time"] for k in klines] == [start_ms, start_ms + 60_000, end_ms]
+    assert [k["close_price"] for k in klines] == [1.0, 2.0, 3.0]
@@ -0,0 +1,85 @@
+"""
+Tests for the instrumented connection pool: checkout statistics, shedding checkouts once the pool is exhausted
+and enough are waiting, the API answering a saturated pool with 503 and Retry-After, and the admin-only pool
+statistics endpoint.
+"""
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import create_engine, exc
+
+from backend.app import database, models, security
+from backend.app.config import Settings
+from backend.app.database import get_read_db
+from backend.app.db_pool import InstrumentedQueuePool, PoolSaturatedError
+from backend.app.main import app
+from backend.app.read_replicas import Replica
+
+def _pool(**kwargs) -> InstrumentedQueuePool:
+    return InstrumentedQueuePool(lambda: sqlite3.connect(":memory:", check_same_thread=False), pool_size=1, max_overflow=0, **kwargs)
+
+def test_checkouts_beyond_the_waiting_limit_are_shed_and_waits_are_recorded():
+    pool = _pool(max_waiting=1, timeout=5)
+    held = pool.connect()
+    waiter_result = []
+    waiter = threading.Thread(target=lambda: waiter_result.append(pool.connect()))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while pool._waiting < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with pytest.raises(PoolSaturatedError):
+        pool.connect() # Exhausted and one checkout already waiting
+    summary = pool.status_summary()
+    assert (summary["checked_out"], summary["waiting"], summary["utilization"], summary["shed"]) == (1, 1, 1.0, 1)
+
+    held.close()
+    waiter.join(timeout=5)
+    waiter_result[0].close()
+    summary = pool.status_summary()
+    assert summary["checkouts"] == 2 and summary["waiting"] == 0
+    assert summary["recent_wait_ms"]["max"] > 0
+    assert summary["recent_connection_age_seconds"]["max"] >= 0
+    pool.dispose()
+
+def test_checkout_timeout_is_counted_and_stats_survive_recreate():
+    pool = _pool(max_waiting=0, timeout=0.05)
+    held = pool.connect()
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+    held.close()
+    recreated = pool.recreate()
+    assert recreated.stats is pool.stats and recreated.status_summary()["timeouts"] == 1
+    recreated.connect().close()
+    assert recreated.stats.checkouts == 2
+
+async def test_saturated_pool_returns_503_with_retry_after(test_client: AsyncClient):
+    session = MagicMock()
+    session.execute.side_effect = PoolSaturatedError("Connection pool exhausted")
+    app.dependency_overrides[get_read_db] = lambda: session
+    try:
+        response = await test_client.get("/api/news/BTCUSDT")
+    finally:
+        del app.dependency_overrides[get_read_db]
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["Retry-After"] == "2"
+
+async def test_pool_statistics_are_admin_only(test_client: AsyncClient):
+    assert (await test_client.get("/admin/db/pools")).status_code == status.HTTP_401_UNAUTHORIZED
+    app.dependency_overrides[security.get_current_active_user] = lambda: models.User(nickname="ops", is_active=True)
+    try:
+        replica = Replica(create_engine("sqlite:///./replica-secret-host.db"))
+        with patch.object(security, "settings", Settings(ADMIN_NICKNAMES="ops")), \
+             patch.object(database, "read_router", SimpleNamespace(replicas=[replica])):
+            response = await test_client.get("/admin/db/pools")
+    finally:
+        del app.dependency_overrides[security.get_current_active_user]
+    assert response.status_code == status.HTTP_200_OK
+    assert list(response.json()) == ["primary", "replica-0"] and "secret-host" not in response.text # Not keyed by URL
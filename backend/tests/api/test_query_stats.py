@@ -0,0 +1,62 @@
+"""
+Tests for statement-level query statistics: statements timed by normalized shape and by calling route, slow
+queries kept with redacted parameters, nothing attached while collection is off, and the admin endpoint.
+"""
+from unittest.mock import patch
+
+import pytest
+from fastapi import status
+from httpx import AsyncClient
+from sqlalchemy import event, text
+
+from backend.app import models, query_stats, security
+from backend.app.config import Settings
+from backend.app.main import app
+
+@pytest.fixture
+def collecting(db_session):
+    engine = db_session.get_bind()
+    query_stats.track_engine(engine)
+    query_stats.reset()
+    query_stats.set_enabled(True)
+    try:
+        yield engine
+    finally:
+        query_stats.set_enabled(False)
+        query_stats.reset()
+
+def test_normalization_groups_statements_by_shape():
+    assert query_stats.normalize_statement("SELECT *  FROM klines\n WHERE symbol = 'BTCUSDT' AND id IN (?, ?, ?) LIMIT 5") == \
+        query_stats.normalize_statement("SELECT * FROM klines WHERE symbol = 'ETHUSDT' AND id IN (?, ?) LIMIT 50") == \
+        "SELECT * FROM klines WHERE symbol = ? AND id IN (...) LIMIT ?"
+
+async def test_statements_are_timed_per_route_and_slow_ones_kept(collecting, db_session, override_get_db, test_client: AsyncClient):
+    with patch.object(query_stats, "settings", Settings(SLOW_QUERY_THRESHOLD_MS=0)):
+        assert (await test_client.get("/api/news/BTCUSDT")).status_code == status.HTTP_200_OK
+        db_session.execute(text("SELECT :token AS token, :n AS n"), {"token": "secret-value", "n": 1}).all()
+
+    snapshot = query_stats.snapshot()
+    routes = {entry["route"]: entry for entry in snapshot["by_route"]}
+    assert routes["GET /api/news/{symbol}"]["count"] >= 1 and routes["-"]["count"] == 1
+    assert any("news_articles" in entry["statement"] for entry in snapshot["by_statement"])
+    newest = snapshot["slow_queries"][0]
+    assert newest["route"] == "-" and newest["parameters"] == "{'token': '***', 'n': 1}" and newest["plan"] is None
+
+    query_stats.set_enabled(False)
+    assert not event.contains(collecting, "before_cursor_execute", query_stats._before_cursor_execute)
+    db_session.execute(text("SELECT 1")).all()
+    assert query_stats.snapshot()["by_route"] == snapshot["by_route"]
+
+async def test_admin_endpoint_requires_an_admin(collecting, test_client: AsyncClient):
+    assert (await test_client.get("/admin/db/queries")).status_code == status.HTTP_401_UNAUTHORIZED
+    app.dependency_overrides[security.get_current_active_user] = lambda: models.User(nickname="ops", is_active=True)
+    try:
+        assert (await test_client.get("/admin/db/queries")).status_code == status.HTTP_403_FORBIDDEN
+        with patch.object(security, "settings", Settings(ADMIN_NICKNAMES="alice, ops")):
+            response = await test_client.get("/admin/db/queries", params={"top": 5})
+            assert response.status_code == status.HTTP_200_OK and response.json()["enabled"] is True
+            assert (await test_client.put("/admin/db/queries/enabled", params={"enabled": False})).json() == {"enabled": False}
+            assert not query_stats.is_enabled()
+            assert (await test_client.delete("/admin/db/queries")).status_code == status.HTTP_200_OK
+    finally:
+        del app.dependency_overrides[security.get_current_active_user]
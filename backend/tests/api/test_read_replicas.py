@@ -0,0 +1,78 @@
+"""
+Tests for routing read-only sessions to replicas: health checks, the replica-lag guard and failover to the
+primary. The primary and the replica are two SQLite files holding different close prices for the same kline,
+so each read shows which one served it.
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from backend.app import kline_queries, read_replicas
+from backend.app.models import Base, Kline
+from backend.app.read_replicas import ReadSession, ReplicaRouter
+
+OPEN_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _engine_with_kline(path, close: str):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine, tables=[Kline.__table__])
+    with Session(engine) as session:
+        session.add(Kline(symbol="BTCUSDT", timeframe="1m", open_time=OPEN_TIME, close_time=OPEN_TIME + timedelta(seconds=59),
+                          open_price=Decimal("1"), high_price=Decimal("2"), low_price=Decimal("0.5"), close_price=Decimal(close),
+                          volume=Decimal("1"), quote_asset_volume=Decimal("1"), number_of_trades=1,
+                          taker_buy_base_asset_volume=Decimal("1"), taker_buy_quote_asset_volume=Decimal("1")))
+        session.commit()
+    return engine
+
+def _close(session) -> float:
+    rows = kline_queries.fetch_kline_rows(session, "BTCUSDT", "1m", None, None, True, 1, columns=("close_price",))
+    return rows[0][1]
+
+@pytest.fixture
+def engines(tmp_path):
+    primary = _engine_with_kline(tmp_path / "primary.db", "1")
+    replica = _engine_with_kline(tmp_path / "replica.db", "2")
+    unreachable = create_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    yield primary, replica, unreachable
+    for engine in (primary, replica, unreachable):
+        engine.dispose()
+
+def test_reads_go_to_a_healthy_replica_unless_they_need_rows_it_may_not_have(engines):
+    primary, replica, unreachable = engines
+    router = ReplicaRouter(primary, [replica, unreachable], check_interval_seconds=60, max_lag_seconds=300)
+    with patch.object(read_replicas, "measure_lag_seconds", return_value=30.0):
+        with ReadSession(router=router) as session:
+            assert _close(session) == 2.0 # Served by the replica; the unreachable one is out of rotation
+            assert [r.healthy for r in router.replicas] == [True, False]
+
+            session.require_rows_until(datetime.now(timezone.utc) - timedelta(minutes=5))
+            assert _close(session) == 2.0 # Older than the replica's lag
+            session.require_rows_until(datetime.now(timezone.utc))
+            assert _close(session) == 1.0 # Could still be replaying: the primary serves it
+
+    with patch.object(read_replicas, "measure_lag_seconds", return_value=600.0):
+        router.check_replicas()
+    assert not router.replicas[0].healthy # Too far behind
+    assert router.engine_for(None) is primary
+
+def test_a_replica_failing_a_read_is_taken_out_and_the_read_retried_on_the_primary(engines, tmp_path):
+    primary, replica, _ = engines
+    router = ReplicaRouter(primary, [replica], check_interval_seconds=60, max_lag_seconds=300)
+    with patch.object(read_replicas, "measure_lag_seconds", return_value=0.0):
+        router.check_replicas()
+    assert router.engine_for(None) is replica
+
+    (tmp_path / "replica.db").unlink() # The next connection finds an empty database: no klines table
+    replica.dispose()
+    with ReadSession(router=router) as session:
+        assert _close(session) == 1.0
+    assert not router.replicas[0].healthy
+
+    # Plain sessions (no replicas configured) ignore the freshness requirement
+    with Session(primary) as session:
+        read_replicas.require_rows_until(session, datetime.now(timezone.utc))
+        assert _close(session) == 1.0
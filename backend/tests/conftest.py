@@ -10,7 +10,7 @@ from sqlalchemy.orm import sessionmaker, Session
 from typing import AsyncGenerator, Generator
 
 from backend.app.main import app  # Main FastAPI application
-from backend.app.database import Base, get_db
+from backend.app.database import Base, get_db, get_read_db
 from backend.app.config import settings
 
 # Use a separate in-memory SQLite database for tests
@@ -46,13 +46,15 @@ def db_session() -> Generator[Session, None, None]:
 @pytest.fixture(scope="function")
 def override_get_db(db_session: Session):
     """
-    Fixture to override the get_db dependency with the test database session.
+    Fixture to override the get_db and get_read_db dependencies with the test database session.
     """
     try:
         app.dependency_overrides[get_db] = lambda: db_session
+        app.dependency_overrides[get_read_db] = lambda: db_session
         yield
     finally:
         del app.dependency_overrides[get_db]
+        del app.dependency_overrides[get_read_db]
 
 # Potentially, a fixture for a real Redis client if needed for integration tests,
 # configured to connect to a test Redis instance or mock Redis.
@@ -0,0 +1,81 @@
+"""
+Tests for the offline Binance archive dump importer.
+"""
+import zipfile
+from unittest.mock import patch
+
+from backend.data_ingestion_service import archive_importer
+from backend.data_ingestion_service.archive_importer import find_archive_files, iter_archive_rows, import_archives, parse_archive_filename
+
+MINUTE_MS = 60_000
+BASE_MS = 1_704_067_200_000 # 2024-01-01
+
+def _csv_lines(start_ms: int, count: int, scale: int = 1) -> str:
+    return "".join(
+        f"{(start_ms + i * MINUTE_MS) * scale},1.0,2.0,0.5,1.5,10.0,{(start_ms + (i + 1) * MINUTE_MS - 1) * scale},15.0,3,4.0,6.0,0\n"
+        for i in range(count)
+    )
+
+def _write_dumps(tmp_path):
+    with zipfile.ZipFile(tmp_path / "BTCUSDT-1m-2024-01.zip", "w") as archive:
+        archive.writestr("BTCUSDT-1m-2024-01.csv", _csv_lines(BASE_MS, 5))
+    nested = tmp_path / "2025"
+    nested.mkdir()
+    header = "open_time,open,high,low,close,volume,close_time,quote_volume,count,taker_buy_volume,taker_buy_quote_volume,ignore\n"
+    (nested / "BTCUSDT-1m-2025-01-02.csv").write_text(header + _csv_lines(BASE_MS + 10 * MINUTE_MS, 3, scale=1000)) # Microsecond timestamps
+    (tmp_path / "ETHUSDT-1h-2024-01.csv").write_text(_csv_lines(BASE_MS, 2))
+    (tmp_path / "notes.txt").write_text("not a dump")
+    (tmp_path / "BTCUSDT-7x-2024-01.csv").write_text(_csv_lines(BASE_MS, 1)) # Unsupported timeframe
+
+def test_finds_supported_dumps_and_filters(tmp_path):
+    _write_dumps(tmp_path)
+    assert sorted(p.rsplit("/", 1)[-1] for p in find_archive_files(str(tmp_path))) == [
+        "BTCUSDT-1m-2024-01.zip", "BTCUSDT-1m-2025-01-02.csv", "ETHUSDT-1h-2024-01.csv"
+    ]
+    assert len(find_archive_files(str(tmp_path), symbol="btcusdt")) == 2
+    assert len(find_archive_files(str(tmp_path), timeframe="1h")) == 1
+    assert parse_archive_filename("BTCUSDT-1m-2024-01.zip") == ("BTCUSDT", "1m")
+    assert parse_archive_filename("BTCUSDT-1m-2024-01.zip.CHECKSUM") is None
+
+def test_rows_skip_headers_and_normalise_microseconds(tmp_path):
+    _write_dumps(tmp_path)
+    rows = list(iter_archive_rows(str(tmp_path / "2025" / "BTCUSDT-1m-2025-01-02.csv")))
+    assert [int(r[0]) for r in rows] == [BASE_MS + m * MINUTE_MS for m in (10, 11, 12)]
+    assert int(rows[0][6]) == BASE_MS + 11 * MINUTE_MS - 1
+    zipped = list(iter_archive_rows(str(tmp_path / "BTCUSDT-1m-2024-01.zip")))
+    assert len(zipped) == 5 and zipped[0][1] == "1.0"
+
+def test_import_loads_each_file_in_batches(tmp_path):
+    _write_dumps(tmp_path)
+    loaded = []
+
+    def fake_load(rows, symbol, timeframe, db_session_factory):
+        loaded.append((symbol, timeframe, len(rows)))
+        return len(rows)
+
+    with patch.object(archive_importer, "load_binance_klines", side_effect=fake_load), \
+         patch.object(archive_importer.settings, "HISTORICAL_SAVE_BATCH_SIZE", 2):
+        results = import_archives(find_archive_files(str(tmp_path)), max_workers=1, db_session_factory=object())
+
+    assert sorted(loaded) == sorted([
+        ("BTCUSDT", "1m", 2), ("BTCUSDT", "1m", 2), ("BTCUSDT", "1m", 1), # 5-row zip in batches of 2
+        ("BTCUSDT", "1m", 2), ("BTCUSDT", "1m", 1),
+        ("ETHUSDT", "1h", 2),
+    ])
+    assert sum(r.rows for r in results) == 10
+    assert all(r.error is None for r in results)
+
+def test_import_reports_failed_files_without_stopping(tmp_path):
+    _write_dumps(tmp_path)
+
+    def failing_for_eth(rows, symbol, timeframe, db_session_factory):
+        if symbol == "ETHUSDT":
+            raise RuntimeError("disk full")
+        return 0 # Already imported: nothing new
+
+    with patch.object(archive_importer, "load_binance_klines", side_effect=failing_for_eth):
+        results = import_archives(find_archive_files(str(tmp_path)), max_workers=1, db_session_factory=object())
+
+    errors = {r.symbol: r.error for r in results}
+    assert errors == {"BTCUSDT": None, "ETHUSDT": "disk full"}
+    assert sum(r.inserted for r in results) == 0
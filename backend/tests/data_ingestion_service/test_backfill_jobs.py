@@ -0,0 +1,80 @@
+"""
+Tests for persisted, resumable backfill jobs.
+"""
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from backend.data_ingestion_service import backfill_jobs, main
+from backend.data_ingestion_service.backfill_jobs import BackfillJob
+
+MINUTE_MS = 60_000
+
+
+def _dict_redis():
+    """MagicMock Redis whose get/set/delete are backed by a dict, so jobs survive between 'runs'."""
+    store = {}
+    redis_client = MagicMock()
+    redis_client.get.side_effect = store.get
+    redis_client.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+    redis_client.delete.side_effect = lambda key: store.pop(key, None)
+    return redis_client, store
+
+def test_progress_fields_report_rate_and_eta():
+    job = BackfillJob.new("BTCUSDT", "1m", 0, 1000 * MINUTE_MS)
+    job.run_started_at -= 10 # 10s into the run
+    job.record_progress(250, 250 * MINUTE_MS)
+
+    fields = job.progress_fields(now=job.run_started_at + 10)
+    assert fields["progress_pct"] == 25.0
+    assert fields["rows_per_second"] == 25.0
+    assert fields["eta_seconds"] == 30 # 750 more minutes at 25 minutes/s
+    assert fields["resumed_from_ms"] is None
+
+    job.resume(target_end_ms=1000 * MINUTE_MS)
+    assert job.resumed_count == 1
+    assert job.progress_fields()["resumed_from_ms"] == 250 * MINUTE_MS
+
+def test_job_round_trips_through_redis():
+    redis_client, _ = _dict_redis()
+    job = BackfillJob.new("ETHUSDT", "5m", 100, 200)
+    backfill_jobs.save_job(redis_client, job)
+    assert backfill_jobs.load_job(redis_client, "ETHUSDT", "5m") == job
+    backfill_jobs.delete_job(redis_client, "ETHUSDT", "5m")
+    assert backfill_jobs.load_job(redis_client, "ETHUSDT", "5m") is None
+
+@pytest.mark.asyncio
+async def test_gap_fill_resumes_from_checkpoint_after_restart():
+    redis_client, store = _dict_redis()
+    buffer = MagicMock(release=AsyncMock())
+    fetch_calls = []
+
+    async def interrupted_fetch(symbol, timeframe, start_ms, end_ms, db_factory, weight_budget=None, progress_callback=None):
+        fetch_calls.append((start_ms, end_ms))
+        if len(fetch_calls) == 1:
+            await progress_callback(1000, start_ms + 1000 * MINUTE_MS) # First window committed...
+            raise asyncio.CancelledError() # ...then the service is stopped
+        await progress_callback(500, end_ms)
+        return 500, 0
+
+    with patch.object(main, "fetch_historical_klines_and_save", side_effect=interrupted_fetch), \
+         patch.object(main, "_get_latest_kline_open_time_from_db", AsyncMock(return_value=None)), \
+         patch.object(main, "shutdown_event", asyncio.Event()):
+        with pytest.raises(asyncio.CancelledError):
+            await main._startup_gap_fill("BTCUSDT", "1m", buffer, asyncio.Semaphore(1), None, redis_client, None)
+
+        saved = backfill_jobs.load_job(redis_client, "BTCUSDT", "1m")
+        assert saved.checkpoint_ms == fetch_calls[0][0] + 1000 * MINUTE_MS
+        assert saved.rows_written == 1000
+
+        # "Restart": the job is picked up from its checkpoint instead of looking at the DB again
+        await main._startup_gap_fill("BTCUSDT", "1m", buffer, asyncio.Semaphore(1), None, redis_client, None)
+
+    assert fetch_calls[1][0] == saved.checkpoint_ms
+    assert fetch_calls[1][1] >= saved.target_end_ms
+    assert backfill_jobs.backfill_job_key("BTCUSDT", "1m") not in store # Completed jobs are deleted
+    status = main.json.loads(store["backfill_status:BTCUSDT:1m"])
+    assert status["status"] == "completed_startup"
+    assert status["rows_written"] == 1500
+    assert status["resumed_from_ms"] == saved.checkpoint_ms
+    buffer.release.assert_awaited()
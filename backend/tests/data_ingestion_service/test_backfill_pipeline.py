@@ -0,0 +1,133 @@
+"""
+Tests for the streaming fetch-and-save backfill pipeline (fetchers -> bounded queue -> batched DB writer).
+"""
+import pytest
+import asyncio
+import threading
+import httpx
+from unittest.mock import patch
+
+from backend.app.config import Settings
+from backend.data_ingestion_service.historical_data_fetcher import fetch_and_save_historical_klines
+from backend.data_ingestion_service.rate_limiter import RequestWeightBudget
+from backend.mock_exchange_server.app import create_app
+
+pytestmark = pytest.mark.asyncio
+
+MINUTE_MS = 60_000
+START_MS = 1_700_000_000_000 // MINUTE_MS * MINUTE_MS
+FETCHER_MODULE = "backend.data_ingestion_service.historical_data_fetcher"
+
+
+class RecordingWriter:
+    """Stands in for load_binance_klines: records each batch and can be held to simulate a slow DB."""
+
+    def __init__(self):
+        self.batches = []
+        self.open_times = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, raw_klines, symbol, timeframe, db_session_factory):
+        self.gate.wait(timeout=10)
+        self.batches.append(len(raw_klines))
+        self.open_times.extend(kline[0] for kline in raw_klines)
+        return len(raw_klines)
+
+
+@pytest.fixture
+def mock_exchange():
+    app = create_app(weight_limit=100000, window_seconds=60.0)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock-exchange")
+    settings = Settings(BINANCE_REST_BASE_URL="http://mock-exchange", BINANCE_API_KEY=None)
+    with patch(f"{FETCHER_MODULE}.settings", settings):
+        yield app, client
+
+async def test_pipeline_writes_every_kline_once_in_bounded_batches(mock_exchange):
+    app, client = mock_exchange
+    writer = RecordingWriter()
+    end_ms = START_MS + 40 * 50 * MINUTE_MS # 40 windows of 50 klines
+    progress = []
+
+    async def on_progress(written, until_ms):
+        progress.append((written, until_ms))
+
+    with patch(f"{FETCHER_MODULE}.load_binance_klines", writer):
+        inserted, skipped, completed = await fetch_and_save_historical_klines(
+            "BTCUSDT", "1m", START_MS, end_ms, db_session_factory=None, limit_per_api_call=50,
+            weight_budget=RequestWeightBudget(100000), progress_callback=on_progress,
+            max_concurrent_windows=4, client=client, batch_size=120, queue_max_pages=3
+        )
+    await client.aclose()
+
+    assert (inserted, skipped, completed) == (2000, 0, True)
+    assert sorted(writer.open_times) == list(range(START_MS, end_ms, MINUTE_MS))
+    assert max(writer.batches) < 120 + 50 # A batch is flushed as soon as it reaches batch_size
+    assert progress[-1] == (2000, end_ms)
+    assert [until for _, until in progress] == sorted(until for _, until in progress)
+
+async def test_pipeline_stops_fetching_while_the_writer_is_behind(mock_exchange):
+    """With the DB writer held, fetchers only run ahead by the queue, one batch and one page per fetcher."""
+    app, client = mock_exchange
+    writer = RecordingWriter()
+    writer.gate.clear()
+    end_ms = START_MS + 100 * 10 * MINUTE_MS # 100 windows of 10 klines
+
+    with patch(f"{FETCHER_MODULE}.load_binance_klines", writer):
+        task = asyncio.create_task(fetch_and_save_historical_klines(
+            "ETHUSDT", "1m", START_MS, end_ms, db_session_factory=None, limit_per_api_call=10,
+            weight_budget=RequestWeightBudget(100000), max_concurrent_windows=2, client=client,
+            batch_size=20, queue_max_pages=4
+        ))
+        await asyncio.sleep(0.5)
+        pages_fetched_while_held = app.state.exchange.requests_served
+        writer.gate.set()
+        inserted, skipped, completed = await asyncio.wait_for(task, timeout=10)
+    await client.aclose()
+
+    # 2 pages in the blocked batch + 4 queued + 1 waiting to be queued per fetcher
+    assert pages_fetched_while_held <= 2 + 4 + 2
+    assert inserted == 1000 and completed
+    assert app.state.exchange.requests_served == 100
+
+async def test_pipeline_progress_stops_at_a_failed_write(mock_exchange):
+    app, client = mock_exchange
+    calls = []
+
+    def failing_second_batch(raw_klines, symbol, timeframe, db_session_factory):
+        calls.append(len(raw_klines))
+        if len(calls) == 2:
+            raise RuntimeError("connection reset")
+        return len(raw_klines)
+
+    progress = []
+
+    async def on_progress(written, until_ms):
+        progress.append(until_ms)
+
+    with patch(f"{FETCHER_MODULE}.load_binance_klines", failing_second_batch):
+        inserted, skipped, completed = await fetch_and_save_historical_klines(
+            "BTCUSDT", "1m", START_MS, START_MS + 4 * 10 * MINUTE_MS, db_session_factory=None, limit_per_api_call=10,
+            weight_budget=RequestWeightBudget(100000), progress_callback=on_progress,
+            max_concurrent_windows=1, client=client, batch_size=10, queue_max_pages=1
+        )
+    await client.aclose()
+
+    assert (inserted, skipped, completed) == (30, 10, False)
+    # Windows after the failed batch are written but not reported as contiguous
+    assert set(progress) == {START_MS + 10 * MINUTE_MS}
+
+async def test_pipeline_reports_failed_fetches_as_incomplete():
+    """An empty result from an exchange that failed every request is not mistaken for a range without klines."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503)), base_url="http://mock-exchange")
+    writer = RecordingWriter()
+    with patch(f"{FETCHER_MODULE}.settings", Settings(BINANCE_REST_BASE_URL="http://mock-exchange", BINANCE_API_KEY=None)), \
+         patch(f"{FETCHER_MODULE}.load_binance_klines", writer):
+        result = await fetch_and_save_historical_klines(
+            "BTCUSDT", "1m", START_MS, START_MS + 20 * MINUTE_MS, db_session_factory=None, limit_per_api_call=10,
+            weight_budget=RequestWeightBudget(100000), max_concurrent_windows=2, client=client
+        )
+    await client.aclose()
+
+    assert result == (0, 0, False)
+    assert not writer.open_times
@@ -7,6 +7,7 @@ import json
 from unittest.mock import MagicMock, AsyncMock, patch
 
 from backend.data_ingestion_service.binance_connector import BinanceWebSocketManager
+from backend.data_ingestion_service.kline_record import KlineRecord
 from backend.app.config import Settings # To access default retry params if needed
 
 # Mark all tests in this module as asyncio
@@ -74,18 +75,45 @@ async def test_bwm_successful_connection_and_message_processing(
         
         # Check that the data_handler was called with the processed kline data
         mock_data_handler.assert_called_once()
-        call_args = mock_data_handler.call_args[0][0] # Get the first positional arg of the call
+        call_args = mock_data_handler.call_args[0][0] # Get the first positional arg of the call (a KlineRecord)
         
-        assert call_args["symbol"] == "BTCUSDT"
-        assert call_args["timeframe"] == "1m"
-        assert call_args["open_time"] == 1678886400000
-        assert call_args["open_price"] == "20000.0" # Stays as string from Binance
-        assert call_args["is_closed"] is True
+        assert call_args.symbol == "BTCUSDT"
+        assert call_args.timeframe == "1m"
+        assert call_args.open_time == 1678886400000
+        assert call_args.open == "20000.0" # Stays as string from Binance
+        assert call_args.is_closed is True
 
         # Trigger shutdown and wait for the task to complete
         shutdown_event.set()
         await run_task # ensure task finishes cleanly
 
+async def test_bwm_parse_kline_message_builds_record(mock_data_handler):
+    """The parser decodes a kline event straight into a KlineRecord and ignores other messages."""
+    manager = BinanceWebSocketManager("BTCUSDT", "1m", mock_data_handler, asyncio.Event())
+    kline_payload = {
+        "e": "kline", "E": 1678886460001, "s": "BTCUSDT",
+        "k": {
+            "t": 1678886400000, "T": 1678886459999, "s": "BTCUSDT", "i": "1m",
+            "f": 100, "L": 200, "o": "20000.0", "c": "20500.0", "h": "20600.0", "l": "19900.0",
+            "v": "1000.0", "n": 100, "x": False,
+            "q": "20250000.0", "V": "500.0", "Q": "10125000.0", "B": "0"
+        }
+    }
+
+    record = manager._parse_kline_message(json.dumps(kline_payload).encode())
+    assert isinstance(record, KlineRecord)
+    assert record.event_time == 1678886460001
+    assert record.close_time == 1678886459999
+    assert record.high == "20600.0"
+    assert record.number_of_trades == 100
+    assert record.is_closed is False
+    assert not hasattr(record, "__dict__") # Slotted record
+
+    missing_field_payload = {"e": "kline", "E": 1, "k": {"t": 1678886400000, "s": "BTCUSDT"}}
+    assert manager._parse_kline_message(json.dumps(missing_field_payload)) is None
+    assert manager._parse_kline_message(json.dumps({"result": None, "id": 1})) is None
+    assert manager._parse_kline_message("not json") is None
+
 async def test_bwm_reconnection_logic(mock_settings, mock_data_handler):
     """Test the reconnection logic of BinanceWebSocketManager."""
     symbol = "ETHUSDT"
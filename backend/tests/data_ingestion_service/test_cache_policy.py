@@ -0,0 +1,118 @@
+"""
+Tests for the Redis kline window policy: budget allocation by popularity and timeframe, resizing a pair's
+ZSET (trimming, or warming older klines from the DB), and upserting DB-written ranges into the window.
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import kline_cache_codec
+from backend.app.config import Settings
+from backend.app.models import Kline
+from backend.data_ingestion_service import cache_policy
+from backend.data_ingestion_service.redis_scripts import UPSERT_WINDOW_KLINES_LUA, upsert_window_klines
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+class FakeKlineZset:
+    """The sorted set commands resize_pair_window uses, over one {member: score} dict."""
+
+    def __init__(self):
+        self.members = {}
+
+    def _ordered(self):
+        return sorted(self.members.items(), key=lambda item: item[1])
+
+    def zcard(self, key):
+        return len(self.members)
+
+    def zrange(self, key, start, end, withscores=False):
+        ordered = self._ordered()[start:None if end == -1 else end + 1]
+        return ordered if withscores else [member for member, _ in ordered]
+
+    def zremrangebyrank(self, key, start, end):
+        doomed = self._ordered()[start:end + 1]
+        for member, _ in doomed:
+            del self.members[member]
+        return len(doomed)
+
+    def zcount(self, key, min_score, max_score):
+        low, high = float(min_score), float(max_score)
+        return sum(1 for score in self.members.values() if low <= score <= high)
+
+    def zadd(self, key, mapping):
+        self.members.update(mapping)
+        return len(mapping)
+
+@pytest.fixture
+def policy_settings():
+    settings = Settings(REDIS_WINDOW_MIN_KLINES=100, REDIS_WINDOW_MAX_SPAN_DAYS=365, REDIS_WINDOW_WARM_MAX_KLINES=3)
+    with patch.object(cache_policy, "settings", settings):
+        yield settings
+
+def test_budget_goes_to_popular_pairs_within_timeframe_caps(policy_settings):
+    pairs = [("BTCUSDT", "1m"), ("ETHUSDT", "1m"), ("BTCUSDT", "1d")]
+    windows = cache_policy.allocate_windows(pairs, {("BTCUSDT", "1m"): 299.0, ("BTCUSDT", "1d"): 10_000.0}, 10_000)
+
+    assert windows[("BTCUSDT", "1d")] == 365 # Capped to a year of daily klines
+    assert windows[("ETHUSDT", "1m")] < windows[("BTCUSDT", "1m")]
+    assert windows[("ETHUSDT", "1m")] >= 100 # Floor
+    assert sum(windows.values()) <= 10_000 and sum(windows.values()) > 9_990 # What the 1d pair can't take goes to the others
+    # Floors alone over the budget are scaled down
+    assert cache_policy.allocate_windows(pairs, {}, 150) == {("BTCUSDT", "1d"): 50, ("BTCUSDT", "1m"): 50, ("ETHUSDT", "1m"): 50}
+    assert cache_policy.allocate_windows([], {}, 150) == {}
+
+def _add_minute_klines(db_session, minutes):
+    db_session.add_all([
+        Kline(symbol="BTCUSDT", timeframe="1m", open_time=BASE + timedelta(minutes=m), close_time=BASE + timedelta(minutes=m, seconds=59),
+              open_price=Decimal("1"), high_price=Decimal("2"), low_price=Decimal("0.5"), close_price=Decimal(str(m)), volume=Decimal("1"),
+              quote_asset_volume=Decimal("1"), number_of_trades=1, taker_buy_base_asset_volume=Decimal("1"), taker_buy_quote_asset_volume=Decimal("1"))
+        for m in minutes
+    ])
+    db_session.commit()
+
+def test_resize_trims_or_warms_from_the_db(db_session, policy_settings):
+    _add_minute_klines(db_session, range(10))
+    factory = sessionmaker(bind=db_session.get_bind())
+    redis_client = FakeKlineZset()
+    newest = db_session.query(Kline).order_by(Kline.open_time.desc()).first()
+    redis_client.zadd("klines:BTCUSDT:1m", {kline_cache_codec.encode_kline(newest): int(newest.open_time.timestamp() * 1000)})
+
+    assert cache_policy.resize_pair_window(redis_client, factory, "BTCUSDT", "1m", 6) == (0, 3) # Warming is capped per run
+    assert cache_policy.resize_pair_window(redis_client, factory, "BTCUSDT", "1m", 6) == (0, 2)
+    records = kline_cache_codec.decode_members(redis_client.zrange("klines:BTCUSDT:1m", 0, -1))
+    assert records["close_price"].tolist() == [4.0, 5.0, 6.0, 7.0, 8.0, 9.0]
+
+    assert cache_policy.resize_pair_window(redis_client, factory, "BTCUSDT", "1m", 2) == (4, 0)
+    assert kline_cache_codec.decode_members(redis_client.zrange("klines:BTCUSDT:1m", 0, -1))["close_price"].tolist() == [8.0, 9.0]
+    assert cache_policy.window_for("BTCUSDT", "1m", 2000) == 2000 # Not sized by a policy run yet
+
+def test_written_range_is_upserted_into_the_window(db_session, policy_settings):
+    _add_minute_klines(db_session, range(10))
+    factory = sessionmaker(bind=db_session.get_bind())
+    redis_client = FakeKlineZset()
+    oldest = db_session.query(Kline).order_by(Kline.open_time).offset(4).first()
+    oldest_ms = int(oldest.open_time.timestamp() * 1000)
+    redis_client.zadd("klines:BTCUSDT:1m", {kline_cache_codec.encode_kline(oldest): oldest_ms})
+
+    with patch.object(cache_policy, "upsert_window_klines", return_value=3) as upsert:
+        # A repair older than the window touches neither the DB nor the ZSET
+        assert cache_policy.cache_written_range(redis_client, MagicMock(), "BTCUSDT", "1m", oldest_ms - 4 * 60_000, oldest_ms - 60_000) == 0
+        upsert.assert_not_called()
+        # A gap fill reaching into it hands the script the newest window's worth of the range
+        policy_settings.MAX_KLINES_IN_REDIS = 4
+        assert cache_policy.cache_written_range(redis_client, factory, "BTCUSDT", "1m", oldest_ms - 2 * 60_000, oldest_ms + 5 * 60_000) == 3
+    key, scored_members, window = upsert.call_args.args[1:]
+    assert key == "klines:BTCUSDT:1m" and window == 4
+    assert [score for score, _ in scored_members] == [oldest_ms + m * 60_000 for m in (5, 4, 3, 2)]
+    assert kline_cache_codec.decode_members([m for _, m in scored_members])["close_price"].tolist() == [9.0, 8.0, 7.0, 6.0]
+
+def test_upsert_window_klines_runs_one_script_call():
+    client = MagicMock()
+    client.register_script.return_value = MagicMock(return_value=2)
+    assert upsert_window_klines(client, "klines:BTCUSDT:1m", [(60_000, b"a"), (120_000, b"b")], 500) == 2
+    client.register_script.assert_called_once_with(UPSERT_WINDOW_KLINES_LUA)
+    client.register_script.return_value.assert_called_once_with(keys=["klines:BTCUSDT:1m"], args=[500, 60_000, b"a", 120_000, b"b"])
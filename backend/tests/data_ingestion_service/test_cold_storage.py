@@ -0,0 +1,74 @@
+"""
+Tests for the Parquet cold tier: month paths, reads across months and the tiering job moving aged months
+out of the DB.
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import cold_storage, kline_storage
+from backend.app.config import Settings
+from backend.app.models import Kline
+from backend.data_ingestion_service import gap_scanner, kline_tiering
+from backend.data_ingestion_service.kline_record import KlineRecord
+
+def _row(open_time: datetime) -> dict:
+    open_time_ms = int(open_time.timestamp() * 1000)
+    row = KlineRecord(
+        symbol="BTCUSDT", timeframe="1m", open_time=open_time_ms, close_time=open_time_ms + 59_999,
+        open="1.0", high="2.0", low="0.5", close="1.5", volume="10.0", quote_asset_volume="15.0",
+        number_of_trades=3, taker_buy_base_asset_volume="4.0", taker_buy_quote_asset_volume="6.0", is_closed=True
+    ).as_db_row()
+    row["symbol"], row["timeframe"] = "BTCUSDT", "1m"
+    return row
+
+@pytest.fixture
+def cold_dir(tmp_path):
+    settings = Settings(COLD_STORAGE_DIR=str(tmp_path), COLD_STORAGE_AFTER_DAYS=90)
+    with patch.object(cold_storage, "settings", settings), patch.object(kline_tiering, "settings", settings):
+        yield tmp_path
+
+def test_cold_months_and_range_end(cold_dir):
+    assert cold_storage.cold_months("BTCUSDT", "1m") == []
+    assert cold_storage.cold_range_end_ms("BTCUSDT", "1m") is None
+    directory = cold_dir / "symbol=BTCUSDT" / "timeframe=1m"
+    directory.mkdir(parents=True)
+    for name in ("month=2024-12.parquet", "month=2024-02.parquet", "month=2024-12.parquet.tmp", "notes.txt"):
+        (directory / name).touch()
+
+    assert cold_storage.cold_months("BTCUSDT", "1m") == [datetime(2024, 2, 1, tzinfo=timezone.utc), datetime(2024, 12, 1, tzinfo=timezone.utc)]
+    assert cold_storage.cold_range_end_ms("BTCUSDT", "1m") == int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+    assert kline_tiering.tiering_cutoff(datetime(2025, 6, 15, tzinfo=timezone.utc)) == datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+def test_gap_scan_ignores_ranges_in_the_cold_tier():
+    ranges = [(0, 50), (80, 120), (150, 170), (190, 260)]
+    assert gap_scanner._outside_range(ranges, 100, 200) == [(0, 50), (80, 100), (200, 260)]
+
+def test_tiering_moves_old_months_and_reads_them_back(db_session, cold_dir):
+    pytest.importorskip("pyarrow")
+    kline_storage._instrument_ids.clear()
+    january, february = datetime(2024, 1, 31, 23, 58, tzinfo=timezone.utc), datetime(2024, 2, 1, tzinfo=timezone.utc)
+    db_session.add_all([Kline(**_row(january + timedelta(minutes=m))) for m in range(4)]) # 2 in January, 2 in February
+    db_session.add(Kline(**_row(datetime(2024, 6, 1, tzinfo=timezone.utc))))
+    db_session.commit()
+    factory = sessionmaker(bind=db_session.get_bind())
+
+    moved = asyncio.run(kline_tiering.tier_pair(factory, "BTCUSDT", "1m", datetime(2024, 3, 1, tzinfo=timezone.utc)))
+    assert moved == 4
+    assert db_session.execute(select(func.count()).select_from(Kline)).scalar_one() == 1
+    assert cold_storage.cold_months("BTCUSDT", "1m") == [datetime(2024, 1, 1, tzinfo=timezone.utc), february]
+
+    newest = cold_storage.read_cold_klines("BTCUSDT", "1m", None, None, True, 3)
+    assert [k.open_time for k in newest] == [january + timedelta(minutes=m) for m in (1, 2, 3)]
+    assert newest[-1].close_time == february + timedelta(minutes=2) - timedelta(milliseconds=1)
+    assert newest[0].close_price == 1.5 and newest[0].number_of_trades == 3
+    oldest = cold_storage.read_cold_klines("BTCUSDT", "1m", int(january.timestamp() * 1000) + 1, None, False, 2)
+    assert [k.open_time for k in oldest] == [january + timedelta(minutes=m) for m in (1, 2)]
+
+    # Rewriting a month merges with the file already there
+    path, total = cold_storage.write_cold_month("BTCUSDT", "1m", february, [_row(february + timedelta(minutes=5))])
+    assert total == 3 and path.endswith("month=2024-02.parquet")
@@ -0,0 +1,108 @@
+"""
+Tests for full-history hole detection and repair.
+"""
+import pytest
+import asyncio
+import json
+import numpy as np
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.orm import sessionmaker
+
+from backend.app.models import Kline
+from backend.app import ingestion_control
+from backend.data_ingestion_service import gap_scanner
+from backend.data_ingestion_service.gap_scanner import GapRepairQueue, find_gaps, scan_pair, scan_and_queue_repairs, gap_repair_worker
+
+MINUTE_MS = 60_000
+BASE_MS = 1_700_000_000_000 // MINUTE_MS * MINUTE_MS
+
+
+def _kline(symbol: str, open_time_ms: int) -> Kline:
+    return Kline(
+        symbol=symbol, timeframe="1m", open_time=datetime.fromtimestamp(open_time_ms / 1000, tz=timezone.utc),
+        open_price=Decimal("1"), high_price=Decimal("1"), low_price=Decimal("1"), close_price=Decimal("1"),
+        volume=Decimal("1"), close_time=datetime.fromtimestamp((open_time_ms + MINUTE_MS - 1) / 1000, tz=timezone.utc),
+        quote_asset_volume=Decimal("1"), number_of_trades=1,
+        taker_buy_base_asset_volume=Decimal("1"), taker_buy_quote_asset_volume=Decimal("1")
+    )
+
+def test_find_gaps_is_vectorized_over_chunks():
+    open_times = np.array([0, 1, 2, 5, 6, 9], dtype=np.int64) * MINUTE_MS
+    assert find_gaps(open_times, MINUTE_MS) == [(3 * MINUTE_MS, 5 * MINUTE_MS), (7 * MINUTE_MS, 9 * MINUTE_MS)]
+    # A gap between the previous chunk's last kline and this chunk's first one
+    assert find_gaps(np.array([12], dtype=np.int64) * MINUTE_MS, MINUTE_MS, previous_open_time_ms=9 * MINUTE_MS) == [(10 * MINUTE_MS, 12 * MINUTE_MS)]
+    assert find_gaps(np.array([], dtype=np.int64), MINUTE_MS) == []
+
+@pytest.mark.asyncio
+async def test_scan_pair_finds_holes_across_chunk_boundaries(db_session):
+    present = [m for m in range(100) if not (10 <= m < 13 or 38 <= m < 45 or m == 71)]
+    db_session.add_all([_kline("BTCUSDT", BASE_MS + m * MINUTE_MS) for m in present])
+    db_session.add(_kline("ETHUSDT", BASE_MS + 11 * MINUTE_MS)) # Other pairs don't fill BTCUSDT's holes
+    db_session.commit()
+    factory = sessionmaker(bind=db_session.get_bind())
+
+    with patch.object(gap_scanner.settings, "GAP_SCAN_CHUNK_KLINES", 20): # Hole 38-44 spans the 20-40/40-60 chunk boundary
+        report = await scan_pair("BTCUSDT", "1m", factory)
+
+    assert report.first_open_time_ms == BASE_MS and report.last_open_time_ms == BASE_MS + 99 * MINUTE_MS
+    assert report.missing_ranges == [
+        (BASE_MS + 10 * MINUTE_MS, BASE_MS + 13 * MINUTE_MS),
+        (BASE_MS + 38 * MINUTE_MS, BASE_MS + 45 * MINUTE_MS),
+        (BASE_MS + 71 * MINUTE_MS, BASE_MS + 72 * MINUTE_MS),
+    ]
+    assert report.present_klines == len(present)
+    assert report.missing_klines == 11
+    assert report.coverage_pct == 89.0
+
+@pytest.mark.asyncio
+async def test_scan_queues_repairs_and_publishes_coverage():
+    registry = MagicMock()
+    done_task = MagicMock(done=MagicMock(return_value=True))
+    running_task = MagicMock(done=MagicMock(return_value=False))
+    registry.pairs = {("BTCUSDT", "1m"): MagicMock(gap_fill_task=done_task), ("ETHUSDT", "1m"): MagicMock(gap_fill_task=running_task)}
+    def fresh_report(symbol, timeframe, db_session_factory):
+        return gap_scanner.CoverageReport(symbol, timeframe, 0, 10 * MINUTE_MS, present_klines=7, missing_klines=4,
+                                          missing_ranges=[(MINUTE_MS, 3 * MINUTE_MS), (5 * MINUTE_MS, 7 * MINUTE_MS)])
+    redis_client = MagicMock()
+    redis_client.smembers.return_value = {f"{5 * MINUTE_MS}-{7 * MINUTE_MS}"} # Already known to have no data
+    queue = GapRepairQueue(maxsize=10)
+
+    with patch.object(gap_scanner, "scan_pair", AsyncMock(side_effect=fresh_report)) as mock_scan:
+        assert await scan_and_queue_repairs(registry, queue, redis_client, None) == 1
+        assert await scan_and_queue_repairs(registry, queue, redis_client, None) == 0 # Still pending: not queued twice
+
+    mock_scan.assert_awaited_with("BTCUSDT", "1m", None) # The pair with a running startup fill is skipped
+    assert queue.qsize() == 1
+    key, payload = redis_client.set.call_args[0][:2]
+    assert key == ingestion_control.coverage_report_key("BTCUSDT", "1m")
+    published = json.loads(payload)
+    assert published["missing_ranges"] == [[MINUTE_MS, 3 * MINUTE_MS]]
+    assert published["unfillable_ranges"] == [[5 * MINUTE_MS, 7 * MINUTE_MS]]
+
+@pytest.mark.asyncio
+async def test_repair_worker_marks_empty_ranges_unfillable():
+    queue = GapRepairQueue(maxsize=10)
+    queue.offer("BTCUSDT", "1m", 0, MINUTE_MS)
+    queue.offer("BTCUSDT", "1m", 5 * MINUTE_MS, 6 * MINUTE_MS)
+    queue.offer("BTCUSDT", "1m", 8 * MINUTE_MS, 9 * MINUTE_MS)
+    redis_client = MagicMock()
+    pipe = redis_client.pipeline.return_value
+    shutdown = asyncio.Event()
+    # Complete but empty, complete with a kline, then empty because every window failed
+    results = iter([(0, 0, True), (1, 0, True), (0, 0, False)])
+
+    async def fake_fetch(*args, **kwargs):
+        result = next(results)
+        if result == (0, 0, False):
+            shutdown.set()
+        return result
+
+    with patch.object(gap_scanner, "fetch_and_save_historical_klines", side_effect=fake_fetch):
+        await asyncio.wait_for(gap_repair_worker(queue, redis_client, None, asyncio.Semaphore(1), None, shutdown), timeout=5)
+
+    key = gap_scanner.unfillable_ranges_key("BTCUSDT", "1m")
+    pipe.sadd.assert_called_once_with(key, f"0-{MINUTE_MS}") # Not the failed range
+    pipe.expire.assert_called_once_with(key, gap_scanner.UNFILLABLE_RANGES_TTL_SECONDS)
+    assert queue.offer("BTCUSDT", "1m", 0, MINUTE_MS) # Finished items can be queued again
@@ -0,0 +1,67 @@
+"""
+Tests for the shared per-upstream HTTP clients and the fetchers using them against the local mock server.
+"""
+import pytest
+import httpx
+from unittest.mock import patch
+
+from backend.app import http_clients
+from backend.app.config import Settings
+from backend.data_ingestion_service.historical_data_fetcher import fetch_historical_klines
+from backend.data_ingestion_service.rate_limiter import RequestWeightBudget
+from backend.mock_exchange_server.app import create_app
+from backend.news_fetcher_service import main as news_fetcher
+
+pytestmark = pytest.mark.asyncio
+
+MINUTE_MS = 60_000
+START_MS = 1_700_000_000_000 // MINUTE_MS * MINUTE_MS
+
+def _mock_server_client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock-exchange")
+
+async def test_shared_client_is_reused_until_closed():
+    client = http_clients.get_http_client(http_clients.BINANCE_UPSTREAM)
+    try:
+        assert http_clients.get_http_client(http_clients.BINANCE_UPSTREAM) is client
+        assert http_clients.get_http_client(http_clients.COINDESK_UPSTREAM) is not client
+        assert client.timeout.read == http_clients.UPSTREAM_PROFILES[http_clients.BINANCE_UPSTREAM].timeout_seconds
+    finally:
+        await http_clients.close_http_clients()
+    assert client.is_closed
+    replacement = http_clients.get_http_client(http_clients.BINANCE_UPSTREAM)
+    assert replacement is not client and not replacement.is_closed
+    await http_clients.close_http_clients()
+
+async def test_historical_fetch_uses_shared_client_without_closing_it():
+    app = create_app()
+    async with _mock_server_client(app) as client:
+        with patch("backend.data_ingestion_service.historical_data_fetcher.settings", Settings(BINANCE_REST_BASE_URL="http://mock-exchange")), \
+             patch("backend.data_ingestion_service.historical_data_fetcher.get_http_client", return_value=client) as get_client:
+            for _ in range(2):
+                klines = await fetch_historical_klines(
+                    "BTCUSDT", "1m", START_MS, START_MS + 30 * MINUTE_MS, limit_per_api_call=10,
+                    weight_budget=RequestWeightBudget(1000)
+                )
+                assert len(klines) == 30
+        assert get_client.call_count == 2
+        assert not client.is_closed # Owned by the registry, closed only at service shutdown
+    assert app.state.exchange.requests_served == 6
+
+async def test_news_fetchers_against_mock_server_and_its_rate_limit():
+    app = create_app(news_request_limit=2, window_seconds=60.0)
+    async with _mock_server_client(app) as client:
+        with patch.object(news_fetcher, "get_http_client", return_value=client), \
+             patch.object(news_fetcher, "NEWSDATA_IO_BASE_URL", "http://mock-exchange/api/1"), \
+             patch.object(news_fetcher, "COINDESK_BASE_URL", "http://mock-exchange"):
+            stock_articles = await news_fetcher.fetch_stock_news("AAPL")
+            crypto_articles = await news_fetcher.fetch_coindesk_crypto_news(news_fetcher.CRYPTO_SYMBOLS_TO_TRACK_INTERNAL)
+            rate_limited = await news_fetcher.fetch_coindesk_crypto_news(news_fetcher.CRYPTO_SYMBOLS_TO_TRACK_INTERNAL)
+
+    assert len(stock_articles) == news_fetcher.NEWSDATA_FETCH_LIMIT_PER_REQUEST
+    assert all(a["symbol"] == "AAPL" and a["external_article_id"] for a in stock_articles)
+    # Only the BTC/ETH/SOL-categorised mock articles map to tracked symbols
+    assert crypto_articles and {a["symbol"] for a in crypto_articles} == {"BTCUSDT", "ETHUSDT", "SOLUSDT"}
+    assert rate_limited == []
+    assert app.state.exchange.news_requests_served == 2
+    assert app.state.exchange.news_rate_limited_responses == 1
@@ -0,0 +1,71 @@
+"""
+Tests for the packed Redis kline members: round trip through the batch decoder, the API read path, and the
+JSON -> packed key migration.
+"""
+import orjson
+from datetime import datetime, timezone
+
+from backend.app import kline_cache_codec
+from backend.app.routers.data import _decode_redis_klines
+from backend.data_ingestion_service.kline_record import KlineRecord
+from backend.data_ingestion_service.redis_kline_migrator import convert_members
+
+OPEN_TIME = 1704067200000 # 2024-01-01T00:00:00Z
+
+def _record(minute: int, close: str = "1.5", is_closed: bool = True) -> KlineRecord:
+    open_time = OPEN_TIME + minute * 60_000
+    return KlineRecord(
+        symbol="BTCUSDT", timeframe="1m", open_time=open_time, close_time=open_time + 59_999,
+        open="1.0", high="2.0", low="0.5", close=close, volume="10.0", quote_asset_volume="15.0",
+        number_of_trades=3, taker_buy_base_asset_volume="4.0", taker_buy_quote_asset_volume="6.0", is_closed=is_closed
+    )
+
+def test_packed_members_decode_in_one_batch():
+    members = [_record(m).as_cache_member() for m in range(3)]
+    assert all(len(m) == kline_cache_codec.MEMBER_SIZE for m in members)
+
+    records = kline_cache_codec.decode_members(members + [b'{"open_time": 1}'])
+    assert records["open_time"].tolist() == [OPEN_TIME, OPEN_TIME + 60_000, OPEN_TIME + 120_000]
+    assert records["close_price"].tolist() == [1.5, 1.5, 1.5]
+    kline = kline_cache_codec.records_to_dicts(records, "BTCUSDT", "1m")[0]
+    assert kline["open_time"] == datetime(2024, 1, 1, tzinfo=timezone.utc) and kline["is_closed"] is True
+    assert kline["number_of_trades"] == 3 and kline["taker_buy_quote_asset_volume"] == 6.0
+    assert len(kline_cache_codec.decode_members([])) == 0
+
+def test_api_decodes_packed_and_complete_legacy_members():
+    legacy_complete = orjson.dumps({
+        "open_time": OPEN_TIME + 60_000, "close_time": OPEN_TIME + 119_999, "open_price": 1.0, "high_price": 2.0,
+        "low_price": 0.5, "close_price": 3.0, "volume": 10.0, "quote_asset_volume": 15.0, "number_of_trades": 3,
+        "taker_buy_base_asset_volume": 4.0, "taker_buy_quote_asset_volume": 6.0, "is_closed": True,
+    })
+    legacy_ohlcv_only = orjson.dumps({"open_time": OPEN_TIME + 120_000, "open": "1", "high": "2", "low": "0.5",
+                                      "close": "1.5", "volume": "1", "close_time": OPEN_TIME + 179_999, "is_closed": True})
+    klines = _decode_redis_klines([_record(0).as_cache_member(), legacy_complete, legacy_ohlcv_only], "BTCUSDT", "1m", "klines:BTCUSDT:1m")
+
+    assert [(k.open_time, k.close_price) for k in klines] == [
+        (datetime(2024, 1, 1, tzinfo=timezone.utc), 1.5), (datetime(2024, 1, 1, 0, 1, tzinfo=timezone.utc), 3.0)
+    ]
+    assert klines[0].symbol == "BTCUSDT" and klines[0].quote_asset_volume == 15.0
+
+def test_migration_converts_and_deduplicates_by_open_time():
+    packed = _record(0).as_cache_member()
+    legacy_open = orjson.dumps({**_legacy_dict(1), "close_price": 9.0, "is_closed": False})
+    legacy_closed = orjson.dumps(_legacy_dict(1))
+    unconvertible = orjson.dumps({"open_time": OPEN_TIME + 120_000, "open": "1"})
+    members = [(packed, float(OPEN_TIME)), (legacy_open, float(OPEN_TIME + 60_000)),
+               (legacy_closed, float(OPEN_TIME + 60_000)), (unconvertible, float(OPEN_TIME + 120_000))]
+
+    converted, dropped = convert_members(members, "BTCUSDT", "1m")
+    assert dropped == 1
+    assert sorted(converted.values()) == [float(OPEN_TIME), float(OPEN_TIME + 60_000)]
+    assert packed in converted
+    records = kline_cache_codec.decode_members(sorted(converted, key=converted.get))
+    assert records["close_price"].tolist() == [1.5, 1.5] and records["is_closed"].tolist() == [1, 1]
+
+def _legacy_dict(minute: int) -> dict:
+    open_time = OPEN_TIME + minute * 60_000
+    return {
+        "open_time": open_time, "close_time": open_time + 59_999, "open_price": 1.0, "high_price": 2.0,
+        "low_price": 0.5, "close_price": 1.5, "volume": 10.0, "quote_asset_volume": 15.0, "number_of_trades": 3,
+        "taker_buy_base_asset_volume": 4.0, "taker_buy_quote_asset_volume": 6.0, "is_closed": True,
+    }
@@ -0,0 +1,84 @@
+"""
+Tests for the kline chunk cache: reads through it return what the DB returns, closed complete blocks are
+cached and served without the DB, and incomplete or open blocks are always read from the DB.
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from backend.app import kline_chunk_cache, kline_queries
+from backend.app.config import Settings
+from backend.app.models import Kline
+
+BLOCK = 10
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc) # A multiple of 10 minutes since the epoch: block 170_438_400
+
+class FakeStringStore:
+    """The string commands the chunk cache uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.values[key], self.ttls[key] = value, ex
+
+    def execute(self):
+        return []
+
+@pytest.fixture
+def chunk_settings():
+    with patch.object(kline_chunk_cache, "settings", Settings(KLINE_CHUNK_CACHE_BLOCK_KLINES=BLOCK, KLINE_CHUNK_CACHE_TTL_SECONDS=3600)):
+        yield
+
+def _add_klines(db_session, minutes):
+    db_session.add_all([
+        Kline(symbol="BTCUSDT", timeframe="1m", open_time=BASE + timedelta(minutes=m), close_time=BASE + timedelta(minutes=m, seconds=59, milliseconds=999),
+              open_price=Decimal("1"), high_price=Decimal("2"), low_price=Decimal("0.5"), close_price=Decimal(m) + Decimal("0.25"), volume=Decimal("10"),
+              quote_asset_volume=Decimal("15"), number_of_trades=m, taker_buy_base_asset_volume=Decimal("4"), taker_buy_quote_asset_volume=Decimal("6"))
+        for m in minutes
+    ])
+    db_session.commit()
+
+def test_reads_match_the_db_and_complete_blocks_are_served_from_redis(db_session, chunk_settings):
+    _add_klines(db_session, [m for m in range(35) if m != 13]) # Block 1 has a hole; block 3 holds 5 klines
+    redis_client = FakeStringStore()
+    reads = [
+        (None, BASE + timedelta(minutes=27), True, 12),
+        (BASE + timedelta(minutes=3), None, False, 25),
+        (BASE + timedelta(minutes=4), BASE + timedelta(minutes=31), True, 100),
+        (None, None, False, 7),
+    ]
+    for start, end, newest_first, limit in reads:
+        assert kline_chunk_cache.fetch_kline_rows(redis_client, db_session, "BTCUSDT", "1m", start, end, newest_first, limit) == \
+            kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", start, end, newest_first, limit)
+
+    first_block = int(BASE.timestamp() * 1000) // (BLOCK * 60_000)
+    assert sorted(redis_client.values) == [kline_chunk_cache.block_key("BTCUSDT", "1m", first_block + b) for b in (0, 2)]
+    assert set(redis_client.ttls.values()) == {3600}
+
+    with patch.object(kline_queries, "fetch_kline_rows", wraps=kline_queries.fetch_kline_rows) as from_db:
+        rows = kline_chunk_cache.fetch_kline_rows(redis_client, db_session, "BTCUSDT", "1m", BASE + timedelta(minutes=22), BASE + timedelta(minutes=28), False, 100)
+        from_db.assert_not_called()
+        assert [row[0] for row in rows] == [BASE + timedelta(minutes=m) for m in range(22, 29)]
+        assert rows[0][1:] == (1.0, 2.0, 0.5, 22.25, 10.0, 15.0, 22, 4.0, 6.0)
+        kline_chunk_cache.fetch_kline_rows(redis_client, db_session, "BTCUSDT", "1m", BASE + timedelta(minutes=12), BASE + timedelta(minutes=14), False, 100)
+        assert from_db.call_count == 1 # The incomplete block
+
+def test_reads_skip_long_gaps_and_stop_at_the_end_of_history(db_session, chunk_settings):
+    _add_klines(db_session, [0, 1, 2, 95, 96])
+    redis_client = FakeStringStore()
+    for start, end, newest_first, limit in [(None, None, True, 4), (None, None, True, 10), (BASE + timedelta(minutes=1), None, False, 10)]:
+        assert kline_chunk_cache.fetch_kline_rows(redis_client, db_session, "BTCUSDT", "1m", start, end, newest_first, limit) == \
+            kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", start, end, newest_first, limit)
+    assert kline_chunk_cache.fetch_kline_rows(redis_client, db_session, "ETHUSDT", "1m", None, None, True, 10) == []
+    assert kline_chunk_cache.fetch_kline_rows(None, db_session, "BTCUSDT", "1m", None, None, True, 2) == \
+        kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", None, None, True, 2) # No Redis: straight to the DB
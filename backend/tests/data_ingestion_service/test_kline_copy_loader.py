@@ -0,0 +1,84 @@
+"""
+Tests for the COPY-based kline bulk loader.
+"""
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from backend.data_ingestion_service import kline_copy_loader
+from backend.data_ingestion_service.kline_copy_loader import encode_copy_rows, load_binance_klines
+
+RAW_KLINE = [1700000000000, "37000.10", "37010.00", "36990.50", "37005.25", "12.5", 1700000059999, "462565.6", 321, "6.2", "229433.1", "0"]
+
+
+class FakeCursor:
+    def __init__(self, rowcount: int):
+        self.rowcount = rowcount
+        self.executed = []
+        self.copied = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        self.executed.append(" ".join(sql.split()))
+
+    def copy_expert(self, sql, file):
+        self.copied.append((sql, file.read()))
+
+
+def _session_factory(cursor: FakeCursor, driver: str = "psycopg2"):
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = "postgresql"
+    session.get_bind.return_value.dialect.driver = driver
+    session.connection.return_value.connection.cursor.return_value = cursor
+    return lambda: session, session
+
+def test_encode_copy_rows_keeps_binance_strings_and_accepts_numpy_rows():
+    text = encode_copy_rows([RAW_KLINE], "BTCUSDT", "1m")
+    assert text == "BTCUSDT\t1m\t1700000000000\t37000.10\t37010.00\t36990.50\t37005.25\t12.5\t1700000059999\t462565.6\t321\t6.2\t229433.1\n"
+
+    numeric_batch = np.array([[1700000000000, 1.5, 2, 1, 1.5, 10, 1700000059999, 15, 3, 4, 6]], dtype=np.float64)
+    line = encode_copy_rows(numeric_batch, "BTCUSDT", "1m").rstrip("\n").split("\t")
+    assert line[2] == "1700000000000" and line[8] == "1700000059999" and line[10] == "3"
+    assert float(line[3]) == 1.5
+
+def test_load_copies_into_staging_then_merges_and_commits():
+    cursor = FakeCursor(rowcount=2)
+    factory, session = _session_factory(cursor)
+
+    inserted = load_binance_klines([RAW_KLINE, [1700000060000] + RAW_KLINE[1:]], "BTCUSDT", "1m", factory)
+
+    assert inserted == 2
+    assert cursor.executed[0].startswith(f"CREATE TEMPORARY TABLE IF NOT EXISTS {kline_copy_loader.STAGING_TABLE}")
+    copy_sql, copy_data = cursor.copied[0]
+    assert copy_sql.startswith(f"COPY {kline_copy_loader.STAGING_TABLE} (symbol, timeframe, open_time_ms")
+    assert copy_data.count("\n") == 2
+    assert cursor.executed[1].startswith("INSERT INTO klines")
+    assert cursor.executed[1].endswith("ON CONFLICT (symbol, timeframe, open_time) DO NOTHING")
+    session.commit.assert_called_once()
+    session.close.assert_called_once()
+
+def test_load_rolls_back_and_raises_on_copy_failure():
+    cursor = FakeCursor(rowcount=0)
+    cursor.copy_expert = MagicMock(side_effect=RuntimeError("bad data"))
+    factory, session = _session_factory(cursor)
+
+    with pytest.raises(RuntimeError):
+        load_binance_klines([RAW_KLINE], "BTCUSDT", "1m", factory)
+    session.rollback.assert_called_once()
+    session.commit.assert_not_called()
+    session.close.assert_called_once()
+
+def test_load_falls_back_to_insert_without_psycopg2():
+    cursor = FakeCursor(rowcount=0)
+    factory, session = _session_factory(cursor, driver="asyncpg")
+    session.execute.return_value.rowcount = 1
+
+    assert load_binance_klines([RAW_KLINE], "BTCUSDT", "1m", factory) == 1
+    assert cursor.copied == []
+    session.execute.assert_called_once()
+    session.commit.assert_called_once()
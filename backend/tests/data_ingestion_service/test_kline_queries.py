@@ -0,0 +1,53 @@
+"""
+Tests for the compiled kline range reads: the same klines as the ORM path, as plain tuples of the requested
+columns, from cached statements.
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from backend.app import kline_queries, kline_storage
+from backend.app.config import Settings
+from backend.app.models import Kline
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _kline(minute: int, close: str) -> Kline:
+    return Kline(
+        symbol="BTCUSDT", timeframe="1m", open_time=BASE + timedelta(minutes=minute), close_time=BASE + timedelta(minutes=minute, seconds=59),
+        open_price=Decimal("1"), high_price=Decimal("2"), low_price=Decimal("0.5"), close_price=Decimal(close), volume=Decimal("10"),
+        quote_asset_volume=Decimal("15"), number_of_trades=3, taker_buy_base_asset_volume=Decimal("4"), taker_buy_quote_asset_volume=Decimal("6")
+    )
+
+def test_rows_match_the_orm_path_and_statements_are_reused(db_session):
+    db_session.add_all([_kline(m, f"{m}.25") for m in range(5)])
+    db_session.commit()
+    kline_queries._statements.clear()
+
+    rows = kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", BASE + timedelta(minutes=1), BASE + timedelta(minutes=3), True, 10)
+    orm = kline_storage.fetch_pair_klines(db_session, "BTCUSDT", "1m", BASE + timedelta(minutes=1), BASE + timedelta(minutes=3), True, 10)
+    assert [row[0] for row in rows] == [BASE + timedelta(minutes=m) for m in (3, 2, 1)]
+    assert [row[0] for row in rows] == [k.open_time.replace(tzinfo=timezone.utc) for k in orm]
+    assert rows[0][1:] == (1.0, 2.0, 0.5, 3.25, 10.0, 15.0, 3, 4.0, 6.0) # open_time, then VALUE_COLUMNS
+    assert isinstance(rows[0][4], float)
+
+    closes = kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", BASE + timedelta(minutes=2), None, False, 2, columns=("close_price",))
+    assert closes == [(BASE + timedelta(minutes=2), 2.25), (BASE + timedelta(minutes=3), 3.25)]
+    kline_queries.fetch_kline_rows(db_session, "ETHUSDT", "1m", BASE, None, False, 2, columns=("close_price",))
+    assert len(kline_queries._statements) == 2 # One per shape, reused across pairs and bounds
+
+def test_compact_storage_reads_fall_back_to_legacy_rows(db_session):
+    kline_storage._instrument_ids.clear()
+    db_session.add_all([_kline(m, "9") for m in range(3)])
+    db_session.commit()
+    with patch.object(kline_storage, "settings", Settings(KLINE_STORAGE="compact", KLINE_LEGACY_FALLBACK_READS=True)) as settings:
+        assert [row[0] for row in kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", None, None, False, 10)] == \
+            [BASE + timedelta(minutes=m) for m in range(3)] # Not registered in the compact schema yet
+        kline_storage.insert_kline_rows(db_session, [{c: getattr(_kline(1, "1.5"), c) for c in ("symbol", "timeframe", "open_time", "close_time") + kline_storage.VALUE_COLUMNS}])
+        db_session.commit()
+        rows = kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", None, None, False, 10, columns=("close_price",))
+        assert rows == [(BASE, 9.0), (BASE + timedelta(minutes=1), 1.5), (BASE + timedelta(minutes=2), 9.0)]
+        settings.KLINE_LEGACY_FALLBACK_READS = False
+        assert kline_queries.fetch_kline_rows(db_session, "BTCUSDT", "1m", None, None, False, 10, columns=("close_price",)) == \
+            [(BASE + timedelta(minutes=1), 1.5)]
+    kline_storage._instrument_ids.clear()
@@ -0,0 +1,110 @@
+"""
+Tests for the local closed kline spool: segment writes, replay into the DB and the processor's fallback to it.
+"""
+import asyncio
+import os
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from backend.app.config import Settings
+from backend.data_ingestion_service import kline_spool
+from backend.data_ingestion_service.kline_record import KlineRecord
+from backend.data_ingestion_service.kline_spool import KlineSpool, SpoolLockedError, read_segment, replay_spool
+from backend.data_ingestion_service.main import kline_data_processor
+
+MINUTE_MS = 60_000
+START_MS = 1_700_000_000_000 // MINUTE_MS * MINUTE_MS
+
+def _kline(i: int, symbol: str = "BTCUSDT") -> KlineRecord:
+    open_time = START_MS + i * MINUTE_MS
+    return KlineRecord(
+        symbol=symbol, timeframe="1m", open_time=open_time, close_time=open_time + MINUTE_MS - 1,
+        open="1.0", high="2.0", low="0.5", close="1.5", volume="10.0",
+        quote_asset_volume="15.0", number_of_trades=3,
+        taker_buy_base_asset_volume="4.0", taker_buy_quote_asset_volume="6.0",
+        is_closed=True, event_time=open_time + MINUTE_MS
+    )
+
+def _spool(directory, segment_max_bytes=1024 * 1024) -> KlineSpool:
+    return KlineSpool(str(directory), segment_max_bytes, fsync_batch_size=2, fsync_interval_seconds=60.0)
+
+def test_spool_rotates_segments_and_skips_a_torn_line(tmp_path):
+    spool = _spool(tmp_path, segment_max_bytes=200)
+    for i in range(4):
+        spool.append(_kline(i))
+    segments = spool.sealed_segments()
+    assert len(segments) > 1
+    with open(segments[-1], "ab") as f:
+        f.write(b'["BTCUSDT","1m",17') # Crash mid-write
+
+    rows = [row for path in segments for row in read_segment(path)]
+    assert [(s, tf, r[0]) for s, tf, r in rows] == [("BTCUSDT", "1m", START_MS + i * MINUTE_MS) for i in range(4)]
+    assert rows[0][2][1:5] == ["1.0", "2.0", "0.5", "1.5"] and rows[0][2][8] == 3
+
+    with pytest.raises(SpoolLockedError):
+        _spool(tmp_path)
+    spool.close()
+    reopened = _spool(tmp_path) # A restarted worker picks up what was left
+    assert not reopened.is_empty
+    reopened.append(_kline(4))
+    assert reopened.sealed_segments()[-1] > segments[-1]
+    reopened.close()
+
+def test_replay_loads_segments_and_keeps_them_when_the_db_fails(tmp_path):
+    spool = _spool(tmp_path)
+    spool.append(_kline(0))
+    spool.append(_kline(0, symbol="ETHUSDT"))
+    spool.append(_kline(1))
+
+    with patch.object(kline_spool, "load_binance_klines", side_effect=SQLAlchemyError("DB down")):
+        assert replay_spool(spool, MagicMock(), batch_size=10) == 0
+    assert not spool.is_empty and len(os.listdir(tmp_path)) == 2 # Segment plus lock file
+
+    with patch.object(kline_spool, "load_binance_klines", return_value=1) as load:
+        assert replay_spool(spool, MagicMock(), batch_size=10) == 3
+    assert spool.is_empty
+    loaded = {(c.args[1], c.args[2]): [row[0] for row in c.args[0]] for c in load.call_args_list}
+    assert loaded == {("BTCUSDT", "1m"): [START_MS, START_MS + MINUTE_MS], ("ETHUSDT", "1m"): [START_MS]}
+    spool.close()
+
+@pytest.mark.asyncio
+async def test_processor_spools_when_the_db_fails_and_until_the_spool_drains(tmp_path):
+    spool = _spool(tmp_path)
+    session = MagicMock()
+    session.execute.side_effect = SQLAlchemyError("DB down")
+    factory = MagicMock(return_value=session)
+
+    with patch("backend.data_ingestion_service.main.settings", Settings(CLOSED_KLINE_DB_TIMEOUT_SECONDS=5.0)), \
+         patch("backend.data_ingestion_service.main.upsert_trim_publish", return_value=(0, 1)) as mock_upsert:
+        await kline_data_processor(_kline(0), symbol="BTCUSDT", timeframe="1m", redis_client=MagicMock(),
+                                   db_session_factory=factory, spool=spool)
+        session.rollback.assert_called_once()
+        mock_upsert.assert_called_once() # Charts still see the kline while the DB is down
+        assert not spool.is_empty
+
+        # The DB is back, but earlier klines are still spooled: keep the insert order and spool this one too
+        session.execute.side_effect = None
+        await kline_data_processor(_kline(1), symbol="BTCUSDT", timeframe="1m", redis_client=MagicMock(),
+                                   db_session_factory=factory, spool=spool)
+    assert session.execute.call_count == 1
+    assert mock_upsert.call_count == 2
+    assert [row[0] for path in spool.sealed_segments() for _, _, row in read_segment(path)] == [START_MS, START_MS + MINUTE_MS]
+    spool.close()
+
+@pytest.mark.asyncio
+async def test_processor_spools_a_slow_insert(tmp_path):
+    spool = _spool(tmp_path)
+    session = MagicMock()
+    session.execute.side_effect = lambda *args: time.sleep(0.5) or MagicMock(rowcount=1)
+
+    with patch("backend.data_ingestion_service.main.settings", Settings(CLOSED_KLINE_DB_TIMEOUT_SECONDS=0.05)), \
+         patch("backend.data_ingestion_service.main.upsert_trim_publish", return_value=(0, 1)) as mock_upsert:
+        await kline_data_processor(_kline(0), symbol="BTCUSDT", timeframe="1m", redis_client=MagicMock(),
+                                   db_session_factory=MagicMock(return_value=session), spool=spool)
+    mock_upsert.assert_called_once()
+    assert spool.appended_total == 1
+    await asyncio.sleep(0.6) # Let the abandoned insert thread finish
+    spool.close()
@@ -0,0 +1,78 @@
+"""
+Tests for the compact kline storage schema: instrument ids, float8 rows, derived close_time, reads that
+fall back to the legacy table, and the legacy -> compact copy.
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from backend.app import kline_storage
+from backend.app.config import Settings
+from backend.app.models import CompactKline, Instrument, Kline
+from backend.data_ingestion_service.kline_record import KlineRecord
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def _row(symbol: str, minute: int, close: str = "1.5") -> dict:
+    open_time = int((BASE + timedelta(minutes=minute)).timestamp() * 1000)
+    row = KlineRecord(
+        symbol=symbol, timeframe="1m", open_time=open_time, close_time=open_time + 59_999,
+        open="1.0", high="2.0", low="0.5", close=close, volume="10.0", quote_asset_volume="15.0",
+        number_of_trades=3, taker_buy_base_asset_volume="4.0", taker_buy_quote_asset_volume="6.0", is_closed=True
+    ).as_db_row()
+    row["symbol"], row["timeframe"] = symbol, "1m"
+    return row
+
+@pytest.fixture
+def compact_storage():
+    kline_storage._instrument_ids.clear()
+    with patch.object(kline_storage, "settings", Settings(KLINE_STORAGE="compact", KLINE_LEGACY_FALLBACK_READS=True)) as settings:
+        yield settings
+    kline_storage._instrument_ids.clear()
+
+def test_compact_rows_round_trip_with_derived_close_time(db_session, compact_storage):
+    assert kline_storage.insert_kline_rows(db_session, [_row("BTCUSDT", m) for m in range(3)] + [_row("ETHUSDT", 0)]) == 4
+    db_session.commit()
+    assert kline_storage.insert_kline_rows(db_session, [_row("BTCUSDT", 2), _row("BTCUSDT", 3)]) == 1 # Duplicates skipped
+    db_session.commit()
+
+    assert db_session.execute(select(func.count()).select_from(Instrument)).scalar_one() == 2
+    assert db_session.execute(select(func.count()).select_from(Kline)).scalar_one() == 0
+    newest = kline_storage.fetch_pair_klines(db_session, "BTCUSDT", "1m", BASE + timedelta(minutes=1), None, True, 2)
+    assert [k.open_time for k in newest] == [BASE + timedelta(minutes=3), BASE + timedelta(minutes=2)]
+    assert newest[0].close_time == BASE + timedelta(minutes=4) - timedelta(milliseconds=1)
+    assert newest[0].close_price == 1.5 and newest[0].number_of_trades == 3 and newest[0].symbol == "BTCUSDT"
+    assert kline_storage.history_bounds(db_session, "BTCUSDT", "1m") == (BASE, BASE + timedelta(minutes=3))
+    assert kline_storage.history_bounds(db_session, "SOLUSDT", "1m") is None
+    assert kline_storage.close_time_for(datetime(2024, 12, 1, tzinfo=timezone.utc), "1M") == datetime(2025, 1, 1, tzinfo=timezone.utc) - timedelta(milliseconds=1)
+
+def test_reads_fall_back_to_legacy_rows_not_yet_copied(db_session, compact_storage):
+    # Minutes 0-3 only in the legacy table; minute 2 also copied (with a different close, to tell them apart), 4 written after the switch
+    db_session.add_all([Kline(**_row("BTCUSDT", m, close="9.0")) for m in range(4)])
+    db_session.commit()
+    kline_storage.insert_kline_rows(db_session, [_row("BTCUSDT", 2), _row("BTCUSDT", 4)])
+    db_session.commit()
+
+    klines = kline_storage.fetch_pair_klines(db_session, "BTCUSDT", "1m", None, None, False, 10)
+    assert [(k.open_time, k.close_price) for k in klines] == [(BASE + timedelta(minutes=m), close) for m, close in ((0, 9.0), (1, 9.0), (2, 1.5), (3, 9.0), (4, 1.5))]
+    assert len(kline_storage.load_open_times(db_session, "BTCUSDT", "1m", BASE, BASE + timedelta(minutes=4))) == 4
+
+    compact_storage.KLINE_LEGACY_FALLBACK_READS = False
+    assert [k.open_time for k in kline_storage.fetch_pair_klines(db_session, "BTCUSDT", "1m", None, None, False, 10)] == \
+        [BASE + timedelta(minutes=2), BASE + timedelta(minutes=4)]
+
+def test_copy_legacy_klines_in_batches_is_idempotent(db_session, compact_storage):
+    db_session.add_all([Kline(**_row("BTCUSDT", m)) for m in range(5)] + [Kline(**_row("ETHUSDT", 0))])
+    db_session.commit()
+    factory = sessionmaker(bind=db_session.get_bind())
+
+    assert kline_storage.copy_legacy_klines(factory, batch_size=2) == 6
+    assert kline_storage.copy_legacy_klines(factory, batch_size=2) == 0
+    copied = db_session.execute(select(CompactKline).order_by(CompactKline.instrument_id, CompactKline.open_time)).scalars().all()
+    assert len(copied) == 6 and copied[0].close_price == 1.5 and copied[0].volume == 10.0
+
+    compact_storage.KLINE_LEGACY_FALLBACK_READS = False
+    assert kline_storage.history_bounds(db_session, "BTCUSDT", "1m") == (BASE, BASE + timedelta(minutes=4))
@@ -3,44 +3,46 @@ Tests for the kline_data_processor in the Data Ingestion Service main module.
 """
 import pytest
 import asyncio
+import gc
 import json
+import weakref
 from unittest.mock import MagicMock, patch, call # call for checking multiple calls
-from decimal import Decimal
 
 from backend.data_ingestion_service.main import kline_data_processor
-from backend.app.models import Kline # For constructing expected Kline object if needed
+from backend.data_ingestion_service.kline_record import KlineRecord
+from backend.data_ingestion_service.redis_scripts import get_registered_script, upsert_trim_publish, UPSERT_TRIM_PUBLISH_LUA
+from backend.app import kline_cache_codec
 from backend.app.config import Settings
-from sqlalchemy.dialects.postgresql import insert as pg_insert # To check statement type
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import SQLAlchemyError
 import redis # For redis.exceptions.RedisError
 
 pytestmark = pytest.mark.asyncio
 
+SYMBOL = "BTCUSDT"
+TIMEFRAME = "1m"
+
 @pytest.fixture
 def mock_kline_data_from_ws():
-    """Provides a sample kline data dictionary as received from BinanceWebSocketManager."""
-    return {
-        "symbol": "BTCUSDT", "timeframe": "1m", "open_time": 1678886400000,
-        "open_price": "20000.0", "high_price": "20600.0", "low_price": "19900.0", 
-        "close_price": "20500.0", "volume": "1000.0", "is_closed": True,
-        "close_time": 1678886459999, "quote_asset_volume": "20250000.0",
-        "number_of_trades": 100, "taker_buy_base_asset_volume": "500.0",
-        "taker_buy_quote_asset_volume": "10125000.0"
-        # Raw Kline data may have more fields, these are the ones used by processor
-    }
+    """Provides a sample KlineRecord as produced by BinanceWebSocketManager._parse_kline_message."""
+    return KlineRecord(
+        symbol=SYMBOL, timeframe=TIMEFRAME, open_time=1678886400000, close_time=1678886459999,
+        open="20000.0", high="20600.0", low="19900.0", close="20500.0", volume="1000.0",
+        quote_asset_volume="20250000.0", number_of_trades=100,
+        taker_buy_base_asset_volume="500.0", taker_buy_quote_asset_volume="10125000.0",
+        is_closed=True, event_time=1678886460000
+    )
 
 @pytest.fixture
 def mock_redis_client_for_processor():
     client = MagicMock(spec=redis.Redis)
-    client.zadd = MagicMock(return_value=1) # Assume 1 element added
-    client.zremrangebyrank = MagicMock(return_value=0) # Assume nothing trimmed for simplicity here
     client.publish = MagicMock(return_value=1) # Assume 1 client received
     return client
 
 @pytest.fixture
 def mock_db_session_for_processor():
     session = MagicMock()
-    session.execute = MagicMock() # Result of execute can be more complex for on_conflict
+    session.execute = MagicMock(return_value=MagicMock(rowcount=1))
     session.commit = MagicMock()
     session.rollback = MagicMock()
     session.close = MagicMock()
@@ -55,6 +57,15 @@ def mock_db_session_factory_for_processor(mock_db_session_for_processor):
 def mock_settings_for_processor():
     return Settings(MAX_KLINES_IN_REDIS=100) # Example setting
 
+async def _run_processor(kline_data, redis_client, db_session_factory):
+    await kline_data_processor(
+        kline_data,
+        symbol=SYMBOL,
+        timeframe=TIMEFRAME,
+        redis_client=redis_client,
+        db_session_factory=db_session_factory
+    )
+
 async def test_kline_processor_success_path(
     mock_kline_data_from_ws,
     mock_redis_client_for_processor,
@@ -62,69 +73,97 @@ async def test_kline_processor_success_path(
     mock_db_session_for_processor, # To assert calls on the session itself
     mock_settings_for_processor
 ):
-    """Test the success path: DB save, Redis cache update, Redis publish."""
-    
-    with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor):
-        await kline_data_processor(
+    """Test the success path: DB save, then one combined Redis cache update + publish."""
+    with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor), \
+         patch("backend.data_ingestion_service.main.upsert_trim_publish", return_value=(0, 1)) as mock_upsert:
+        await _run_processor(
             mock_kline_data_from_ws,
             mock_redis_client_for_processor,
             mock_db_session_factory_for_processor
         )
 
     # 1. DB Assertions
-    mock_db_session_factory_for_processor.assert_called_once() # Factory was called to get a session
-    # Check that execute was called with an insert statement
+    mock_db_session_factory_for_processor.assert_called_once()
     assert mock_db_session_for_processor.execute.call_count == 1
     executed_statement = mock_db_session_for_processor.execute.call_args[0][0]
-    # Check if it's a SQLAlchemy insert statement (more specific checks are harder without deep SQLAlchemy mocking)
-    # For PostgreSQL, it should be `sqlalchemy.dialects.postgresql.dml.Insert`
-    assert "INSERT INTO klines" in str(executed_statement.compile(dialect=pg_insert(Kline).dialect)).upper()
-    assert "ON CONFLICT (symbol, timeframe, open_time) DO NOTHING" in str(executed_statement.compile(dialect=pg_insert(Kline).dialect)).upper()
+    compiled_sql = str(executed_statement.compile(dialect=postgresql.dialect())).upper()
+    assert "INSERT INTO KLINES" in compiled_sql
+    assert "ON CONFLICT (SYMBOL, TIMEFRAME, OPEN_TIME) DO NOTHING" in compiled_sql
     mock_db_session_for_processor.commit.assert_called_once()
     mock_db_session_for_processor.rollback.assert_not_called()
     mock_db_session_for_processor.close.assert_called_once()
 
-    # 2. Redis Cache Assertions
-    redis_key = f"klines:{mock_kline_data_from_ws['symbol']}:{mock_kline_data_from_ws['timeframe']}"
-    expected_redis_score = mock_kline_data_from_ws['open_time']
-    # Kline data for Redis is a JSON string of the original dict, with Decimals as strings
-    expected_redis_member_dict = {
-        k: str(v) if isinstance(v, Decimal) else v 
-        for k, v in mock_kline_data_from_ws.items()
-    }
-    # The processor maps to Kline model first, then converts that to dict for JSON. So field names might differ slightly if mapping changes.
-    # Let's check the call to zadd more generically first.
-    mock_redis_client_for_processor.zadd.assert_called_once()
-    zadd_args = mock_redis_client_for_processor.zadd.call_args[0]
-    assert zadd_args[0] == redis_key
-    # zadd_args[1] is the mapping {member: score, ...}
-    # The member is a JSON string. Score is open_time.
-    # Example: ({json_string_of_kline: open_time_int})
-    # We expect only one kline to be added here.
-    added_member_json_str = list(zadd_args[1].keys())[0]
-    added_member_score = list(zadd_args[1].values())[0]
-    assert added_member_score == expected_redis_score
-    # Parse the JSON string from the zadd call to check its contents
-    added_member_dict_actual = json.loads(added_member_json_str)
-    assert added_member_dict_actual["symbol"] == mock_kline_data_from_ws["symbol"]
-    assert added_member_dict_actual["open_time"] == mock_kline_data_from_ws["open_time"]
-    assert float(added_member_dict_actual["open_price"]) == float(mock_kline_data_from_ws["open_price"]) # Compare as float due to string source
-
-    # Check trim call
-    # zremrangebyrank klines:SYMBOL:TIMEFRAME 0 -(MAX_KLINES_IN_REDIS + 1)
-    mock_redis_client_for_processor.zremrangebyrank.assert_called_once_with(
-        redis_key, 0, -(mock_settings_for_processor.MAX_KLINES_IN_REDIS + 1)
-    )
+    # 2. A single Redis round trip carries the cache upsert, the trim and the publish
+    mock_upsert.assert_called_once()
+    args = mock_upsert.call_args[0]
+    client, zset_key, member, score, max_members, channel, payload = args
+    assert client is mock_redis_client_for_processor
+    assert zset_key == f"klines:{SYMBOL}:{TIMEFRAME}"
+    assert score == mock_kline_data_from_ws.open_time # Score is open_time in ms
+    assert max_members == mock_settings_for_processor.MAX_KLINES_IN_REDIS
+    assert channel == f"kline_updates:{SYMBOL}:{TIMEFRAME}"
+
+    # The cache member is packed binary (see kline_cache_codec)
+    member_record = kline_cache_codec.decode_members([member])[0]
+    assert member_record["open_time"] == mock_kline_data_from_ws.open_time
+    assert member_record["open_price"] == 20000.0
+    assert member_record["is_closed"] == 1
 
-    # 3. Redis Pub/Sub Assertions
-    pubsub_channel = f"kline_updates:{mock_kline_data_from_ws['symbol']}:{mock_kline_data_from_ws['timeframe']}"
-    mock_redis_client_for_processor.publish.assert_called_once()
-    publish_args = mock_redis_client_for_processor.publish.call_args[0]
-    assert publish_args[0] == pubsub_channel
-    # The published message should be the same JSON string as added to the cache member.
-    published_member_dict_actual = json.loads(publish_args[1])
-    assert published_member_dict_actual["symbol"] == mock_kline_data_from_ws["symbol"]
-    assert published_member_dict_actual["open_time"] == mock_kline_data_from_ws["open_time"]
+    # Published payloads carry a float view
+    payload_dict = json.loads(payload)
+    assert payload_dict["type"] == "kline_closed"
+    assert payload_dict["data"]["open_time"] == mock_kline_data_from_ws.open_time
+    assert payload_dict["data"]["open"] == 20000.0
+    assert payload_dict["data"]["close"] == 20500.0
+
+    # The individual commands are no longer issued from Python
+    mock_redis_client_for_processor.publish.assert_not_called()
+
+async def test_kline_processor_binds_string_numerics_without_orm(
+    mock_kline_data_from_ws,
+    mock_redis_client_for_processor,
+    mock_db_session_factory_for_processor,
+    mock_db_session_for_processor,
+    mock_settings_for_processor
+):
+    """The insert binds the record's decimal strings directly; no Kline ORM object or Decimal is built."""
+    with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor), \
+         patch("backend.data_ingestion_service.main.upsert_trim_publish", return_value=(0, 1)):
+        await _run_processor(
+            mock_kline_data_from_ws,
+            mock_redis_client_for_processor,
+            mock_db_session_factory_for_processor
+        )
+
+    bound_row = mock_db_session_for_processor.execute.call_args[0][1]
+    assert bound_row["symbol"] == SYMBOL
+    assert bound_row["open_price"] == "20000.0"
+    assert bound_row["taker_buy_quote_asset_volume"] == "10125000.0"
+    assert bound_row["number_of_trades"] == 100
+    assert int(bound_row["open_time"].timestamp() * 1000) == mock_kline_data_from_ws.open_time
+
+async def test_kline_processor_tick_publishes_float_view(
+    mock_kline_data_from_ws,
+    mock_redis_client_for_processor,
+    mock_db_session_factory_for_processor,
+):
+    """Unclosed klines are only published (as floats); nothing is written to the DB or cache."""
+    mock_kline_data_from_ws.is_closed = False
+    with patch("backend.data_ingestion_service.main.upsert_trim_publish") as mock_upsert:
+        await _run_processor(
+            mock_kline_data_from_ws,
+            mock_redis_client_for_processor,
+            mock_db_session_factory_for_processor
+        )
+
+    mock_db_session_factory_for_processor.assert_not_called()
+    mock_upsert.assert_not_called()
+    channel, payload = mock_redis_client_for_processor.publish.call_args[0]
+    assert channel == f"kline_updates:{SYMBOL}:{TIMEFRAME}"
+    payload_dict = json.loads(payload)
+    assert payload_dict["type"] == "kline_tick"
+    assert payload_dict["data"]["is_closed"] is False
+    assert payload_dict["data"]["high"] == 20600.0
 
 async def test_kline_processor_db_failure(
     mock_kline_data_from_ws,
@@ -136,8 +175,9 @@ async def test_kline_processor_db_failure(
     """Test that Redis operations are skipped if DB save fails."""
     mock_db_session_for_processor.execute.side_effect = SQLAlchemyError("DB Error")
 
-    with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor):
-        await kline_data_processor(
+    with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor), \
+         patch("backend.data_ingestion_service.main.upsert_trim_publish") as mock_upsert:
+        await _run_processor(
             mock_kline_data_from_ws,
             mock_redis_client_for_processor,
             mock_db_session_factory_for_processor
@@ -148,84 +188,84 @@ async def test_kline_processor_db_failure(
     mock_db_session_for_processor.rollback.assert_called_once()
     mock_db_session_for_processor.close.assert_called_once()
 
-    mock_redis_client_for_processor.zadd.assert_not_called()
-    mock_redis_client_for_processor.zremrangebyrank.assert_not_called()
-    mock_redis_client_for_processor.publish.assert_not_called()
+    mock_upsert.assert_not_called()
 
-async def test_kline_processor_redis_cache_failure(
+async def test_kline_processor_redis_script_failure(
     mock_kline_data_from_ws,
     mock_redis_client_for_processor,
     mock_db_session_factory_for_processor,
     mock_db_session_for_processor, # For DB success checks
     mock_settings_for_processor
 ):
-    """Test that Pub/Sub still happens if Redis cache update (zadd) fails, but logs error."""
-    mock_redis_client_for_processor.zadd.side_effect = redis.exceptions.RedisError("Cache Error")
-    
-    # We need to patch logger to check for error logs
-    with patch("backend.data_ingestion_service.main.logger.error") as mock_logger_error:
-        with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor):
-            await kline_data_processor(
-                mock_kline_data_from_ws,
-                mock_redis_client_for_processor,
-                mock_db_session_factory_for_processor
-            )
+    """Test that a failing Redis script is logged and does not raise."""
+    with patch("backend.data_ingestion_service.main.logger.error") as mock_logger_error, \
+         patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor), \
+         patch("backend.data_ingestion_service.main.upsert_trim_publish",
+               side_effect=redis.exceptions.RedisError("Cache Error")) as mock_upsert:
+        await _run_processor(
+            mock_kline_data_from_ws,
+            mock_redis_client_for_processor,
+            mock_db_session_factory_for_processor
+        )
 
     # DB should succeed
     mock_db_session_for_processor.execute.assert_called_once()
     mock_db_session_for_processor.commit.assert_called_once()
 
-    # Redis cache (zadd) was called and failed
-    mock_redis_client_for_processor.zadd.assert_called_once()
-    # zremrangebyrank should still be called as it's in a separate try-except in the original code
-    # (though logically it might be better if it also depended on zadd success)
-    # Current code has trim in a separate try-block, so it *will* be called.
-    mock_redis_client_for_processor.zremrangebyrank.assert_called_once()
-    
-    # Check that an error was logged for the zadd failure
-    # mock_logger_error.assert_any_call(f"Error updating Redis cache for ...: Cache Error") # Exact message matching
-    assert mock_logger_error.call_count > 0 # Check at least one error was logged for Redis cache
-    # Verify that the error log contains relevant info
-    found_cache_error_log = False
-    for call_arg in mock_logger_error.call_args_list:
-        if "Error updating Redis cache" in call_arg[0][0] and "Cache Error" in str(call_arg[0][1]):
-            found_cache_error_log = True
-            break
+    mock_upsert.assert_called_once()
+    found_cache_error_log = any(
+        "Error updating Redis cache" in call_arg[0][0] and "Cache Error" in call_arg[0][0]
+        for call_arg in mock_logger_error.call_args_list
+    )
     assert found_cache_error_log, "Expected Redis cache error was not logged"
 
-    # Pub/Sub should still be attempted and succeed
-    mock_redis_client_for_processor.publish.assert_called_once()
+async def test_upsert_trim_publish_runs_single_script_call():
+    """The helper registers the Lua script once per client and issues one call per kline."""
+    mock_script = MagicMock(return_value=[3, 2])
+    client = MagicMock(spec=redis.Redis)
+    client.register_script = MagicMock(return_value=mock_script)
+
+    result_first = upsert_trim_publish(client, "klines:ETHUSDT:5m", '{"open_time": 1}', 1, 10, "kline_updates:ETHUSDT:5m", "{}")
+    result_second = upsert_trim_publish(client, "klines:ETHUSDT:5m", '{"open_time": 2}', 2, 10, "kline_updates:ETHUSDT:5m", "{}")
+
+    client.register_script.assert_called_once_with(UPSERT_TRIM_PUBLISH_LUA)
+    assert mock_script.call_count == 2
+    mock_script.assert_called_with(
+        keys=["klines:ETHUSDT:5m"],
+        args=['{"open_time": 2}', 2, 10, "kline_updates:ETHUSDT:5m", "{}"]
+    )
+    assert result_first == (3, 2)
+    assert result_second == (3, 2)
+    client.zadd.assert_not_called()
+    client.zcard.assert_not_called()
+    client.zremrangebyrank.assert_not_called()
 
-async def test_kline_processor_redis_publish_failure(
+async def test_registered_scripts_do_not_keep_clients_alive():
+    """Scripts are cached on their client, so a dropped client (and its scripts) can be collected."""
+    client = redis.Redis()
+    script = get_registered_script(client, UPSERT_TRIM_PUBLISH_LUA)
+    assert get_registered_script(client, UPSERT_TRIM_PUBLISH_LUA) is script
+    client_ref = weakref.ref(client)
+    del client, script
+    gc.collect()
+    assert client_ref() is None
+
+async def test_kline_processor_fenced_by_lease(
     mock_kline_data_from_ws,
     mock_redis_client_for_processor,
     mock_db_session_factory_for_processor,
-    mock_db_session_for_processor, # For DB/Cache success checks
     mock_settings_for_processor
 ):
-    """Test that DB and Cache can succeed, but if Publish fails, an error is logged."""
-    mock_redis_client_for_processor.publish.side_effect = redis.exceptions.RedisError("Publish Error")
-
-    with patch("backend.data_ingestion_service.main.logger.error") as mock_logger_error:
-        with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor):
-            await kline_data_processor(
-                mock_kline_data_from_ws,
-                mock_redis_client_for_processor,
-                mock_db_session_factory_for_processor
-            )
-    
-    # DB and Cache should succeed
-    mock_db_session_for_processor.execute.assert_called_once()
-    mock_db_session_for_processor.commit.assert_called_once()
-    mock_redis_client_for_processor.zadd.assert_called_once()
-    mock_redis_client_for_processor.zremrangebyrank.assert_called_once()
-
-    # Publish was called and failed
-    mock_redis_client_for_processor.publish.assert_called_once()
-    # Check for error log related to publish failure
-    found_publish_error_log = False
-    for call_arg in mock_logger_error.call_args_list:
-        if "Error publishing kline to Redis Pub/Sub" in call_arg[0][0] and "Publish Error" in str(call_arg[0][1]):
-            found_publish_error_log = True
-            break
-    assert found_publish_error_log, "Expected Redis publish error was not logged" 
\ No newline at end of file
+    """With a lease, closed klines go through the fenced script and ticks through publish_if_owner."""
+    lease = {"lease_key": "ingestion:lease:BTCUSDT:1m", "lease_owner": "worker-a"}
+    with patch("backend.data_ingestion_service.main.settings", mock_settings_for_processor), \
+         patch("backend.data_ingestion_service.main.upsert_trim_publish", return_value=(-1, 0)) as mock_upsert, \
+         patch("backend.data_ingestion_service.main.publish_if_owner", return_value=-1) as mock_publish_if_owner:
+        await kline_data_processor(mock_kline_data_from_ws, SYMBOL, TIMEFRAME, mock_redis_client_for_processor, mock_db_session_factory_for_processor, **lease)
+        mock_kline_data_from_ws.is_closed = False
+        await kline_data_processor(mock_kline_data_from_ws, SYMBOL, TIMEFRAME, mock_redis_client_for_processor, mock_db_session_factory_for_processor, **lease)
+
+    assert mock_upsert.call_args[1] == lease
+    lease_key, lease_owner, channel, _payload = mock_publish_if_owner.call_args[0][1:]
+    assert (lease_key, lease_owner, channel) == (lease["lease_key"], "worker-a", f"kline_updates:{SYMBOL}:{TIMEFRAME}")
+    mock_redis_client_for_processor.publish.assert_not_called()
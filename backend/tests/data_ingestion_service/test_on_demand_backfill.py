@@ -0,0 +1,122 @@
+"""
+Tests for on-demand backfills: ranges requested by chart reads, deduplicated in Redis and run ahead of gap repairs.
+"""
+import asyncio
+import pytest
+from unittest.mock import ANY, MagicMock, patch
+
+from backend.app import ingestion_control
+from backend.app.routers.data import _older_history_range
+from backend.data_ingestion_service import gap_scanner
+from backend.data_ingestion_service.gap_scanner import (
+    GapRepairQueue, PRIORITY_INTERACTIVE, gap_repair_worker, backfill_request_listener
+)
+
+MINUTE_MS = 60_000
+
+def test_backfill_request_is_queued_once_and_not_below_history_floor():
+    redis_client = MagicMock()
+    redis_client.get.return_value = None
+    redis_client.set.side_effect = [True, False]
+
+    assert ingestion_control.request_backfill(redis_client, "btcusdt", "1m", 0, 10 * MINUTE_MS) == ingestion_control.BACKFILL_STATUS_QUEUED
+    redis_client.get.side_effect = lambda key: ingestion_control.BACKFILL_STATUS_IN_PROGRESS if key.startswith(ingestion_control.BACKFILL_REQUEST_KEY_PREFIX) else None
+    assert ingestion_control.request_backfill(redis_client, "BTCUSDT", "1m", 0, 10 * MINUTE_MS) == ingestion_control.BACKFILL_STATUS_IN_PROGRESS
+    redis_client.zadd.assert_called_once_with(ingestion_control.BACKFILL_REQUEST_QUEUE_KEY, {f"BTCUSDT:1m:0-{10 * MINUTE_MS}": ANY})
+
+    redis_client.get.side_effect = lambda key: str(20 * MINUTE_MS) if key == ingestion_control.history_floor_key("BTCUSDT", "1m") else None
+    assert ingestion_control.request_backfill(redis_client, "BTCUSDT", "1m", 0, 10 * MINUTE_MS) == ingestion_control.BACKFILL_STATUS_NO_OLDER_DATA
+    assert ingestion_control.parse_backfill_request_member(f"BTCUSDT:1m:0-{MINUTE_MS}") == ("BTCUSDT", "1m", 0, MINUTE_MS)
+    assert ingestion_control.parse_backfill_request_member("BTCUSDT:1m:garbage") is None
+
+def test_reads_past_stored_history_request_a_backfill_for_every_fixed_timeframe():
+    hour_ms = 60 * MINUTE_MS
+    oldest_ms = 5000 * 2 * hour_ms
+    # 2h is subscribable but was missing from the router's own timeframe table
+    assert _older_history_range("2h", oldest_ms, 10, None) == (4000 * 2 * hour_ms, oldest_ms)
+    for timeframe in ingestion_control.SUPPORTED_TIMEFRAMES - {"1M"}:
+        assert _older_history_range(timeframe, 10**13, 10, None) is not None, timeframe
+    assert _older_history_range("1M", 10**13, 10, None) is None # Calendar months have no fixed length
+
+@pytest.mark.asyncio
+async def test_interactive_ranges_jump_the_repair_queue():
+    queue = GapRepairQueue(maxsize=2)
+    assert queue.offer("BTCUSDT", "1m", 0, MINUTE_MS)
+    assert queue.offer("BTCUSDT", "1m", 5 * MINUTE_MS, 6 * MINUTE_MS)
+    assert not queue.offer("BTCUSDT", "1m", 8 * MINUTE_MS, 9 * MINUTE_MS) # Background repairs are bounded
+    assert queue.offer("ETHUSDT", "1h", 0, 10 * MINUTE_MS, priority=PRIORITY_INTERACTIVE) # Interactive ones are not
+
+    first = await queue.get()
+    assert first == ("ETHUSDT", "1h", 0, 10 * MINUTE_MS)
+    assert queue.priority(first) == PRIORITY_INTERACTIVE
+    assert await queue.get() == ("BTCUSDT", "1m", 0, MINUTE_MS)
+    queue.done(first)
+    assert queue.pending_count(PRIORITY_INTERACTIVE) == 0
+
+@pytest.mark.asyncio
+async def test_worker_serves_interactive_ranges_without_the_gap_fill_semaphore():
+    queue = GapRepairQueue(maxsize=10)
+    queue.offer("BTCUSDT", "1m", 0, 10 * MINUTE_MS, priority=PRIORITY_INTERACTIVE)
+    queue.offer("BTCUSDT", "1m", 10 * MINUTE_MS, 20 * MINUTE_MS, priority=PRIORITY_INTERACTIVE)
+    redis_client = MagicMock()
+    redis_client.get.return_value = None
+    shutdown = asyncio.Event()
+    results = iter([(0, 0, True), (10, 0, True)])
+
+    async def fake_fetch(*args, **kwargs):
+        result = next(results)
+        if result == (10, 0, True):
+            shutdown.set()
+        return result
+
+    # A semaphore nobody can acquire: the worker would hang if interactive ranges waited for startup gap fills
+    with patch.object(gap_scanner, "fetch_and_save_historical_klines", side_effect=fake_fetch):
+        await asyncio.wait_for(gap_repair_worker(queue, redis_client, None, asyncio.Semaphore(0), None, shutdown), timeout=5)
+
+    statuses = [(c.args[0], c.args[1]) for c in redis_client.set.call_args_list if c.args[0].startswith(ingestion_control.BACKFILL_REQUEST_KEY_PREFIX)]
+    second_key = ingestion_control.backfill_request_key("BTCUSDT", "1m", 10 * MINUTE_MS, 20 * MINUTE_MS)
+    assert statuses[-2:] == [(second_key, ingestion_control.BACKFILL_STATUS_IN_PROGRESS), (second_key, ingestion_control.BACKFILL_STATUS_COMPLETED)]
+    # The empty range was before the pair's listing: the floor stops further requests, it isn't a gap to rescan
+    redis_client.set.assert_any_call(ingestion_control.history_floor_key("BTCUSDT", "1m"), 10 * MINUTE_MS, ex=gap_scanner.HISTORY_FLOOR_TTL_SECONDS)
+    redis_client.pipeline.assert_not_called() # Nor marked unfillable
+
+@pytest.mark.asyncio
+async def test_listener_takes_one_request_at_a_time():
+    queue = GapRepairQueue(maxsize=10)
+    shutdown = asyncio.Event()
+    requests = iter([("BTCUSDT", "1m", 0, MINUTE_MS), ("ETHUSDT", "1m", 0, MINUTE_MS)])
+
+    def fake_pop(redis_client, timeout_seconds):
+        return next(requests)
+
+    with patch.object(ingestion_control, "pop_backfill_request", side_effect=fake_pop) as pop:
+        listener = asyncio.create_task(backfill_request_listener(queue, MagicMock(), shutdown))
+        await asyncio.sleep(0.1)
+        assert pop.call_count == 1 # The first request is still pending here
+        queue.done(await queue.get())
+        await asyncio.sleep(gap_scanner.BACKFILL_REQUEST_POLL_SECONDS + 0.2)
+        shutdown.set()
+        await asyncio.wait_for(listener, timeout=5)
+
+    assert pop.call_count == 2
+    assert await queue.get() == ("ETHUSDT", "1m", 0, MINUTE_MS)
+
+@pytest.mark.asyncio
+async def test_failed_interactive_fetch_is_reported_failed_without_raising_the_floor():
+    queue = GapRepairQueue(maxsize=10)
+    queue.offer("BTCUSDT", "1m", 0, 10 * MINUTE_MS, priority=PRIORITY_INTERACTIVE)
+    redis_client = MagicMock()
+    shutdown = asyncio.Event()
+
+    async def failed_fetch(*args, **kwargs):
+        shutdown.set()
+        return 0, 0, False # e.g. Binance answered 503 or rate limited us until the retries ran out
+
+    with patch.object(gap_scanner, "fetch_and_save_historical_klines", side_effect=failed_fetch):
+        await asyncio.wait_for(gap_repair_worker(queue, redis_client, None, asyncio.Semaphore(0), None, shutdown), timeout=5)
+
+    request_key = ingestion_control.backfill_request_key("BTCUSDT", "1m", 0, 10 * MINUTE_MS)
+    statuses = [c.args[1] for c in redis_client.set.call_args_list if c.args[0] == request_key]
+    assert statuses == [ingestion_control.BACKFILL_STATUS_IN_PROGRESS, ingestion_control.BACKFILL_STATUS_FAILED]
+    assert ingestion_control.history_floor_key("BTCUSDT", "1m") not in [c.args[0] for c in redis_client.set.call_args_list]
+    redis_client.pipeline.assert_not_called()
@@ -0,0 +1,186 @@
+"""
+Tests for sharded ingestion: consistent hashing, lease handoff and fencing of Redis writes.
+"""
+import asyncio
+import pytest
+import time
+from collections import Counter
+from unittest.mock import MagicMock
+
+from backend.app import ingestion_control
+from backend.data_ingestion_service.sharding import HashRing, LeaseCoordinator, rebalance_once, desired_pairs, pair_lease_key
+
+PAIRS = [(f"COIN{i}USDT", tf) for i in range(50) for tf in ("1m", "5m", "1h")]
+
+class InMemoryLeaseStore:
+    """The subset of Redis semantics the LeaseCoordinator relies on, shared between simulated workers."""
+    def __init__(self):
+        self.values = {}
+        self.expires_at = {}
+        self.workers = {}
+
+    def _alive(self, key):
+        if key in self.expires_at and self.expires_at[key] <= time.time() * 1000:
+            self.values.pop(key, None)
+            self.expires_at.pop(key, None)
+        return key in self.values
+
+    def client(self):
+        store = self
+        client = MagicMock()
+
+        def set_(key, value, nx=False, px=None):
+            if nx and store._alive(key):
+                return None
+            store.values[key] = value
+            store.expires_at[key] = time.time() * 1000 + px
+            return True
+        client.set.side_effect = set_
+
+        def register_script(source):
+            def run(keys, args):
+                key = keys[0]
+                owned = store._alive(key) and store.values[key] == args[0]
+                if "PEXPIRE" in source:
+                    if owned:
+                        store.expires_at[key] = time.time() * 1000 + int(args[1])
+                    return int(owned)
+                if owned: # Release
+                    del store.values[key]
+                    store.expires_at.pop(key, None)
+                return int(owned)
+            return run
+        client.register_script.side_effect = register_script
+
+        def pipeline():
+            calls = []
+            pipe = MagicMock()
+            pipe.zadd.side_effect = lambda key, mapping: calls.append(("zadd", mapping))
+            pipe.zremrangebyscore.side_effect = lambda key, lo, hi: calls.append(("zrem", hi))
+            pipe.zrange.side_effect = lambda key, a, b: calls.append(("zrange",))
+            def execute():
+                for call in calls:
+                    if call[0] == "zadd":
+                        store.workers.update(call[1])
+                    elif call[0] == "zrem":
+                        for worker, beat in list(store.workers.items()):
+                            if beat <= call[1]:
+                                del store.workers[worker]
+                return [1, 0, sorted(store.workers)]
+            pipe.execute.side_effect = execute
+            return pipe
+        client.pipeline.side_effect = pipeline
+        client.zrem.side_effect = lambda key, worker: store.workers.pop(worker, None)
+        return client
+
+class FakeRegistry:
+    def __init__(self):
+        self.pairs = {}
+        self.proactive_pairs = set(PAIRS)
+
+    async def start_pair(self, symbol, timeframe, dynamic=False):
+        self.pairs[(symbol, timeframe)] = True
+
+    async def stop_pair(self, symbol, timeframe):
+        self.pairs.pop((symbol, timeframe), None)
+
+def test_hash_ring_splits_pairs_and_moves_few_on_join():
+    members = [ingestion_control.pair_member(s, tf) for s, tf in PAIRS]
+    ring_two = HashRing(["worker-a", "worker-b"])
+    ring_three = HashRing(["worker-a", "worker-b", "worker-c"])
+
+    counts = Counter(ring_two.owner(m) for m in members)
+    assert set(counts) == {"worker-a", "worker-b"}
+    assert min(counts.values()) > len(members) * 0.3 # Reasonably even split
+
+    moved = [m for m in members if ring_two.owner(m) != ring_three.owner(m)]
+    assert all(ring_three.owner(m) == "worker-c" for m in moved) # Only pairs taken by the new worker move
+    assert HashRing([]).owner("BTCUSDT:1m") is None
+
+@pytest.mark.asyncio
+async def test_rebalance_hands_off_without_double_ownership():
+    store = InMemoryLeaseStore()
+    worker_a = LeaseCoordinator(store.client(), "worker-a", lease_ttl_ms=10000)
+    worker_b = LeaseCoordinator(store.client(), "worker-b", lease_ttl_ms=10000)
+    registry_a, registry_b = FakeRegistry(), FakeRegistry()
+    universe = set(PAIRS)
+
+    # A alone owns everything
+    await rebalance_once(registry_a, worker_a, universe)
+    assert set(registry_a.pairs) == universe
+
+    # B joins: it is assigned half the pairs but can't start them while A still holds the leases
+    assigned_to_b = await rebalance_once(registry_b, worker_b, universe)
+    assert assigned_to_b and not registry_b.pairs
+
+    # A sees B, stops and releases B's share; B picks it up on its next round
+    await rebalance_once(registry_a, worker_a, universe)
+    await rebalance_once(registry_b, worker_b, universe)
+    assert set(registry_b.pairs) == assigned_to_b
+    assert set(registry_a.pairs) == universe - assigned_to_b
+    assert not set(registry_a.pairs) & set(registry_b.pairs)
+    for symbol, timeframe in registry_b.pairs:
+        assert store.values[pair_lease_key(symbol, timeframe)] == "worker-b"
+
+@pytest.mark.asyncio
+async def test_crashed_worker_pairs_are_taken_over_after_lease_expiry():
+    store = InMemoryLeaseStore()
+    worker_a = LeaseCoordinator(store.client(), "worker-a", lease_ttl_ms=50)
+    worker_b = LeaseCoordinator(store.client(), "worker-b", lease_ttl_ms=50)
+    registry_a, registry_b = FakeRegistry(), FakeRegistry()
+    universe = set(PAIRS)
+
+    await rebalance_once(registry_a, worker_a, universe)
+    await rebalance_once(registry_b, worker_b, universe)
+    await rebalance_once(registry_a, worker_a, universe)
+    await rebalance_once(registry_b, worker_b, universe)
+    assert registry_a.pairs and registry_b.pairs
+
+    # A stops heartbeating; once its heartbeat and leases expire B owns every pair
+    time.sleep(0.06)
+    await rebalance_once(registry_b, worker_b, universe)
+    assert set(registry_b.pairs) == universe
+    assert desired_pairs(universe, HashRing(["worker-b"]), "worker-b") == universe
+
+@pytest.mark.asyncio
+async def test_lost_lease_stops_pair():
+    store = InMemoryLeaseStore()
+    worker_a = LeaseCoordinator(store.client(), "worker-a", lease_ttl_ms=10000)
+    registry_a = FakeRegistry()
+    universe = {("BTCUSDT", "1m")}
+    await rebalance_once(registry_a, worker_a, universe)
+    assert registry_a.pairs
+
+    store.values[pair_lease_key("BTCUSDT", "1m")] = "worker-z" # Lease taken over (e.g. A was paused past its TTL)
+    await rebalance_once(registry_a, worker_a, universe)
+    assert not registry_a.pairs
+
+class SlowStoppingRegistry(FakeRegistry):
+    def __init__(self, events):
+        super().__init__()
+        self.events = events
+
+    async def stop_pair(self, symbol, timeframe):
+        self.events.append("stop")
+        await asyncio.sleep(0.05) # A pair task slow to wind down
+        await super().stop_pair(symbol, timeframe)
+
+@pytest.mark.asyncio
+async def test_kept_leases_are_renewed_before_slow_handoffs():
+    store = InMemoryLeaseStore()
+    events = []
+    worker_a = LeaseCoordinator(store.client(), "worker-a", lease_ttl_ms=10000)
+    worker_b = LeaseCoordinator(store.client(), "worker-b", lease_ttl_ms=10000)
+    renew = worker_a.renew
+    worker_a.renew = lambda pairs: events.append("renew") or renew(pairs)
+    registry_a = SlowStoppingRegistry(events)
+    universe = set(PAIRS)
+    await rebalance_once(registry_a, worker_a, universe)
+    assigned_to_b = await rebalance_once(FakeRegistry(), worker_b, universe)
+    events.clear()
+
+    started = time.monotonic()
+    await rebalance_once(registry_a, worker_a, universe)
+    assert events[0] == "renew" and events.count("stop") == len(assigned_to_b)
+    assert time.monotonic() - started < 0.05 * len(assigned_to_b) / 2 # Handoffs stopped concurrently
+    assert set(registry_a.pairs) == universe - assigned_to_b
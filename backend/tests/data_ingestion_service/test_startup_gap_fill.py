@@ -0,0 +1,77 @@
+"""
+Tests for startup gap filling support: the closed-kline buffer and the shared request weight budget.
+"""
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from backend.data_ingestion_service.kline_record import KlineRecord
+from backend.data_ingestion_service.startup_buffer import ClosedKlineBuffer
+from backend.data_ingestion_service.rate_limiter import RequestWeightBudget
+
+pytestmark = pytest.mark.asyncio
+
+def _record(open_time: int, is_closed: bool = True, close: str = "1.0") -> KlineRecord:
+    return KlineRecord(
+        symbol="BTCUSDT", timeframe="1m", open_time=open_time, close_time=open_time + 59999,
+        open="1.0", high="1.0", low="1.0", close=close, volume="1.0",
+        quote_asset_volume="1.0", number_of_trades=1,
+        taker_buy_base_asset_volume="1.0", taker_buy_quote_asset_volume="1.0",
+        is_closed=is_closed
+    )
+
+async def test_buffer_passes_ticks_and_holds_closed_klines_until_release():
+    processor = AsyncMock()
+    buffer = ClosedKlineBuffer("BTCUSDT", "1m", processor)
+
+    await buffer.handle(_record(120000))
+    await buffer.handle(_record(60000))
+    await buffer.handle(_record(180000, is_closed=False))
+    await buffer.handle(_record(60000, close="2.0")) # Duplicate open_time supersedes the earlier one
+
+    # Only the live tick went through
+    assert processor.await_count == 1
+    assert processor.await_args_list[0][0][0].is_closed is False
+    assert buffer.pending_count == 2
+
+    await buffer.release()
+    replayed = [c[0][0] for c in processor.await_args_list[1:]]
+    assert [k.open_time for k in replayed] == [60000, 120000]
+    assert replayed[0].close == "2.0"
+    assert buffer.is_live is True
+    assert buffer.pending_count == 0
+
+    # After release closed klines go straight through
+    await buffer.handle(_record(240000))
+    assert processor.await_args_list[-1][0][0].open_time == 240000
+
+async def test_buffer_release_drains_klines_arriving_during_replay():
+    buffer = None
+    seen = []
+
+    async def processor(kline):
+        seen.append(kline.open_time)
+        if kline.open_time == 60000:
+            await buffer.handle(_record(120000)) # Arrives while the replay is in flight
+
+    buffer = ClosedKlineBuffer("BTCUSDT", "1m", processor)
+    await buffer.handle(_record(60000))
+    await buffer.release()
+    assert seen == [60000, 120000]
+
+async def test_weight_budget_waits_when_exhausted():
+    budget = RequestWeightBudget(weight_per_minute=60) # Refills 1 weight per second
+    with patch("backend.data_ingestion_service.rate_limiter.asyncio.sleep", new=AsyncMock()) as mock_sleep:
+        for _ in range(30):
+            await budget.acquire(2)
+        mock_sleep.assert_not_awaited() # The first minute's budget is available as a burst
+
+        with patch.object(budget, "_refill"): # Freeze the clock so the wait can't be satisfied by elapsed time
+            budget._tokens = 0.0
+            mock_sleep.side_effect = lambda seconds: setattr(budget, "_tokens", budget._tokens + seconds)
+            await budget.acquire(2)
+        mock_sleep.assert_awaited_once()
+        assert mock_sleep.await_args[0][0] == pytest.approx(2.0)
+
+async def test_weight_budget_rejects_non_positive_budget():
+    with pytest.raises(ValueError):
+        RequestWeightBudget(0)
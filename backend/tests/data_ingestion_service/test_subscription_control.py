@@ -0,0 +1,101 @@
+"""
+Tests for runtime subscription control: control stream commands and idle pair eviction.
+"""
+import pytest
+import time
+from unittest.mock import MagicMock, patch
+
+from backend.app import ingestion_control
+from backend.app.config import Settings
+from backend.data_ingestion_service.subscription_control import handle_control_command, evict_idle_pairs
+
+pytestmark = pytest.mark.asyncio
+
+class FakeRegistry:
+    """Stands in for main.PairRegistry."""
+    def __init__(self, proactive_pairs=()):
+        self.proactive_pairs = set(proactive_pairs)
+        self.rebalance_count = 0
+
+    def request_rebalance(self):
+        self.rebalance_count += 1
+
+def _fake_redis(tracked=()):
+    """MagicMock Redis client backed by a real set for ingestion:tracked_pairs."""
+    members = {ingestion_control.pair_member(s, tf) for s, tf in tracked}
+    redis_client = MagicMock()
+    redis_client.smembers.side_effect = lambda key: set(members)
+    redis_client.sadd.side_effect = lambda key, *values: members.update(values)
+    redis_client.srem.side_effect = lambda key, *values: members.difference_update(values)
+    redis_client.members = members
+    return redis_client
+
+def _command(command, symbol, timeframe):
+    return {"command": command, "symbol": symbol, "timeframe": timeframe, "source": "test"}
+
+async def test_subscribe_adds_pair_to_tracked_set_once():
+    registry = FakeRegistry()
+    redis_client = _fake_redis()
+
+    await handle_control_command(registry, redis_client, _command("subscribe", "solusdt", "5m"))
+    await handle_control_command(registry, redis_client, _command("subscribe", "SOLUSDT", "5m"))
+
+    assert redis_client.members == {"SOLUSDT:5m"}
+    assert registry.rebalance_count == 1
+    redis_client.zadd.assert_called_once() # Request counts as an access
+
+async def test_subscribe_rejects_invalid_pairs_and_respects_limit():
+    registry = FakeRegistry(proactive_pairs=[("BTCUSDT", "1h")])
+    redis_client = _fake_redis(tracked=[("BTCUSDT", "1h")])
+
+    await handle_control_command(registry, redis_client, _command("subscribe", "BTC/USDT", "1m"))
+    await handle_control_command(registry, redis_client, _command("subscribe", "BTCUSDT", "7m"))
+    assert redis_client.members == {"BTCUSDT:1h"}
+
+    # Proactive pairs don't count towards the dynamic limit
+    with patch("backend.data_ingestion_service.subscription_control.settings", Settings(INGESTION_MAX_DYNAMIC_PAIRS=1)):
+        await handle_control_command(registry, redis_client, _command("subscribe", "BTCUSDT", "1m"))
+        await handle_control_command(registry, redis_client, _command("subscribe", "ETHUSDT", "1m"))
+    assert redis_client.members == {"BTCUSDT:1h", "BTCUSDT:1m"}
+
+async def test_unsubscribe_only_removes_dynamic_pairs():
+    registry = FakeRegistry(proactive_pairs=[("BTCUSDT", "1m")])
+    redis_client = _fake_redis(tracked=[("BTCUSDT", "1m"), ("ETHUSDT", "1m")])
+
+    await handle_control_command(registry, redis_client, _command("unsubscribe", "BTCUSDT", "1m"))
+    await handle_control_command(registry, redis_client, _command("unsubscribe", "ETHUSDT", "1m"))
+
+    assert redis_client.members == {"BTCUSDT:1m"}
+
+async def test_evict_idle_pairs_uses_last_access():
+    long_ago = time.time() - 3600
+    registry = FakeRegistry(proactive_pairs=[("BTCUSDT", "1m")]) # Proactive: never evicted
+    redis_client = _fake_redis(tracked=[("BTCUSDT", "1m"), ("ETHUSDT", "1m"), ("SOLUSDT", "1m")])
+    last_access = {
+        ingestion_control.pair_member("ETHUSDT", "1m"): time.time() - 10, # Viewed recently
+        ingestion_control.pair_member("SOLUSDT", "1m"): long_ago,         # Idle
+    }
+    redis_client.zscore.side_effect = lambda key, member: last_access.get(member)
+
+    with patch("backend.data_ingestion_service.subscription_control.settings", Settings(INGESTION_PAIR_IDLE_EVICTION_SECONDS=600)):
+        evicted = await evict_idle_pairs(registry, redis_client)
+
+    assert evicted == 1
+    assert redis_client.members == {"BTCUSDT:1m", "ETHUSDT:1m"}
+    assert registry.rebalance_count == 1
+
+async def test_request_pair_ingestion_skips_tracked_and_recently_requested_pairs():
+    redis_client = MagicMock()
+    redis_client.sismember.return_value = False
+    redis_client.set.side_effect = [True, None] # Second request within the dedup window
+
+    assert ingestion_control.request_pair_ingestion(redis_client, "adausdt", "1h") is True
+    assert ingestion_control.request_pair_ingestion(redis_client, "ADAUSDT", "1h") is False
+    redis_client.xadd.assert_called_once()
+    stream, fields = redis_client.xadd.call_args[0]
+    assert stream == ingestion_control.INGESTION_CONTROL_STREAM
+    assert fields["command"] == "subscribe" and fields["symbol"] == "ADAUSDT" and fields["timeframe"] == "1h"
+
+    redis_client.sismember.return_value = True
+    assert ingestion_control.request_pair_ingestion(redis_client, "BTCUSDT", "1m") is False
+    assert redis_client.xadd.call_count == 1
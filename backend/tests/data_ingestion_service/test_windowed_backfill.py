@@ -0,0 +1,102 @@
+"""
+Tests for windowed, weight-governed historical backfill against the local mock exchange.
+"""
+import pytest
+import time
+import httpx
+from unittest.mock import patch
+
+from backend.app import ingestion_control
+from backend.app.config import Settings
+from backend.data_ingestion_service.historical_data_fetcher import (
+    TIMEFRAME_TO_BINANCE_INTERVAL, TIMEFRAME_TO_MS, fetch_historical_klines, _split_into_windows
+)
+from backend.data_ingestion_service.rate_limiter import RequestWeightBudget
+from backend.mock_exchange_server.app import create_app
+
+MINUTE_MS = 60_000
+START_MS = 1_700_000_000_000 // MINUTE_MS * MINUTE_MS
+
+def _mock_exchange_client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://mock-exchange")
+
+@pytest.fixture
+def mock_exchange_settings():
+    return Settings(BINANCE_REST_BASE_URL="http://mock-exchange", BINANCE_API_KEY=None)
+
+def test_split_into_windows_covers_range_exactly():
+    windows = _split_into_windows(0, 2500, 1000)
+    assert windows == [(0, 1000), (1000, 2000), (2000, 2500)]
+    assert _split_into_windows(5, 5, 1000) == []
+
+@pytest.mark.asyncio
+async def test_every_subscribable_timeframe_can_be_fetched(mock_exchange_settings):
+    assert ingestion_control.SUPPORTED_TIMEFRAMES <= set(TIMEFRAME_TO_MS) == set(TIMEFRAME_TO_BINANCE_INTERVAL)
+    async with _mock_exchange_client(create_app(weight_limit=100000, window_seconds=60.0)) as client:
+        with patch("backend.data_ingestion_service.historical_data_fetcher.settings", mock_exchange_settings):
+            klines = await fetch_historical_klines("BTCUSDT", "1s", START_MS, START_MS + 2500 * 1000, client=client)
+    assert [int(k.open_time.timestamp() * 1000) for k in klines] == list(range(START_MS, START_MS + 2500 * 1000, 1000))
+
+@pytest.mark.asyncio
+async def test_windowed_fetch_is_complete_ordered_and_within_weight(mock_exchange_settings):
+    """
+    Concurrent windows return every kline exactly once, in order, without tripping the limit. The budget is
+    half the server limit (like the 1200/6000 defaults): a full bucket plus one window of refill then never
+    exceeds what the server allows in any of its fixed windows.
+    """
+    app = create_app(weight_limit=40, window_seconds=1.0)
+    budget = RequestWeightBudget(20, window_seconds=1.0)
+    end_ms = START_MS + 30 * 100 * MINUTE_MS # 30 windows of 100 klines = 60 weight, more than one server window allows
+    progress = []
+
+    async def on_progress(fetched, until_ms):
+        progress.append((fetched, until_ms))
+
+    async with _mock_exchange_client(app) as client:
+        with patch("backend.data_ingestion_service.historical_data_fetcher.settings", mock_exchange_settings):
+            klines = await fetch_historical_klines(
+                "BTCUSDT", "1m", START_MS, end_ms, limit_per_api_call=100,
+                weight_budget=budget, progress_callback=on_progress, max_concurrent_windows=8, client=client
+            )
+
+    open_times = [int(k.open_time.timestamp() * 1000) for k in klines]
+    assert open_times == list(range(START_MS, end_ms, MINUTE_MS))
+    assert app.state.exchange.requests_served == 30
+    assert app.state.exchange.rate_limited_responses == 0
+    assert app.state.exchange.ban_responses == 0
+    assert progress[-1] == (3000, end_ms)
+    assert [until for _, until in progress] == sorted(until for _, until in progress) # Contiguous progress only moves forward
+
+@pytest.mark.asyncio
+async def test_used_weight_header_and_retry_after_govern_the_limiter(mock_exchange_settings):
+    """
+    Another client on the same IP has already used most of the window. The used-weight header shrinks
+    our budget, and the 429's Retry-After pauses every window, so the fetch completes without a ban.
+    """
+    app = create_app(weight_limit=20, window_seconds=1.0)
+    app.state.exchange.used_weight = 14
+    budget = RequestWeightBudget(20, window_seconds=1.0) # Thinks the whole window is free
+    end_ms = START_MS + 12 * 50 * MINUTE_MS
+
+    started = time.monotonic()
+    async with _mock_exchange_client(app) as client:
+        with patch("backend.data_ingestion_service.historical_data_fetcher.settings", mock_exchange_settings):
+            klines = await fetch_historical_klines(
+                "ETHUSDT", "1m", START_MS, end_ms, limit_per_api_call=50,
+                weight_budget=budget, max_concurrent_windows=12, client=client
+            )
+
+    assert len(klines) == 12 * 50
+    assert budget.server_used_weight is not None
+    assert app.state.exchange.ban_responses == 0
+    assert app.state.exchange.rate_limited_responses <= 12 # At most one 429 per window before the pause kicks in
+    assert time.monotonic() - started < 10
+
+@pytest.mark.asyncio
+async def test_budget_observes_headers_directly():
+    budget = RequestWeightBudget(100)
+    budget.observe_response(200, httpx.Headers({"X-MBX-USED-WEIGHT-1M": "90"}))
+    assert budget.available <= 10.1
+    budget.observe_response(429, httpx.Headers({"Retry-After": "3"}))
+    assert budget.rate_limited_count == 1
+    assert budget._blocked_until - time.monotonic() > 2.5
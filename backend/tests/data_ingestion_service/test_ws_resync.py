@@ -0,0 +1,114 @@
+"""
+Tests for the WebSocket manager's reconnect resync: klines that closed while the stream was down are
+fetched over REST (from the local mock exchange) and fed through the handler before live messages.
+"""
+import asyncio
+import time
+import httpx
+import orjson
+import pytest
+import websockets
+from unittest.mock import patch
+
+from backend.app.config import Settings
+from backend.data_ingestion_service import binance_connector
+from backend.data_ingestion_service.binance_connector import BinanceWebSocketManager
+from backend.data_ingestion_service.historical_data_fetcher import fetch_closed_kline_records
+from backend.data_ingestion_service.rate_limiter import RequestWeightBudget
+from backend.mock_exchange_server.app import create_app
+
+pytestmark = pytest.mark.asyncio
+
+MINUTE_MS = 60_000
+
+def _mock_exchange_patches(client):
+    return (
+        patch("backend.data_ingestion_service.historical_data_fetcher.settings", Settings(BINANCE_REST_BASE_URL="http://mock-exchange")),
+        patch("backend.data_ingestion_service.historical_data_fetcher.get_http_client", return_value=client),
+    )
+
+def _ws_kline_message(open_time: int, closed: bool) -> bytes:
+    return orjson.dumps({"e": "kline", "E": open_time + MINUTE_MS, "s": "BTCUSDT", "k": {
+        "t": open_time, "T": open_time + MINUTE_MS - 1, "s": "BTCUSDT", "i": "1m", "o": "1.0", "c": "1.5",
+        "h": "2.0", "l": "0.5", "v": "10.0", "n": 3, "x": closed, "q": "15.0", "V": "4.0", "Q": "6.0",
+    }})
+
+class _FakeConnection:
+    """Plays back queued messages, then reports the connection as closed."""
+
+    def __init__(self, messages, on_exhausted=None):
+        self._messages = list(messages)
+        self._on_exhausted = on_exhausted
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def recv(self):
+        if self._messages:
+            return self._messages.pop(0)
+        if self._on_exhausted:
+            self._on_exhausted()
+        raise websockets.exceptions.ConnectionClosedOK(None, None)
+
+    async def close(self):
+        pass
+
+async def test_fetch_closed_kline_records_leaves_out_the_open_kline():
+    now_ms = int(time.time() * 1000)
+    current_open = now_ms - now_ms % MINUTE_MS
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app()), base_url="http://mock-exchange") as client:
+        settings_patch, client_patch = _mock_exchange_patches(client)
+        with settings_patch, client_patch:
+            records, completed = await fetch_closed_kline_records(
+                "BTCUSDT", "1m", current_open - 5 * MINUTE_MS, now_ms, weight_budget=RequestWeightBudget(1000)
+            )
+    assert completed
+    assert [r.open_time for r in records] == [current_open - i * MINUTE_MS for i in range(5, 0, -1)]
+    assert all(r.is_closed and r.symbol == "BTCUSDT" and isinstance(r.open, str) for r in records)
+
+async def test_reconnect_feeds_missed_klines_before_live_messages():
+    now_ms = int(time.time() * 1000)
+    current_open = now_ms - now_ms % MINUTE_MS
+    last_seen = current_open - 4 * MINUTE_MS
+    shutdown = asyncio.Event()
+    handled = []
+
+    async def handler(kline):
+        handled.append((kline.open_time, kline.is_closed))
+
+    connections = iter([
+        _FakeConnection([_ws_kline_message(last_seen, closed=True)]),
+        # After the reconnect only the still-open kline's tick arrives live
+        _FakeConnection([_ws_kline_message(current_open, closed=False)], on_exhausted=shutdown.set),
+    ])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app()), base_url="http://mock-exchange") as client:
+        settings_patch, client_patch = _mock_exchange_patches(client)
+        with settings_patch, client_patch, patch.object(binance_connector, "INITIAL_RECONNECT_DELAY_SECONDS", 0), \
+             patch.object(binance_connector.websockets, "connect", side_effect=lambda *a, **kw: next(connections)):
+            manager = BinanceWebSocketManager("BTCUSDT", "1m", handler, shutdown, weight_budget=RequestWeightBudget(1000))
+            await asyncio.wait_for(manager.run(), timeout=10)
+            await asyncio.sleep(0) # Live messages are handled in their own tasks
+
+    missed = [current_open - i * MINUTE_MS for i in range(3, 0, -1)]
+    assert handled == [(last_seen, True)] + [(ot, True) for ot in missed] + [(current_open, False)]
+    assert manager.last_closed_open_time == missed[-1]
+    assert manager.resynced_klines_total == 3
+
+async def test_resync_is_bounded_and_skipped_without_history():
+    handled = []
+
+    async def handler(kline):
+        handled.append(kline.open_time)
+
+    manager = BinanceWebSocketManager("BTCUSDT", "1m", handler, asyncio.Event())
+    assert await manager._resync_missed_klines() == 0 # First connection: the startup gap fill covers it
+
+    manager.last_closed_open_time = 0 # Down since 1970
+    with patch.object(binance_connector, "fetch_closed_kline_records", return_value=([], True)) as fetch:
+        await manager._resync_missed_klines()
+    start_ms, end_ms = fetch.call_args.args[2:4]
+    assert end_ms - start_ms <= (manager.settings.WS_RESYNC_MAX_KLINES + 1) * MINUTE_MS
+    assert start_ms % MINUTE_MS == 0